@@ -348,6 +348,8 @@ class TestCloneProgressReporter(CloneProgressReporterHelper):
                 try:
                     p = o['status']['progress_report']['percentage cloned']
                     log.debug(f'percentage cloned = {p}')
+                    self.assertIn('files/s', o['status']['progress_report'])
+                    self.assertIn('bytes/s', o['status']['progress_report'])
                 except KeyError:
                     # if KeyError is caught, either progress_report is present
                     # or clone is complete
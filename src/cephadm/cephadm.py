@@ -1,7 +1,9 @@
 #!/usr/bin/python3
 
 import argparse
+import base64
 import datetime
+import hashlib
 import ipaddress
 import io
 import json
@@ -18,6 +20,7 @@ import tempfile
 import time
 import errno
 import ssl
+import zlib
 from typing import Dict, List, Tuple, Optional, Union, Any, Callable, Sequence, TypeVar, cast
 
 import re
@@ -136,7 +139,13 @@ from cephadmlib.logging import (
     Highlight,
     LogDestination,
 )
-from cephadmlib.systemd import check_unit, check_units, terminate_service, enable_service
+from cephadmlib.systemd import (
+    check_unit,
+    check_unit_batch,
+    check_units,
+    terminate_service,
+    enable_service,
+)
 from cephadmlib import systemd_unit
 from cephadmlib.signals import send_signal_to_container_entrypoint
 from cephadmlib import runscripts
@@ -153,7 +162,7 @@ from cephadmlib.decorators import (
     executes_early,
     require_image
 )
-from cephadmlib.host_facts import HostFacts, list_networks
+from cephadmlib.host_facts import HostFacts, HostFactsCache, list_networks
 from cephadmlib.ssh import authorize_ssh_key, check_ssh_connectivity
 from cephadmlib.daemon_form import (
     DaemonForm,
@@ -1276,6 +1285,12 @@ class CephadmAgent(DaemonForm):
         'listener.key',
     ]
 
+    # metadata fields that change on every iteration. They are left out of
+    # the section hashes and sent on their own (see _metadata_payload)
+    volatile_facts = ('timestamp', 'system_uptime', 'memory_free_kb',
+                      'memory_available_kb', 'cpu_load', 'facts_timing')
+    volatile_daemon_fields = ('memory_usage', 'cpu_percentage')
+
     @classmethod
     def for_daemon_type(cls, daemon_type: str) -> bool:
         return cls.daemon_type == daemon_type
@@ -1312,6 +1327,14 @@ class CephadmAgent(DaemonForm):
         self.recent_iteration_run_times: List[float] = [0.0, 0.0, 0.0]
         self.recent_iteration_index: int = 0
         self.cached_ls_values: Dict[str, Dict[str, str]] = {}
+        # hashes of the metadata sections the mgr reported holding for us.
+        # Only sections with a different hash are sent
+        self.acked_hashes: Dict[str, str] = {}
+        self.mgr_supports_delta = False
+        # host facts that rarely change are not gathered again every iteration
+        self.facts_cache = HostFactsCache()
+        self.compress_metadata = False
+        self.metadata_resent = False
         self.ssl_ctx = ssl.create_default_context()
         self.ssl_ctx.check_hostname = True
         self.ssl_ctx.verify_mode = ssl.CERT_REQUIRED
@@ -1390,6 +1413,7 @@ class CephadmAgent(DaemonForm):
                 self.starting_port = int(config['listener_port'])
                 self.host = config['host']
                 use_lsm = config['device_enhanced_scan']
+                compress = config.get('compress_metadata', 'False')
         except Exception as e:
             self.shutdown()
             raise Error(f'Failed to get agent target ip and port from config: {e}')
@@ -1406,6 +1430,7 @@ class CephadmAgent(DaemonForm):
         self.device_enhanced_scan = False
         if use_lsm.lower() == 'true':
             self.device_enhanced_scan = True
+        self.compress_metadata = compress.lower() == 'true'
         self.volume_gatherer.update_func(lambda: self._ceph_volume(enhanced=self.device_enhanced_scan))
 
     def run(self) -> None:
@@ -1445,17 +1470,14 @@ class CephadmAgent(DaemonForm):
                 for k, v in networks[key].items():
                     networks_list[key][k] = list(v)
 
-            data = json.dumps({'host': self.host,
-                               'ls': (self.ls_gatherer.data if self.ack == self.ls_gatherer.ack
-                                      and self.ls_gatherer.data is not None else []),
-                               'networks': networks_list,
-                               'facts': HostFacts(self.ctx).dump(),
-                               'volume': (self.volume_gatherer.data if self.ack == self.volume_gatherer.ack
-                                          and self.volume_gatherer.data is not None else ''),
-                               'ack': str(ack),
-                               'keyring': self.keyring,
-                               'port': self.listener_port})
-            data = data.encode('ascii')
+            sections = {'ls': (self.ls_gatherer.data if self.ack == self.ls_gatherer.ack
+                               and self.ls_gatherer.data is not None else []),
+                        'networks': networks_list,
+                        'facts': HostFacts(self.ctx, cache=self.facts_cache).dump(),
+                        'volume': (self.volume_gatherer.data if self.ack == self.volume_gatherer.ack
+                                   and self.volume_gatherer.data is not None else '')}
+            payload = self._metadata_payload(sections, ack)
+            data = json.dumps(payload).encode('ascii')
 
             try:
                 send_time = time.monotonic()
@@ -1470,8 +1492,10 @@ class CephadmAgent(DaemonForm):
                 response_json = json.loads(response)
                 total_request_time = datetime.timedelta(seconds=(time.monotonic() - send_time)).total_seconds()
                 logger.info(f'Received mgr response: "{response_json["result"]}" {total_request_time} seconds after sending request.')
+                self._handle_metadata_ack(payload['hashes'], response_json.get('hashes'))
             except Exception as e:
                 logger.error(f'Failed to send metadata to mgr: {e}')
+                self.acked_hashes = {}
 
             end_time = time.monotonic()
             run_time = datetime.timedelta(seconds=(end_time - start_time))
@@ -1482,6 +1506,74 @@ class CephadmAgent(DaemonForm):
             self.event.wait(max(self.loop_interval - int(run_time_average), 0))
             self.event.clear()
 
+    def _split_volatile(self, section: str, value: Any) -> Tuple[Any, Any]:
+        # the part of a section that is hashed, and its volatile fields
+        if section == 'facts':
+            facts = json.loads(value)
+            volatile = {k: facts.pop(k) for k in self.volatile_facts if k in facts}
+            return facts, volatile
+        if section == 'ls':
+            daemons = []
+            volatile = {}
+            for d in value:
+                daemons.append({k: v for k, v in d.items() if k not in self.volatile_daemon_fields})
+                if 'name' in d:
+                    volatile[d['name']] = {k: d[k] for k in self.volatile_daemon_fields if k in d}
+            return daemons, volatile
+        return value, None
+
+    def _metadata_payload(self, sections: Dict[str, Any], ack: int) -> Dict[str, Any]:
+        # Every section we have data for is reported by hash, but only sent
+        # if the mgr does not already hold it. Sections without data for the
+        # current ack are sent empty, as before. The volatile fields of the
+        # sections that are not sent are sent on their own, every time.
+        hashes = {}
+        volatile = {}
+        for section, value in sections.items():
+            if not value:
+                continue
+            stable, volatile[section] = self._split_volatile(section, value)
+            hashes[section] = hashlib.sha256(json.dumps(stable, sort_keys=True).encode('utf-8')).hexdigest()
+        changed = {
+            section: value for section, value in sections.items()
+            if section not in hashes or self.acked_hashes.get(section) != hashes[section]
+        }
+        if self.mgr_supports_delta:
+            volatile = {
+                section: fields for section, fields in volatile.items()
+                if fields and section not in changed
+            }
+            if volatile:
+                changed['volatile'] = volatile
+        payload: Dict[str, Any] = {'host': self.host}
+        # a mgr that does not know about deltas would not understand
+        # compressed sections either
+        if self.compress_metadata and self.mgr_supports_delta and changed:
+            payload['compressed'] = base64.b64encode(
+                zlib.compress(json.dumps(changed).encode('utf-8'))).decode('ascii')
+        else:
+            payload.update(changed)
+        payload.update({'ack': str(ack),
+                        'keyring': self.keyring,
+                        'port': self.listener_port,
+                        'hashes': hashes})
+        return payload
+
+    def _handle_metadata_ack(self, sent_hashes: Dict[str, str], acked_hashes: Optional[Dict[str, str]]) -> None:
+        # a mgr without delta support does not report hashes, so we keep
+        # sending everything
+        self.mgr_supports_delta = acked_hashes is not None
+        self.acked_hashes = acked_hashes or {}
+        if self.mgr_supports_delta and any(self.acked_hashes.get(s) != h for s, h in sent_hashes.items()):
+            # the mgr is missing something we only sent the hash of (e.g. it
+            # failed over). Send it right away rather than next iteration
+            if not self.metadata_resent:
+                logger.info('mgr is missing agent metadata. Resending')
+                self.metadata_resent = True
+                self.wakeup()
+        else:
+            self.metadata_resent = False
+
     def _ceph_volume(self, enhanced: bool = False) -> Tuple[str, bool]:
         self.ctx.command = 'inventory --format=json'.split()
         if enhanced:
@@ -1524,14 +1616,13 @@ class CephadmAgent(DaemonForm):
                         continue
                     (cluster, daemon_id) = j.split('-', 1)
                     legacy_unit_name = 'ceph-%s@%s' % (daemon_type, daemon_id)
-                    (enabled, state, _) = check_unit(self.ctx, legacy_unit_name)
                     daemons[f'{daemon_type}.{daemon_id}'] = {
                         'style': 'legacy',
                         'name': '%s.%s' % (daemon_type, daemon_id),
                         'fsid': self.ctx.fsid if self.ctx.fsid is not None else 'unknown',
                         'systemd_unit': legacy_unit_name,
-                        'enabled': 'true' if enabled else 'false',
-                        'state': state,
+                        'enabled': None,  # filled in below
+                        'state': None,
                     }
             elif is_fsid(i):
                 fsid = str(i)  # convince mypy that fsid is a str here
@@ -1539,12 +1630,11 @@ class CephadmAgent(DaemonForm):
                     if '.' in j and os.path.isdir(os.path.join(data_dir, fsid, j)):
                         (daemon_type, daemon_id) = j.split('.', 1)
                         unit_name = get_unit_name(fsid, daemon_type, daemon_id)
-                        (enabled, state, _) = check_unit(self.ctx, unit_name)
                         daemons[j] = {
                             'style': 'cephadm:v1',
                             'systemd_unit': unit_name,
-                            'enabled': 'true' if enabled else 'false',
-                            'state': state,
+                            'enabled': None,  # filled in below
+                            'state': None,
                         }
                         c = CephContainer.for_daemon(
                             self.ctx,
@@ -1559,6 +1649,15 @@ class CephadmAgent(DaemonForm):
                         daemons[j]['container_id'] = container_id
                         if container_id:
                             daemons[j]['memory_usage'] = seen_memusage.get(container_id[0:seen_memusage_cid_len])
+        unit_status = check_unit_batch(
+            self.ctx, [d['systemd_unit'] for d in daemons.values()]) or {}
+        for d in daemons.values():
+            if d['systemd_unit'] in unit_status:
+                (enabled, state, _) = unit_status[d['systemd_unit']]
+            else:
+                (enabled, state, _) = check_unit(self.ctx, d['systemd_unit'])
+            d['enabled'] = 'true' if enabled else 'false'
+            d['state'] = state
         return daemons
 
     def _parse_container_id_name(self, code: int, out: str) -> Dict[str, str]:
@@ -1573,7 +1672,7 @@ class CephadmAgent(DaemonForm):
     def _get_ls(self) -> Tuple[List[Dict[str, str]], bool]:
         if not self.cached_ls_values:
             logger.info('No cached ls output. Running full daemon ls')
-            ls = list_daemons(self.ctx)
+            ls = list_daemons(self.ctx, batch=True)
             for d in ls:
                 self.cached_ls_values[d['name']] = d
             return (ls, True)
@@ -1586,7 +1685,7 @@ class CephadmAgent(DaemonForm):
                 # If that happens we need a full ls
                 logger.info('Change detected in state of daemons. Running full daemon ls')
                 self.cached_ls_values = {}
-                ls = list_daemons(self.ctx)
+                ls = list_daemons(self.ctx, batch=True)
                 for d in ls:
                     self.cached_ls_values[d['name']] = d
                 return (ls, True)
@@ -1616,7 +1715,7 @@ class CephadmAgent(DaemonForm):
                         self.cached_ls_values[daemon]['memory_usage'] = ls_subset[daemon]['memory_usage']
             if need_full_ls:
                 logger.info('Change detected in state of daemons. Running full daemon ls')
-                ls = list_daemons(self.ctx)
+                ls = list_daemons(self.ctx, batch=True)
                 self.cached_ls_values = {}
                 for d in ls:
                     self.cached_ls_values[d['name']] = d
@@ -3335,7 +3434,8 @@ def command_ls(ctx):
     # type: (CephadmContext) -> None
     ls = list_daemons(ctx, detail=not ctx.no_detail,
                       legacy_dir=ctx.legacy_dir,
-                      daemon_name=ctx.name)
+                      daemon_name=ctx.name,
+                      batch=True)
     print(json.dumps(ls, indent=4))
 
 
@@ -3345,11 +3445,15 @@ def list_daemons(
     legacy_dir: Optional[str] = None,
     daemon_name: Optional[str] = None,
     type_of_daemon: Optional[str] = None,
+    batch: bool = False,
 ) -> List[Dict[str, str]]:
+    # with batch set, the state of all the systemd units and containers is
+    # looked up with one systemctl and one container engine call rather
+    # than with a few calls per daemon
     _updater: DaemonStatusUpdater = NoOpDaemonStatusUpdater()
     if detail:
         detail_updaters = [
-            CoreStatusUpdater(),
+            CoreStatusUpdater(batch=batch),
             DigestsStatusUpdater(),
             VersionStatusUpdater(),
             MemUsageStatusUpdater(),
@@ -3357,12 +3461,13 @@ def list_daemons(
         ]
         _updater = CombinedStatusUpdater(detail_updaters)
 
-    daemon_entries = daemons_matching(
+    daemon_entries = list(daemons_matching(
         ctx,
         legacy_dir,
         daemon_name=daemon_name,
         daemon_type=type_of_daemon,
-    )
+    ))
+    _updater.prepare(ctx, daemon_entries)
     return [_updater.expand(ctx, entry) for entry in daemon_entries]
 
 
@@ -331,6 +331,9 @@ class ContainerInfo:
         )
 
 
+_CONTAINER_STATS_FORMAT = '{{.Id}},{{.Config.Image}},{{.Image}},{{.Created}},{{index .Config.Labels "io.ceph.version"}}'
+
+
 def _container_stats(
     ctx: CephadmContext,
     container_name: str,
@@ -344,7 +347,7 @@ def _container_stats(
         container_path,
         'inspect',
         '--format',
-        '{{.Id}},{{.Config.Image}},{{.Image}},{{.Created}},{{index .Config.Labels "io.ceph.version"}}',
+        _CONTAINER_STATS_FORMAT,
         container_name,
     ]
     out, err, code = call(ctx, cmd, verbosity=CallVerbosity.QUIET)
@@ -372,6 +375,63 @@ def parsed_container_stats(
     return _parse_container_stats(out, err, code)
 
 
+def _container_stats_batch(
+    ctx: CephadmContext,
+    container_names: List[str],
+    *,
+    container_path: str,
+) -> Tuple[str, str, int]:
+    """returns the name followed by the _container_stats fields, one line per
+    existing container
+    """
+    container_path = container_path or ctx.container_engine.path
+    cmd = [
+        container_path,
+        'inspect',
+        '--format',
+        '{{.Name}},' + _CONTAINER_STATS_FORMAT,
+    ] + container_names
+    out, err, code = call(ctx, cmd, verbosity=CallVerbosity.QUIET)
+    return out, err, code
+
+
+def _parse_container_stats_batch(
+    out: str, err: str, code: int
+) -> Optional[Dict[str, ContainerInfo]]:
+    # inspect fails if any of the containers does not exist, but still
+    # reports the ones that do
+    if code != 0 and 'no such' not in err.lower():
+        return None
+    stats = {}
+    for line in out.splitlines():
+        if not line.strip():
+            continue
+        name, _, fields = line.strip().partition(',')
+        try:
+            # docker prefixes the name with a slash
+            stats[name.lstrip('/')] = ContainerInfo(*fields.split(','))
+        except TypeError:
+            return None
+    return stats
+
+
+def parsed_container_stats_batch(
+    ctx: CephadmContext,
+    container_names: List[str],
+    *,
+    container_path: str = '',
+) -> Optional[Dict[str, ContainerInfo]]:
+    """Return the ContainerInfo of each of the named containers that exist,
+    using a single inspect call, or None if the container engine failed.
+    """
+    if not container_names:
+        return {}
+    out, err, code = _container_stats_batch(
+        ctx, container_names, container_path=container_path
+    )
+    return _parse_container_stats_batch(out, err, code)
+
+
 def _container_image_stats(
     ctx: CephadmContext, image_name: str, *, container_path: str = ''
 ) -> Tuple[str, str, int]:
@@ -15,6 +15,7 @@ from .container_engines import (
     Docker,
     Podman,
     parsed_container_stats,
+    parsed_container_stats_batch,
 )
 from .context import CephadmContext
 from .daemon_identity import DaemonIdentity, DaemonSubIdentity
@@ -687,3 +688,30 @@ def get_container_stats(
         if ci is not None:
             return ci
     return None
+
+
+def get_container_stats_batch(
+    ctx: CephadmContext,
+    identities: List[DaemonIdentity],
+    *,
+    container_path: str = '',
+) -> Optional[Dict[str, Optional[ContainerInfo]]]:
+    """Return what get_container_stats would for each daemon, keyed by the
+    daemon's unit name, using a single container engine call. Returns None
+    if the container engine failed.
+    """
+    names = {}
+    for identity in identities:
+        c = CephContainer.for_daemon(ctx, identity, 'bash')
+        names[identity.unit_name] = (c.cname, c.old_cname)
+    stats = parsed_container_stats_batch(
+        ctx,
+        [name for cnames in names.values() for name in cnames],
+        container_path=container_path,
+    )
+    if stats is None:
+        return None
+    result: Dict[str, Optional[ContainerInfo]] = {}
+    for unit_name, (cname, old_cname) in names.items():
+        result[unit_name] = stats.get(cname) or stats.get(old_cname)
+    return result
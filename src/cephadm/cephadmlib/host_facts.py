@@ -12,7 +12,17 @@ import time
 from glob import glob
 from pathlib import Path
 
-from typing import Any, cast, Dict, List, Optional, Set, Union
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from cephadmlib.call_wrappers import call, call_throws, CallVerbosity
 from cephadmlib.context import CephadmContext
@@ -113,31 +123,166 @@ class Enclosure:
         return self._dump()
 
 
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+class HostFactsCache:
+    """Keeps sections of the host facts between HostFacts instances, so a
+    long running caller (the agent) does not gather everything again on
+    every dump.
+
+    A section is gathered again once it is older than its TTL, or as soon
+    as its signature, a cheap summary of the state it was gathered from
+    (e.g. the block devices and their sizes), changes.
+    """
+
+    def __init__(self) -> None:
+        # section -> (time.monotonic() it was gathered, signature, value)
+        self._sections: Dict[str, Tuple[float, Any, Any]] = {}
+
+    def get(
+        self,
+        section: str,
+        ttl: float,
+        fetch: Callable[[], Any],
+        signature: Optional[Callable[[], Any]] = None,
+    ) -> Tuple[Any, Optional[float]]:
+        """Return the section's value and how long it took to gather it, or
+        None if it came from the cache.
+        """
+        sig = signature() if signature else None
+        now = time.monotonic()
+        entry = self._sections.get(section)
+        if entry is not None and now - entry[0] < ttl and entry[1] == sig:
+            return entry[2], None
+        value = fetch()
+        self._sections[section] = (now, sig, value)
+        return value, time.monotonic() - now
+
+
 class HostFacts:
     _dmi_path_list = ['/sys/class/dmi/id']
+    _dmi_fields = [
+        'sys_vendor',
+        'product_family',
+        'product_name',
+        'bios_version',
+        'bios_date',
+        'chassis_serial',
+        'board_serial',
+        'product_serial',
+    ]
     _nic_path_list = ['/sys/class/net']
     _apparmor_path_list = ['/etc/apparmor']
     _disk_vendor_workarounds = {'0x1af4': 'Virtio Block Device'}
     _excluded_block_devices = ('sr', 'zram', 'dm-', 'loop', 'md')
     _sg_generic_glob = '/sys/class/scsi_generic/*'
-
-    def __init__(self, ctx: CephadmContext):
+    # how long (seconds) a section kept in a HostFactsCache is reused for.
+    # Memory, load, uptime and ports are read on every dump.
+    _section_ttls = {
+        'cpu': 3600,
+        'dmi': 3600,
+        'os': 3600,
+        'sysctl': 300,
+        'kernel_parameters': 300,
+        'security': 300,
+        'nics': 60,
+        'block_devices': 600,
+    }
+
+    def __init__(
+        self, ctx: CephadmContext, cache: Optional[HostFactsCache] = None
+    ):
+        start = time.monotonic()
         self.ctx: CephadmContext = ctx
-        self.cpu_model: str = 'Unknown'
-        self.sysctl_options: Dict[str, str] = self._populate_sysctl_options()
-        self.cpu_count: int = 0
-        self.cpu_cores: int = 0
-        self.cpu_threads: int = 0
-        self.interfaces: Dict[str, Any] = {}
+        # without a cache shared with other instances, every section is
+        # gathered (once) by this instance
+        self._cache = cache or HostFactsCache()
+        self._refreshed: Dict[str, float] = {}
+        self._cached_sections: Set[str] = set()
+        self.sysctl_options: Dict[str, str] = self._cached(
+            'sysctl', self._populate_sysctl_options
+        )
 
         self._meminfo: List[str] = read_file(['/proc/meminfo']).splitlines()
-        self._get_cpuinfo()
-        self._process_nics()
+        cpuinfo = self._cached('cpu', self._get_cpuinfo)
+        self.cpu_model: str = cpuinfo['cpu_model']
+        self.cpu_count: int = cpuinfo['cpu_count']
+        self.cpu_cores: int = cpuinfo['cpu_cores']
+        self.cpu_threads: int = cpuinfo['cpu_threads']
+        self.interfaces: Dict[str, Any] = self._cached(
+            'nics', self._process_nics, self._nics_signature
+        )
         self.arch: str = platform.processor()
         self.kernel: str = platform.release()
+        self._dmi: Dict[str, str] = self._cached('dmi', self._get_dmi)
+        (
+            self._enclosures,
+            self._block_devices,
+            self._device_list,
+        ) = self._cached(
+            'block_devices',
+            self._get_block_device_facts,
+            self._block_devices_signature,
+        )
+        self._init_time = time.monotonic() - start
+
+    def _cached(
+        self,
+        section: str,
+        fetch: Callable[[], Any],
+        signature: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        value, duration = self._cache.get(
+            section, HostFacts._section_ttls[section], fetch, signature
+        )
+        if duration is None:
+            self._cached_sections.add(section)
+        else:
+            self._refreshed[section] = duration
+        return value
+
+    def _get_block_device_facts(
+        self,
+    ) -> Tuple[Dict[str, 'Enclosure'], List[str], List[Dict[str, object]]]:
         self._enclosures = self._discover_enclosures()
         self._block_devices = self._get_block_devs()
         self._device_list = self._get_device_info()
+        return self._enclosures, self._block_devices, self._device_list
+
+    @staticmethod
+    def _block_devices_signature() -> Tuple[Any, ...]:
+        """Changes when a block device, a device path, a multipath device
+        or an enclosure is added or removed, or a device is resized"""
+        devs = [
+            (dev, read_file([os.path.join('/sys/block', dev, 'size')]))
+            for dev in sorted(os.listdir('/sys/block'))
+            if not dev.startswith(HostFacts._excluded_block_devices)
+        ]
+        return (
+            devs,
+            _mtime('/dev/disk/by-path'),
+            _mtime('/dev/mapper'),
+            sorted(glob(HostFacts._sg_generic_glob)),
+        )
+
+    @staticmethod
+    def _nics_signature() -> List[Tuple[str, str]]:
+        """Changes when a NIC is added or removed or goes up or down"""
+        sig = []
+        for nic_path in HostFacts._nic_path_list:
+            if not os.path.exists(nic_path):
+                continue
+            for iface in sorted(os.listdir(nic_path)):
+                operstate = read_file(
+                    [os.path.join(nic_path, iface, 'operstate')]
+                )
+                sig.append((iface, operstate))
+        return sig
 
     def _populate_sysctl_options(self) -> Dict[str, str]:
         sysctl_options = {}
@@ -196,24 +341,30 @@ class HostFacts:
         return len(self._enclosures.keys())
 
     def _get_cpuinfo(self):
-        # type: () -> None
+        # type: () -> Dict[str, Any]
         """Determine cpu information via /proc/cpuinfo"""
         raw = read_file(['/proc/cpuinfo'])
         output = raw.splitlines()
         cpu_set = set()
+        cpuinfo: Dict[str, Any] = {
+            'cpu_model': 'Unknown',
+            'cpu_cores': 0,
+            'cpu_threads': 0,
+        }
 
         for line in output:
             field = [f.strip() for f in line.split(':')]
             if 'model name' in line:
-                self.cpu_model = field[1]
+                cpuinfo['cpu_model'] = field[1]
             if 'physical id' in line:
                 cpu_set.add(field[1])
             if 'siblings' in line:
-                self.cpu_threads = int(field[1].strip())
+                cpuinfo['cpu_threads'] = int(field[1].strip())
             if 'cpu cores' in line:
-                self.cpu_cores = int(field[1].strip())
+                cpuinfo['cpu_cores'] = int(field[1].strip())
             pass
-        self.cpu_count = len(cpu_set)
+        cpuinfo['cpu_count'] = len(cpu_set)
+        return cpuinfo
 
     def _get_block_devs(self):
         # type: () -> List[str]
@@ -228,6 +379,10 @@ class HostFacts:
     def operating_system(self):
         # type: () -> str
         """Determine OS version"""
+        return self._cached('os', self._get_operating_system)
+
+    def _get_operating_system(self):
+        # type: () -> str
         raw_info = read_file(['/etc/os-release'])
         os_release = raw_info.splitlines()
         rel_str = 'Unknown'
@@ -486,8 +641,9 @@ class HostFacts:
         return bytes_to_human(self.flash_capacity_bytes)
 
     def _process_nics(self):
-        # type: () -> None
+        # type: () -> Dict[str, Any]
         """Look at the NIC devices and extract network related metadata"""
+        interfaces: Dict[str, Any] = {}
         # from https://github.com/torvalds/linux/blob/master/include/uapi/linux/if_arp.h
         hw_lookup = {
             '1': 'ethernet',
@@ -557,7 +713,7 @@ class HostFacts:
                     iftype = 'logical'
                     driver = ''
 
-                self.interfaces[iface] = {
+                interfaces[iface] = {
                     'mtu': mtu,
                     'upper_devs_list': upper_devs_list,
                     'lower_devs_list': lower_devs_list,
@@ -569,6 +725,7 @@ class HostFacts:
                     'ipv4_address': get_ipv4_address(iface),
                     'ipv6_address': get_ipv6_address(iface),
                 }
+        return interfaces
 
     @property
     def nic_count(self):
@@ -606,18 +763,25 @@ class HostFacts:
         """Determine the memory available to new applications without swapping"""
         return self._get_mem_data('MemAvailable')
 
+    def _get_dmi(self):
+        # type: () -> Dict[str, str]
+        return {
+            name: read_file(HostFacts._dmi_path_list, name)
+            for name in HostFacts._dmi_fields
+        }
+
     @property
     def vendor(self):
         # type: () -> str
         """Determine server vendor from DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'sys_vendor')
+        return self._dmi['sys_vendor']
 
     @property
     def model(self):
         # type: () -> str
         """Determine server model information from DMI data in sysfs"""
-        family = read_file(HostFacts._dmi_path_list, 'product_family')
-        product = read_file(HostFacts._dmi_path_list, 'product_name')
+        family = self._dmi['product_family']
+        product = self._dmi['product_name']
         if family == 'Unknown' and product:
             return '{}'.format(product)
 
@@ -627,31 +791,31 @@ class HostFacts:
     def bios_version(self):
         # type: () -> str
         """Determine server BIOS version from  DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'bios_version')
+        return self._dmi['bios_version']
 
     @property
     def bios_date(self):
         # type: () -> str
         """Determine server BIOS date from  DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'bios_date')
+        return self._dmi['bios_date']
 
     @property
     def chassis_serial(self):
         # type: () -> str
         """Determine chassis serial number from DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'chassis_serial')
+        return self._dmi['chassis_serial']
 
     @property
     def board_serial(self):
         # type: () -> str
         """Determine mainboard serial number from DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'board_serial')
+        return self._dmi['board_serial']
 
     @property
     def product_serial(self):
         # type: () -> str
         """Determine server's serial number from DMI data in sysfs"""
-        return read_file(HostFacts._dmi_path_list, 'product_serial')
+        return self._dmi['product_serial']
 
     @property
     def timestamp(self):
@@ -671,6 +835,10 @@ class HostFacts:
     def kernel_security(self):
         # type: () -> Dict[str, str]
         """Determine the security features enabled in the kernel - SELinux, AppArmor"""
+        return self._cached('security', self._get_kernel_security)
+
+    def _get_kernel_security(self):
+        # type: () -> Dict[str, str]
 
         def _fetch_selinux() -> Dict[str, str]:
             """Get the selinux status"""
@@ -766,7 +934,12 @@ class HostFacts:
     def kernel_parameters(self):
         # type: () -> Dict[str, str]
         """Get kernel parameters required/used in Ceph clusters"""
+        return self._cached(
+            'kernel_parameters', self._get_kernel_parameters
+        )
 
+    def _get_kernel_parameters(self):
+        # type: () -> Dict[str, str]
         k_param = {}
         out, _, _ = call_throws(
             self.ctx, ['sysctl', '-a'], verbosity=CallVerbosity.SILENT
@@ -828,13 +1001,23 @@ class HostFacts:
     def dump(self):
         # type: () -> str
         """Return the attributes of this HostFacts object as json"""
-        data = {
-            k: getattr(self, k)
-            for k in dir(self)
-            if not k.startswith('_')
-            and isinstance(
-                getattr(self, k), (float, int, str, list, dict, tuple)
-            )
+        start = time.monotonic()
+        data = {}
+        for k in dir(self):
+            if k.startswith('_'):
+                continue
+            v = getattr(self, k)
+            if isinstance(v, (float, int, str, list, dict, tuple)):
+                data[k] = v
+        # how long gathering the facts took, and which sections came from
+        # the cache
+        data['facts_timing'] = {
+            'init': round(self._init_time, 6),
+            'dump': round(time.monotonic() - start, 6),
+            'refreshed': {
+                k: round(v, 6) for k, v in sorted(self._refreshed.items())
+            },
+            'cached': sorted(self._cached_sections - set(self._refreshed)),
         }
         return json.dumps(data, indent=2, sort_keys=True)
 
@@ -29,6 +29,11 @@
 # iterator and gather extra details in an ad-hoc way or get too much info than
 # needed and incur extra costs getting that unwanted data.
 #
+# Updaters may also implement a prepare method. When the caller has all of
+# the entries up front it can pass them to prepare before expanding any of
+# them, letting the updater gather its data for all entries at once (e.g. a
+# single systemctl or container engine call) rather than once per entry.
+#
 # The CombinedStatusUpdater class exists so that multiple updaters can be
 # easily combined. The init method of the class takes a list of other
 # DaemonStatusUpdater classes and calls them (in order) to update the status
@@ -267,6 +272,17 @@ class DaemonStatusUpdater:
     provided by the core listing functions in this module.
     """
 
+    def prepare(
+        self,
+        ctx: CephadmContext,
+        entries: List[Union[LegacyDaemonEntry, DaemonEntry]],
+    ) -> None:
+        """Called with all of the entries before any of them are expanded,
+        so that information can be gathered for all the entries at once
+        instead of once per entry.
+        """
+        pass
+
     def update(
         self,
         val: Dict[str, Any],
@@ -331,6 +347,14 @@ class CombinedStatusUpdater(DaemonStatusUpdater):
     def __init__(self, updaters: List[DaemonStatusUpdater]):
         self.updaters = updaters
 
+    def prepare(
+        self,
+        ctx: CephadmContext,
+        entries: List[Union[LegacyDaemonEntry, DaemonEntry]],
+    ) -> None:
+        for updater in self.updaters:
+            updater.prepare(ctx, entries)
+
     def update(
         self,
         val: Dict[str, Any],
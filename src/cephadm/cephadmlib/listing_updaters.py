@@ -1,6 +1,6 @@
 # Additional types to help with container & daemon listing
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import json
 import logging
@@ -8,11 +8,12 @@ import os
 
 from .call_wrappers import call, CallVerbosity
 from .container_engines import (
+    ContainerInfo,
     normalize_container_id,
     parsed_container_cpu_perc,
     parsed_container_mem_usage,
 )
-from .container_types import get_container_stats
+from .container_types import get_container_stats, get_container_stats_batch
 from .context import CephadmContext
 from .daemon_identity import DaemonIdentity
 from .daemons import (
@@ -29,18 +30,67 @@ from .daemons import (
 from .daemons.ceph import ceph_daemons
 from .data_utils import normalize_image_digest, try_convert_datetime
 from .file_utils import get_file_timestamp
-from .listing import DaemonStatusUpdater
-from .systemd import check_unit
+from .listing import DaemonEntry, DaemonStatusUpdater, LegacyDaemonEntry
+from .systemd import check_unit, check_unit_batch
 
 
 logger = logging.getLogger()
 
 
 class CoreStatusUpdater(DaemonStatusUpdater):
-    def __init__(self, keep_container_info: str = '') -> None:
+    def __init__(
+        self, keep_container_info: str = '', batch: bool = False
+    ) -> None:
         # set keep_container_info to a custom key that will be used to cache
         # the ContainerInfo object in the status dict.
         self.keep_container_info = keep_container_info
+        # with batch set, prepare() looks up the state of all the units and
+        # containers at once instead of calling systemctl and the container
+        # engine for every daemon.
+        self.batch = batch
+        self._unit_status: Optional[Dict[str, Tuple[bool, str, bool]]] = None
+        self._container_stats: Optional[
+            Dict[str, Optional[ContainerInfo]]
+        ] = None
+
+    def prepare(
+        self,
+        ctx: CephadmContext,
+        entries: List[Union[LegacyDaemonEntry, DaemonEntry]],
+    ) -> None:
+        if not self.batch:
+            return
+        # use the same unit names update and legacy_update check
+        self._unit_status = check_unit_batch(
+            ctx,
+            [
+                e.status['name']
+                if isinstance(e, LegacyDaemonEntry)
+                else e.identity.unit_name
+                for e in entries
+            ],
+        )
+        self._container_stats = get_container_stats_batch(
+            ctx,
+            [e.identity for e in entries if isinstance(e, DaemonEntry)],
+        )
+
+    def _check_unit(
+        self, ctx: CephadmContext, unit_name: str
+    ) -> Tuple[bool, str, bool]:
+        if self._unit_status and unit_name in self._unit_status:
+            return self._unit_status[unit_name]
+        return check_unit(ctx, unit_name)
+
+    def _get_container_stats(
+        self, ctx: CephadmContext, identity: DaemonIdentity
+    ) -> Optional[ContainerInfo]:
+        if (
+            self._container_stats is not None
+            and identity.unit_name in self._container_stats
+        ):
+            return self._container_stats[identity.unit_name]
+        return get_container_stats(ctx, identity)
 
     def update(
         self,
@@ -49,7 +99,7 @@ class CoreStatusUpdater(DaemonStatusUpdater):
         identity: DaemonIdentity,
         data_dir: str,
     ) -> None:
-        enabled, state, _ = check_unit(ctx, identity.unit_name)
+        enabled, state, _ = self._check_unit(ctx, identity.unit_name)
         val['enabled'] = enabled
         val['state'] = state
 
@@ -58,7 +108,7 @@ class CoreStatusUpdater(DaemonStatusUpdater):
         daemon_dir = os.path.join(
             data_dir, identity.fsid, identity.daemon_name
         )
-        cinfo = get_container_stats(ctx, identity)
+        cinfo = self._get_container_stats(ctx, identity)
         if self.keep_container_info:
             val[self.keep_container_info] = cinfo
         if cinfo:
@@ -112,7 +162,9 @@ class CoreStatusUpdater(DaemonStatusUpdater):
         cache = getattr(self, '_cache', {})
         setattr(self, '_cache', cache)
         legacy_unit_name = val['name']
-        (val['enabled'], val['state'], _) = check_unit(ctx, legacy_unit_name)
+        (val['enabled'], val['state'], _) = self._check_unit(
+            ctx, legacy_unit_name
+        )
         if not cache.get('host_version'):
             try:
                 out, err, code = call(
@@ -2,7 +2,7 @@
 
 import logging
 
-from typing import Tuple, List
+from typing import Dict, List, Optional, Tuple
 
 from .context import CephadmContext
 from .call_wrappers import call, CallVerbosity
@@ -10,6 +10,28 @@ from .call_wrappers import call, CallVerbosity
 logger = logging.getLogger()
 
 
+# UnitFileState values for which `systemctl is-enabled` exits 0
+_ENABLED_UNIT_FILE_STATES = {
+    'enabled',
+    'enabled-runtime',
+    'static',
+    'alias',
+    'indirect',
+    'generated',
+    'transient',
+}
+
+
+def _unit_state(active_state: str) -> str:
+    if active_state in ['active']:
+        return 'running'
+    elif active_state in ['inactive']:
+        return 'stopped'
+    elif active_state in ['failed', 'auto-restart']:
+        return 'error'
+    return 'unknown'
+
+
 def check_unit(ctx: CephadmContext, unit_name: str) -> Tuple[bool, str, bool]:
     # NOTE: we ignore the exit code here because systemctl outputs
     # various exit codes based on the state of the service, but the
@@ -39,21 +61,61 @@ def check_unit(ctx: CephadmContext, unit_name: str) -> Tuple[bool, str, bool]:
             ['systemctl', 'is-active', unit_name],
             verbosity=CallVerbosity.QUIET,
         )
-        out = out.strip()
-        if out in ['active']:
-            state = 'running'
-        elif out in ['inactive']:
-            state = 'stopped'
-        elif out in ['failed', 'auto-restart']:
-            state = 'error'
-        else:
-            state = 'unknown'
+        state = _unit_state(out.strip())
     except Exception as e:
         logger.warning('unable to run systemctl: %s' % e)
         state = 'unknown'
     return (enabled, state, installed)
 
 
+def check_unit_batch(
+    ctx: CephadmContext, unit_names: List[str]
+) -> Optional[Dict[str, Tuple[bool, str, bool]]]:
+    """Return the same (enabled, state, installed) tuples as check_unit for
+    all of the given units, using a single `systemctl show` call. Returns
+    None if systemctl could not be run or its output was not understood,
+    in which case callers should fall back to check_unit.
+    """
+    if not unit_names:
+        return {}
+    try:
+        out, err, code = call(
+            ctx,
+            [
+                'systemctl',
+                'show',
+                '--property=UnitFileState,ActiveState',
+            ]
+            + unit_names,
+            verbosity=CallVerbosity.QUIET,
+        )
+    except Exception as e:
+        logger.warning('unable to run systemctl: %s' % e)
+        return None
+    if code != 0:
+        return None
+    # one block of properties per unit, in the order they were given
+    blocks = [b for b in out.strip().split('\n\n') if b.strip()]
+    if len(blocks) != len(unit_names):
+        return None
+    result = {}
+    for unit_name, block in zip(unit_names, blocks):
+        props = dict(
+            line.split('=', 1) for line in block.splitlines() if '=' in line
+        )
+        if 'ActiveState' not in props:
+            return None
+        unit_file_state = props.get('UnitFileState', '')
+        enabled = unit_file_state in _ENABLED_UNIT_FILE_STATES
+        installed = enabled or unit_file_state == 'disabled'
+        result[unit_name] = (
+            enabled,
+            _unit_state(props['ActiveState'].strip()),
+            installed,
+        )
+    return result
+
+
 def check_units(ctx: CephadmContext, units: List[str]) -> bool:
     for u in units:
         (enabled, state, installed) = check_unit(ctx, u)
@@ -0,0 +1,127 @@
+"""
+Time `cephadm ls` with and without batched unit and container lookups.
+
+A fake systemctl and podman are put on the PATH. They answer the queries
+`ls` makes for a host with the given number of OSDs and, optionally, sleep
+on every call to simulate a busy host. Run from src/cephadm:
+
+    PYTHONPATH=..:../python-common python -m tests.bench_ls --osds 40
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import cephadm
+
+
+FSID = '00000000-0000-0000-0000-000000000000'
+IMAGE = 'quay.io/ceph/ceph:v19'
+IMAGE_ID = 'fd6b0fb89677f907edf0f5dbec41b2d09850d58ff860a8a0671ad24fafa1e889'
+
+SYSTEMCTL = """#!/bin/sh
+echo "$*" >> "{log}"
+sleep {delay}
+case "$1" in
+is-enabled) echo enabled ;;
+is-active) echo active ;;
+show)
+    shift 2
+    sep=''
+    for unit in "$@"; do
+        [ -n "$sep" ] && echo
+        echo ActiveState=active
+        echo UnitFileState=enabled
+        sep=1
+    done
+    ;;
+esac
+"""
+
+PODMAN = """#!/bin/sh
+echo "$*" >> "{log}"
+sleep {delay}
+case "$1" in
+version) echo 4.9.0 ;;
+image) echo '[{image}@sha256:{image_id}]' ;;
+inspect)
+    format="$3"
+    shift 3
+    code=0
+    for name in "$@"; do
+        case "$name" in
+        *-osd-*) ;;
+        *) echo "Error: no such object: $name" >&2; code=125; continue ;;
+        esac
+        cid=$(printf '%s' "$name" | sha256sum | cut -c1-64)
+        case "$format" in
+        '{{{{.Name}}}}'*) printf '%s,' "$name" ;;
+        esac
+        echo "$cid,{image},{image_id},2025-01-31 08:13:30 +0000 UTC,19.2.0"
+    done
+    exit $code
+    ;;
+esac
+"""
+
+
+def setup(tmpdir: str, osds: int, delay: float) -> None:
+    bindir = os.path.join(tmpdir, 'bin')
+    os.mkdir(bindir)
+    log = os.path.join(tmpdir, 'calls.log')
+    params = dict(log=log, delay=delay, image=IMAGE, image_id=IMAGE_ID)
+    for exe, script in [('systemctl', SYSTEMCTL), ('podman', PODMAN)]:
+        path = os.path.join(bindir, exe)
+        with open(path, 'w') as f:
+            f.write(script.format(**params))
+        os.chmod(path, 0o755)
+    os.environ['PATH'] = bindir + os.pathsep + os.environ['PATH']
+    for osd_id in range(osds):
+        os.makedirs(os.path.join(tmpdir, 'data', FSID, f'osd.{osd_id}'))
+
+
+def count_calls(tmpdir: str) -> int:
+    log = os.path.join(tmpdir, 'calls.log')
+    if not os.path.exists(log):
+        return 0
+    with open(log) as f:
+        n = len(f.readlines())
+    os.unlink(log)
+    return n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--osds', type=int, default=40)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='seconds the fake executables sleep per call')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        setup(tmpdir, args.osds, args.delay)
+        ctx = cephadm.cephadm_init_ctx(
+            ['--data-dir', os.path.join(tmpdir, 'data'), 'ls'])
+        ctx.container_engine = cephadm.Podman()
+        ctx.container_engine.get_version(ctx)
+        count_calls(tmpdir)
+
+        shown = {}
+        for batch in [False, True]:
+            timings = []
+            for _ in range(args.runs):
+                start = time.monotonic()
+                ls = cephadm.list_daemons(ctx, batch=batch)
+                timings.append(time.monotonic() - start)
+            calls = count_calls(tmpdir) // args.runs
+            shown[batch] = json.dumps(ls, sort_keys=True)
+            print('%-10s best %.3fs, worst %.3fs, %d calls per ls' % (
+                'batch' if batch else 'per-daemon', min(timings), max(timings), calls))
+        print('identical output: %s' % (shown[False] == shown[True]))
+
+
+if __name__ == '__main__':
+    main()
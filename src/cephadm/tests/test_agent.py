@@ -1,5 +1,5 @@
 from unittest import mock
-import copy, datetime, json, os, socket, threading
+import base64, copy, datetime, hashlib, json, os, socket, threading, zlib
 
 import pytest
 
@@ -20,6 +20,10 @@ AGENT_ID = 'host1'
 AGENT_DIR = f'/var/lib/ceph/{FSID}/agent.{AGENT_ID}'
 
 
+def _metadata_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
 def test_agent_validate():
     required_files = _cephadm.CephadmAgent.required_files
     with with_cephadm_ctx([]) as ctx:
@@ -425,7 +429,7 @@ def test_agent_get_ls(_ls_subset, _ls, cephadm_fs):
 @mock.patch("cephadmlib.agent.urlopen")
 @mock.patch("cephadm.list_networks")
 @mock.patch("cephadm.HostFacts.dump")
-@mock.patch("cephadm.HostFacts.__init__", lambda _, __: None)
+@mock.patch("cephadm.HostFacts.__init__", lambda *args, **kwargs: None)
 @mock.patch("ssl.SSLContext.load_verify_locations")
 @mock.patch("threading.Thread.is_alive")
 @mock.patch("cephadm.MgrListener.start")
@@ -491,7 +495,7 @@ def test_agent_run(_pull_conf_settings, _port_in_use, _gatherer_start,
 
     _port_in_use.side_effect = _fake_port_in_use
     _is_alive.return_value = False
-    _HF_dump.return_value = 'Host Facts'
+    _HF_dump.return_value = json.dumps({'hostname': AGENT_ID})
     _list_networks.return_value = network_data
     _urlopen.side_effect = lambda *args, **kwargs: FakeHTTPResponse()
     _RQ_init.side_effect = lambda *args, **kwargs: None
@@ -530,11 +534,17 @@ def test_agent_run(_pull_conf_settings, _port_in_use, _gatherer_start,
            'host': host,
            'ls': [{'valid_daemon': 'valid_metadata'}],
            'networks': network_data_no_sets,
-           'facts': 'Host Facts',
+           'facts': json.dumps({'hostname': AGENT_ID}),
            'volume': 'ceph-volume inventory data',
            'ack': str(7),
            'keyring': 'agent keyring',
-           'port': str(open_listener_port)
+           'port': str(open_listener_port),
+           'hashes': {
+               'ls': _metadata_hash([{'valid_daemon': 'valid_metadata'}]),
+               'networks': _metadata_hash(network_data_no_sets),
+               'facts': _metadata_hash({'hostname': AGENT_ID}),
+               'volume': _metadata_hash('ceph-volume inventory data'),
+           },
         }
         _RQ_init.assert_called_with(
             f'https://{target_ip}:{target_port}/data',
@@ -557,6 +567,114 @@ def test_agent_run(_pull_conf_settings, _port_in_use, _gatherer_start,
             agent.run()
 
 
+@mock.patch("cephadm.CephadmAgent.wakeup")
+def test_agent_metadata_payload(_agent_wakeup, cephadm_fs):
+    with with_cephadm_ctx([]) as ctx:
+        agent = _cephadm.CephadmAgent(ctx, FSID, AGENT_ID)
+        agent.host = AGENT_ID
+        agent.keyring = 'agent keyring'
+        agent.listener_port = '7777'
+        agent.compress_metadata = True
+        sections = {
+            'ls': [{'name': 'osd.0'}],
+            'networks': {'10.2.1.0/24': {'eth1': ['10.2.1.122']}},
+            'facts': json.dumps({'hostname': AGENT_ID}),
+            'volume': '',
+        }
+        hashes = {
+            'ls': _metadata_hash(sections['ls']),
+            'networks': _metadata_hash(sections['networks']),
+            'facts': _metadata_hash({'hostname': AGENT_ID}),
+        }
+
+        # nothing acked yet: everything is sent, uncompressed as we do not
+        # know if the mgr supports it. The stale volume section has no hash
+        payload = agent._metadata_payload(sections, 3)
+        assert payload == dict(host=AGENT_ID, **sections, ack='3',
+                               keyring='agent keyring', port='7777', hashes=hashes)
+
+        # a mgr without delta support: keep sending everything
+        agent._handle_metadata_ack(hashes, None)
+        assert agent._metadata_payload(sections, 3) == payload
+        _agent_wakeup.assert_not_called()
+
+        # the mgr holds ls and networks, only send the rest, compressed
+        agent._handle_metadata_ack(hashes, {'ls': hashes['ls'], 'networks': hashes['networks']})
+        _agent_wakeup.assert_called_once()
+        payload = agent._metadata_payload(sections, 3)
+        assert payload['hashes'] == hashes
+        assert 'ls' not in payload and 'facts' not in payload
+        changed = json.loads(zlib.decompress(base64.b64decode(payload['compressed'])))
+        # the volatile fields of the daemons are sent every time
+        assert changed == {'facts': sections['facts'], 'volume': '',
+                           'volatile': {'ls': {'osd.0': {}}}}
+
+        # all acked
+        agent._handle_metadata_ack(hashes, hashes)
+        agent.compress_metadata = False
+        payload = agent._metadata_payload(sections, 3)
+        assert payload == dict(host=AGENT_ID, volume='', volatile={'ls': {'osd.0': {}}},
+                               ack='3', keyring='agent keyring', port='7777', hashes=hashes)
+
+        # the mgr lost everything (failover): resend right away, but only once
+        agent._handle_metadata_ack(hashes, {})
+        agent._handle_metadata_ack(hashes, {})
+        assert _agent_wakeup.call_count == 2
+        assert agent._metadata_payload(sections, 3)['ls'] == sections['ls']
+
+
+@mock.patch("cephadm.CephadmAgent.wakeup")
+def test_agent_metadata_payload_volatile(_agent_wakeup, cephadm_fs, funkypatch):
+    from cephadmlib.host_facts import HostFacts, HostFactsCache
+
+    funkypatch.patch('cephadmlib.host_facts.call_throws').return_value = ('', '', 0)
+    funkypatch.patch('cephadmlib.host_facts.call').return_value = ('', '', 0)
+    cephadm_fs.create_file('/proc/meminfo', contents='MemTotal: 1024 kB\nMemFree: 512 kB\n')
+    cephadm_fs.create_file('/proc/loadavg', contents='0.1 0.2 0.3 1/100 42\n')
+    cephadm_fs.create_file('/proc/uptime', contents='100.0 50.0\n')
+    facts_cache = HostFactsCache()
+
+    def gather(memory_usage):
+        return {
+            'ls': [{'name': 'osd.0', 'state': 'running',
+                    'memory_usage': memory_usage, 'cpu_percentage': '1.0%'}],
+            'networks': {'10.2.1.0/24': {'eth1': ['10.2.1.122']}},
+            'facts': HostFacts(mock.MagicMock(), cache=facts_cache).dump(),
+            'volume': '',
+        }
+
+    with with_cephadm_ctx([]) as ctx:
+        agent = _cephadm.CephadmAgent(ctx, FSID, AGENT_ID)
+        agent.host = AGENT_ID
+        agent.keyring = 'agent keyring'
+        agent.listener_port = '7777'
+        payload = agent._metadata_payload(gather(1024), 3)
+        assert 'facts' in payload and 'ls' in payload
+        agent._handle_metadata_ack(payload['hashes'], payload['hashes'])
+
+        # the uptime, memory, load, timing and daemon usage changed, but
+        # nothing else: they are sent on their own
+        cephadm_fs.get_object('/proc/meminfo').set_contents('MemTotal: 1024 kB\nMemFree: 256 kB\n')
+        cephadm_fs.get_object('/proc/loadavg').set_contents('0.5 0.2 0.3 1/100 42\n')
+        cephadm_fs.get_object('/proc/uptime').set_contents('130.0 60.0\n')
+        sections = gather(2048)
+        assert sections['facts'] != payload['facts']
+        resent = agent._metadata_payload(sections, 3)
+        assert resent['hashes'] == payload['hashes']
+        assert 'facts' not in resent and 'ls' not in resent
+        volatile = resent['volatile']
+        assert volatile['ls'] == {'osd.0': {'memory_usage': 2048, 'cpu_percentage': '1.0%'}}
+        assert sorted(volatile['facts']) == sorted(_cephadm.CephadmAgent.volatile_facts)
+        assert volatile['facts']['system_uptime'] == 130.0
+        assert volatile['facts']['memory_free_kb'] == 256
+
+        # anything else is a change
+        cephadm_fs.get_object('/proc/meminfo').set_contents('MemTotal: 2048 kB\nMemFree: 256 kB\n')
+        resent = agent._metadata_payload(gather(2048), 3)
+        assert json.loads(resent['facts'])['memory_total_kb'] == 2048
+        assert 'facts' not in resent['volatile']
+
+
 @mock.patch("cephadm.CephadmAgent.pull_conf_settings")
 @mock.patch("cephadm.CephadmAgent.wakeup")
 def test_mgr_listener_handle_json_payload(_agent_wakeup, _pull_conf_settings, cephadm_fs):
@@ -1,7 +1,8 @@
+import json
 import pytest
 
 from unittest import mock
-from tests.fixtures import host_sysfs, import_cephadm, cephadm_fs
+from tests.fixtures import host_sysfs, import_cephadm, cephadm_fs, funkypatch
 
 from cephadmlib.host_facts import Enclosure
 
@@ -115,3 +116,66 @@ def test_host_facts_security(cephadm_fs):
     assert ksec['complain'] == 0
     assert ksec['enforce'] == 1
     assert ksec['unconfined'] == 2
+
+
+def _fake_block_device(fs, dev, size):
+    # just enough for HostFacts to list it as an HDD
+    fs.create_file(f'/sys/block/{dev}/size', contents=str(size))
+    fs.create_file(f'/sys/block/{dev}/queue/rotational', contents='1')
+    fs.create_file(f'/sys/block/{dev}/device/model', contents='Disk')
+
+
+def test_host_facts_cache(cephadm_fs, funkypatch):
+    from cephadmlib.host_facts import HostFacts, HostFactsCache
+
+    _call_throws = funkypatch.patch('cephadmlib.host_facts.call_throws')
+    _call_throws.return_value = ('net.ipv4.ip_nonlocal_bind = 0', '', 0)
+    _call = funkypatch.patch('cephadmlib.host_facts.call')
+    _call.return_value = ('', '', 0)
+    cephadm_fs.create_file('/proc/meminfo', contents='MemTotal: 1024 kB\n')
+    cephadm_fs.create_file('/proc/loadavg', contents='0.1 0.2 0.3 1/100 42\n')
+    cephadm_fs.create_file('/proc/uptime', contents='100.0 50.0\n')
+    cephadm_fs.create_file('/sys/class/net/eth0/operstate', contents='up')
+    cephadm_fs.create_file('/sys/class/net/eth0/type', contents='1')
+    _fake_block_device(cephadm_fs, 'sda', 1024)
+
+    ctx = mock.MagicMock()
+    cache = HostFactsCache()
+    facts = json.loads(HostFacts(ctx, cache=cache).dump())
+    assert facts['hdd_count'] == 1
+    assert facts['memory_total_kb'] == 1024
+    assert facts['kernel_parameters'] == {'net.ipv4.ip_nonlocal_bind': '0'}
+    assert facts['facts_timing']['cached'] == []
+    assert 'block_devices' in facts['facts_timing']['refreshed']
+    # sysctl -a for sysctl_options and kernel_parameters
+    assert _call_throws.call_count == 2
+
+    # nothing changed: everything but memory, load and the like is cached
+    cephadm_fs.get_object('/proc/meminfo').set_contents('MemTotal: 2048 kB\n')
+    facts = json.loads(HostFacts(ctx, cache=cache).dump())
+    assert facts['facts_timing']['refreshed'] == {}
+    assert facts['memory_total_kb'] == 2048
+    assert _call_throws.call_count == 2
+
+    # a new block device and a NIC going down are picked up right away
+    _fake_block_device(cephadm_fs, 'sdb', 2048)
+    cephadm_fs.get_object('/sys/class/net/eth0/operstate').set_contents('down')
+    facts = json.loads(HostFacts(ctx, cache=cache).dump())
+    assert sorted(facts['facts_timing']['refreshed']) == ['block_devices', 'nics']
+    assert facts['hdd_count'] == 2
+    assert facts['interfaces']['eth0']['operstate'] == 'down'
+
+    # and so is a resized one
+    cephadm_fs.get_object('/sys/block/sdb/size').set_contents('4096')
+    facts = json.loads(HostFacts(ctx, cache=cache).dump())
+    assert list(facts['facts_timing']['refreshed']) == ['block_devices']
+    assert facts['hdd_capacity_bytes'] == (1024 + 4096) * 512
+
+    # sections are gathered again once their TTL expired
+    for section, (fetched, sig, value) in cache._sections.items():
+        cache._sections[section] = (fetched - 301, sig, value)
+    facts = json.loads(HostFacts(ctx, cache=cache).dump())
+    assert sorted(facts['facts_timing']['refreshed']) == [
+        'kernel_parameters', 'nics', 'security', 'sysctl',
+    ]
+    assert _call_throws.call_count == 4
@@ -558,3 +558,166 @@ fsid = {fsid}
     assert losd_entry['state'] == 'running'
     assert losd_entry['host_version'] == 'v1.2.3'
     edl.assert_checked_all()
+
+
+def _fake_batch_call(img, img_id, img_sha, containers, units, calls):
+    """Fake call that only answers the batched systemctl/inspect forms, with
+    containers mapping container names to ids and units mapping unit names to
+    (UnitFileState, ActiveState).
+    """
+    date = '2025-01-31 08:13:30.148338962 -0500 EST'
+
+    def _fake_call(ctx, cmd, *args, **kwargs):
+        calls.append(cmd)
+        out = ''
+        err = ''
+        code = 0
+        if 'stats' in cmd and any('MemUsage' in a for a in cmd):
+            out = '\n'.join(['bob,500 / 1000', 'kit,100 / 1000'])
+        elif 'stats' in cmd and any('CPUPerc' in a for a in cmd):
+            out = '\n'.join(['bob,1.5%', 'kit,0.5%'])
+        elif 'inspect' in cmd and any('RepoDigests' in a for a in cmd):
+            out = f'[{img}@{img_sha}]'
+        elif 'show' in cmd:
+            out = '\n\n'.join(
+                f'UnitFileState={units[u][0]}\nActiveState={units[u][1]}'
+                for u in cmd[3:]
+            )
+        elif 'inspect' in cmd and any('{{.Name}}' in a for a in cmd):
+            lines = []
+            for name in cmd[4:]:
+                if name in containers:
+                    lines.append(f'/{name},{containers[name]},{img},{img_id},{date},')
+                else:
+                    err = f'Error: no such object: {name}'
+                    code = 1
+            out = '\n'.join(lines)
+        elif 'ceph' in cmd and '-v' in cmd:
+            out = 'ceph version v1.2.3 phony-version'
+        else:
+            raise AssertionError(f'unexpected command: {cmd}')
+        return out, err, code
+
+    return _fake_call
+
+
+def test_list_daemons_detail_batch(cephadm_fs, funkypatch):
+    _cephadm = import_cephadm()
+    _call = funkypatch.patch('cephadmlib.call_wrappers.call')
+
+    img = 'quay.io/fake/ceph:ci'
+    img_id = 'fd6b0fb89677f907edf0f5dbec41b2d09850d58ff860a8a0671ad24fafa1e889'
+    img_sha = 'sha256:c217e3d06df0334fba3f33242e76548a4f71cec619dfa29f64dec9321bd518f3'
+    ctr1 = 'cd9ceec3fc3aa59901e3ced4f4eab8557d067cf05cbc24fa2521962d4bef3b92'
+    ctr2 = '7d067cf05cbc24fa2521962d4bef3b92cd9ceec3fc3aa59901e3ced4f4eab855'
+    fsid = 'dc93cfee-ddc5-11ef-a056-525400220000'
+    containers = {
+        f'ceph-{fsid}-mon-ceph0': ctr1,
+        # a container started before the switch to the new name format
+        f'ceph-{fsid}-osd.1': ctr2,
+    }
+    units = {
+        f'ceph-{fsid}@mon.ceph0': ('enabled', 'active'),
+        f'ceph-{fsid}@mgr.ceph0.zzzabc': ('disabled', 'failed'),
+        f'ceph-{fsid}@osd.1': ('enabled', 'active'),
+        'mon.fred': ('static', 'inactive'),
+    }
+    calls = []
+    _call.side_effect = _fake_batch_call(
+        img, img_id, img_sha, containers, units, calls
+    )
+
+    fake_ceph = pathlib.Path('/var/lib/fake/ceph')
+    cluster_dir = fake_ceph / fsid
+    (cluster_dir / 'mon.ceph0').mkdir(parents=True)
+    (cluster_dir / 'mgr.ceph0.zzzabc').mkdir(parents=True)
+    (cluster_dir / 'osd.1').mkdir(parents=True)
+    (fake_ceph / 'mon' / 'ycagel-fred').mkdir(parents=True)
+    legacy_etc_conf = pathlib.Path('/etc/ceph/ycagel.conf')
+    legacy_etc_conf.parent.mkdir(parents=True)
+    legacy_etc_conf.write_text(f"""
+[global]
+fsid = {fsid}
+""")
+
+    with with_cephadm_ctx([], mock_cephadm_call_fn=False) as ctx:
+        ctx.data_dir = str(fake_ceph)
+        dl = _cephadm.list_daemons(ctx, batch=True)
+    assert len(dl) == 4
+    # one systemctl and one container inspect call for all daemons
+    assert len([c for c in calls if 'show' in c]) == 1
+    assert len([c for c in calls if 'is-active' in c or 'is-enabled' in c]) == 0
+    assert len([c for c in calls if any('{{.Name}}' in a for a in c)]) == 1
+    edl = _EntryHelper(dl)
+    mon_entry = edl.get('mon.ceph0')
+    assert mon_entry['enabled'] == True
+    assert mon_entry['state'] == 'running'
+    assert mon_entry['container_id'] == ctr1
+    assert mon_entry['container_image_name'] == img
+    assert mon_entry['container_image_id'] == img_id
+    assert mon_entry['container_image_digests'] == [f'{img}@{img_sha}']
+    mgr_entry = edl.get('mgr.ceph0.zzzabc')
+    assert mgr_entry['enabled'] == False
+    assert mgr_entry['state'] == 'error'
+    assert mgr_entry['container_id'] is None
+    osd_entry = edl.get('osd.1')
+    assert osd_entry['state'] == 'running'
+    assert osd_entry['container_id'] == ctr2
+    lmon_entry = edl.get('mon.fred')
+    assert lmon_entry['enabled'] == True
+    assert lmon_entry['state'] == 'stopped'
+    edl.assert_checked_all()
+
+
+def test_list_daemons_detail_batch_fallback(cephadm_fs, funkypatch):
+    _cephadm = import_cephadm()
+    _call = funkypatch.patch('cephadmlib.call_wrappers.call')
+
+    img = 'quay.io/fake/ceph:ci'
+    img_id = 'fd6b0fb89677f907edf0f5dbec41b2d09850d58ff860a8a0671ad24fafa1e889'
+    ctr1 = 'cd9ceec3fc3aa59901e3ced4f4eab8557d067cf05cbc24fa2521962d4bef3b92'
+    date = '2025-01-31 08:13:30.148338962 -0500 EST'
+
+    # an older systemctl and container engine that can not handle the
+    # batched calls: fall back to checking each daemon on its own
+    def _fake_call(ctx, cmd, *args, **kwargs):
+        out = ''
+        code = 0
+        if 'show' in cmd:
+            out = 'ActiveState=active'
+        elif 'inspect' in cmd and any('{{.Name}}' in a for a in cmd):
+            code = 125
+        elif 'stats' in cmd:
+            out = ''
+        elif 'inspect' in cmd and any('RepoDigests' in a for a in cmd):
+            out = ''
+        elif 'is-active' in cmd:
+            out = 'active'
+        elif 'inspect' in cmd and 'mon' in cmd[-1]:
+            out = f'{ctr1},{img},{img_id},{date},'
+        elif 'inspect' in cmd:
+            code = 1
+        return out, '', code
+
+    _call.side_effect = _fake_call
+
+    fsid = 'dc93cfee-ddc5-11ef-a056-525400220000'
+    fake_ceph = pathlib.Path('/var/lib/fake/ceph')
+    cluster_dir = fake_ceph / fsid
+    (cluster_dir / 'mon.ceph0').mkdir(parents=True)
+    (cluster_dir / 'mgr.ceph0.zzzabc').mkdir(parents=True)
+
+    with with_cephadm_ctx([], mock_cephadm_call_fn=False) as ctx:
+        ctx.data_dir = str(fake_ceph)
+        dl = _cephadm.list_daemons(ctx, batch=True)
+    assert len(dl) == 2
+    edl = _EntryHelper(dl)
+    mon_entry = edl.get('mon.ceph0')
+    assert mon_entry['enabled'] == True
+    assert mon_entry['state'] == 'running'
+    assert mon_entry['container_id'] == ctr1
+    mgr_entry = edl.get('mgr.ceph0.zzzabc')
+    assert mgr_entry['enabled'] == True
+    assert mgr_entry['state'] == 'running'
+    assert mgr_entry['container_id'] is None
+    edl.assert_checked_all()
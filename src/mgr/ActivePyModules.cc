@@ -1031,6 +1031,68 @@ PyObject* ActivePyModules::get_latest_counter_python(
       labels);
 }
 
+PyObject* ActivePyModules::get_latest_unlabeled_counters_python(
+    const std::string &svc_type,
+    int prio_limit)
+{
+  without_gil_t no_gil;
+  std::lock_guard l(lock);
+
+  DaemonStateCollection daemons;
+  if (svc_type == "") {
+    daemons = daemon_state.get_all();
+  } else {
+    daemons = daemon_state.get_by_service(svc_type);
+  }
+
+  auto f = with_gil(no_gil, [&] {
+    return PyFormatter();
+  });
+  for (auto& [key, state] : daemons) {
+    std::lock_guard l(state->lock);
+    with_gil(no_gil, [&, key=ceph::to_string(key), state=state] {
+      f.open_object_section(key.c_str());
+      for (auto& [counter_name, counter_instance] : state->perf_counters.instances) {
+        // labeled counters are not part of the unlabeled schema either
+        auto labels = ceph::perf_counters::key_labels(counter_name);
+        if (labels.begin() != labels.end()) {
+          continue;
+        }
+        const auto& type = state->perf_counters.types[counter_name];
+        if (type.priority < prio_limit) {
+          continue;
+        }
+        f.open_array_section(counter_name.c_str());
+        if (type.type & PERFCOUNTER_LONGRUNAVG) {
+          const auto &datapoint = counter_instance.get_latest_data_avg();
+          f.dump_float("t", datapoint.t);
+          f.dump_unsigned("s", datapoint.s);
+          f.dump_unsigned("c", datapoint.c);
+        } else {
+          const auto &datapoint = counter_instance.get_latest_data();
+          f.dump_float("t", datapoint.t);
+          f.dump_unsigned("v", datapoint.v);
+        }
+        f.close_section();
+      }
+      f.close_section();
+    });
+  }
+  return f.get();
+}
+
+PyObject* ActivePyModules::get_pg_progress_since_python(uint64_t since)
+{
+  PyFormatter f;
+  without_gil_t no_gil;
+  cluster_state.with_pgmap([&](const PGMap &pg_map) {
+    no_gil.acquire_gil();
+    cluster_state.dump_pg_progress_since(since, &f);
+    server.dump_pg_ready(&f);
+  });
+  return f.get();
+}
+
 PyObject* ActivePyModules::get_unlabeled_perf_schema_python(
     const std::string &svc_type,
     const std::string &svc_id)
@@ -107,6 +107,10 @@ public:
       std::string_view counter_name,
       std::string_view sub_counter_name,
       const std::vector<std::pair<std::string_view, std::string_view>> &labels);
+  PyObject *get_latest_unlabeled_counters_python(
+      const std::string &svc_type,
+      int prio_limit);
+  PyObject *get_pg_progress_since_python(uint64_t since);
   PyObject *get_unlabeled_perf_schema_python(
       const std::string &svc_type,
       const std::string &svc_id);
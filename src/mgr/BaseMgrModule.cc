@@ -667,6 +667,29 @@ get_latest_unlabeled_counter(BaseMgrModule *self, PyObject *args)
       svc_name, svc_id, counter_path);
 }
 
+static PyObject*
+get_latest_unlabeled_counters(BaseMgrModule *self, PyObject *args)
+{
+  char *svc_type = nullptr;
+  int prio_limit = 0;
+  if (!PyArg_ParseTuple(args, "si:get_latest_unlabeled_counters", &svc_type,
+                                                  &prio_limit)) {
+    return nullptr;
+  }
+  return self->py_modules->get_latest_unlabeled_counters_python(
+      svc_type, prio_limit);
+}
+
+static PyObject*
+get_pg_progress_since(BaseMgrModule *self, PyObject *args)
+{
+  unsigned long long since = 0;
+  if (!PyArg_ParseTuple(args, "K:get_pg_progress_since", &since)) {
+    return nullptr;
+  }
+  return self->py_modules->get_pg_progress_since_python(since);
+}
+
 static PyObject*
 get_latest_counter(BaseMgrModule *self, PyObject *args)
 {
@@ -1542,6 +1565,12 @@ PyMethodDef BaseMgrModule_methods[] = {
   {"_ceph_get_latest_unlabeled_counter", (PyCFunction)get_latest_unlabeled_counter, METH_VARARGS,
    "Fetch (or get) the latest (or updated) value of an unlabeled counter"},
 
+  {"_ceph_get_latest_unlabeled_counters", (PyCFunction)get_latest_unlabeled_counters, METH_VARARGS,
+   "Fetch the latest values of all unlabeled counters of a daemon type"},
+
+  {"_ceph_get_pg_progress_since", (PyCFunction)get_pg_progress_since, METH_VARARGS,
+   "Get the progress of the PGs that changed since a PGMap version"},
+
   {"_ceph_get_latest_counter", (PyCFunction)get_latest_counter, METH_VARARGS,
    "Fetch (or get) the latest (or updated) value of a performance counter"},
 
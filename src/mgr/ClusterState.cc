@@ -150,6 +150,7 @@ void ClusterState::update_delta_stats()
   jf.dump_object("pending_inc", pending_inc);
   jf.flush(*_dout);
   *_dout << dendl;
+  note_pg_progress(pending_inc);
   pg_map.apply_incremental(g_ceph_context, pending_inc);
   pending_inc = PGMap::Incremental();
 }
@@ -188,6 +189,7 @@ void ClusterState::notify_osdmap(const OSDMap &osd_map)
   jf.flush(*_dout);
   *_dout << dendl;
 
+  note_pg_progress(pending_inc);
   pg_map.apply_incremental(g_ceph_context, pending_inc);
   pending_inc = PGMap::Incremental();
   // TODO: Complete the separation of PG state handling so
@@ -195,6 +197,80 @@ void ClusterState::notify_osdmap(const OSDMap &osd_map)
   // while the full-blown PGMap lives only here.
 }
 
+// how many pg_map versions a removed PG is remembered for
+static constexpr version_t PG_PROGRESS_REMOVED_VERSIONS = 1000;
+
+void ClusterState::note_pg_progress(const PGMap::Incremental& inc)
+{
+  ceph_assert(ceph_mutex_is_locked(lock));
+  for (auto& [pgid, stat] : inc.pg_stat_updates) {
+    auto p = pg_map.pg_stat.find(pgid);
+    if (p != pg_map.pg_stat.end() &&
+	p->second.state == stat.state &&
+	p->second.reported_epoch == stat.reported_epoch &&
+	p->second.stats.sum.num_bytes == stat.stats.sum.num_bytes &&
+	p->second.stats.sum.num_bytes_recovered ==
+	  stat.stats.sum.num_bytes_recovered) {
+      continue;
+    }
+    auto [q, inserted] = pg_progress_version.try_emplace(pgid, inc.version);
+    if (!inserted) {
+      pg_progress_changes.erase({q->second, pgid});
+      q->second = inc.version;
+    }
+    pg_progress_changes.emplace(inc.version, pgid);
+    pg_progress_removed.erase(pgid);
+  }
+  for (auto& pgid : inc.pg_remove) {
+    auto q = pg_progress_version.find(pgid);
+    if (q == pg_progress_version.end()) {
+      continue;
+    }
+    pg_progress_changes.erase({q->second, pgid});
+    pg_progress_version.erase(q);
+    pg_progress_removed[pgid] = inc.version;
+  }
+  if (inc.version > PG_PROGRESS_REMOVED_VERSIONS) {
+    const version_t cutoff = inc.version - PG_PROGRESS_REMOVED_VERSIONS;
+    for (auto p = pg_progress_removed.begin(); p != pg_progress_removed.end();) {
+      if (p->second < cutoff) {
+	pg_progress_trimmed = std::max(pg_progress_trimmed, p->second);
+	p = pg_progress_removed.erase(p);
+      } else {
+	++p;
+      }
+    }
+  }
+}
+
+void ClusterState::dump_pg_progress_since(version_t since,
+					  ceph::Formatter *f) const
+{
+  ceph_assert(ceph_mutex_is_locked(lock));
+  f->dump_unsigned("version", pg_map.version);
+  if (since == 0 || since < pg_progress_trimmed) {
+    f->dump_bool("full", true);
+    pg_map.dump_pg_progress(f);
+    f->open_array_section("removed");
+    f->close_section();
+    return;
+  }
+  f->dump_bool("full", false);
+  std::set<pg_t> changed;
+  for (auto p = pg_progress_changes.lower_bound({since + 1, pg_t()});
+       p != pg_progress_changes.end(); ++p) {
+    changed.insert(p->second);
+  }
+  pg_map.dump_pg_progress(f, changed);
+  f->open_array_section("removed");
+  for (auto& [pgid, version] : pg_progress_removed) {
+    if (version > since) {
+      f->dump_stream("pgid") << pgid;
+    }
+  }
+  f->close_section();
+}
+
 class ClusterSocketHook : public AdminSocketHook {
   ClusterState *cluster_state;
 public:
@@ -47,6 +47,17 @@ protected:
   PGMap pg_map;
   PGMap::Incremental pending_inc;
 
+  /// pg_map version at which the pg_progress fields of each PG last changed
+  std::map<pg_t,version_t> pg_progress_version;
+  /// the same, ordered by version
+  std::set<std::pair<version_t,pg_t>> pg_progress_changes;
+  /// PGs removed from pg_map, and the version they were removed at
+  std::map<pg_t,version_t> pg_progress_removed;
+  /// the removals up to this version have been forgotten
+  version_t pg_progress_trimmed = 0;
+
+  void note_pg_progress(const PGMap::Incremental& inc);
+
   bufferlist health_json;
   bufferlist mon_status_json;
 
@@ -68,6 +79,14 @@ public:
 
   void notify_osdmap(const OSDMap &osd_map);
 
+  /**
+   * Dump the pg_progress entries of the PGs that changed after pg_map
+   * version @p since, and the PGs removed since then.  All the PGs are
+   * dumped, with "full" set, if the removals since then were forgotten.
+   * The lock must be held, i.e. this is to be called from with_pgmap().
+   */
+  void dump_pg_progress_since(version_t since, ceph::Formatter *f) const;
+
   bool have_fsmap() const {
     std::lock_guard l(lock);
     return fsmap.get_epoch() > 0;
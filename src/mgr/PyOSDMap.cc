@@ -204,10 +204,12 @@ static PyObject *osdmap_map_pool_pgs_up(BasePyOSDMap* self, PyObject *args)
   if (!pi)
     return nullptr;
   map<pg_t,vector<int>> pm;
+  PyThreadState *tstate = PyEval_SaveThread();
   for (unsigned ps = 0; ps < pi->get_pg_num(); ++ps) {
     pg_t pgid(ps, poolid);
     self->osdmap->pg_to_up_acting_osds(pgid, &pm[pgid], nullptr, nullptr, nullptr);
   }
+  PyEval_RestoreThread(tstate);
   PyFormatter f;
   for (auto p : pm) {
     string pg = stringify(p.first);
@@ -258,6 +260,39 @@ BasePyOSDMap_dealloc(BasePyOSDMap *self)
   Py_TYPE(self)->tp_free(self);
 }
 
+static PyObject *osdmap_map_pool_pgs_acting(BasePyOSDMap* self, PyObject *args)
+{
+  int poolid;
+  if (!PyArg_ParseTuple(args, "i:map_pool_pgs_acting",
+			&poolid)) {
+    return nullptr;
+  }
+  auto pi = self->osdmap->get_pg_pool(poolid);
+  if (!pi) {
+    PyErr_Format(PyExc_KeyError, "pool %d does not exist", poolid);
+    return nullptr;
+  }
+  // only ask for the acting set, so that CRUSH is skipped for the PGs
+  // with a pg_temp mapping
+  vector<vector<int>> acting(pi->get_pg_num());
+  PyThreadState *tstate = PyEval_SaveThread();
+  for (unsigned ps = 0; ps < acting.size(); ++ps) {
+    pg_t pgid(ps, poolid);
+    self->osdmap->pg_to_up_acting_osds(pgid, nullptr, nullptr, &acting[ps], nullptr);
+  }
+  PyEval_RestoreThread(tstate);
+  PyFormatter f;
+  for (unsigned ps = 0; ps < acting.size(); ++ps) {
+    string pg = stringify(pg_t(ps, poolid));
+    f.open_array_section(pg.c_str());
+    for (auto o : acting[ps]) {
+      f.dump_int("osd", o);
+    }
+    f.close_section();
+  }
+  return f.get();
+}
+
 static PyObject *osdmap_pg_to_up_acting_osds(BasePyOSDMap *self, PyObject *args)
 {
   int pool_id = 0;
@@ -359,6 +394,8 @@ PyMethodDef BasePyOSDMap_methods[] = {
    "Calculate new pg-upmap-primary values"},
   {"_map_pool_pgs_up", (PyCFunction)osdmap_map_pool_pgs_up, METH_VARARGS,
    "Calculate up set mappings for all PGs in a pool"},
+  {"_map_pool_pgs_acting", (PyCFunction)osdmap_map_pool_pgs_acting, METH_VARARGS,
+   "Calculate acting set mappings for all PGs in a pool"},
   {"_pg_to_up_acting_osds", (PyCFunction)osdmap_pg_to_up_acting_osds, METH_VARARGS,
     "Calculate up+acting OSDs for a PG ID"},
   {"_pool_raw_used_rate", (PyCFunction)osdmap_pool_raw_used_rate, METH_VARARGS,
@@ -9,17 +9,41 @@ import json
 import math
 import random
 import time
-from mgr_module import CLIReadCommand, CLICommand, CommandResult, MgrModule, Option, OSDMap, CephReleases
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from mgr_module import CLIReadCommand, CLICommand, CommandResult, MgrModule, Option, OSDMap, OSDMapIncremental, CephReleases
 from threading import Event
-from typing import cast, Any, Dict, List, Optional, Sequence, Tuple, Union
+from typing import cast, Any, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
 from mgr_module import CRUSHMap
 import datetime
 
+from . import array_eval
+
 TIME_FORMAT = '%Y-%m-%d_%H:%M:%S'
 
 
+# pool fields that feed into the PG -> OSD mapping
+POOL_MAPPING_KEYS = ('type', 'size', 'crush_rule', 'pg_num', 'pg_placement_num',
+                     'pgp_num', 'flags')
+# osd fields that feed into the PG -> OSD mapping
+OSD_MAPPING_KEYS = ('up', 'in', 'weight', 'primary_affinity')
+# OSDMapIncremental dump entries produced by calc_pg_upmaps
+UPMAP_INC_KEYS = ('new_pg_upmap', 'old_pg_upmap', 'new_pg_upmap_items', 'old_pg_upmap_items')
+
+
 class MappingState:
-    def __init__(self, osdmap, raw_pg_stats, raw_pool_stats, desc=''):
+    """
+    PG up mappings and PG stats of one osdmap.
+
+    If a previous MappingState is given and ``incremental`` is set, only the
+    pools whose placement inputs (pool definition, upmaps, crush rule and
+    subtree, or the state of their OSDs) changed since ``prev`` are remapped;
+    the up mappings of the other pools are shared with ``prev``.
+    """
+
+    def __init__(self, osdmap, raw_pg_stats, raw_pool_stats, desc='',
+                 prev: Optional['MappingState'] = None,
+                 incremental: bool = False):
         self.desc = desc
         self.osdmap = osdmap
         self.osdmap_dump = self.osdmap.dump()
@@ -33,19 +57,105 @@ class MappingState:
         osd_poolids = [p['pool'] for p in self.osdmap_dump.get('pools', [])]
         pg_poolids = [p['poolid'] for p in raw_pool_stats.get('pool_stats', [])]
         self.poolids = set(osd_poolids) & set(pg_poolids)
-        self.pg_up = {}
-        self.pg_up_by_poolid = {}
+        self.incremental = incremental
+        self.pool_signatures: Dict[int, str] = {}
+        if incremental:
+            self.pool_signatures = self.calc_pool_signatures()
+        else:
+            prev = None
+        self.remapped_poolids: Set[int] = set()
+        self.pg_up: Dict[str, List[int]] = {}
+        self.pg_up_by_poolid: Dict[int, Dict[str, List[int]]] = {}
+        self.packed_pools: Dict[int, Optional[array_eval.PackedPool]] = {}
         for poolid in self.poolids:
-            self.pg_up_by_poolid[poolid] = osdmap.map_pool_pgs_up(poolid)
+            if prev is not None and \
+               poolid in prev.pg_up_by_poolid and \
+               prev.pool_signatures.get(poolid) == self.pool_signatures[poolid]:
+                self.pg_up_by_poolid[poolid] = prev.pg_up_by_poolid[poolid]
+                if raw_pg_stats is prev.raw_pg_stats and \
+                   poolid in prev.packed_pools:
+                    self.packed_pools[poolid] = prev.packed_pools[poolid]
+            else:
+                self.pg_up_by_poolid[poolid] = osdmap.map_pool_pgs_up(poolid)
+                self.remapped_poolids.add(poolid)
             for a, b in self.pg_up_by_poolid[poolid].items():
                 self.pg_up[a] = b
 
+    def calc_pool_signatures(self) -> Dict[int, str]:
+        """
+        Summarize, per pool, everything the up mapping of its PGs depends on.
+        """
+        tunables = self.crush_dump.get('tunables')
+        rules = {r['rule_id']: r for r in self.crush_dump.get('rules', [])}
+        osds = {
+            o['osd']: {k: o.get(k) for k in OSD_MAPPING_KEYS}
+            for o in self.osdmap_dump.get('osds', [])
+        }
+        upmaps: Dict[int, list] = {}
+        for key in ('pg_upmap', 'pg_upmap_items', 'pg_upmap_primaries'):
+            for item in self.osdmap_dump.get(key, []):
+                poolid = int(item['pgid'].split('.')[0])
+                upmaps.setdefault(poolid, []).append((key, item))
+        buckets = {b['id']: b for b in self.crush_dump.get('buckets', [])}
+        choose_args: Dict[int, list] = {}
+        for name, args in self.crush_dump.get('choose_args', {}).items():
+            for arg in args:
+                choose_args.setdefault(arg['bucket_id'], []).append((name, arg))
+        pool_roots: Dict[int, List[int]] = {}
+        root_state: Dict[int, Dict[str, Any]] = {}
+        for rootid in self.crush.find_takes():
+            subtree_buckets = []
+            todo = [rootid]
+            while todo:
+                bucket = buckets.get(todo.pop())
+                if bucket is None:
+                    continue
+                subtree_buckets.append((bucket, choose_args.get(bucket['id'])))
+                todo.extend(i['id'] for i in bucket.get('items', []) if i['id'] < 0)
+            weights = self.crush.get_take_weight_osd_map(rootid)
+            root_state[rootid] = {
+                'buckets': subtree_buckets,
+                'osds': [(osd, osds.get(osd)) for osd in sorted(weights)],
+            }
+            for poolid in self.osdmap.get_pools_by_take(rootid):
+                pool_roots.setdefault(poolid, []).append(rootid)
+        r = {}
+        for pool in self.osdmap_dump.get('pools', []):
+            poolid = pool['pool']
+            if poolid not in self.poolids:
+                continue
+            if poolid in pool_roots:
+                subtree: Any = [root_state[root] for root in pool_roots[poolid]]
+            else:
+                # rule we cannot resolve to a take; depend on the whole map
+                subtree = [self.crush_dump.get('buckets'),
+                           self.crush_dump.get('choose_args'),
+                           sorted(osds.items())]
+            r[poolid] = json.dumps({
+                'pool': {k: pool.get(k) for k in POOL_MAPPING_KEYS},
+                'rule': rules.get(pool['crush_rule']),
+                'tunables': tunables,
+                'upmaps': upmaps.get(poolid, []),
+                'subtree': subtree,
+            }, sort_keys=True)
+        return r
+
+    def packed_pool(self, poolid: int) -> Optional[array_eval.PackedPool]:
+        if poolid not in self.packed_pools:
+            self.packed_pools[poolid] = array_eval.pack_pool(
+                self.pg_up_by_poolid[poolid], self.pg_stat)
+        return self.packed_pools[poolid]
+
     def calc_misplaced_from(self, other_ms):
         num = len(other_ms.pg_up)
         misplaced = 0
-        for pgid, before in other_ms.pg_up.items():
-            if before != self.pg_up.get(pgid, []):
-                misplaced += 1
+        for poolid, pm in other_ms.pg_up_by_poolid.items():
+            if self.pg_up_by_poolid.get(poolid) is pm:
+                # shared by an incremental update, nothing moved
+                continue
+            for pgid, before in pm.items():
+                if before != self.pg_up.get(pgid, []):
+                    misplaced += 1
         if num > 0:
             return float(misplaced) / float(num)
         return 0.0
@@ -69,10 +179,20 @@ class Plan(object):
         self.osd_weights = {}
         self.compat_ws = {}
         self.inc = osdmap.new_incremental()
+        # upmap changes computed concurrently for independent CRUSH roots
+        self.upmap_incs: List[OSDMapIncremental] = []
         self.pg_status = {}
 
+    def inc_dump(self) -> Dict[str, Any]:
+        incdump = self.inc.dump()
+        for inc in self.upmap_incs:
+            for key, items in inc.dump().items():
+                if key in UPMAP_INC_KEYS:
+                    incdump.setdefault(key, []).extend(items)
+        return incdump
+
     def dump(self) -> str:
-        return json.dumps(self.inc.dump(), indent=4, sort_keys=True)
+        return json.dumps(self.inc_dump(), indent=4, sort_keys=True)
 
     def show(self) -> str:
         return 'upmap plan'
@@ -93,7 +213,9 @@ class MsPlan(Plan):
         return MappingState(self.initial.osdmap.apply_incremental(self.inc),
                             self.initial.raw_pg_stats,
                             self.initial.raw_pool_stats,
-                            'plan %s final' % self.name)
+                            'plan %s final' % self.name,
+                            prev=self.initial,
+                            incremental=self.initial.incremental)
 
     def show(self) -> str:
         ls = []
@@ -109,7 +231,7 @@ class MsPlan(Plan):
                       (osd, weight))
         for osd, weight in self.osd_weights.items():
             ls.append('ceph osd reweight osd.%d %f' % (osd, weight))
-        incdump = self.inc.dump()
+        incdump = self.inc_dump()
         for pgid in incdump.get('old_pg_upmap_items', []):
             ls.append('ceph osd rm-pg-upmap-items %s' % pgid)
         for item in incdump.get('new_pg_upmap_items', []):
@@ -286,6 +408,25 @@ class Module(MgrModule):
                desc='metrics with which to calculate OSD utilization',
                long_desc='Value is a list of one or more of "pgs", "objects", or "bytes", and indicates which metrics to use to balance utilization.',
                runtime=True),
+        Option(name='crush_compat_optimizer',
+               type='str',
+               default='step',
+               enum_allowed=['step', 'anneal'],
+               desc='optimizer used in crush-compat mode',
+               long_desc='"step" moves weight-set weights by a fixed fraction of their '
+                         'deviation for crush_compat_max_iterations rounds. "anneal" '
+                         'ranks several candidate updates by a predicted score, only '
+                         'evaluates the most promising one and stops once the score '
+                         'converges.',
+               runtime=True),
+        Option(name='crush_compat_convergence',
+               type='float',
+               default=.001,
+               min=0,
+               max=1,
+               desc='relative score improvement below which the anneal optimizer '
+                    'considers itself converged',
+               runtime=True),
         Option(name='crush_compat_step',
                type='float',
                default=.5,
@@ -294,6 +435,31 @@ class Module(MgrModule):
                desc='aggressiveness of optimization',
                long_desc='.99 is very aggressive, .01 is less aggressive',
                runtime=True),
+        Option(name='eval_engine',
+               type='str',
+               default='auto',
+               enum_allowed=['auto', 'python', 'array'],
+               desc='implementation used to evaluate the PG distribution',
+               long_desc='"array" packs PG mappings and stats into numpy arrays and '
+                         'uses batched reductions, "python" walks every PG. '
+                         '"auto" uses "array" if numpy is available.',
+               runtime=True),
+        Option(name='execute_max_inflight_commands',
+               type='uint',
+               default=64,
+               desc='maximum number of mon commands in flight when executing a plan',
+               long_desc='Upmap and weight changes of a plan are sent to the monitors '
+                         'as a pipeline of at most this many outstanding commands. '
+                         '0 means no limit.',
+               runtime=True),
+        Option(name='incremental_mapping',
+               type='bool',
+               default=True,
+               desc='reuse PG mappings of pools whose placement did not change',
+               long_desc='Keep the PG up mappings computed for the previous osdmap and '
+                         'only remap the pools whose pg_num, upmaps, CRUSH rule or '
+                         'subtree, or OSD states changed since then.',
+               runtime=True),
         Option(name='min_score',
                type='float',
                default=0,
@@ -314,6 +480,16 @@ class Module(MgrModule):
                default=10,
                desc='maximum upmap optimizations to make per attempt',
                runtime=True),
+        Option(name='upmap_workers',
+               type='uint',
+               default=1,
+               min=1,
+               desc='number of threads computing upmap changes',
+               long_desc='Pools whose CRUSH rules map to disjoint sets of OSDs '
+                         '(e.g. separate hdd and ssd roots) are optimized concurrently '
+                         'by up to this many threads, each with an even share of '
+                         'upmap_max_optimizations. 1 optimizes all pools serially.',
+               runtime=True),
         Option(name='upmap_max_deviation',
                type='int',
                default=5,
@@ -348,6 +524,9 @@ class Module(MgrModule):
     pg_upmap_items_removed: List[Dict[str, Any]] = []
     pg_upmap_primaries_added: List[Dict[str, Any]] = []
     pg_upmap_primaries_removed: List[Dict[str, Any]] = []
+    last_mapping_state: Optional[MappingState] = None
+    last_execute: Dict[str, Any] = {}
+    crush_compat_history: List[Dict[str, Any]] = []
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super(Module, self).__init__(*args, **kwargs)
@@ -366,6 +545,7 @@ class Module(MgrModule):
             'optimize_result': self.optimize_result,
             'no_optimization_needed': self.no_optimization_needed,
             'mode': self.get_module_option('mode'),
+            'last_execute': self.last_execute,
         }
         return (0, json.dumps(s, indent=4, sort_keys=True), '')
 
@@ -387,6 +567,8 @@ class Module(MgrModule):
             'optimize_result': self.optimize_result,
             'no_optimization_needed': self.no_optimization_needed,
             'mode': self.get_module_option('mode'),
+            'last_execute': self.last_execute,
+            'crush_compat_iterations': self.crush_compat_history,
             'pg_upmap_items_added': self.pg_upmap_items_added,
             'pg_upmap_items_removed': self.pg_upmap_items_removed,
             'pg_upmap_primaries_added': self.pg_upmap_primaries_added,
@@ -414,10 +596,7 @@ class Module(MgrModule):
                 warn = ('Unable to apply mode {} due to unknown min_compat_client {}.'.format(mode, min_compat_client))
                 return (-errno.EPERM, '', warn)
         elif mode == Mode.crush_compat:
-            ms = MappingState(self.get_osdmap(),
-                              self.get("pg_stats"),
-                              self.get("pool_stats"),
-                              'initialize compat weight-set')
+            ms = self.mapping_state(self.get_osdmap(), 'initialize compat weight-set')
             self.get_compat_weight_set_weights(ms)  # ignore error
         elif (mode == Mode.read) or (mode == Mode.upmap_read):
             try:
@@ -524,10 +703,7 @@ class Module(MgrModule):
     def _state_from_option(self, option: Optional[str] = None) -> Tuple[MappingState, List[str]]:
         pools = []
         if option is None:
-            ms = MappingState(self.get_osdmap(),
-                              self.get("pg_stats"),
-                              self.get("pool_stats"),
-                              'current cluster')
+            ms = self.mapping_state(self.get_osdmap(), 'current cluster')
         elif option in self.plans:
             plan = self.plans.get(option)
             assert plan
@@ -539,10 +715,7 @@ class Module(MgrModule):
                 # Hence ms might not be accurate here since we are basically
                 # using an old snapshotted osdmap vs a fresh copy of pg_stats.
                 # It should not be a big deal though..
-                ms = MappingState(plan.osdmap,
-                                  self.get("pg_stats"),
-                                  self.get("pool_stats"),
-                                  f'plan "{plan.name}"')
+                ms = self.mapping_state(plan.osdmap, f'plan "{plan.name}"')
             else:
                 ms = cast(MsPlan, plan).final_state()
         else:
@@ -552,10 +725,7 @@ class Module(MgrModule):
             if option not in valid_pool_names:
                 raise ValueError(f'option "{option}" not a plan or a pool')
             pools.append(option)
-            ms = MappingState(osdmap,
-                              self.get("pg_stats"),
-                              self.get("pool_stats"),
-                              f'pool "{option}"')
+            ms = self.mapping_state(osdmap, f'pool "{option}"')
         return ms, pools
 
     @CLIReadCommand('balancer eval-verbose')
@@ -775,6 +945,24 @@ class Module(MgrModule):
             self.event.wait(sleep_interval)
             self.event.clear()
 
+    def mapping_state(self, osdmap: OSDMap, desc: str) -> MappingState:
+        incremental = cast(bool, self.get_module_option('incremental_mapping'))
+        prev = self.last_mapping_state if incremental else None
+        ms = MappingState(osdmap,
+                          self.get("pg_stats"),
+                          self.get("pool_stats"),
+                          desc,
+                          prev=prev,
+                          incremental=incremental)
+        if not incremental:
+            self.last_mapping_state = None
+            return ms
+        self.log.debug('%s: remapped %d/%d pools', desc,
+                       len(ms.remapped_poolids), len(ms.poolids))
+        if prev is None or osdmap.get_epoch() >= prev.osdmap.get_epoch():
+            self.last_mapping_state = ms
+        return ms
+
     def plan_create(self, name: str, osdmap: OSDMap, pools: List[str]) -> Plan:
         mode = cast(str, self.get_module_option('mode'))
         if mode == 'upmap':
@@ -786,13 +974,40 @@ class Module(MgrModule):
         else:
             plan = MsPlan(name,
                           mode,
-                          MappingState(osdmap,
-                                       self.get("pg_stats"),
-                                       self.get("pool_stats"),
-                                       'plan %s initial' % name),
+                          self.mapping_state(osdmap, 'plan %s initial' % name),
                           pools)
         return plan
 
+    def eval_engine(self) -> str:
+        engine = cast(str, self.get_module_option('eval_engine'))
+        if engine == 'python':
+            return engine
+        if not array_eval.available():
+            if engine == 'array':
+                self.log.warning('numpy is not available, '
+                                 'falling back to python eval_engine')
+            return 'python'
+        return 'array'
+
+    @staticmethod
+    def count_by_osd(pm: Dict[str, List[int]],
+                     pg_stat: Dict[str, Dict[str, Any]]) -> array_eval.OsdCounts:
+        pgs_by_osd: Dict[int, int] = {}
+        objects_by_osd: Dict[int, int] = {}
+        bytes_by_osd: Dict[int, int] = {}
+        for pgid, up in pm.items():
+            for osd in [int(osd) for osd in up]:
+                if osd == CRUSHMap.ITEM_NONE:
+                    continue
+                if osd not in pgs_by_osd:
+                    pgs_by_osd[osd] = 0
+                    objects_by_osd[osd] = 0
+                    bytes_by_osd[osd] = 0
+                pgs_by_osd[osd] += 1
+                objects_by_osd[osd] += pg_stat[pgid]['num_objects']
+                bytes_by_osd[osd] += pg_stat[pgid]['num_bytes']
+        return pgs_by_osd, objects_by_osd, bytes_by_osd
+
     def calc_eval(self, ms: MappingState, pools: List[str]) -> Eval:
         pe = Eval(ms)
         pool_rule = {}
@@ -810,10 +1025,10 @@ class Module(MgrModule):
             pool_info[p['pool_name']] = p
         if len(pool_info) == 0:
             return pe
-        self.log.debug('pool_name %s' % pe.pool_name)
-        self.log.debug('pool_id %s' % pe.pool_id)
-        self.log.debug('pools %s' % pools)
-        self.log.debug('pool_rule %s' % pool_rule)
+        self.log.debug('pool_name %s', pe.pool_name)
+        self.log.debug('pool_id %s', pe.pool_id)
+        self.log.debug('pools %s', pools)
+        self.log.debug('pool_rule %s', pool_rule)
 
         osd_weight = {a['osd']: a['weight']
                       for a in ms.osdmap_dump.get('osds', []) if a['weight'] > 0}
@@ -861,47 +1076,40 @@ class Module(MgrModule):
                 'objects': 0,
                 'bytes': 0,
             }
-        self.log.debug('pool_roots %s' % pe.pool_roots)
-        self.log.debug('root_pools %s' % pe.root_pools)
-        self.log.debug('target_by_root %s' % pe.target_by_root)
+        self.log.debug('pool_roots %s', pe.pool_roots)
+        self.log.debug('root_pools %s', pe.root_pools)
+        self.log.debug('target_by_root %s', pe.target_by_root)
 
         # pool and root actual
+        engine = self.eval_engine()
         for pool, pi in pool_info.items():
             poolid = pi['pool']
-            pm = ms.pg_up_by_poolid[poolid]
+            if engine == 'array':
+                pgs_by_osd, objects_by_osd, bytes_by_osd = \
+                    array_eval.count_by_osd(ms.packed_pool(poolid))
+            else:
+                pgs_by_osd, objects_by_osd, bytes_by_osd = \
+                    self.count_by_osd(ms.pg_up_by_poolid[poolid], ms.pg_stat)
             pgs = 0
             objects = 0
             bytes = 0
-            pgs_by_osd = {}
-            objects_by_osd = {}
-            bytes_by_osd = {}
-            for pgid, up in pm.items():
-                for osd in [int(osd) for osd in up]:
-                    if osd == CRUSHMap.ITEM_NONE:
-                        continue
-                    if osd not in pgs_by_osd:
-                        pgs_by_osd[osd] = 0
-                        objects_by_osd[osd] = 0
-                        bytes_by_osd[osd] = 0
-                    pgs_by_osd[osd] += 1
-                    objects_by_osd[osd] += ms.pg_stat[pgid]['num_objects']
-                    bytes_by_osd[osd] += ms.pg_stat[pgid]['num_bytes']
-                    # pick a root to associate this pg instance with.
-                    # note that this is imprecise if the roots have
-                    # overlapping children.
-                    # FIXME: divide bytes by k for EC pools.
-                    for root in pe.pool_roots[pool]:
-                        if osd in pe.target_by_root[root]:
-                            actual_by_root[root]['pgs'][osd] += 1
-                            actual_by_root[root]['objects'][osd] += ms.pg_stat[pgid]['num_objects']
-                            actual_by_root[root]['bytes'][osd] += ms.pg_stat[pgid]['num_bytes']
-                            pgs += 1
-                            objects += ms.pg_stat[pgid]['num_objects']
-                            bytes += ms.pg_stat[pgid]['num_bytes']
-                            pe.total_by_root[root]['pgs'] += 1
-                            pe.total_by_root[root]['objects'] += ms.pg_stat[pgid]['num_objects']
-                            pe.total_by_root[root]['bytes'] += ms.pg_stat[pgid]['num_bytes']
-                            break
+            for osd in pgs_by_osd:
+                # pick a root to associate this osd's pg instances with.
+                # note that this is imprecise if the roots have
+                # overlapping children.
+                # FIXME: divide bytes by k for EC pools.
+                for root in pe.pool_roots[pool]:
+                    if osd in pe.target_by_root[root]:
+                        actual_by_root[root]['pgs'][osd] += pgs_by_osd[osd]
+                        actual_by_root[root]['objects'][osd] += objects_by_osd[osd]
+                        actual_by_root[root]['bytes'][osd] += bytes_by_osd[osd]
+                        pgs += pgs_by_osd[osd]
+                        objects += objects_by_osd[osd]
+                        bytes += bytes_by_osd[osd]
+                        pe.total_by_root[root]['pgs'] += pgs_by_osd[osd]
+                        pe.total_by_root[root]['objects'] += objects_by_osd[osd]
+                        pe.total_by_root[root]['bytes'] += bytes_by_osd[osd]
+                        break
             pe.count_by_pool[pool] = {
                 'pgs': {
                     k: v
@@ -980,8 +1188,8 @@ class Module(MgrModule):
                     for k, v in actual_by_root[root]['bytes'].items()
                 },
             }
-        self.log.debug('actual_by_pool %s' % pe.actual_by_pool)
-        self.log.debug('actual_by_root %s' % pe.actual_by_root)
+        self.log.debug('actual_by_pool %s', pe.actual_by_pool)
+        self.log.debug('actual_by_root %s', pe.actual_by_root)
 
         # average and stddev and score
         pe.stats_by_root = {
@@ -991,7 +1199,7 @@ class Module(MgrModule):
                 pe.total_by_root[a]
             ) for a, b in pe.count_by_root.items()
         }
-        self.log.debug('stats_by_root %s' % pe.stats_by_root)
+        self.log.debug('stats_by_root %s', pe.stats_by_root)
 
         # the scores are already normalized
         pe.score_by_root = {
@@ -1001,7 +1209,7 @@ class Module(MgrModule):
                 'bytes': pe.stats_by_root[r]['bytes']['score'],
             } for r in pe.total_by_root.keys()
         }
-        self.log.debug('score_by_root %s' % pe.score_by_root)
+        self.log.debug('score_by_root %s', pe.score_by_root)
 
         # get the list of score metrics, comma separated
         metrics = cast(str, self.get_module_option('crush_compat_metrics')).split(',')
@@ -1169,9 +1377,6 @@ class Module(MgrModule):
         self.log.info('pools %s' % pools)
 
         adjusted_pools = []
-        inc = plan.inc
-        total_did = 0
-        left = max_optimizations
         pools_with_pg_merge = [p['pool_name'] for p in osdmap_dump.get('pools', [])
                                if p['pg_num'] > p['pg_num_target']]
         crush_rule_by_pool_name = dict((p['pool_name'], p['crush_rule'])
@@ -1186,8 +1391,35 @@ class Module(MgrModule):
             adjusted_pools.append(pool)
         # shuffle so all pools get equal (in)attention
         random.shuffle(adjusted_pools)
-        pool_dump = osdmap_dump.get('pools', [])
-        for pool in adjusted_pools:
+
+        workers = cast(int, self.get_module_option('upmap_workers'))
+        groups = [adjusted_pools]
+        if workers > 1:
+            groups = self.group_pools_by_osds(plan, adjusted_pools)
+        if len(groups) > 1:
+            total_did = self.upmap_pools_parallel(plan, groups, workers,
+                                                  int(max_optimizations), max_deviation)
+        else:
+            total_did = self.upmap_pools(plan, plan.inc, adjusted_pools,
+                                         int(max_optimizations), max_deviation)
+        self.log.info('prepared %d/%d upmap changes' % (total_did, max_optimizations))
+        if total_did == 0:
+            self.no_optimization_needed = True
+            return -errno.EALREADY, 'Unable to find further optimization, ' \
+                                    'or pool(s) pg_num is decreasing, ' \
+                                    'or distribution is already perfect'
+        return 0, ''
+
+    def upmap_pools(self,
+                    plan: Plan,
+                    inc: OSDMapIncremental,
+                    pools: List[str],
+                    max_optimizations: int,
+                    max_deviation: int) -> int:
+        total_did = 0
+        left = max_optimizations
+        pool_dump = plan.osdmap_dump.get('pools', [])
+        for pool in pools:
             for p in pool_dump:
                 if p['pool_name'] == pool:
                     pool_id = p['pool']
@@ -1210,13 +1442,83 @@ class Module(MgrModule):
             left -= did
             if left <= 0:
                 break
-        self.log.info('prepared %d/%d upmap changes' % (total_did, max_optimizations))
-        if total_did == 0:
-            self.no_optimization_needed = True
-            return -errno.EALREADY, 'Unable to find further optimization, ' \
-                                    'or pool(s) pg_num is decreasing, ' \
-                                    'or distribution is already perfect'
-        return 0, ''
+        return total_did
+
+    def group_pools_by_osds(self, plan: Plan, pools: List[str]) -> List[List[str]]:
+        """
+        Partition pools into groups that do not share any OSD, following
+        the CRUSH roots their rules take.  Pools of different groups can be
+        optimized independently of each other.
+        """
+        pool_names = {p['pool']: p['pool_name']
+                      for p in plan.osdmap_dump.get('pools', [])}
+        parent = {pool: pool for pool in pools}
+
+        def find(pool: str) -> str:
+            while parent[pool] != pool:
+                parent[pool] = parent[parent[pool]]
+                pool = parent[pool]
+            return pool
+
+        def union(a: str, b: str) -> None:
+            parent[find(a)] = find(b)
+
+        crush = plan.osdmap.get_crush()
+        seen = set()
+        osd_pool: Dict[int, str] = {}
+        for rootid in crush.find_takes():
+            root_pools = [pool_names[poolid]
+                          for poolid in plan.osdmap.get_pools_by_take(rootid)
+                          if pool_names.get(poolid) in parent]
+            if not root_pools:
+                continue
+            seen.update(root_pools)
+            for pool in root_pools[1:]:
+                union(root_pools[0], pool)
+            for osd in crush.get_take_weight_osd_map(rootid):
+                if osd in osd_pool:
+                    union(osd_pool[osd], root_pools[0])
+                else:
+                    osd_pool[osd] = root_pools[0]
+        if len(seen) != len(pools):
+            # some rule could not be resolved to a take; be conservative
+            return [pools]
+        groups: Dict[str, List[str]] = {}
+        for pool in pools:
+            groups.setdefault(find(pool), []).append(pool)
+        return list(groups.values())
+
+    def upmap_pools_parallel(self,
+                             plan: Plan,
+                             groups: List[List[str]],
+                             workers: int,
+                             max_optimizations: int,
+                             max_deviation: int) -> int:
+        # calc_pg_upmaps releases the GIL, and only reads the osdmap. every
+        # group gets its own incremental and an even share of the budget.
+        jobs = []
+        for i, group in enumerate(groups):
+            budget = max_optimizations // len(groups)
+            if i < max_optimizations % len(groups):
+                budget += 1
+            if budget > 0:
+                jobs.append((group, budget, plan.osdmap.new_incremental()))
+        if not jobs:
+            return 0
+        self.log.info('optimizing %d independent pool groups with %d workers',
+                      len(jobs), min(workers, len(jobs)))
+        with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            futures = [
+                executor.submit(self.upmap_pools, plan, inc, group, budget,
+                                max_deviation)
+                for group, budget, inc in jobs
+            ]
+            done = [f.result() for f in futures]
+        for (group, budget, inc), did in zip(jobs, done):
+            self.log.debug('pools %s: prepared %d/%d upmap changes', group, did, budget)
+            if did > 0:
+                plan.upmap_incs.append(inc)
+        return sum(done)
 
     def do_crush_compat(self, plan: MsPlan) -> Tuple[int, str]:
         self.log.info('do_crush_compat')
@@ -1279,6 +1581,15 @@ class Module(MgrModule):
             self.log.warning("Invalid crush_compat balancing key %s. Using 'pgs'." % key)
             key = 'pgs'
 
+        optimizer = cast(str, self.get_module_option('crush_compat_optimizer'))
+        self.crush_compat_history = []
+        self.record_crush_compat_iteration(optimizer, 0, pe.score, 0.0, step,
+                                           True, time.time())
+        if optimizer == 'anneal':
+            return self.crush_compat_anneal(plan, pe, orig_ws, orig_osd_weight, key,
+                                            step, max_iterations, max_misplaced,
+                                            min_pg_per_osd)
+
         # go
         best_ws = copy.deepcopy(orig_ws)
         best_ow = copy.deepcopy(orig_osd_weight)
@@ -1289,7 +1600,8 @@ class Module(MgrModule):
         next_ow = copy.deepcopy(best_ow)
         while left > 0:
             # adjust
-            self.log.debug('best_ws %s' % best_ws)
+            iteration_start = time.time()
+            self.log.debug('best_ws %s', best_ws)
             random.shuffle(roots)
             for root in roots:
                 pools = best_pe.root_pools[root]
@@ -1358,6 +1670,10 @@ class Module(MgrModule):
             next_misplaced = next_ms.calc_misplaced_from(ms)
             self.log.debug('Step result score %f -> %f, misplacing %f',
                            best_pe.score, next_pe.score, next_misplaced)
+            self.record_crush_compat_iteration(
+                optimizer, max_iterations - left + 1, next_pe.score, next_misplaced,
+                step, next_misplaced <= max_misplaced and next_pe.score <= best_pe.score * 1.0001,
+                iteration_start)
 
             if next_misplaced > max_misplaced:
                 if best_pe.score < pe.score:
@@ -1389,6 +1705,180 @@ class Module(MgrModule):
                         break
             left -= 1
 
+        return self.crush_compat_finish(plan, pe, best_pe, best_ws, best_ow,
+                                        orig_osd_weight)
+
+    def record_crush_compat_iteration(self,
+                                      optimizer: str,
+                                      iteration: int,
+                                      score: float,
+                                      misplaced: float,
+                                      step: float,
+                                      accepted: bool,
+                                      start: float) -> None:
+        self.crush_compat_history.append({
+            'optimizer': optimizer,
+            'iteration': iteration,
+            'score': score,
+            'misplaced': misplaced,
+            'step': step,
+            'accepted': accepted,
+            'duration': time.time() - start,
+        })
+
+    def crush_compat_propose(self,
+                             pe: Eval,
+                             ws: Dict[int, float],
+                             ow: Dict[int, float],
+                             orig_osd_weight: Dict[int, float],
+                             key: str,
+                             alpha: float,
+                             min_pg_per_osd: int) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """
+        Scale the weight-set weight of every OSD by
+        (target / actual * reweight) ** alpha, then renormalize the weights
+        under each root.
+        """
+        crush = pe.ms.osdmap.get_crush()
+        next_ws = dict(ws)
+        next_ow = dict(ow)
+        for root, target in pe.target_by_root.items():
+            if pe.total_by_root[root][key] < len(target) * min_pg_per_osd:
+                continue
+            actual = pe.actual_by_root[root][key]
+            for osd in actual:
+                if orig_osd_weight[osd] == 0:
+                    continue
+                if actual[osd] > 0:
+                    # like the step optimizer, factor in the osd reweight so
+                    # that the weight-set absorbs it as the reweight goes to 1
+                    next_ws[osd] = ws[osd] * (target[osd] / actual[osd] * ow[osd]) ** alpha
+                else:
+                    # newly created osd, see do_crush_compat
+                    next_ws[osd] = ws[osd] * (1.0 - alpha) + target[osd] * alpha
+                if ow[osd] < 1.0:
+                    next_ow[osd] = min(1.0, max(alpha + (1.0 - alpha) * ow[osd],
+                                                ow[osd] + .005))
+            root_weight = crush.get_item_weight(pe.root_ids[root])
+            root_sum = sum(next_ws[osd] for osd in target)
+            if root_sum > 0 and root_weight:
+                factor = root_sum / root_weight
+                for osd in actual:
+                    next_ws[osd] = next_ws[osd] / factor
+        return next_ws, next_ow
+
+    def crush_compat_predict(self,
+                             pe: Eval,
+                             ws: Dict[int, float],
+                             next_ws: Dict[int, float],
+                             key: str) -> float:
+        """
+        Predict the score of ``next_ws`` without remapping any PG, assuming
+        each OSD's share of a root scales with its weight-set weight.
+        """
+        score = 0.0
+        for root, target in pe.target_by_root.items():
+            actual = pe.actual_by_root[root][key]
+            share = {
+                osd: actual[osd] * next_ws[osd] / ws[osd] if ws[osd] > 0 else actual[osd]
+                for osd in actual
+            }
+            total_share = sum(share.values())
+            total = pe.total_by_root[root][key]
+            if total_share > 0:
+                share = {osd: v / total_share * total for osd, v in share.items()}
+            stats = pe.calc_stats({'pgs': share, 'objects': share, 'bytes': share},
+                                  target,
+                                  {'pgs': total, 'objects': total, 'bytes': total})
+            score += stats['pgs']['score']
+        return score / max(len(pe.target_by_root), 1)
+
+    def crush_compat_anneal(self,
+                            plan: MsPlan,
+                            pe: Eval,
+                            orig_ws: Dict[int, float],
+                            orig_osd_weight: Dict[int, float],
+                            key: str,
+                            step: float,
+                            max_iterations: int,
+                            max_misplaced: float,
+                            min_pg_per_osd: int) -> Tuple[int, str]:
+        """
+        Annealing optimizer for crush-compat mode.
+
+        Each round proposes a few multiplicative weight-set updates of
+        decreasing size and ranks them by a predicted score (see
+        crush_compat_predict), which needs no PG remapping.  Only the best
+        candidate is evaluated with a full calc_eval.  A worse real score is
+        still accepted with a probability that shrinks as the temperature
+        cools.  The search stops once the best score has improved by less
+        than crush_compat_convergence (relative) for three rounds in a row,
+        or after crush_compat_max_iterations full evaluations.
+        """
+        convergence = cast(float, self.get_module_option('crush_compat_convergence'))
+        ms = plan.initial
+        cur_pe, cur_ws, cur_ow = pe, dict(orig_ws), dict(orig_osd_weight)
+        best_pe, best_ws, best_ow = pe, dict(orig_ws), dict(orig_osd_weight)
+        temperature = pe.score * .05
+        stale = 0
+        for iteration in range(1, max_iterations + 1):
+            start = time.time()
+            candidates = []
+            for alpha in (step, step / 2, step / 4, step / 8):
+                next_ws, next_ow = self.crush_compat_propose(
+                    cur_pe, cur_ws, cur_ow, orig_osd_weight, key, alpha, min_pg_per_osd)
+                predicted = self.crush_compat_predict(cur_pe, cur_ws, next_ws, key)
+                candidates.append((predicted, alpha, next_ws, next_ow))
+            predicted, alpha, next_ws, next_ow = min(candidates, key=lambda c: c[0])
+
+            plan.compat_ws = next_ws
+            next_ms = plan.final_state()
+            next_pe = self.calc_eval(next_ms, plan.pools)
+            next_misplaced = next_ms.calc_misplaced_from(ms)
+            delta = next_pe.score - cur_pe.score
+            self.log.debug('Anneal round %d alpha %f predicted %f score %f -> %f, '
+                           'misplacing %f', iteration, alpha, predicted,
+                           cur_pe.score, next_pe.score, next_misplaced)
+
+            if next_misplaced > max_misplaced:
+                accepted = False
+            elif delta <= 0:
+                accepted = True
+            else:
+                accepted = temperature > 0 and \
+                    random.random() < math.exp(-delta / temperature)
+            self.record_crush_compat_iteration('anneal', iteration, next_pe.score,
+                                               next_misplaced, alpha, accepted, start)
+            if accepted:
+                cur_pe, cur_ws, cur_ow = next_pe, next_ws, next_ow
+            else:
+                step /= 2.0
+            if accepted and next_pe.score < best_pe.score:
+                gain = (best_pe.score - next_pe.score) / best_pe.score
+                best_pe, best_ws, best_ow = next_pe, next_ws, next_ow
+                stale = stale + 1 if gain < convergence else 0
+            else:
+                stale += 1
+            if best_pe.score == 0 or stale >= 3:
+                break
+            if next_misplaced > max_misplaced and best_pe.score < pe.score:
+                self.log.debug('Step misplaced %f > max %f, stopping',
+                               next_misplaced, max_misplaced)
+                break
+            temperature /= 2.0
+
+        self.log.info('Anneal finished after %d full evaluations, score %f -> %f',
+                      len(self.crush_compat_history) - 1, pe.score, best_pe.score)
+        return self.crush_compat_finish(plan, pe, best_pe, best_ws, best_ow,
+                                        orig_osd_weight)
+
+    def crush_compat_finish(self,
+                            plan: MsPlan,
+                            pe: Eval,
+                            best_pe: Eval,
+                            best_ws: Dict[int, float],
+                            best_ow: Dict[int, float],
+                            orig_osd_weight: Dict[int, float]) -> Tuple[int, str]:
         # allow a small regression if we are phasing out osd weights
         fudge = 0.0
         if best_ow != orig_osd_weight:
@@ -1473,7 +1963,11 @@ class Module(MgrModule):
     def execute(self, plan: Plan) -> Tuple[int, str]:
         self.log.info('Executing plan %s' % plan.name)
 
-        commands = []
+        start = time.time()
+        # the plan may have been computed several epochs ago, only count
+        # the epochs that executing it produces
+        start_epoch = self.get_osdmap().get_epoch()
+        commands: List[Dict[str, Any]] = []
 
         # compat weight-set
         if len(plan.compat_ws):
@@ -1493,14 +1987,12 @@ class Module(MgrModule):
         for osd, weight in plan.compat_ws.items():
             self.log.info('ceph osd crush weight-set reweight-compat osd.%d %f',
                           osd, weight)
-            result = CommandResult('')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd crush weight-set reweight-compat',
                 'format': 'json',
                 'item': 'osd.%d' % osd,
                 'weight': [weight],
-            }), '')
-            commands.append(result)
+            })
 
         # new_weight
         reweightn = {}
@@ -1508,37 +2000,31 @@ class Module(MgrModule):
             reweightn[str(osd)] = str(int(weight * float(0x10000)))
         if len(reweightn):
             self.log.info('ceph osd reweightn %s', reweightn)
-            result = CommandResult('')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd reweightn',
                 'format': 'json',
                 'weights': json.dumps(reweightn),
-            }), '')
-            commands.append(result)
+            })
 
         # upmap
-        incdump = plan.inc.dump()
+        incdump = plan.inc_dump()
         for item in incdump.get('new_pg_upmap', []):
             self.log.info('ceph osd pg-upmap %s mappings %s', item['pgid'],
                           item['osds'])
-            result = CommandResult('foo')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd pg-upmap',
                 'format': 'json',
                 'pgid': item['pgid'],
                 'id': item['osds'],
-            }), 'foo')
-            commands.append(result)
+            })
 
         for pgid in incdump.get('old_pg_upmap', []):
             self.log.info('ceph osd rm-pg-upmap %s', pgid)
-            result = CommandResult('foo')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd rm-pg-upmap',
                 'format': 'json',
                 'pgid': pgid,
-            }), 'foo')
-            commands.append(result)
+            })
 
         for item in incdump.get('new_pg_upmap_items', []):
             self.log.info('ceph osd pg-upmap-items %s mappings %s', item['pgid'],
@@ -1546,48 +2032,91 @@ class Module(MgrModule):
             osdlist = []
             for m in item['mappings']:
                 osdlist += [m['from'], m['to']]
-            result = CommandResult('foo')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd pg-upmap-items',
                 'format': 'json',
                 'pgid': item['pgid'],
                 'id': osdlist,
-            }), 'foo')
-            commands.append(result)
+            })
 
         for pgid in incdump.get('old_pg_upmap_items', []):
             self.log.info('ceph osd rm-pg-upmap-items %s', pgid)
-            result = CommandResult('foo')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd rm-pg-upmap-items',
                 'format': 'json',
                 'pgid': pgid,
-            }), 'foo')
-            commands.append(result)
+            })
 
         # read
         for item in incdump.get('new_pg_upmap_primaries', []):
             self.log.info('ceph osd pg-upmap-primary %s primary_osd %s', item['pgid'],
                           item['primary_osd'])
-            result = CommandResult('foo')
-            self.send_command(result, 'mon', '', json.dumps({
+            commands.append({
                 'prefix': 'osd pg-upmap-primary',
                 'format': 'json',
                 'pgid': item['pgid'],
                 'id': item['primary_osd'],
-            }), 'foo')
-            commands.append(result)
+            })
 
-        # wait for commands
-        self.log.debug('commands %s' % commands)
-        for result in commands:
-            r, outb, outs = result.wait()
-            if r != 0:
-                self.log.error('execute error: r = %d, detail = %s' % (r, outs))
-                return r, outs
+        window = cast(int, self.get_module_option('execute_max_inflight_commands'))
+        r, outs, sent = self.send_commands_windowed(commands, window)
+        end = time.time()
+        self.last_execute = {
+            'plan': plan.name,
+            'commands': len(commands),
+            'commands_sent': sent,
+            'max_inflight_commands': window,
+            'start_epoch': start_epoch,
+            'epochs': self.get_osdmap().get_epoch() - start_epoch,
+            'duration': str(datetime.timedelta(seconds=(end - start))),
+            'result': r,
+        }
+        self.log.info('Executed plan %s: %d/%d commands, %d osdmap epochs, %.3fs',
+                      plan.name, sent, len(commands), self.last_execute['epochs'],
+                      end - start)
+        if r != 0:
+            return r, outs
         self.log.debug('done')
         return 0, ''
 
+    def send_commands_windowed(self,
+                               commands: List[Dict[str, Any]],
+                               window: int) -> Tuple[int, str, int]:
+        """
+        Send mon commands keeping at most ``window`` of them in flight (no
+        limit if ``window`` is 0).  The monitor folds the commands it
+        receives while a proposal is pending into the same osdmap epoch,
+        so keeping a window full rather than waiting on each command
+        yields few epochs without flooding the mon.
+
+        Stops submitting on the first error.  Returns the first error (or
+        0), its status string and the number of commands sent.
+        """
+        inflight: Deque[CommandResult] = deque()
+        error = (0, '')
+        sent = 0
+
+        def reap() -> None:
+            nonlocal error
+            r, outb, outs = inflight.popleft().wait()
+            if r != 0:
+                self.log.error('execute error: r = %d, detail = %s' % (r, outs))
+                if error[0] == 0:
+                    error = (r, outs)
+
+        for cmd in commands:
+            while window > 0 and len(inflight) >= window:
+                reap()
+            if error[0] != 0:
+                break
+            result = CommandResult('foo')
+            self.send_command(result, 'mon', '', json.dumps(cmd), 'foo')
+            inflight.append(result)
+            sent += 1
+        while inflight:
+            reap()
+        return error[0], error[1], sent
+
     def gather_telemetry(self) -> Dict[str, Any]:
         return {
             'active': self.active,
@@ -1595,7 +2124,7 @@ class Module(MgrModule):
         }
 
     def update_pg_upmap_activity(self, plan: Plan) -> None:
-        incdump = plan.inc.dump()
+        incdump = plan.inc_dump()
 
         # update pg_upmap_items
         self.pg_upmap_items_added = incdump.get('new_pg_upmap_items', [])
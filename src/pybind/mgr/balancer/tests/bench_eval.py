@@ -0,0 +1,65 @@
+"""
+Compare the python and array balancer evaluation engines on synthetic maps.
+
+Run from src/pybind/mgr:
+
+    UNITTEST=true PYTHONPATH=..:../../python-common \\
+        python -m balancer.tests.bench_eval --osds 5000 --pgs 200000
+"""
+
+import argparse
+import time
+
+from tests import mock
+
+from balancer import array_eval, module
+from balancer.tests.fixtures import CRUSHMapStub, make_mapping_state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--osds', type=int, default=5000)
+    parser.add_argument('--roots', type=int, default=2)
+    parser.add_argument('--pools', type=int, default=20)
+    parser.add_argument('--pgs', type=int, default=200000,
+                        help='total number of PGs across all pools')
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with mock.patch.object(module, 'CRUSHMap', CRUSHMapStub), \
+            mock.patch.object(array_eval, 'CRUSHMap', CRUSHMapStub):
+        balancer = module.Module('balancer', 0, 0)
+        balancer.set_module_option('crush_compat_metrics', 'pgs,objects,bytes')
+        start = time.monotonic()
+        ms = make_mapping_state(num_osds=args.osds,
+                                num_roots=args.roots,
+                                num_pools=args.pools,
+                                pg_num=max(args.pgs // args.pools, 1),
+                                size=args.size)
+        print('built synthetic map: %d osds, %d pgs in %.2fs' % (
+            args.osds, len(ms.pg_up), time.monotonic() - start))
+
+        engines = ['python']
+        if array_eval.available():
+            engines.append('array')
+        else:
+            print('numpy is not available, only timing the python engine')
+        shown = {}
+        for engine in engines:
+            balancer.set_module_option('eval_engine', engine)
+            timings = []
+            for _ in range(args.runs):
+                start = time.monotonic()
+                pe = balancer.calc_eval(ms, [])
+                timings.append(time.monotonic() - start)
+            shown[engine] = pe.show(verbose=True)
+            print('%-8s best %.3fs, worst %.3fs, score %f' % (
+                engine, min(timings), max(timings), pe.score))
+        if len(shown) > 1:
+            print('identical output: %s' % (shown['python'] == shown['array']))
+
+
+if __name__ == '__main__':
+    main()
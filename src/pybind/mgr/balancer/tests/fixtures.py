@@ -0,0 +1,221 @@
+import copy
+import math
+import random
+import threading
+from typing import Any, Dict, List
+
+from balancer.module import MappingState
+
+
+# mgr_module.CRUSHMap is a mock when running the unit tests
+ITEM_NONE = 0x7fffffff
+
+
+class CRUSHMapStub:
+    ITEM_NONE = ITEM_NONE
+
+
+class FakeCRUSH:
+    """
+    Just enough of CRUSHMap for the balancer evaluation: a set of roots,
+    each taking a disjoint range of OSDs.
+    """
+
+    def __init__(self, roots: Dict[int, List[int]], names: Dict[int, str]) -> None:
+        self.roots = roots
+        self.names = names
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'buckets': [{
+                'id': root,
+                'name': self.names[root],
+                'items': [{'id': osd, 'weight': w}
+                          for osd, w in self.get_take_weight_osd_map(root).items()],
+            } for root in self.roots],
+            'rules': [{'rule_id': i, 'steps': [{'op': 'take', 'item': root}]}
+                      for i, root in enumerate(self.roots)],
+            'choose_args': {},
+            'tunables': {},
+        }
+
+    def find_takes(self) -> List[int]:
+        return list(self.roots)
+
+    def get_item_name(self, item: int) -> str:
+        return self.names[item]
+
+    def get_take_weight_osd_map(self, root: int) -> Dict[int, float]:
+        return {osd: 1.0 + (osd % 3) * .5 for osd in self.roots[root]}
+
+    def get_item_weight(self, item: int) -> float:
+        return sum(self.get_take_weight_osd_map(item).values())
+
+
+class FakeOSDMap:
+    def __init__(self,
+                 num_osds: int = 12,
+                 num_roots: int = 2,
+                 num_pools: int = 3,
+                 pg_num: int = 64,
+                 size: int = 3,
+                 seed: int = 0,
+                 straw2: bool = False) -> None:
+        rng = random.Random(seed)
+        self.epoch = 1
+        self.size = size
+        self.seed = seed
+        self.straw2 = straw2
+        # compat weight-set, defaults to the crush weights
+        self.weight_set: Dict[int, float] = {}
+        self.map_calls: List[int] = []
+        self.upmap_calls: List[Any] = []
+        self.pg_upmap_items: List[Dict[str, Any]] = []
+        roots: Dict[int, List[int]] = {}
+        names: Dict[int, str] = {}
+        per_root = num_osds // num_roots
+        for r in range(num_roots):
+            rootid = -1 - r
+            roots[rootid] = list(range(r * per_root, (r + 1) * per_root))
+            names[rootid] = 'root%d' % r
+        self.crush = FakeCRUSH(roots, names)
+        self.pools: List[Dict[str, Any]] = []
+        self.pool_root: Dict[int, int] = {}
+        self.pg_up: Dict[int, Dict[str, List[int]]] = {}
+        rootids = list(roots)
+        for poolid in range(1, num_pools + 1):
+            rootid = rootids[poolid % len(rootids)]
+            self.pool_root[poolid] = rootid
+            self.pools.append({
+                'pool': poolid,
+                'pool_name': 'pool%d' % poolid,
+                'crush_rule': rootids.index(rootid),
+                'pg_num': pg_num,
+                'pg_num_target': pg_num,
+            })
+        self.osds = [{'osd': o, 'up': 1, 'in': 1, 'weight': 1.0 if o % 7 else .5,
+                      'primary_affinity': 1.0, 'up_thru': 1}
+                     for o in range(num_osds)]
+        # an out osd
+        self.osds[-1]['weight'] = 0.0
+        self.osds[-1]['in'] = 0
+        for poolid, rootid in self.pool_root.items():
+            if straw2:
+                self.pg_up[poolid] = self.map_pool_straw2(poolid, pg_num)
+                continue
+            osds = roots[rootid]
+            mapping = {}
+            for ps in range(pg_num):
+                up = rng.sample(osds, min(size, len(osds)))
+                if rng.random() < .01:
+                    # a degraded mapping for an EC-style pool
+                    up[-1] = ITEM_NONE
+                mapping['%d.%x' % (poolid, ps)] = up
+            self.pg_up[poolid] = mapping
+
+    def map_pool_straw2(self, poolid: int, pg_num: int) -> Dict[str, List[int]]:
+        """
+        Place PGs like a flat straw2 bucket would: every osd draws
+        ln(hash) / weight and the longest straws win.
+        """
+        crush_weights = self.crush.get_take_weight_osd_map(self.pool_root[poolid])
+        weights = {
+            osd: self.weight_set.get(osd, w) * self.osds[osd]['weight']
+            for osd, w in crush_weights.items()
+        }
+        mapping = {}
+        for ps in range(pg_num):
+            draws = []
+            for osd, w in weights.items():
+                if w <= 0:
+                    continue
+                h = random.Random(hash((self.seed, poolid, ps, osd))).random()
+                draws.append((math.log(1.0 - h) / w, osd))
+            mapping['%d.%x' % (poolid, ps)] = \
+                [osd for _, osd in sorted(draws, reverse=True)[:self.size]]
+        return mapping
+
+    def apply_incremental(self, inc: 'FakeIncremental') -> 'FakeOSDMap':
+        new = copy.copy(self)
+        new.epoch = self.epoch + 1
+        new.weight_set = {**self.weight_set, **inc.compat_ws}
+        new.osds = [dict(o, weight=inc.reweights.get(o['osd'], o['weight']))
+                    for o in self.osds]
+        new.pg_up = {
+            poolid: new.map_pool_straw2(poolid, len(mapping))
+            for poolid, mapping in self.pg_up.items()
+        }
+        return new
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'epoch': self.epoch,
+            'pools': self.pools,
+            'osds': self.osds,
+            'pg_upmap_items': self.pg_upmap_items,
+        }
+
+    def get_epoch(self) -> int:
+        return self.epoch
+
+    def get_crush(self) -> FakeCRUSH:
+        return self.crush
+
+    def get_pools_by_take(self, take: int) -> List[int]:
+        return [p for p, r in self.pool_root.items() if r == take]
+
+    def new_incremental(self) -> 'FakeIncremental':
+        return FakeIncremental()
+
+    def calc_pg_upmaps(self, inc: 'FakeIncremental', max_deviation: int,
+                       max_iterations: int, pools: List[str]) -> int:
+        self.upmap_calls.append((threading.get_ident(), pools))
+        poolid = [p['pool'] for p in self.pools if p['pool_name'] in pools][0]
+        did = min(max_iterations, 2)
+        for ps in range(did):
+            inc.items.append({'pgid': '%d.%x' % (poolid, ps),
+                              'mappings': [{'from': 0, 'to': 1}]})
+        return did
+
+    def map_pool_pgs_up(self, poolid: int) -> Dict[str, List[int]]:
+        self.map_calls.append(poolid)
+        return dict(self.pg_up[poolid])
+
+    def pg_stats(self, seed: int = 0) -> Dict[str, Any]:
+        rng = random.Random(seed)
+        stats = []
+        for mapping in self.pg_up.values():
+            for pgid in mapping:
+                objects = rng.randint(0, 10000)
+                stats.append({
+                    'pgid': pgid,
+                    'stat_sum': {
+                        'num_objects': objects,
+                        'num_bytes': objects * rng.randint(1, 1 << 22),
+                    },
+                })
+        return {'pg_stats': stats}
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {'pool_stats': [{'poolid': p['pool']} for p in self.pools]}
+
+
+def make_mapping_state(**kwargs: Any) -> MappingState:
+    osdmap = FakeOSDMap(**kwargs)
+    return MappingState(osdmap, osdmap.pg_stats(), osdmap.pool_stats(), 'synthetic')
+
+
+class FakeIncremental:
+    def __init__(self) -> None:
+        self.items: List[Dict[str, Any]] = []
+        self.compat_ws: Dict[int, float] = {}
+        self.reweights: Dict[int, float] = {}
+
+    def set_osd_reweights(self, weights: Dict[int, float]) -> None:
+        self.reweights = dict(weights)
+
+    def set_crush_compat_weight_set_weights(self, weights: Dict[int, float]) -> None:
+        self.compat_ws = dict(weights)
+
+    def dump(self) -> Dict[str, Any]:
+        return {'epoch': 2, 'new_pg_upmap_items': list(self.items)}
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from balancer import array_eval, module
+from balancer.module import MappingState, Module, MsPlan
+from balancer.tests.fixtures import CRUSHMapStub, FakeOSDMap
+from tests import mock
+
+
+def make_balancer(monkeypatch, **options):
+    monkeypatch.setattr(module, 'CRUSHMap', CRUSHMapStub)
+    monkeypatch.setattr(array_eval, 'CRUSHMap', CRUSHMapStub)
+    m = Module('balancer', 0, 0)
+    defaults = {
+        'crush_compat_max_iterations': 25,
+        'crush_compat_step': .5,
+        'crush_compat_metrics': 'pgs,objects,bytes',
+        'crush_compat_optimizer': 'step',
+        'crush_compat_convergence': .001,
+        'min_score': 0,
+        'eval_engine': 'python',
+    }
+    defaults.update(options)
+    # the mocked option store does not know about 'uint' and 'float' options
+    m.get_module_option = mock.Mock(side_effect=lambda key: defaults[key])
+    m.get_ceph_option = mock.Mock(return_value=1.0)
+    return m
+
+
+def make_plan(m):
+    osdmap = FakeOSDMap(num_osds=12, num_roots=2, num_pools=4, pg_num=128,
+                        straw2=True)
+    ms = MappingState(osdmap, osdmap.pg_stats(), osdmap.pool_stats(), 'initial')
+    m.get_compat_weight_set_weights = mock.Mock(return_value={
+        osd: w
+        for root in osdmap.crush.roots
+        for osd, w in osdmap.crush.get_take_weight_osd_map(root).items()
+    })
+    return MsPlan('test', 'crush-compat', ms, [])
+
+
+@pytest.mark.parametrize('optimizer', ['step', 'anneal'])
+def test_crush_compat_improves_score(monkeypatch, optimizer):
+    random.seed(0)
+    m = make_balancer(monkeypatch, crush_compat_optimizer=optimizer)
+    plan = make_plan(m)
+    initial = m.calc_eval(plan.initial, []).score
+    r, detail = m.do_crush_compat(plan)
+    assert r == 0, detail
+    assert plan.compat_ws
+    final = m.calc_eval(plan.final_state(), []).score
+    assert final < initial
+
+    history = m.crush_compat_history
+    assert history[0]['iteration'] == 0
+    assert history[0]['score'] == initial
+    assert 1 < len(history) <= 26
+    assert all(h['optimizer'] == optimizer for h in history)
+    assert all(h['duration'] >= 0 for h in history)
+
+
+def test_anneal_stops_on_convergence(monkeypatch):
+    random.seed(0)
+    m = make_balancer(monkeypatch, crush_compat_optimizer='anneal',
+                      crush_compat_max_iterations=250,
+                      crush_compat_convergence=.5)
+    plan = make_plan(m)
+    m.do_crush_compat(plan)
+    # a 50% relative improvement per round cannot be kept up for long
+    assert len(m.crush_compat_history) < 250
+
+
+def test_anneal_propose_factors_in_reweight(monkeypatch):
+    m = make_balancer(monkeypatch)
+    pe = mock.Mock()
+    pe.ms.osdmap.get_crush.return_value.get_item_weight.return_value = 2.0
+    pe.root_ids = {'default': -1}
+    pe.target_by_root = {'default': {0: .5, 1: .5}}
+    pe.actual_by_root = {'default': {'pgs': {0: .5, 1: .5}}}
+    pe.total_by_root = {'default': {'pgs': 128}}
+    ws = {0: 1.0, 1: 1.0}
+    ow = {0: .5, 1: 1.0}
+    next_ws, next_ow = m.crush_compat_propose(pe, ws, ow, ow, 'pgs', .5, 1)
+    # both osds are balanced, but osd.0 only gets half of its weight through
+    # the reweight, so its weight-set weight has to absorb it
+    assert next_ws[0] < next_ws[1]
+    assert next_ws[0] + next_ws[1] == pytest.approx(2.0)
+    assert next_ow[0] > ow[0]
+    assert next_ow[1] == 1.0
@@ -0,0 +1,48 @@
+import pytest
+
+from balancer import array_eval, module
+from balancer.module import Module
+from balancer.tests.fixtures import CRUSHMapStub, ITEM_NONE, make_mapping_state
+
+
+@pytest.fixture
+def balancer(monkeypatch):
+    monkeypatch.setattr(module, 'CRUSHMap', CRUSHMapStub)
+    monkeypatch.setattr(array_eval, 'CRUSHMap', CRUSHMapStub)
+    m = Module('balancer', 0, 0)
+    m.set_module_option('crush_compat_metrics', 'pgs,objects,bytes')
+    return m
+
+
+def calc_eval(module, ms, pools, engine):
+    module.set_module_option('eval_engine', engine)
+    return module.calc_eval(ms, pools)
+
+
+@pytest.mark.skipif(not array_eval.available(), reason='numpy is not available')
+@pytest.mark.parametrize('pools', [[], ['pool2']])
+def test_array_engine_matches_python(balancer, pools):
+    ms = make_mapping_state(num_osds=30, num_roots=3, num_pools=5, pg_num=128)
+    expected = calc_eval(balancer, ms, pools, 'python')
+    actual = calc_eval(balancer, ms, pools, 'array')
+    assert actual.show(verbose=True) == expected.show(verbose=True)
+    assert actual.count_by_pool == expected.count_by_pool
+    assert actual.stats_by_root == expected.stats_by_root
+    assert actual.score == expected.score
+
+
+def test_count_by_osd_skips_item_none(balancer):
+    ms = make_mapping_state(num_osds=6, num_roots=1, num_pools=1, pg_num=200)
+    pgs, _, _ = balancer.count_by_osd(ms.pg_up_by_poolid[1], ms.pg_stat)
+    assert ITEM_NONE not in pgs
+    assert sum(pgs.values()) == sum(
+        len([o for o in up if o != ITEM_NONE])
+        for up in ms.pg_up_by_poolid[1].values())
+    if array_eval.available():
+        assert array_eval.count_by_osd(ms.packed_pool(1))[0] == pgs
+
+
+def test_python_fallback_without_numpy(balancer, monkeypatch):
+    monkeypatch.setattr(array_eval, 'np', None)
+    balancer.set_module_option('eval_engine', 'array')
+    assert balancer.eval_engine() == 'python'
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from balancer import module
+from balancer.module import Module, Plan
+from tests import mock
+
+
+class FakeResult:
+    inflight = 0
+    max_inflight = 0
+
+    def __init__(self, tag=None):
+        self.r = 0
+
+    def wait(self):
+        FakeResult.inflight -= 1
+        return self.r, '', 'error' if self.r else ''
+
+
+@pytest.fixture
+def balancer(monkeypatch):
+    FakeResult.inflight = 0
+    FakeResult.max_inflight = 0
+    monkeypatch.setattr(module, 'CommandResult', FakeResult)
+    m = Module('balancer', 0, 0)
+    m.sent = []
+    orig_send_command = m.send_command
+
+    def send_command(result, svc_type, svc_id, command, tag, inbuf=None):
+        if not isinstance(result, FakeResult):
+            # config get/set issued by the mocked module option store
+            return orig_send_command(result, svc_type, svc_id, command, tag, inbuf)
+        cmd = json.loads(command)
+        m.sent.append(cmd)
+        if cmd.get('pgid') == m.failing_pgid:
+            result.r = -22
+        FakeResult.inflight += 1
+        FakeResult.max_inflight = max(FakeResult.max_inflight, FakeResult.inflight)
+
+    m.failing_pgid = None
+    m.send_command = send_command
+    m.get_osdmap = mock.Mock()
+    m.get_osdmap.return_value.get_epoch.return_value = 12
+    return m
+
+
+def set_window(m, window):
+    # the mocked option store does not know about 'uint' options
+    m.get_module_option = mock.Mock(return_value=window)
+
+
+def upmap_plan(num):
+    plan = Plan.__new__(Plan)
+    plan.name = 'test'
+    plan.compat_ws = {}
+    plan.osd_weights = {}
+    plan.upmap_incs = []
+    plan.osdmap = mock.Mock()
+    plan.osdmap.get_epoch.return_value = 10
+    plan.inc = mock.Mock()
+    plan.inc.dump.return_value = {
+        'new_pg_upmap_items': [
+            {'pgid': '1.%x' % i, 'mappings': [{'from': 0, 'to': 1}]}
+            for i in range(num)
+        ],
+        'old_pg_upmap_items': ['2.%x' % i for i in range(num)],
+    }
+    return plan
+
+
+def test_execute_bounds_inflight_commands(balancer):
+    set_window(balancer, 8)
+    # the plan was computed at epoch 10, the cluster moved on to 11 since
+    balancer.get_osdmap.return_value.get_epoch.side_effect = [11, 13]
+    r, _ = balancer.execute(upmap_plan(50))
+    assert r == 0
+    assert len(balancer.sent) == 100
+    assert FakeResult.max_inflight == 8
+    assert FakeResult.inflight == 0
+    assert balancer.last_execute['commands_sent'] == 100
+    assert balancer.last_execute['epochs'] == 2
+
+
+def test_execute_unbounded_window(balancer):
+    set_window(balancer, 0)
+    r, _ = balancer.execute(upmap_plan(50))
+    assert r == 0
+    assert FakeResult.max_inflight == 100
+
+
+def test_execute_stops_on_error(balancer):
+    set_window(balancer, 4)
+    balancer.failing_pgid = '1.2'
+    r, detail = balancer.execute(upmap_plan(50))
+    assert r == -22
+    assert detail == 'error'
+    # the failure is noticed once the window is full
+    assert len(balancer.sent) < 10
+    assert FakeResult.inflight == 0
+    assert balancer.last_execute['result'] == -22
@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+
+from balancer.module import MappingState
+from balancer.tests.fixtures import FakeOSDMap
+
+
+@pytest.fixture
+def osdmap():
+    return FakeOSDMap(num_osds=12, num_roots=2, num_pools=4, pg_num=32)
+
+
+def next_state(osdmap, prev, incremental=True):
+    osdmap.epoch += 1
+    osdmap.map_calls.clear()
+    return MappingState(osdmap, osdmap.pg_stats(), osdmap.pool_stats(),
+                        'epoch %d' % osdmap.epoch, prev=prev, incremental=incremental)
+
+
+def test_unchanged_map_is_not_remapped(osdmap):
+    first = next_state(osdmap, None)
+    assert sorted(osdmap.map_calls) == [1, 2, 3, 4]
+    second = next_state(osdmap, first)
+    assert osdmap.map_calls == []
+    assert second.remapped_poolids == set()
+    assert second.pg_up == first.pg_up
+    assert second.calc_misplaced_from(first) == 0.0
+
+
+def test_irrelevant_osd_fields_are_ignored(osdmap):
+    first = next_state(osdmap, None)
+    for o in osdmap.osds:
+        o['up_thru'] += 1
+    next_state(osdmap, first)
+    assert osdmap.map_calls == []
+
+
+def test_pg_num_change_remaps_only_that_pool(osdmap):
+    first = next_state(osdmap, None)
+    osdmap.pools[0] = dict(osdmap.pools[0], pg_num=64)
+    second = next_state(osdmap, first)
+    assert second.remapped_poolids == {1}
+    assert second.pg_up_by_poolid[2] is first.pg_up_by_poolid[2]
+
+
+def test_upmap_change_remaps_only_that_pool(osdmap):
+    first = next_state(osdmap, None)
+    osdmap.pg_upmap_items.append({'pgid': '3.1', 'mappings': [{'from': 0, 'to': 1}]})
+    second = next_state(osdmap, first)
+    assert second.remapped_poolids == {3}
+
+
+def test_osd_state_change_remaps_pools_under_its_root(osdmap):
+    first = next_state(osdmap, None)
+    # osd.0 is under root -1, which takes pools 2 and 4
+    osdmap.osds[0]['up'] = 0
+    second = next_state(osdmap, first)
+    assert second.remapped_poolids == {2, 4}
+
+
+def test_crush_subtree_change_remaps_pools_under_that_root(osdmap):
+    first = next_state(osdmap, None)
+    osdmap.crush.roots = copy.deepcopy(osdmap.crush.roots)
+    osdmap.crush.roots[-2].pop()
+    second = next_state(osdmap, first)
+    assert second.remapped_poolids == {1, 3}
+
+
+def test_full_rebuild_when_not_incremental(osdmap):
+    first = next_state(osdmap, None)
+    second = next_state(osdmap, first, incremental=False)
+    assert sorted(osdmap.map_calls) == [1, 2, 3, 4]
+    assert second.pg_up == first.pg_up
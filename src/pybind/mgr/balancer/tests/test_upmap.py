@@ -0,0 +1,84 @@
+import pytest
+
+from balancer.module import Module, Plan
+from balancer.tests.fixtures import FakeOSDMap
+from tests import mock
+
+
+@pytest.fixture
+def osdmap():
+    return FakeOSDMap(num_osds=12, num_roots=2, num_pools=4, pg_num=32)
+
+
+def make_balancer(**options):
+    m = Module('balancer', 0, 0)
+    defaults = {
+        'upmap_max_optimizations': 10,
+        'upmap_max_deviation': 1,
+        'upmap_workers': 1,
+    }
+    defaults.update(options)
+    # the mocked option store does not know about 'uint' options
+    m.get_module_option = mock.Mock(side_effect=lambda key: defaults[key])
+    return m
+
+
+def make_plan(osdmap):
+    plan = Plan('test', 'upmap', osdmap, [])
+    plan.pg_status = {
+        'pgs_by_pool_state': [{
+            'pool_id': p['pool'],
+            'pg_state_counts': [{'state_name': 'active+clean', 'count': p['pg_num']}],
+        } for p in osdmap.pools],
+    }
+    return plan
+
+
+def test_group_pools_by_disjoint_roots(osdmap):
+    m = make_balancer()
+    groups = m.group_pools_by_osds(make_plan(osdmap), ['pool1', 'pool2', 'pool3', 'pool4'])
+    assert sorted(sorted(g) for g in groups) == [['pool1', 'pool3'], ['pool2', 'pool4']]
+
+
+def test_group_pools_by_overlapping_roots(osdmap):
+    # a root spanning the devices of both other roots, like a device class
+    # shadow tree would
+    osdmap.crush.roots[-3] = [0, 11]
+    osdmap.crush.names[-3] = 'overlap'
+    osdmap.pools.append(dict(osdmap.pools[0], pool=5, pool_name='pool5'))
+    osdmap.pool_root[5] = -3
+    m = make_balancer()
+    pools = ['pool1', 'pool2', 'pool3', 'pool4', 'pool5']
+    groups = m.group_pools_by_osds(make_plan(osdmap), pools)
+    assert len(groups) == 1
+    assert sorted(groups[0]) == pools
+
+
+def test_do_upmap_serial(osdmap):
+    m = make_balancer()
+    plan = make_plan(osdmap)
+    r, _ = m.do_upmap(plan)
+    assert r == 0
+    assert plan.upmap_incs == []
+    assert len(plan.inc_dump()['new_pg_upmap_items']) == 8
+
+
+def test_do_upmap_parallel(osdmap):
+    m = make_balancer(upmap_workers=4)
+    plan = make_plan(osdmap)
+    r, _ = m.do_upmap(plan)
+    assert r == 0
+    assert len(plan.upmap_incs) == 2
+    items = plan.inc_dump()['new_pg_upmap_items']
+    # each of the two groups got a budget of 5
+    assert len(items) == 8
+    assert len(osdmap.upmap_calls) == 4
+    assert len(set(pgid['pgid'] for pgid in items)) == 8
+
+
+def test_do_upmap_parallel_budget_smaller_than_groups(osdmap):
+    m = make_balancer(upmap_workers=4, upmap_max_optimizations=1)
+    plan = make_plan(osdmap)
+    r, _ = m.do_upmap(plan)
+    assert r == 0
+    assert len(plan.inc_dump()['new_pg_upmap_items']) == 1
@@ -21,6 +21,7 @@ class BasePyOSDMap(object):
     def _calc_pg_upmaps(self, inc, max_deviation, max_iterations, pool):...
     def _balance_primaries(self, pool_id, inc):...
     def _map_pool_pgs_up(self, poolid):...
+    def _map_pool_pgs_acting(self, poolid):...
     def _pg_to_up_acting_osds(self, pool_id, ps):...
     def _pool_raw_used_rate(self, pool_id):...
     @classmethod
@@ -77,6 +78,8 @@ class BaseMgrModule(object):
     def _ceph_get_rocksdb_version(self) -> str: ...
     def _ceph_get_unlabeled_counter(self, svc_type: str, svc_name: str, path: str) -> Dict[str, List[Tuple[float, int]]]: ...
     def _ceph_get_latest_unlabeled_counter(self, svc_type, svc_name, path): ...
+    def _ceph_get_latest_unlabeled_counters(self, svc_type: str, prio_limit: int) -> Dict[str, Dict[str, Any]]: ...
+    def _ceph_get_pg_progress_since(self, since: int) -> Dict[str, Any]: ...
     def _ceph_get_latest_counter(self, svc_type: str, svc_name: str, counter_name: str, sub_counter_name: str, labels: List[Tuple[str, str]]): ...
     def _ceph_get_metadata(self, svc_type, svc_id): ...
     def _ceph_get_daemon_status(self, svc_type, svc_id): ...
@@ -6,12 +6,14 @@ except ImportError:
     class Server:  # type: ignore
         pass
 
+import base64
 import json
 import logging
 import socket
 import ssl
 import threading
 import time
+import zlib
 
 from orchestrator import DaemonDescriptionStatus
 from orchestrator._interface import daemon_type_to_service
@@ -662,6 +664,7 @@ class HostData(Server):
         results: Dict[str, Any] = {}
         try:
             self.check_request_fields(data)
+            self.decompress_metadata(data)
         except Exception as e:
             results['result'] = f'Bad metadata: {e}'
             self.mgr.log.warning(f'Received bad metadata from an agent: {e}')
@@ -670,6 +673,10 @@ class HostData(Server):
             # host agent is reporting on is marked offline, it shouldn't be any more
             self.mgr.offline_hosts_remove(data['host'])
             results['result'] = self.handle_metadata(data)
+            if 'hashes' in data:
+                # the agent only sends the sections whose hash differs from these
+                results['hashes'] = dict(
+                    self.mgr.cache.agent_metadata_hashes.get(data['host'], {}))
         return results
 
     def check_request_fields(self, data: Dict[str, Any]) -> None:
@@ -698,12 +705,28 @@ class HostData(Server):
         except Exception as e:
             raise Exception(
                 f'Counter value from agent on host {host} could not be converted to an integer: {e}')
+        if 'hashes' in data and not isinstance(data['hashes'], dict):
+            raise Exception(
+                f'Agent on host {host} reported malformed metadata hashes ("hashes" field)')
+        if 'volatile' in data and not isinstance(data['volatile'], dict):
+            raise Exception(
+                f'Agent on host {host} reported malformed volatile metadata ("volatile" field)')
         metadata_types = ['ls', 'networks', 'facts', 'volume']
         metadata_types_str = '{' + ', '.join(metadata_types) + '}'
-        if not all(item in data.keys() for item in metadata_types):
+        # with the delta protocol, unchanged sections are only reported by hash
+        reported = set(data.keys()) | set(data.get('hashes', {}).keys())
+        if not all(item in reported for item in metadata_types):
             self.mgr.log.warning(
                 f'Agent on host {host} reported incomplete metadata. Not all of {metadata_types_str} were present. Received fields {fields}')
 
+    def decompress_metadata(self, data: Dict[str, Any]) -> None:
+        if 'compressed' not in data:
+            return
+        sections = json.loads(zlib.decompress(base64.b64decode(data.pop('compressed'))))
+        if not isinstance(sections, dict):
+            raise Exception(f'Agent on host {data["host"]} sent malformed compressed metadata')
+        data.update(sections)
+
     def handle_metadata(self, data: Dict[str, Any]) -> str:
         try:
             host = data['host']
@@ -733,6 +756,20 @@ class HostData(Server):
                 self.mgr.log.debug(
                     f'Received old metadata from agent on host {host}. Requested up-to-date metadata.')
 
+            # agents supporting the delta protocol report the hash of every
+            # section they have fresh data for, and only send the sections
+            # whose hash differs from the one we last stored for the host
+            hashes: Optional[Dict[str, str]] = data.get('hashes')
+            stored_hashes = self.mgr.cache.agent_metadata_hashes.setdefault(host, {})
+            unchanged: Set[str] = set()
+            if hashes is not None:
+                unchanged = set(
+                    section for section, digest in hashes.items()
+                    if section not in data and stored_hashes.get(section) == digest
+                )
+                if unchanged:
+                    self.mgr.cache.update_host_unchanged(host, unchanged, data.get('volatile', {}))
+
             if 'ls' in data and data['ls']:
                 self.mgr._process_ls_output(host, data['ls'])
                 self.mgr.update_failed_daemon_health_check()
@@ -752,7 +789,15 @@ class HostData(Server):
                     f'Change detected in state of daemons from {host} agent metadata. Kicking serve loop')
                 self.mgr._kick_serve_loop()
 
-            if up_to_date and ('ls' in data and data['ls']):
+            if hashes is not None:
+                for section, digest in hashes.items():
+                    if section in data and data[section]:
+                        stored_hashes[section] = digest
+                    elif section not in unchanged:
+                        # neither sent nor matching, the agent has to send it
+                        stored_hashes.pop(section, None)
+
+            if up_to_date and (('ls' in data and data['ls']) or 'ls' in unchanged):
                 was_out_of_date = not self.mgr.cache.all_host_metadata_up_to_date()
                 self.mgr.cache.metadata_up_to_date[host] = True
                 if was_out_of_date and self.mgr.cache.all_host_metadata_up_to_date():
@@ -766,6 +811,8 @@ class HostData(Server):
             return 'Successfully processed metadata.'
 
         except Exception as e:
+            # have the agent send everything again
+            self.mgr.cache.agent_metadata_hashes.pop(host, None)
             err_str = f'Failed to update metadata with metadata from agent on host {host}: {e}'
             self.mgr.log.warning(err_str)
             return err_str
@@ -1,5 +1,6 @@
 import datetime
 import enum
+import hashlib
 from copy import copy
 import ipaddress
 import itertools
@@ -607,6 +608,10 @@ class ClientKeyringSpec(object):
 class ClientKeyringStore():
     """
     Track client keyring files that we are supposed to maintain
+
+    Also caches, in memory only, what the serve loop needs to compute the
+    client files: the keyrings fetched from the mons, the hosts each
+    placement maps to for the current inventory, and the resulting files.
     """
 
     def __init__(self, mgr):
@@ -614,6 +619,14 @@ class ClientKeyringStore():
         self.mgr: CephadmOrchestrator = mgr
         self.mgr = mgr
         self.keys: Dict[str, ClientKeyringSpec] = {}
+        # entity -> (keyring, digest, fetched)
+        self.keyrings: Dict[str, Tuple[str, str, datetime.datetime]] = {}
+        # placement -> hosts, valid for placements_inventory
+        self.placements: Dict[str, Set[str]] = {}
+        self.placements_inventory: Optional[Tuple] = None
+        # host -> path -> (mode, uid, gid, content, digest), valid for client_files_key
+        self.client_files: Dict[str, Dict[str, Tuple[int, int, int, bytes, str]]] = {}
+        self.client_files_key: Optional[Tuple] = None
 
     def load(self) -> None:
         c = self.mgr.get_store('client_keyrings') or b'{}'
@@ -629,13 +642,36 @@ class ClientKeyringStore():
 
     def update(self, ks: ClientKeyringSpec) -> None:
         self.keys[ks.entity] = ks
+        self.keyrings.pop(ks.entity, None)
         self.save()
 
     def rm(self, entity: str) -> None:
         if entity in self.keys:
             del self.keys[entity]
+            self.keyrings.pop(entity, None)
             self.save()
 
+    def get_keyring(self, entity: str) -> Optional[Tuple[str, str]]:
+        """
+        Return the keyring of an entity and its digest, or None if the mons
+        would not give it to us. Keyrings are fetched again once they are
+        older than client_keyring_refresh_interval.
+        """
+        cached = self.keyrings.get(entity)
+        if cached and datetime_now() - cached[2] < datetime.timedelta(
+                seconds=self.mgr.client_keyring_refresh_interval):
+            return cached[0], cached[1]
+        ret, keyring, err = self.mgr.mon_command({
+            'prefix': 'auth get',
+            'entity': entity,
+        })
+        if ret:
+            self.keyrings.pop(entity, None)
+            return None
+        digest = hashlib.sha256(keyring.encode('utf-8')).hexdigest()
+        self.keyrings[entity] = (keyring, digest, datetime_now())
+        return keyring, digest
+
 
 class TunedProfileStore():
     """
@@ -811,6 +847,11 @@ class HostCache():
 
         self.metadata_up_to_date = {}  # type: Dict[str, bool]
 
+        # host -> agent metadata section (ls, networks, facts, volume) -> hash
+        # of the content last stored from the host's agent. Not persisted, an
+        # agent sends everything again after a mgr failover.
+        self.agent_metadata_hashes = {}  # type: Dict[str, Dict[str, str]]
+
     def load(self):
         # type: () -> None
         for k, v in self.mgr.get_store_prefix(HOST_CACHE_PREFIX).items():
@@ -956,6 +997,33 @@ class HostCache():
         self.networks[host] = nets
         self.last_network_update[host] = datetime_now()
 
+    def update_host_unchanged(self, host: str, sections: Set[str],
+                              volatile: Dict[str, Any]) -> None:
+        """
+        The agent on `host` reported that these metadata sections did not
+        change since they were last stored: they are as good as a fresh
+        update, once the fields that change on every report (the `volatile`
+        facts, memory and cpu usage of the daemons) are updated and the
+        timestamps moved.
+        """
+        now = datetime_now()
+        if 'ls' in sections and host in self.daemons:
+            for dd in self.daemons[host].values():
+                if 'ls' in volatile:
+                    fields = volatile['ls'].get(dd.name(), {})
+                    dd.memory_usage = fields.get('memory_usage')
+                    dd.cpu_percentage = fields.get('cpu_percentage')
+                dd.last_refresh = now
+            self._tmp_daemons.pop(host, {})
+            self.last_daemon_update[host] = now
+        if 'networks' in sections and host in self.networks:
+            self.last_network_update[host] = now
+        if 'facts' in sections and host in self.facts:
+            self.facts[host].update(volatile.get('facts', {}))
+            self.last_facts_update[host] = now
+        if 'volume' in sections and host in self.devices:
+            self.last_device_update[host] = now
+
     def update_daemon_config_deps(self, host: str, name: str, deps: List[str], stamp: datetime.datetime) -> None:
         self.daemon_config_deps[host][name] = {
             'deps': deps,
@@ -1019,6 +1087,7 @@ class HostCache():
 
     def invalidate_host_daemons(self, host):
         # type: (str) -> None
+        self.agent_metadata_hashes.get(host, {}).pop('ls', None)
         self.daemon_refresh_queue.append(host)
         if host in self.last_daemon_update:
             del self.last_daemon_update[host]
@@ -1026,6 +1095,7 @@ class HostCache():
 
     def invalidate_host_devices(self, host):
         # type: (str) -> None
+        self.agent_metadata_hashes.get(host, {}).pop('volume', None)
         self.device_refresh_queue.append(host)
         if host in self.last_device_update:
             del self.last_device_update[host]
@@ -1033,6 +1103,7 @@ class HostCache():
 
     def invalidate_host_networks(self, host):
         # type: (str) -> None
+        self.agent_metadata_hashes.get(host, {}).pop('networks', None)
         self.network_refresh_queue.append(host)
         if host in self.last_network_update:
             del self.last_network_update[host]
@@ -1186,6 +1257,7 @@ class HostCache():
             del self.scheduled_daemon_actions[host]
         if host in self.last_client_files:
             del self.last_client_files[host]
+        self.agent_metadata_hashes.pop(host, None)
         self.mgr.set_store(HOST_CACHE_PREFIX + host, None)
 
     def get_hosts(self):
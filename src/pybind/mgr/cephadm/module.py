@@ -99,9 +99,10 @@ from .inventory import (
 from .upgrade import CephadmUpgrade
 from .template import TemplateMgr
 from .utils import CEPH_IMAGE_TYPES, RESCHEDULE_FROM_OFFLINE_HOSTS_TYPES, forall_hosts, \
-    cephadmNoImage, SpecialHostLabels
+    cephadmNoImage, SpecialHostLabels, WORKER_POOL_SIZE
 from .configchecks import CephadmConfigChecks
 from .offline_watcher import OfflineHostWatcher
+from .refresh import HostRefreshScheduler
 from .tuned_profiles import TunedProfileUtils
 from .ceph_volume import CephVolume
 
@@ -205,6 +206,15 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             default=10 * 60,
             desc='how frequently to perform a host check',
         ),
+        Option(
+            'host_refresh_batch_size',
+            type='int',
+            default=0,
+            min=0,
+            desc='maximum number of hosts refreshed per serve loop. By default '
+            'this is sized to spread the refresh of every host over the shortest '
+            'cache timeout'
+        ),
         Option(
             'stray_daemon_check_interval',
             type='secs',
@@ -303,6 +313,12 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             default='*',
             desc='PlacementSpec describing on which hosts to manage /etc/ceph/ceph.conf',
         ),
+        Option(
+            'client_keyring_refresh_interval',
+            type='secs',
+            default=5 * 60,
+            desc='how frequently to fetch the managed client keyrings from the monitors again',
+        ),
         # not used anymore
         Option(
             'registry_url',
@@ -390,6 +406,12 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             default=3.0,
             desc='Multiplied by agent refresh rate to calculate how long agent must not report before being marked down'
         ),
+        Option(
+            'agent_compress_metadata',
+            type='bool',
+            default=True,
+            desc='Have the agent compress the metadata it sends to the mgr'
+        ),
         Option(
             'hw_monitoring',
             type='bool',
@@ -532,6 +554,7 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             self.daemon_cache_timeout = 0
             self.facts_cache_timeout = 0
             self.host_check_interval = 0
+            self.host_refresh_batch_size = 0
             self.stray_daemon_check_interval = 0
             self.max_count_per_host = 0
             self.mode = ''
@@ -566,6 +589,7 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             self.config_dashboard = True
             self.manage_etc_ceph_ceph_conf = True
             self.manage_etc_ceph_ceph_conf_hosts = '*'
+            self.client_keyring_refresh_interval = 0
             self.registry_url: Optional[str] = None
             self.registry_username: Optional[str] = None
             self.registry_password: Optional[str] = None
@@ -587,6 +611,7 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
             self.use_agent = False
             self.agent_refresh_rate = 0
             self.agent_down_multiplier = 0.0
+            self.agent_compress_metadata = True
             self.agent_starting_port = 0
             self.hw_monitoring = False
             self.service_discovery_port = 0
@@ -623,7 +648,7 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
 
         self.cephadm_binary_path = self._get_cephadm_binary_path()
 
-        self._worker_pool = multiprocessing.pool.ThreadPool(10)
+        self._worker_pool = multiprocessing.pool.ThreadPool(WORKER_POOL_SIZE)
 
         self.ssh._reconfig_ssh()
 
@@ -638,6 +663,8 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
         self.cache = HostCache(self)
         self.cache.load()
 
+        self.refresh_scheduler = HostRefreshScheduler(self)
+
         self.node_proxy_cache = NodeProxyCache(self)
         self.node_proxy_cache.load()
 
@@ -1523,6 +1550,11 @@ class CephadmOrchestrator(orchestrator.Orchestrator, MgrModule,
         status = self.config_checks_enabled
         return HandleCommandResult(stdout="Enabled" if status else "Disabled")
 
+    @orchestrator._cli_read_command('cephadm refresh-status')
+    def _refresh_status(self) -> HandleCommandResult:
+        """Show the host refresh queue and how long host refreshes take"""
+        return HandleCommandResult(stdout=json.dumps(self.refresh_scheduler.status(), indent=4))
+
     @orchestrator._cli_write_command('cephadm config-check enable')
     def _config_check_enable(self, check_name: str) -> HandleCommandResult:
         """Enable a specific configuration check"""
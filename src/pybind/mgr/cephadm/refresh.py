@@ -0,0 +1,206 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from ceph.utils import datetime_now, datetime_to_str
+
+from .utils import WORKER_POOL_SIZE
+
+if TYPE_CHECKING:
+    from cephadm.module import CephadmOrchestrator
+
+logger = logging.getLogger(__name__)
+
+# number of host refreshes the latency figures are computed over
+LATENCY_SAMPLES = 1000
+
+
+class HostRefreshScheduler:
+    """
+    Picks the hosts the serve loop refreshes over SSH.
+
+    Rather than probing every host on every loop, only the hosts that
+    have something to refresh are queued:
+
+    * pending hosts, with a refresh queued in the HostCache (a command,
+      an agent report or a mgr restart invalidated them), metadata that
+      is not up to date, or that were never checked, and
+    * stale hosts, whose daemons, facts, networks, devices or host check
+      are older than the configured cache timeouts.
+
+    Pending hosts go first. Within each group the host the scheduler
+    refreshed the longest time ago goes first. At most `batch_size()`
+    hosts are refreshed per loop, about as many as the workers get through
+    in one sleep interval, so that a burst of refreshes is spread over the
+    next loops rather than holding up the serve loop and the worker pool.
+    Stale hosts are further limited to `routine_batch_size()` per loop,
+    which spreads the routine refreshes evenly over the refresh period.
+    """
+
+    def __init__(self, mgr: "CephadmOrchestrator") -> None:
+        self.mgr = mgr
+        self.lock = threading.Lock()
+        # host -> time.monotonic() of the last time it was picked
+        self.last_refresh: Dict[str, float] = {}
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.loop_stats: Dict[str, Any] = {}
+
+    def sleep_interval(self) -> int:
+        return max(
+            30,
+            min(
+                self.mgr.host_check_interval,
+                self.mgr.facts_cache_timeout,
+                self.mgr.daemon_cache_timeout,
+                self.mgr.device_cache_timeout,
+                self.mgr.stray_daemon_check_interval,
+            )
+        )
+
+    def refresh_period(self) -> int:
+        # the shortest time any cached data of a host is good for
+        return max(
+            self.sleep_interval(),
+            min(
+                self.mgr.host_check_interval,
+                self.mgr.facts_cache_timeout,
+                self.mgr.daemon_cache_timeout,
+                self.mgr.device_cache_timeout,
+            )
+        )
+
+    def batch_size(self, num_hosts: int) -> int:
+        if self.mgr.host_refresh_batch_size > 0:
+            return self.mgr.host_refresh_batch_size
+        if not self.latencies:
+            # nothing measured yet (e.g. after a mgr failover): no more
+            # hosts than the workers take at once
+            return WORKER_POOL_SIZE
+        # as many hosts as the workers get through in one sleep interval
+        latency = max(sum(self.latencies) / len(self.latencies), 0.001)
+        return max(WORKER_POOL_SIZE,
+                   int(WORKER_POOL_SIZE * self.sleep_interval() / latency))
+
+    def routine_batch_size(self, num_hosts: int) -> int:
+        # the share of the hosts to refresh per loop for every host to be
+        # refreshed once per refresh period
+        return max(1, math.ceil(num_hosts * self.sleep_interval() / self.refresh_period()))
+
+    def _is_pending(self, host: str, registry_login: bool) -> bool:
+        cache = self.mgr.cache
+        if host in self.mgr.offline_hosts:
+            return host not in cache.last_host_check
+        return (
+            host in cache.daemon_refresh_queue
+            or host in cache.device_refresh_queue
+            or host in cache.network_refresh_queue
+            or host in cache.osdspec_previews_refresh_queue
+            or (registry_login and host in cache.registry_login_queue)
+            or host not in cache.last_host_check
+            or not cache.host_metadata_up_to_date(host)
+        )
+
+    def _overdue(self, host: str, now: float) -> Optional[float]:
+        """
+        Seconds since the oldest of the host's cached data expired, or None
+        if none of it did. Data that was never fetched counts as expired.
+        """
+        cache = self.mgr.cache
+        timers = [(cache.last_host_check, self.mgr.host_check_interval)]
+        if host not in self.mgr.offline_hosts:
+            timers += [
+                (cache.last_daemon_update, self.mgr.daemon_cache_timeout),
+                (cache.last_facts_update, self.mgr.facts_cache_timeout),
+                (cache.last_network_update, self.mgr.device_cache_timeout),
+                (cache.last_device_update, self.mgr.device_cache_timeout),
+            ]
+        overdue: Optional[float] = None
+        for last_update, timeout in timers:
+            if host not in last_update:
+                return math.inf
+            late = now - last_update[host].timestamp() - timeout
+            if late >= 0 and (overdue is None or late > overdue):
+                overdue = late
+        return overdue
+
+    def select(self, hosts: List[str]) -> List[str]:
+        now = datetime_now().timestamp()
+        registry_login = bool(self.mgr.get_store('registry_credentials'))
+        queue: List[Tuple[int, float, str]] = []
+        max_overdue = 0.0
+        for host in hosts:
+            if self._is_pending(host, registry_login):
+                priority = 0
+            else:
+                overdue = self._overdue(host, now)
+                if overdue is None:
+                    continue
+                if overdue != math.inf:
+                    max_overdue = max(max_overdue, overdue)
+                priority = 1
+            queue.append((priority, self.last_refresh.get(host, 0.0), host))
+        queue.sort()
+
+        pending = sum(1 for priority, _, _ in queue if priority == 0)
+        size = min(self.batch_size(len(hosts)), len(queue))
+        if size > pending:
+            size = min(size, pending + self.routine_batch_size(len(hosts)))
+        batch = [host for _, _, host in queue[:size]]
+        started = time.monotonic()
+        for host in batch:
+            self.last_refresh[host] = started
+        known = set(hosts)
+        for host in list(self.last_refresh):
+            if host not in known:
+                del self.last_refresh[host]
+
+        with self.lock:
+            self.loop_stats = {
+                'started': datetime_to_str(datetime_now()),
+                'hosts': len(hosts),
+                'queue_depth': len(queue),
+                'pending': pending,
+                'stale': len(queue) - pending,
+                'refreshed': len(batch),
+                'deferred': len(queue) - len(batch),
+                'max_overdue': round(max_overdue, 3),
+            }
+        if len(queue) > len(batch):
+            logger.debug('refreshing %d of %d queued hosts (%d pending)',
+                         len(batch), len(queue), pending)
+        return batch
+
+    def record_latency(self, duration: float) -> None:
+        self.latencies.append(duration)
+
+    def loop_done(self, duration: float) -> None:
+        with self.lock:
+            self.loop_stats['duration'] = round(duration, 3)
+
+    def status(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        num_hosts = len(self.mgr.cache.get_hosts())
+        with self.lock:
+            r: Dict[str, Any] = {
+                'batch_size': self.batch_size(num_hosts),
+                'routine_batch_size': self.routine_batch_size(num_hosts),
+                'last_loop': dict(self.loop_stats),
+            }
+        r['refresh_latency'] = {
+            'count': len(latencies),
+        }
+        if latencies:
+            r['refresh_latency'].update({
+                'avg': round(sum(latencies) / len(latencies), 3),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1], 3),
+            })
+        return r
@@ -5,6 +5,7 @@ import json
 import logging
 import uuid
 import os
+import time
 from collections import defaultdict
 from typing import TYPE_CHECKING, Optional, List, cast, Dict, Any, Union, Tuple, Set, \
     DefaultDict, Callable
@@ -166,16 +167,7 @@ class CephadmServe:
                 self.mgr.service_action('reconfig', svc)
 
     def _serve_sleep(self) -> None:
-        sleep_interval = max(
-            30,
-            min(
-                self.mgr.host_check_interval,
-                self.mgr.facts_cache_timeout,
-                self.mgr.daemon_cache_timeout,
-                self.mgr.device_cache_timeout,
-                self.mgr.stray_daemon_check_interval,
-            )
-        )
+        sleep_interval = self.mgr.refresh_scheduler.sleep_interval()
         self.log.debug('Sleeping for %d seconds', sleep_interval)
         self.mgr.event.wait(sleep_interval)
         self.mgr.event.clear()
@@ -248,18 +240,33 @@ class CephadmServe:
         bad_hosts = []
         failures = []
         agents_down: List[str] = []
+        hosts = [
+            h for h in self.mgr.cache.get_hosts()
+            # skip hosts that are in maintenance - they could be powered off
+            if self.mgr.inventory._inventory[h].get("status", "").lower() != "maintenance"
+        ]
+        # only the hosts picked by the scheduler are probed over ssh
+        to_refresh = set(self.mgr.refresh_scheduler.select(hosts))
 
         @forall_hosts
         def refresh(host: str) -> None:
-
-            # skip hosts that are in maintenance - they could be powered off
-            if self.mgr.inventory._inventory[host].get("status", "").lower() == "maintenance":
-                return
-
             if self.mgr.use_agent:
                 if self.mgr.agent_helpers._check_agent(host):
                     agents_down.append(host)
 
+            if host in to_refresh:
+                start = time.monotonic()
+                refresh_host(host)
+                self.mgr.refresh_scheduler.record_latency(time.monotonic() - start)
+
+            if (
+                    self.mgr.cache.host_needs_autotune_memory(host)
+                    and not self.mgr.inventory.has_label(host, SpecialHostLabels.NO_MEMORY_AUTOTUNE)
+            ):
+                self.log.debug(f"autotuning memory for {host}")
+                self._autotune_host_memory(host)
+
+        def refresh_host(host: str) -> None:
             if self.mgr.cache.host_needs_check(host):
                 r = self._check_host(host)
                 if r is not None:
@@ -316,14 +323,9 @@ class CephadmServe:
                 if r:
                     failures.append(r)
 
-            if (
-                    self.mgr.cache.host_needs_autotune_memory(host)
-                    and not self.mgr.inventory.has_label(host, SpecialHostLabels.NO_MEMORY_AUTOTUNE)
-            ):
-                self.log.debug(f"autotuning memory for {host}")
-                self._autotune_host_memory(host)
-
-        refresh(self.mgr.cache.get_hosts())
+        start = time.monotonic()
+        refresh(hosts)
+        self.mgr.refresh_scheduler.loop_done(time.monotonic() - start)
 
         self._write_all_client_files()
 
@@ -1261,19 +1263,59 @@ class CephadmServe:
         config_digest = ''.join('%02x' % c for c in hashlib.sha256(config).digest())
         cluster_cfg_dir = f'/var/lib/ceph/{self.mgr._cluster_fsid}/config'
 
-        if self.mgr.manage_etc_ceph_ceph_conf:
-            try:
-                pspec = PlacementSpec.from_string(self.mgr.manage_etc_ceph_ceph_conf_hosts)
+        hosts = self.mgr.cache.get_conf_keyring_available_hosts()
+        unreachable_hosts = self.mgr.cache.get_unreachable_hosts()
+        draining_hosts = self.mgr.cache.get_conf_keyring_draining_hosts()
+        inventory_key = (
+            tuple((h.hostname, tuple(sorted(h.labels)), h.status) for h in hosts),
+            tuple(h.hostname for h in unreachable_hosts),
+            tuple(h.hostname for h in draining_hosts),
+        )
+        if inventory_key != self.mgr.keys.placements_inventory:
+            self.mgr.keys.placements = {}
+            self.mgr.keys.placements_inventory = inventory_key
+
+        def place(placement: PlacementSpec) -> Set[str]:
+            key = json.dumps(placement.to_json(), sort_keys=True)
+            if key not in self.mgr.keys.placements:
                 ha = HostAssignment(
-                    spec=ServiceSpec('mon', placement=pspec),
-                    hosts=self.mgr.cache.get_conf_keyring_available_hosts(),
-                    unreachable_hosts=self.mgr.cache.get_unreachable_hosts(),
-                    draining_hosts=self.mgr.cache.get_conf_keyring_draining_hosts(),
+                    spec=ServiceSpec('mon', placement=placement),
+                    hosts=hosts,
+                    unreachable_hosts=unreachable_hosts,
+                    draining_hosts=draining_hosts,
                     daemons=[],
                     networks=self.mgr.cache.networks,
                 )
                 all_slots, _, _ = ha.place()
-                for host in {s.hostname for s in all_slots}:
+                self.mgr.keys.placements[key] = {s.hostname for s in all_slots}
+            return self.mgr.keys.placements[key]
+
+        keyrings: Dict[str, Tuple[str, str]] = {}
+        for ks in self.mgr.keys.keys.values():
+            fetched = self.mgr.keys.get_keyring(ks.entity)
+            if fetched is None:
+                self.log.warning(f'unable to fetch keyring for {ks.entity}')
+                continue
+            keyrings[ks.entity] = fetched
+
+        # nothing changed since last time
+        client_files_key = (
+            config_digest,
+            inventory_key,
+            self.mgr.manage_etc_ceph_ceph_conf,
+            self.mgr.manage_etc_ceph_ceph_conf_hosts,
+            tuple(sorted(
+                (ks.entity, keyrings[ks.entity][1], json.dumps(ks.to_json(), sort_keys=True))
+                for ks in self.mgr.keys.keys.values() if ks.entity in keyrings
+            )),
+        )
+        if client_files_key == self.mgr.keys.client_files_key:
+            return self.mgr.keys.client_files
+
+        if self.mgr.manage_etc_ceph_ceph_conf:
+            try:
+                pspec = PlacementSpec.from_string(self.mgr.manage_etc_ceph_ceph_conf_hosts)
+                for host in place(pspec):
                     if host not in client_files:
                         client_files[host] = {}
                     ceph_conf = (0o644, 0, 0, bytes(config), str(config_digest))
@@ -1285,26 +1327,11 @@ class CephadmServe:
 
         # client keyrings
         for ks in self.mgr.keys.keys.values():
+            if ks.entity not in keyrings:
+                continue
             try:
-                ret, keyring, err = self.mgr.mon_command({
-                    'prefix': 'auth get',
-                    'entity': ks.entity,
-                })
-                if ret:
-                    self.log.warning(f'unable to fetch keyring for {ks.entity}')
-                    continue
-                digest = ''.join('%02x' % c for c in hashlib.sha256(
-                    keyring.encode('utf-8')).digest())
-                ha = HostAssignment(
-                    spec=ServiceSpec('mon', placement=ks.placement),
-                    hosts=self.mgr.cache.get_conf_keyring_available_hosts(),
-                    unreachable_hosts=self.mgr.cache.get_unreachable_hosts(),
-                    draining_hosts=self.mgr.cache.get_conf_keyring_draining_hosts(),
-                    daemons=[],
-                    networks=self.mgr.cache.networks,
-                )
-                all_slots, _, _ = ha.place()
-                for host in {s.hostname for s in all_slots}:
+                keyring, digest = keyrings[ks.entity]
+                for host in place(ks.placement):
                     if host not in client_files:
                         client_files[host] = {}
                     ceph_conf = (0o644, 0, 0, bytes(config), str(config_digest))
@@ -1317,6 +1344,9 @@ class CephadmServe:
             except Exception as e:
                 self.log.warning(
                     f'unable to calc client keyring {ks.entity} placement {ks.placement}: {e}')
+
+        self.mgr.keys.client_files = client_files
+        self.mgr.keys.client_files_key = client_files_key
         return client_files
 
     def _write_all_client_files(self) -> None:
@@ -1329,7 +1359,21 @@ class CephadmServe:
         def _write_files(host: str) -> None:
             self._write_client_files(client_files, host)
 
-        _write_files(self.mgr.cache.get_hosts())
+        # only hand the hosts whose files differ to the workers
+        _write_files([
+            h for h in self.mgr.cache.get_hosts()
+            if not self._client_files_up_to_date(client_files.get(h, {}), h)
+        ])
+
+    def _client_files_up_to_date(self,
+                                 files: Dict[str, Tuple[int, int, int, bytes, str]],
+                                 host: str) -> bool:
+        last_files = self.mgr.cache.get_host_client_files(host)
+        for path, (mode, uid, gid, _, digest) in files.items():
+            if last_files.get(path) != (digest, mode, uid, gid):
+                return False
+        # files that are no longer wanted get removed, except /etc/ceph/ceph.conf
+        return all(path in files or path == '/etc/ceph/ceph.conf' for path in last_files)
 
     def _write_client_files(self,
                             client_files: Dict[str, Dict[str, Tuple[int, int, int, bytes, str]]],
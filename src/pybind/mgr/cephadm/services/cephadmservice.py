@@ -1673,6 +1673,7 @@ class CephadmAgent(CephService):
                 str(agent.server_port),
                 mgr.cert_mgr.get_root_ca(),
                 str(mgr.get_module_option("device_enhanced_scan")),
+                str(mgr.get_module_option("agent_compress_metadata")),
             ]
         )
 
@@ -1707,7 +1708,8 @@ class CephadmAgent(CephService):
                'refresh_period': self.mgr.agent_refresh_rate,
                'listener_port': self.mgr.agent_starting_port,
                'host': daemon_spec.host,
-               'device_enhanced_scan': str(self.mgr.device_enhanced_scan)}
+               'device_enhanced_scan': str(self.mgr.device_enhanced_scan),
+               'compress_metadata': str(self.mgr.agent_compress_metadata)}
 
         listener_cert, listener_key = self.get_certificates(daemon_spec)
         config = {
@@ -1720,4 +1722,5 @@ class CephadmAgent(CephService):
 
         return config, sorted([str(self.mgr.get_mgr_ip()), str(agent.server_port),
                                self.mgr.cert_mgr.get_root_ca(),
-                               str(self.mgr.get_module_option('device_enhanced_scan'))])
+                               str(self.mgr.get_module_option('device_enhanced_scan')),
+                               str(self.mgr.get_module_option('agent_compress_metadata'))])
@@ -0,0 +1,89 @@
+import base64
+import datetime
+import hashlib
+import json
+import zlib
+
+from cephadm import CephadmOrchestrator
+from cephadm.agent import HostData
+
+from .fixtures import _run_cephadm, with_host
+
+from tests import mock
+
+
+def _hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _host_data(cephadm_module: CephadmOrchestrator) -> HostData:
+    # skip Server.__init__, we do not want to start a cherrypy server
+    host_data = HostData.__new__(HostData)
+    host_data.mgr = cephadm_module
+    return host_data
+
+
+@mock.patch("cephadm.serve.CephadmServe._run_cephadm", _run_cephadm('[]'))
+def test_agent_metadata_delta(cephadm_module: CephadmOrchestrator):
+    ls = [{
+        'style': 'cephadm:v1',
+        'name': 'crash.test',
+        'fsid': 'fsid',
+        'state': 'running',
+    }]
+    networks = {'10.2.1.0/24': {'eth1': ['10.2.1.122']}}
+    facts = json.dumps({'hostname': 'test'})
+    hashes = {'ls': _hash(ls), 'networks': _hash(networks), 'facts': _hash(facts)}
+    cache = cephadm_module.cache
+
+    with with_host(cephadm_module, 'test'):
+        cephadm_module.agent_cache.agent_counter['test'] = 1
+        host_data = _host_data(cephadm_module)
+
+        def report(**sections):
+            data = dict(host='test', ack='1', keyring='key', port='4721', **sections)
+            data['hashes'] = hashes
+            host_data.decompress_metadata(data)
+            assert host_data.handle_metadata(data) == 'Successfully processed metadata.'
+
+        report(ls=ls, networks=networks, facts=facts, volume='')
+        assert cache.agent_metadata_hashes['test'] == hashes
+        assert list(cache.daemons['test']) == ['crash.test']
+        assert cache.networks['test'] == networks
+
+        # unchanged sections are only reported by hash, which is as good as
+        # a fresh update
+        last_update = cache.last_daemon_update['test'] - datetime.timedelta(seconds=60)
+        cache.last_daemon_update['test'] = last_update
+        cache.metadata_up_to_date['test'] = False
+        with mock.patch.object(cephadm_module, '_process_ls_output') as process_ls:
+            report(volume='')
+        process_ls.assert_not_called()
+        assert cache.last_daemon_update['test'] > last_update
+        assert cache.metadata_up_to_date['test']
+        assert list(cache.daemons['test']) == ['crash.test']
+
+        # along with the fields that change on every report
+        report(volume='', volatile={
+            'ls': {'crash.test': {'memory_usage': 1024, 'cpu_percentage': '1.5%'}},
+            'facts': {'system_uptime': 42.0},
+        })
+        dd = cache.daemons['test']['crash.test']
+        assert (dd.memory_usage, dd.cpu_percentage) == (1024, '1.5%')
+        assert cache.facts['test'] == {'hostname': 'test', 'system_uptime': 42.0}
+
+        # compressed changed sections are merged into the stored data
+        networks = {'10.2.1.0/24': {'eth1': ['10.2.1.123']}}
+        hashes['networks'] = _hash(networks)
+        compressed = base64.b64encode(
+            zlib.compress(json.dumps({'networks': networks, 'volume': ''}).encode('utf-8')))
+        report(compressed=compressed.decode('ascii'))
+        assert cache.networks['test'] == networks
+        assert cache.agent_metadata_hashes['test'] == hashes
+
+        # the mgr dropped its copy of the daemons: it no longer has what the
+        # agent reports by hash, which it has to send again
+        cache.invalidate_host_daemons('test')
+        report(volume='')
+        assert 'ls' not in cache.agent_metadata_hashes['test']
+        assert 'networks' in cache.agent_metadata_hashes['test']
@@ -7,6 +7,7 @@ from contextlib import contextmanager
 import pytest
 
 from ceph.deployment.drive_group import DriveGroupSpec, DeviceSelection
+from cephadm.schedule import HostAssignment
 from cephadm.serve import CephadmServe
 from cephadm.inventory import (
     HostCacheStatus,
@@ -2237,6 +2238,52 @@ osd_k2 = osd_v2
             assert '/etc/ceph/ceph.keyring1.keyring' in client_files['host2'].keys()
             assert 'host3' not in client_files.keys()
 
+    @mock.patch('cephadm.CephadmOrchestrator.mon_command')
+    @mock.patch('cephadm.serve.CephadmServe._write_client_files')
+    def test_client_files_cache(self, _write_client_files, _mon_command, cephadm_module):
+        cephadm_module.inventory.add_host(HostSpec('host1', labels=['keyring1']))
+        cephadm_module.inventory.add_host(HostSpec('host2'))
+        cephadm_module.cache.update_host_daemons('host1', {})
+        cephadm_module.cache.update_host_daemons('host2', {})
+        cephadm_module.keys.update(ClientKeyringSpec('keyring1', PlacementSpec(label='keyring1')))
+        _mon_command.return_value = (0, 'my-keyring', '')
+
+        def auth_gets():
+            return len([c for c in _mon_command.call_args_list if c[0][0]['prefix'] == 'auth get'])
+
+        with mock.patch('cephadm.serve.HostAssignment.place', autospec=True,
+                        side_effect=HostAssignment.place) as _place:
+            client_files = CephadmServe(cephadm_module)._calc_client_files()
+            assert list(client_files) == ['host1']
+            assert auth_gets() == 1
+            assert _place.call_count == 1
+
+            # nothing changed: no auth get, no placement
+            assert CephadmServe(cephadm_module)._calc_client_files() is client_files
+            assert auth_gets() == 1
+            assert _place.call_count == 1
+
+            # the keyring spec changed: fetch the keyring again, same placement
+            cephadm_module.keys.update(ClientKeyringSpec(
+                'keyring1', PlacementSpec(label='keyring1'), mode=0o640))
+            client_files = CephadmServe(cephadm_module)._calc_client_files()
+            assert client_files['host1']['/etc/ceph/ceph.keyring1.keyring'][0] == 0o640
+            assert auth_gets() == 2
+            assert _place.call_count == 1
+
+            # the inventory changed
+            cephadm_module.inventory.add_label('host2', 'keyring1')
+            client_files = CephadmServe(cephadm_module)._calc_client_files()
+            assert sorted(client_files) == ['host1', 'host2']
+            assert auth_gets() == 2
+            assert _place.call_count == 2
+
+        # only hosts whose files differ are written to
+        for path, (mode, uid, gid, _, digest) in client_files['host1'].items():
+            cephadm_module.cache.update_client_file('host1', path, digest, mode, uid, gid)
+        CephadmServe(cephadm_module)._write_all_client_files()
+        assert [c[0][1] for c in _write_client_files.call_args_list] == ['host2']
+
     @mock.patch("cephadm.serve.CephadmServe._run_cephadm")
     def test_registry_login(self, _run_cephadm, cephadm_module: CephadmOrchestrator):
         def check_registry_credentials(url, username, password):
@@ -0,0 +1,113 @@
+import datetime
+
+from cephadm import CephadmOrchestrator
+from cephadm.serve import CephadmServe
+from cephadm.utils import WORKER_POOL_SIZE
+
+from .fixtures import _run_cephadm, with_host
+
+from tests import mock
+
+
+def _age(cephadm_module: CephadmOrchestrator, host: str, seconds: int) -> None:
+    cache = cephadm_module.cache
+    for last_update in [
+        cache.last_host_check,
+        cache.last_daemon_update,
+        cache.last_facts_update,
+        cache.last_network_update,
+        cache.last_device_update,
+    ]:
+        last_update[host] -= datetime.timedelta(seconds=seconds)
+
+
+@mock.patch("cephadm.serve.CephadmServe._run_cephadm", _run_cephadm('{}'))
+def test_refresh_scheduler(cephadm_module: CephadmOrchestrator):
+    scheduler = cephadm_module.refresh_scheduler
+    with with_host(cephadm_module, 'host1'), \
+            with_host(cephadm_module, 'host2'), \
+            with_host(cephadm_module, 'host3'):
+        hosts = cephadm_module.cache.get_hosts()
+        CephadmServe(cephadm_module)._refresh_hosts_and_daemons()
+        assert scheduler.select(hosts) == []
+        assert scheduler.status()['last_loop']['queue_depth'] == 0
+
+        # stale hosts are queued, the longest overdue first
+        _age(cephadm_module, 'host1', 3600)
+        _age(cephadm_module, 'host3', 3600)
+        cephadm_module.host_refresh_batch_size = 1
+        assert scheduler.select(hosts) == ['host1']
+        assert scheduler.select(hosts) == ['host3']
+        assert scheduler.select(hosts) == ['host1']
+
+        # pending changes go before stale data
+        cephadm_module.cache.invalidate_host_daemons('host2')
+        assert scheduler.select(hosts) == ['host2']
+        status = scheduler.status()['last_loop']
+        assert status['queue_depth'] == 3
+        assert status['pending'] == 1
+        assert status['stale'] == 2
+        assert status['deferred'] == 2
+
+        # only the picked hosts are probed
+        cephadm_module.host_refresh_batch_size = 2
+        with mock.patch.object(CephadmServe, '_refresh_host_daemons', return_value=None) as refresh:
+            CephadmServe(cephadm_module)._refresh_hosts_and_daemons()
+            assert sorted(c[0][0] for c in refresh.call_args_list) == ['host2', 'host3']
+        assert scheduler.status()['refresh_latency']['count'] > 0
+
+
+def test_refresh_batch_size(cephadm_module: CephadmOrchestrator):
+    scheduler = cephadm_module.refresh_scheduler
+    # a cold start does not probe every host at once
+    assert scheduler.batch_size(1000) == WORKER_POOL_SIZE
+    cephadm_module.facts_cache_timeout = 60
+    # as many 2s refreshes as 10 workers go through in 60s
+    scheduler.latencies.extend([1.0, 3.0])
+    assert scheduler.batch_size(1000) == 300
+    assert scheduler.batch_size(4) == 300
+    scheduler.latencies.extend([120.0] * 10)
+    assert scheduler.batch_size(1000) == 10
+    cephadm_module.host_refresh_batch_size = 50
+    assert scheduler.batch_size(1000) == 50
+
+
+@mock.patch("cephadm.serve.CephadmServe._run_cephadm", _run_cephadm('{}'))
+def test_refresh_cold_start(cephadm_module: CephadmOrchestrator):
+    scheduler = cephadm_module.refresh_scheduler
+    hosts = ['host%d' % i for i in range(WORKER_POOL_SIZE * 5)]
+    with mock.patch.object(cephadm_module.cache, 'get_hosts', return_value=hosts):
+        # none of the hosts was ever checked
+        assert len(scheduler.select(hosts)) == WORKER_POOL_SIZE
+        status = scheduler.status()
+        assert status['last_loop']['pending'] == len(hosts)
+        assert status['last_loop']['deferred'] == len(hosts) - WORKER_POOL_SIZE
+
+
+@mock.patch("cephadm.serve.CephadmServe._run_cephadm", _run_cephadm('{}'))
+def test_refresh_spread(cephadm_module: CephadmOrchestrator):
+    scheduler = cephadm_module.refresh_scheduler
+    # a 60s loop, every host refreshed once per 180s
+    cephadm_module.stray_daemon_check_interval = 60
+    for option in ['host_check_interval', 'facts_cache_timeout',
+                   'daemon_cache_timeout', 'device_cache_timeout']:
+        setattr(cephadm_module, option, 180)
+    assert scheduler.routine_batch_size(3) == 1
+    assert scheduler.routine_batch_size(1000) == 334
+    with with_host(cephadm_module, 'host1'), \
+            with_host(cephadm_module, 'host2'), \
+            with_host(cephadm_module, 'host3'):
+        hosts = cephadm_module.cache.get_hosts()
+        CephadmServe(cephadm_module)._refresh_hosts_and_daemons()
+        for host in hosts:
+            _age(cephadm_module, host, 3600)
+
+        # stale hosts are refreshed one per loop, over the refresh period
+        picked = [scheduler.select(hosts) for _ in range(3)]
+        assert sorted(sum(picked, [])) == sorted(hosts)
+        assert scheduler.status()['last_loop']['deferred'] == 2
+
+        # pending hosts are not held back
+        cephadm_module.cache.invalidate_host_daemons('host1')
+        cephadm_module.cache.invalidate_host_daemons('host2')
+        assert len(scheduler.select(hosts)) == 3
@@ -42,6 +42,9 @@ NON_CEPH_IMAGE_TYPES = MONITORING_STACK_TYPES + ['nvmeof', 'smb']
 # Used for _run_cephadm used for check-host etc that don't require an --image parameter
 cephadmNoImage = CephadmNoImage.token
 
+# number of threads of CephadmOrchestrator._worker_pool
+WORKER_POOL_SIZE = 10
+
 
 class ContainerInspectInfo(NamedTuple):
     image_id: str
@@ -4,11 +4,16 @@ Device health monitoring
 
 import errno
 import json
+import time
 from mgr_module import MgrModule, CommandResult, MgrModuleRecoverDB, CLIRequiresDB, CLICommand, CLIReadCommand, Option, MgrDBNotReady
 import operator
 import rados
 import re
-from threading import Event
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from threading import BoundedSemaphore, Event
 from datetime import datetime, timedelta, timezone
 from typing import cast, Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING, Union
 
@@ -47,6 +52,55 @@ def get_nvme_wear_level(data: Dict[Any, Any]) -> Optional[float]:
     return pct_used / 100.0
 
 
+def get_wear_level(data: Dict[Any, Any]) -> Optional[float]:
+    wear_level = get_ata_wear_level(data)
+    if wear_level is None:
+        wear_level = get_nvme_wear_level(data)
+    return wear_level
+
+
+# the encodings of the raw_smart column, recorded in the encoding column
+SMART_JSON = 'json'
+SMART_ZLIB = 'zlib'
+
+
+def encode_smart(data: Any) -> bytes:
+    """
+    Encode SMART metrics for the raw_smart column: compact, zlib compressed
+    JSON, stored with the SMART_ZLIB encoding.
+    """
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_smart(raw: Union[str, bytes], encoding: str = SMART_JSON) -> Any:
+    if encoding == SMART_ZLIB:
+        raw = zlib.decompress(cast(bytes, raw)).decode('utf-8')
+    elif encoding != SMART_JSON:
+        raise ValueError(f'unknown raw_smart encoding {encoding}')
+    return json.loads(raw)
+
+
+class DeviceMetricsBatch:
+    """
+    The SMART metrics of devices scraped in one go, compressed as they come
+    in, so that they can be stored in a single transaction.
+    """
+
+    def __init__(self) -> None:
+        self.raw_smart: Dict[str, bytes] = {}
+        self.wear_levels: Dict[str, Optional[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.raw_smart)
+
+    def __contains__(self, devid: str) -> bool:
+        return devid in self.raw_smart
+
+    def add(self, devid: str, data: Any) -> None:
+        self.raw_smart[devid] = encode_smart(data)
+        self.wear_levels[devid] = get_wear_level(data)
+
+
 class Module(MgrModule):
 
     # latest (if db does not exist)
@@ -61,6 +115,7 @@ class Module(MgrModule):
             time DATETIME DEFAULT (strftime('%s', 'now')),
             devid TEXT NOT NULL REFERENCES Device (devid),
             raw_smart TEXT NOT NULL,
+            encoding TEXT NOT NULL DEFAULT 'json',
             PRIMARY KEY (time, devid)
         );
         """
@@ -82,7 +137,15 @@ class Module(MgrModule):
                 PRIMARY KEY (time, devid)
             );
             """,
-        ]
+        ],
+        # v2: raw_smart may be compressed, older modules refuse to load the
+        # db instead of failing to parse those rows
+        [
+            """
+            ALTER TABLE DeviceHealthMetrics
+                ADD COLUMN encoding TEXT NOT NULL DEFAULT 'json';
+            """,
+        ],
     ]
 
     MODULE_OPTIONS = [
@@ -100,6 +163,22 @@ class Module(MgrModule):
             desc='how frequently to scrape device health metrics',
             runtime=True,
         ),
+        Option(
+            name='scrape_concurrency',
+            default=16,
+            type='int',
+            min=1,
+            desc='how many daemons to scrape device health metrics from at once',
+            runtime=True,
+        ),
+        Option(
+            name='scrape_host_concurrency',
+            default=2,
+            type='int',
+            min=1,
+            desc='how many daemons of the same host to scrape at once',
+            runtime=True,
+        ),
         Option(
             name='pool_name',
             default='device_health_metrics',
@@ -154,11 +233,14 @@ class Module(MgrModule):
         # other
         self.run = True
         self.event = Event()
+        self.scrape_status: Dict[str, Any] = {}
 
         # for mypy which does not run the code
         if TYPE_CHECKING:
             self.enable_monitoring = True
             self.scrape_frequency = 0.0
+            self.scrape_concurrency = 0
+            self.scrape_host_concurrency = 0
             self.pool_name = ''
             self.device_health_metrics = ''
             self.retention_period = 0.0
@@ -212,6 +294,13 @@ class Module(MgrModule):
         else:
             return self.scrape_device(devid)
 
+    @CLIReadCommand('device scrape-status')
+    def do_scrape_status(self) -> Tuple[int, str, str]:
+        '''
+        Show duration and failures of the last scrape of all daemons
+        '''
+        return 0, json.dumps(self.scrape_status, indent=4, sort_keys=True), ''
+
     @CLIRequiresDB
     @CLIReadCommand('device get-health-metrics')
     @MgrModuleRecoverDB
@@ -417,10 +506,12 @@ class Module(MgrModule):
             return -errno.EAGAIN, "", "mgr db not yet available"
         raw_smart_data = self.do_scrape_daemon(daemon_type, daemon_id)
         if raw_smart_data:
+            batch = DeviceMetricsBatch()
             for device, raw_data in raw_smart_data.items():
                 data = self.extract_smart_features(raw_data)
                 if device and data:
-                    self.put_device_metrics(device, data)
+                    batch.add(device, data)
+            self.put_devices_metrics(batch)
         return 0, "", ""
 
     def scrape_all(self) -> Tuple[int, str, str]:
@@ -428,27 +519,87 @@ class Module(MgrModule):
             return -errno.EAGAIN, "", "mgr db not yet available"
         osdmap = self.get("osd_map")
         assert osdmap is not None
-        did_device = {}
+        batch = DeviceMetricsBatch()
         ids = []
         for osd in osdmap['osds']:
             ids.append(('osd', str(osd['osd'])))
         monmap = self.get("mon_map")
         for mon in monmap['mons']:
             ids.append(('mon', mon['name']))
-        for daemon_type, daemon_id in ids:
-            raw_smart_data = self.do_scrape_daemon(daemon_type, daemon_id)
+        start = time.monotonic()
+        failed = []
+        for (daemon_type, daemon_id), raw_smart_data in zip(ids, self.scrape_daemons(ids)):
+            if raw_smart_data is None:
+                failed.append(f'{daemon_type}.{daemon_id}')
             if not raw_smart_data:
                 continue
             for device, raw_data in raw_smart_data.items():
-                if device in did_device:
+                if device in batch:
                     self.log.debug('skipping duplicate %s' % device)
                     continue
-                did_device[device] = 1
                 data = self.extract_smart_features(raw_data)
                 if device and data:
-                    self.put_device_metrics(device, data)
+                    batch.add(device, data)
+        # store everything at once, rather than one transaction (and one
+        # prune of old metrics) per device
+        self.put_devices_metrics(batch)
+        duration = time.monotonic() - start
+        self.log.info(f'scraped {len(ids)} daemons ({len(failed)} failed) '
+                      f'and {len(batch)} devices in {duration:.1f}s')
+        self.scrape_status = {
+            'last_scrape': datetime.utcnow().strftime(TIME_FORMAT),
+            'duration': round(duration, 3),
+            'daemons': len(ids),
+            'devices': len(batch),
+            'failed': len(failed),
+            'failed_daemons': failed,
+        }
         return 0, "", ""
 
+    def _daemon_host(self,
+                     osd_metadata: Dict[str, Dict[str, Any]],
+                     daemon_type: str,
+                     daemon_id: str) -> str:
+        if daemon_type == 'osd':
+            meta = osd_metadata.get(daemon_id)
+        else:
+            meta = self.get_metadata(daemon_type, daemon_id)
+        # a daemon of an unknown host is a host of its own
+        return (meta or {}).get('hostname') or f'{daemon_type}.{daemon_id}'
+
+    def scrape_daemons(self,
+                       ids: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Scrape many daemons, up to scrape_concurrency of them at once but
+        no more than scrape_host_concurrency per host.
+
+        :return: the do_scrape_daemon() result of each daemon, in the order
+            of ids.
+        """
+        osd_metadata = self.get('osd_metadata') or {}
+        by_host: Dict[str, List[int]] = defaultdict(list)
+        for i, (daemon_type, daemon_id) in enumerate(ids):
+            by_host[self._daemon_host(osd_metadata, daemon_type, daemon_id)].append(i)
+        host_of = {i: host for host, indexes in by_host.items() for i in indexes}
+        slots = {host: BoundedSemaphore(max(self.scrape_host_concurrency, 1))
+                 for host in by_host}
+
+        # interleave the hosts, so that the workers do not all end up
+        # waiting for the slots of the same host
+        order = [i for group in zip_longest(*by_host.values())
+                 for i in group if i is not None]
+
+        def scrape(i: int) -> Optional[Dict[str, Any]]:
+            with slots[host_of[i]]:
+                return self.do_scrape_daemon(*ids[i])
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(ids)
+        workers = max(min(self.scrape_concurrency, len(ids)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, result in zip(order, executor.map(scrape, order)):
+                results[i] = result
+        return results
+
     def scrape_device(self, devid: str) -> Tuple[int, str, str]:
         if not self.db_ready():
             return -errno.EAGAIN, "", "mgr db not yet available"
@@ -463,10 +614,12 @@ class Module(MgrModule):
         raw_smart_data = self.do_scrape_daemon(daemon_type, daemon_id,
                                                devid=devid)
         if raw_smart_data:
+            batch = DeviceMetricsBatch()
             for device, raw_data in raw_smart_data.items():
                 data = self.extract_smart_features(raw_data)
                 if device and data:
-                    self.put_device_metrics(device, data)
+                    batch.add(device, data)
+            self.put_devices_metrics(batch)
         return 0, "", ""
 
     def do_scrape_daemon(self,
@@ -515,30 +668,44 @@ class Module(MgrModule):
             self.log.debug(f"device {devid} already exists")
 
     def put_device_metrics(self, devid: str, data: Any) -> None:
+        batch = DeviceMetricsBatch()
+        batch.add(devid, data)
+        self.put_devices_metrics(batch)
+
+    def put_devices_metrics(self, batch: DeviceMetricsBatch) -> None:
+        SQL_DEVICE = """
+        INSERT OR IGNORE INTO Device VALUES (?);
+        """
         SQL = """
-        INSERT OR REPLACE INTO DeviceHealthMetrics (devid, raw_smart, time)
-            VALUES (?, ?, strftime('%s', 'now'));
+        INSERT OR REPLACE INTO DeviceHealthMetrics (devid, raw_smart, encoding, time)
+            VALUES (?, ?, ?, ?);
         """
 
+        if not batch:
+            return
+        now = int(datetime.now(timezone.utc).timestamp())
         with self._db_lock, self.db:
             self.db.execute('BEGIN;')
-            self._create_device(devid)
-            self.db.execute(SQL, (devid, json.dumps(data)))
+            cursor = self.db.executemany(SQL_DEVICE,
+                                         [(devid,) for devid in batch.raw_smart])
+            if cursor.rowcount >= 1:
+                self.log.info(f"created {cursor.rowcount} device(s)")
+            self.db.executemany(SQL, [(devid, raw_smart, SMART_ZLIB, now)
+                                      for devid, raw_smart in batch.raw_smart.items()])
             self._prune_device_metrics()
-
-        # extract wear level?
-        wear_level = get_ata_wear_level(data)
-        if wear_level is None:
-            wear_level = get_nvme_wear_level(data)
-        dev_data = self.get(f"device {devid}") or {}
-        if wear_level is not None:
-            if dev_data.get(wear_level) != str(wear_level):
-                dev_data["wear_level"] = str(wear_level)
-                self.log.debug(f"updating {devid} wear level to {wear_level}")
-                self.set_device_wear_level(devid, wear_level)
-        else:
-            if "wear_level" in dev_data:
-                del dev_data["wear_level"]
+        self.log.debug(f"stored metrics of {len(batch)} device(s)")
+
+        # one look at the wear levels known to the mgr, instead of one
+        # "device <devid>" per device; only the changed ones are sent out
+        devs = {dev['devid']: dev for dev in self.get('devices')['devices']}
+        for devid, wear_level in batch.wear_levels.items():
+            current = devs.get(devid, {}).get('wear_level')
+            if wear_level is not None:
+                # the mgr keeps it as a float, so it does not round trip
+                if current is None or abs(current - wear_level) > 1e-6:
+                    self.log.debug(f"updating {devid} wear level to {wear_level}")
+                    self.set_device_wear_level(devid, wear_level)
+            elif current is not None:
                 self.log.debug(f"removing {devid} wear level")
                 self.set_device_wear_level(devid, -1.0)
 
@@ -554,13 +721,13 @@ class Module(MgrModule):
         res = {}
 
         SQL_EXACT = """
-        SELECT time, raw_smart
+        SELECT time, raw_smart, encoding
             FROM DeviceHealthMetrics
             WHERE devid = ? AND time = ?
             ORDER BY time DESC;
         """
         SQL_MIN = """
-        SELECT time, raw_smart
+        SELECT time, raw_smart, encoding
             FROM DeviceHealthMetrics
             WHERE devid = ? AND ? <= time
             ORDER BY time DESC;
@@ -585,8 +752,8 @@ class Module(MgrModule):
                 t = row['time']
                 dt = datetime.utcfromtimestamp(t).strftime(TIME_FORMAT)
                 try:
-                    res[dt] = json.loads(row['raw_smart'])
-                except (ValueError, IndexError):
+                    res[dt] = decode_smart(row['raw_smart'], row['encoding'])
+                except (ValueError, IndexError, zlib.error):
                     self.log.debug(f"unable to parse value for {devid}:{t}")
                     pass
         return res
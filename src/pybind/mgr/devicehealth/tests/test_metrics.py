@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from devicehealth.module import DeviceMetricsBatch, Module, SMART_ZLIB, decode_smart
+from tests import mock
+
+
+def nvme(pct_used):
+    return {'nvme_smart_health_information_log': {'percentage_used': pct_used}}
+
+
+def connect():
+    db = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+@pytest.fixture
+def devicehealth():
+    m = Module('devicehealth', 0, 0)
+    m.get_module_option = mock.Mock(return_value=None)
+    db = connect()
+    m.load_schema(db)
+    m._db = db
+    m.retention_period = 86400
+    m.devices = []
+    m.get = mock.Mock(side_effect=lambda what: {'devices': m.devices})
+    m.set_device_wear_level = mock.Mock()
+    return m
+
+
+def test_batch_is_stored_in_one_transaction(devicehealth):
+    batch = DeviceMetricsBatch()
+    for i in range(10):
+        batch.add('dev%d' % i, nvme(i))
+    devicehealth._prune_device_metrics = mock.Mock()
+    devicehealth.put_devices_metrics(batch)
+
+    assert devicehealth._prune_device_metrics.call_count == 1
+    rows = devicehealth._db.execute(
+        'SELECT devid, raw_smart, encoding FROM DeviceHealthMetrics ORDER BY devid').fetchall()
+    assert len(rows) == 10
+    assert all(isinstance(row['raw_smart'], bytes) for row in rows)
+    assert all(row['encoding'] == SMART_ZLIB for row in rows)
+    assert decode_smart(rows[3]['raw_smart'], rows[3]['encoding']) == nvme(3)
+    assert devicehealth.get.call_count == 1
+
+
+def test_legacy_json_rows_are_readable(devicehealth):
+    devicehealth.put_device_metrics('dev0', nvme(5))
+    with devicehealth._db_lock:
+        devicehealth._legacy_put_device_metrics('20200101-000000', 'dev0',
+                                                json.dumps(nvme(1)))
+    metrics = devicehealth._get_device_metrics('dev0')
+    assert sorted(m['nvme_smart_health_information_log']['percentage_used']
+                  for m in metrics.values()) == [1, 5]
+
+
+def test_v1_db_is_upgraded():
+    m = Module('devicehealth', 0, 0)
+    m.get_module_option = mock.Mock(return_value=None)
+    db = connect()
+    m.create_skeleton_schema(db)
+    for sql in Module.SCHEMA_VERSIONED[0]:
+        db.execute(sql)
+    m.update_schema_version(db, 1)
+    db.execute("INSERT INTO Device VALUES ('dev0')")
+    db.execute("INSERT INTO DeviceHealthMetrics (time, devid, raw_smart) VALUES (?, ?, ?)",
+               (1, 'dev0', json.dumps(nvme(1))))
+
+    m.load_schema(db)
+    version = db.execute("SELECT value FROM MgrModuleKV WHERE key = '__version'").fetchone()
+    assert int(version['value']) == len(Module.SCHEMA_VERSIONED)
+    row = db.execute('SELECT raw_smart, encoding FROM DeviceHealthMetrics').fetchone()
+    assert decode_smart(row['raw_smart'], row['encoding']) == nvme(1)
+
+
+def test_new_db_is_created_at_latest_version():
+    m = Module('devicehealth', 0, 0)
+    m.get_module_option = mock.Mock(return_value=None)
+    db = connect()
+    m.load_schema(db)
+    # loading it again must not rerun the upgrades
+    m.load_schema(db)
+    version = db.execute("SELECT value FROM MgrModuleKV WHERE key = '__version'").fetchone()
+    assert int(version['value']) == len(Module.SCHEMA_VERSIONED)
+
+
+def test_only_changed_wear_levels_are_sent(devicehealth):
+    devicehealth.devices = [
+        {'devid': 'same', 'wear_level': 0.05000000074505806},
+        {'devid': 'changed', 'wear_level': 0.04},
+        {'devid': 'gone', 'wear_level': 0.5},
+    ]
+    batch = DeviceMetricsBatch()
+    batch.add('same', nvme(5))
+    batch.add('changed', nvme(5))
+    batch.add('gone', {})
+    batch.add('new', nvme(1))
+    devicehealth.put_devices_metrics(batch)
+    assert sorted(devicehealth.set_device_wear_level.call_args_list) == [
+        mock.call('changed', 0.05),
+        mock.call('gone', -1.0),
+        mock.call('new', 0.01),
+    ]
+
+
+def test_scrape_all_bounds_per_host_concurrency(devicehealth):
+    osds = 24
+    devicehealth.scrape_concurrency = 8
+    devicehealth.scrape_host_concurrency = 2
+    inflight = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def do_scrape_daemon(daemon_type, daemon_id, devid=''):
+        host = 'host%d' % (int(daemon_id) % 3) if daemon_type == 'osd' else 'mon'
+        with lock:
+            inflight[host] = inflight.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), inflight[host])
+        time.sleep(0.01)
+        with lock:
+            inflight[host] -= 1
+        if daemon_id == '5':
+            return None
+        return {'dev%s' % daemon_id: nvme(1), 'shared': nvme(2)}
+
+    devicehealth.get = mock.Mock(side_effect=lambda what: {
+        'osd_map': {'osds': [{'osd': i} for i in range(osds)]},
+        'mon_map': {'mons': [{'name': 'a'}]},
+        'osd_metadata': {str(i): {'hostname': 'host%d' % (i % 3)} for i in range(osds)},
+        'devices': {'devices': []},
+    }[what])
+    devicehealth.get_metadata = mock.Mock(return_value={'hostname': 'mon'})
+    devicehealth.do_scrape_daemon = do_scrape_daemon
+
+    assert devicehealth.scrape_all()[0] == 0
+    assert max(peak.values()) == 2
+    assert devicehealth.scrape_status['daemons'] == osds + 1
+    assert devicehealth.scrape_status['failed_daemons'] == ['osd.5']
+    # the devices of every daemon but osd.5, and the shared one once
+    assert devicehealth.scrape_status['devices'] == osds + 1
@@ -26,6 +26,7 @@ if TYPE_CHECKING:
 
 import cephfs
 import inspect
+import itertools
 import logging
 import errno
 import functools
@@ -248,6 +249,14 @@ class OSDMap(ceph_module.BasePyOSDMap):
     def map_pool_pgs_up(self, poolid: int) -> List[int]:
         return self._map_pool_pgs_up(poolid)
 
+    def map_pool_pgs_acting(self, poolid: int) -> Dict[str, List[int]]:
+        """
+        Map every PG of a pool to its acting set, keyed by PG id.
+
+        :raises KeyError: if the pool does not exist in this map
+        """
+        return self._map_pool_pgs_acting(poolid)
+
     def pg_to_up_acting_osds(self, pool_id: int, ps: int) -> Dict[str, Any]:
         return self._pg_to_up_acting_osds(pool_id, ps)
 
@@ -1012,6 +1021,72 @@ ServerInfoT = Dict[str, Union[str, List[ServiceInfoT]]]
 PerfCounterT = Dict[str, Any]
 
 
+class CallStats(object):
+    """
+    Number, payload size and latency histogram of one kind of call a module
+    makes into ceph-mgr or into another module.
+    """
+
+    # upper bounds, in seconds, of the latency histogram buckets
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(self.BUCKETS)
+
+    def record(self, seconds: float, nbytes: int) -> None:
+        self.count += 1
+        self.bytes += nbytes
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            # cumulative, like prometheus histograms
+            'buckets': [[str(bound), count] for bound, count in zip(
+                self.BUCKETS, itertools.accumulate(self.buckets))],
+        }
+
+
+class ModulePerf(object):
+    """
+    Per module instrumentation of MgrModule.get(), MgrModule.remote() and
+    of the module's cephfs connection pools.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls: Dict[str, Dict[str, CallStats]] = {'get': {}, 'remote': {}, 'cephfs': {}}
+
+    def record(self, kind: str, name: str, seconds: float, nbytes: int = 0) -> None:
+        with self.lock:
+            stats = self.calls[kind].get(name)
+            if stats is None:
+                stats = self.calls[kind][name] = CallStats()
+            stats.record(seconds, nbytes)
+
+    def dump(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with self.lock:
+            return {kind: {name: stats.dump() for name, stats in calls.items()}
+                    for kind, calls in self.calls.items()}
+
+    def reset(self) -> None:
+        with self.lock:
+            for calls in self.calls.values():
+                calls.clear()
+
+
 class API:
     def DecoratorFactory(attr: str, default: Any):  # type: ignore
         class DecoratorClass:
@@ -1076,6 +1151,7 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
 
     def __init__(self, module_name: str, py_modules_ptr: object, this_ptr: object):
         self.module_name = module_name
+        self._module_perf = ModulePerf()
         super(MgrModule, self).__init__(py_modules_ptr, this_ptr)
 
         for o in self.MODULE_OPTIONS:
@@ -1107,7 +1183,9 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
 
         self._version = self._ceph_get_version()
 
-        self._perf_schema_cache = None
+        # daemon name -> (metadata fingerprint, unlabeled perf counter schema)
+        self._perf_schema_cache: Dict[str, Tuple[str, Dict[str, Dict[str, Union[str, int]]]]] = {}
+        self._perf_schema_lock = threading.Lock()
 
         # Keep a librados instance for those that need it.
         self._rados: Optional[rados.Rados] = None
@@ -1284,7 +1362,8 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
             assert self.SCHEMA is not None
             for sql in self.SCHEMA:
                 db.execute(sql)
-            self.update_schema_version(db, 1)
+            # SCHEMA is the latest version of SCHEMA_VERSIONED
+            self.update_schema_version(db, len(self.SCHEMA_VERSIONED or [[]]))
         else:
             assert self.SCHEMA_VERSIONED is not None
             latest = len(self.SCHEMA_VERSIONED)
@@ -1501,10 +1580,37 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
             All these structures have their own JSON representations: experiment
             or look at the C++ ``dump()`` methods to learn about them.
         """
+        start = time.monotonic()
         obj = self._ceph_get(data_name)
+        nbytes = 0
         if isinstance(obj, bytes):
+            nbytes = len(obj)
             obj = json.loads(obj)
+        # parameterized names, like "device <devid>", are accounted together
+        self._module_perf.record('get', data_name.split(' ', 1)[0],
+                                 time.monotonic() - start, nbytes)
+
+        return obj
 
+    @API.expose
+    def get_pg_progress_since(self, version: int = 0) -> Dict[str, Any]:
+        """
+        Called by the plugin to fetch the ``pg_progress`` entries of only
+        the PGs that changed since an earlier call, instead of those of all
+        the PGs.
+
+        :param int version: the ``version`` returned by the previous call,
+            or 0 for all the PGs
+        :return: a dict with the PGMap ``version`` to pass to the next
+            call, ``pgs``, the PG ids whose ``pg_progress`` entry changed
+            mapped to that entry, ``removed``, the PG ids that do not exist
+            anymore, and ``pg_ready``.  If ``full`` is set, ``pgs`` has
+            all the PGs, and the PGs that are not in there were removed.
+        """
+        start = time.monotonic()
+        obj = self._ceph_get_pg_progress_since(version)
+        self._module_perf.record('get', 'pg_progress_since',
+                                 time.monotonic() - start, 0)
         return obj
 
     def _stattype_to_str(self, stattype: int) -> str:
@@ -1705,6 +1811,23 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
         """
         return self._ceph_get_latest_unlabeled_counter(svc_type, svc_name, path)
 
+    @API.expose
+    def get_latest_unlabeled_counters(
+        self, svc_type: str, prio_limit: int = PRIO_USEFUL
+    ) -> Dict[str, Dict[str, Union[Tuple[float, int], Tuple[float, int, int]]]]:
+        """
+        Called by the plugin to fetch the newest data point of every unlabeled
+        performance counter of every daemon of a service type at once.
+
+        :param str svc_type: service type (e.g., 'osd'), or '' for all
+            services
+        :param int prio_limit: skip counters with a lower priority
+        :return: A dict of daemon names (e.g. "osd.0") to dicts of counter
+            paths to their latest two-tuple of (timestamp, value) or
+            three-tuple of (timestamp, value, count).
+        """
+        return self._ceph_get_latest_unlabeled_counters(svc_type, prio_limit)
+
     @API.expose
     def get_latest_counter(self,
                            svc_type: str,
@@ -2277,6 +2400,36 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
         else:
             return 0, 0
 
+    def _get_cached_unlabeled_perf_schema(
+        self,
+        svc_type: str,
+        svc_id: str,
+        fingerprint: str,
+        counters: Dict[str, Any],
+    ) -> Optional[Dict[str, Dict[str, Union[str, int]]]]:
+        """
+        Return the unlabeled perf counter schema of a daemon, fetching it only
+        if the daemon's metadata changed or it reports counters the cached
+        schema does not know about.
+        """
+        svc_full_name = "{0}.{1}".format(svc_type, svc_id)
+        with self._perf_schema_lock:
+            cached = self._perf_schema_cache.get(svc_full_name)
+        if cached is not None:
+            cached_fingerprint, schema = cached
+            if cached_fingerprint == fingerprint and all(p in schema for p in counters):
+                return schema
+
+        schemas = self.get_unlabeled_perf_schema(svc_type, svc_id)
+        if not schemas or svc_full_name not in schemas:
+            return None
+        # Value is returned in a potentially-multi-service format,
+        # get just the service we're asking about
+        schema = schemas[svc_full_name]
+        with self._perf_schema_lock:
+            self._perf_schema_cache[svc_full_name] = (fingerprint, schema)
+        return schema
+
     @API.expose
     @profile_method()
     def get_unlabeled_perf_counters(
@@ -2306,55 +2459,50 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
 
         result = defaultdict(dict)  # type: Dict[str, dict]
 
+        # the daemons' metadata, as reported via list_servers(), tells when a
+        # daemon was upgraded or replaced and its schema has to be refetched
+        fingerprints: Dict[str, Dict[str, str]] = defaultdict(dict)
         for server in self.list_servers():
             for service in cast(List[ServiceInfoT], server['services']):
-                if service['type'] not in services:
-                    continue
-
-                schemas = self.get_unlabeled_perf_schema(service['type'], service['id'])
-                if not schemas:
-                    self.log.warning("No perf counter schema for {0}.{1}".format(
-                        service['type'], service['id']
-                    ))
+                if service['type'] in services:
+                    fingerprints[service['type']][service['id']] = service.get('ceph_version', '')
+
+        for svc_type, daemons in fingerprints.items():
+            latest = self.get_latest_unlabeled_counters(svc_type, prio_limit)
+            for svc_id, fingerprint in daemons.items():
+                svc_full_name = "{0}.{1}".format(svc_type, svc_id)
+                counters = latest.get(svc_full_name, {})
+                schema = self._get_cached_unlabeled_perf_schema(
+                    svc_type, svc_id, fingerprint, counters)
+                if schema is None:
+                    self.log.warning("No perf counter schema for {0}".format(svc_full_name))
                     continue
 
-                # Value is returned in a potentially-multi-service format,
-                # get just the service we're asking about
-                svc_full_name = "{0}.{1}".format(
-                    service['type'], service['id'])
-                schema = schemas[svc_full_name]
-
                 # Populate latest values
-                for counter_path, counter_schema in schema.items():
-                    # self.log.debug("{0}: {1}".format(
-                    #     counter_path, json.dumps(counter_schema)
-                    # ))
-                    priority = counter_schema['priority']
-                    assert isinstance(priority, int)
-                    if priority < prio_limit:
-                        continue
-
+                for counter_path, data in counters.items():
+                    counter_schema = schema[counter_path]
                     tp = counter_schema['type']
                     assert isinstance(tp, int)
                     counter_info = dict(counter_schema)
                     # Also populate count for the long running avgs
                     if tp & self.PERFCOUNTER_LONGRUNAVG:
-                        v, c = self.get_unlabeled_counter_latest_avg(
-                            service['type'],
-                            service['id'],
-                            counter_path
-                        )
+                        if data:
+                            # https://github.com/python/mypy/issues/1178
+                            _, v, c = cast(Tuple[float, int, int], data)
+                        else:
+                            v, c = 0, 0
                         counter_info['value'], counter_info['count'] = v, c
-                        result[svc_full_name][counter_path] = counter_info
                     else:
-                        counter_info['value'] = self.get_unlabeled_counter_latest(
-                            service['type'],
-                            service['id'],
-                            counter_path
-                        )
+                        counter_info['value'] = data[1] if data else 0
 
                     result[svc_full_name][counter_path] = counter_info
 
+        with self._perf_schema_lock:
+            for name in list(self._perf_schema_cache):
+                svc_type, svc_id = name.split('.', 1)
+                if svc_type in services and svc_id not in fingerprints.get(svc_type, {}):
+                    del self._perf_schema_cache[name]
+
         self.log.debug("returning {0} counter".format(len(result)))
 
         return result
@@ -2589,8 +2737,47 @@ class MgrModule(ceph_module.BaseMgrModule, MgrModuleLoggingMixin):
         :raises RuntimeError: **Any** error raised within the method is converted to a RuntimeError
         :raises ImportError: No such module
         """
-        return self._ceph_dispatch_remote(module_name, method_name,
-                                          args, kwargs)
+        start = time.monotonic()
+        try:
+            return self._ceph_dispatch_remote(module_name, method_name,
+                                              args, kwargs)
+        finally:
+            self._module_perf.record('remote', '{}.{}'.format(module_name, method_name),
+                                     time.monotonic() - start)
+
+    def get_all_module_perf(self, reset: bool = False) -> Dict[str, Dict[str, Dict[str, Dict[str, Any]]]]:
+        """
+        Collect ``get_module_perf()`` of every enabled module.
+        """
+        mgr_map = self.get('mgr_map')
+        names = set(mgr_map['modules'])
+        names.update(mgr_map['always_on_modules'].get(self.release_name, []))
+        perf = {}
+        for name in sorted(names):
+            if name == self.module_name:
+                perf[name] = self.get_module_perf(reset)
+                continue
+            try:
+                perf[name] = self.remote(name, 'get_module_perf', reset)
+            except (ImportError, NameError, RuntimeError) as e:
+                # not loaded, e.g. because it cannot run here
+                self.log.debug('no perf of module %s: %s', name, e)
+        return perf
+
+    @API.expose
+    def get_module_perf(self, reset: bool = False) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Return the number, payload size and latency of the calls this module
+        made through ``get()`` and ``remote()``, by data name and by
+        module and method respectively, and of its cephfs connection pool
+        waits, connects and disconnects, by filesystem.
+
+        :param reset: start counting from zero afterwards
+        """
+        perf = self._module_perf.dump()
+        if reset:
+            self._module_perf.reset()
+        return perf
 
     def add_osd_perf_query(self, query: Dict[str, Any]) -> Optional[int]:
         """
@@ -19,6 +19,7 @@ import time
 import logging
 import sys
 from ipaddress import ip_address
+from collections import deque
 from threading import Lock, Condition
 from typing import no_type_check, NewType
 from traceback import format_exc as tb_format_exc
@@ -29,7 +30,7 @@ if sys.version_info >= (3, 3):
 else:
     from threading import _Timer as Timer
 
-from typing import Tuple, Any, Callable, Optional, Dict, TYPE_CHECKING, TypeVar, List, Iterable, Generator, Generic, Iterator
+from typing import Tuple, Any, Callable, Deque, Optional, Dict, TYPE_CHECKING, TypeVar, List, Iterable, Generator, Generic, Iterator
 
 from ceph.deployment.utils import wrap_ipv6
 from ceph.cryptotools.select import get_crypto_caller
@@ -121,52 +122,46 @@ def lock_timeout_log(lock: Lock, timeout: int = 5) -> Iterator[None]:
 
 
 class CephfsConnectionPool(object):
+    """
+    libcephfs handles, pooled per filesystem.
+
+    Every filesystem has its own pool of up to MAX_CONCURRENT_CONNECTIONS
+    connections. Idle connections are kept on a stack that is popped without
+    taking any lock, so handing out an idle handle costs neither a lock nor
+    an fs_map lookup. A pool is only locked to open a connection, to share a
+    busy one when the pool is full, and to release a handle.
+
+    Connections are checked against the fs_map when its epoch changes (see
+    refresh_fs_map()) rather than whenever a handle is handed out: the pool
+    of a filesystem that got removed, or removed and created again with the
+    same name, is replaced and its connections are aborted once released.
+    When the fs_map comes from a notification, the idle connections of the
+    replaced pool are aborted by the timer rather than on the notify thread.
+
+    The time spent waiting for a handle when no connection was idle, and the
+    time taken to open and close connections, are recorded under the
+    ``cephfs`` kind of the module's call statistics (``ceph mgr module
+    perf``). dump() returns the connections and ops in flight per filesystem.
+    """
     class Connection(object):
-        def __init__(self, mgr: Module_T, fs_name: str):
+        def __init__(self, mgr: Module_T, fs_name: str, fs_id: int):
             self.fs: Optional["cephfs.LibCephFS"] = None
             self.mgr = mgr
             self.fs_name = fs_name
+            self.fs_id = fs_id
             self.ops_in_progress = 0
             self.last_used = time.time()
-            self.fs_id = self.get_fs_id()
-
-        def get_fs_id(self) -> int:
-            fs_map = self.mgr.get('fs_map')
-            for fs in fs_map['filesystems']:
-                if fs['mdsmap']['fs_name'] == self.fs_name:
-                    return fs['id']
-            raise CephfsConnectionException(
-                -errno.ENOENT, "FS '{0}' not found".format(self.fs_name))
 
         def get_fs_handle(self) -> "cephfs.LibCephFS":
             self.last_used = time.time()
+            # taking an idle connection off the stack is not locked: the
+            # count has to go up last, a busy connection may get shared.
             self.ops_in_progress += 1
             return self.fs
 
-        def put_fs_handle(self, notify: Callable) -> None:
+        def put_fs_handle(self) -> None:
             assert self.ops_in_progress > 0
             self.ops_in_progress -= 1
-            if self.ops_in_progress == 0:
-                notify()
-
-        def del_fs_handle(self, waiter: Optional[Callable]) -> None:
-            if waiter:
-                while self.ops_in_progress != 0:
-                    waiter()
-            if self.is_connection_valid():
-                self.disconnect()
-            else:
-                self.abort()
-
-        def is_connection_valid(self) -> bool:
-            fs_id = None
-            try:
-                fs_id = self.get_fs_id()
-            except:  # noqa
-                # the filesystem does not exist now -- connection is not valid.
-                pass
-            logger.debug("self.fs_id={0}, fs_id={1}".format(self.fs_id, fs_id))
-            return self.fs_id == fs_id
 
         def is_connection_idle(self, timeout: float) -> bool:
             return (self.ops_in_progress == 0 and ((time.time() - self.last_used) >= timeout))
@@ -208,6 +203,34 @@ class CephfsConnectionPool(object):
             logger.info("abort done from cephfs '{0}'".format(self.fs_name))
             self.fs = None
 
+    class FsPool(object):
+        """
+        Connections to one filesystem.
+        """
+        def __init__(self, fs_name: str, fs_id: int):
+            self.fs_name = fs_name
+            self.fs_id = fs_id
+            self.lock = Lock()
+            self.cond = Condition(self.lock)
+            self.connections: List[CephfsConnectionPool.Connection] = []
+            # connections without ops in progress, most recently used last
+            self.idle: Deque[CephfsConnectionPool.Connection] = deque()
+            # connections being opened, they count against the limit
+            self.connecting = 0
+            # set once the pool got replaced or deleted: its connections are
+            # closed when released, aborted if the filesystem is gone.
+            self.closing = False
+            self.abort = False
+
+        def pop_idle(self) -> Optional["CephfsConnectionPool.Connection"]:
+            try:
+                return self.idle.pop()
+            except IndexError:
+                return None
+
+        def ops_in_flight(self) -> int:
+            return sum(c.ops_in_progress for c in self.connections)
+
     # TODO: make this configurable
     TIMER_TASK_RUN_INTERVAL = 30.0   # seconds
     CONNECTION_IDLE_INTERVAL = 60.0  # seconds
@@ -215,101 +238,272 @@ class CephfsConnectionPool(object):
 
     def __init__(self, mgr: Module_T):
         self.mgr = mgr
-        self.connections: Dict[str, List[CephfsConnectionPool.Connection]] = {}
+        self.fs_pools: Dict[str, CephfsConnectionPool.FsPool] = {}
+        # replaced pools whose idle connections are left to the timer
+        self.stale_pools: List[CephfsConnectionPool.FsPool] = []
+        # pool and connection of the handles that are open, by handle id
+        self.handles: Dict[int, Tuple[CephfsConnectionPool.FsPool,
+                                      CephfsConnectionPool.Connection]] = {}
+        self.fs_map_epoch: Optional[int] = None
+        self.fs_ids: Dict[str, int] = {}
         self.lock = Lock()
-        self.cond = Condition(self.lock)
         self.timer_task = RTimer(CephfsConnectionPool.TIMER_TASK_RUN_INTERVAL,
                                  self.cleanup_connections)
         self.timer_task.start()
 
+    def _record(self, fs_name: str, event: str, seconds: float) -> None:
+        self.mgr._module_perf.record('cephfs', '{0}.{1}'.format(fs_name, event), seconds)
+
+    def refresh_fs_map(self, fs_map: Optional[Dict[str, Any]] = None,
+                       close: bool = True) -> None:
+        """
+        Replace the pools of filesystems that were removed or recreated
+        since the last fs_map seen. Modules that get fs_map notifications
+        pass the map on, the pool also checks it periodically.
+
+        Without `close`, the replaced pools are only taken out of use and
+        their idle connections are aborted by the next cleanup_connections(),
+        so that notify() does not wait on libcephfs.
+        """
+        if fs_map is None:
+            fs_map = self.mgr.get('fs_map')
+        with self.lock:
+            if self.fs_map_epoch is not None and fs_map['epoch'] <= self.fs_map_epoch:
+                return
+            self.fs_map_epoch = fs_map['epoch']
+            self.fs_ids = {fs['mdsmap']['fs_name']: fs['id'] for fs in fs_map['filesystems']}
+            stale = [fs_pool for fs_name, fs_pool in self.fs_pools.items()
+                     if self.fs_ids.get(fs_name) != fs_pool.fs_id]
+            for fs_pool in stale:
+                del self.fs_pools[fs_pool.fs_name]
+        for fs_pool in stale:
+            # this is possible if the filesystem got removed (and recreated
+            # with same name) via "ceph fs rm/new" mon command.
+            logger.warning(f'filesystem id changed for volume ({fs_pool.fs_name}), disconnecting')
+            self._record(fs_pool.fs_name, 'invalidate', 0.0)
+            if close:
+                self._close_pool(fs_pool, abort=True)
+            else:
+                with fs_pool.lock:
+                    fs_pool.closing = True
+                    fs_pool.abort = True
+        if stale and not close:
+            with self.lock:
+                self.stale_pools.extend(stale)
+
     def cleanup_connections(self) -> None:
+        self.refresh_fs_map()
         with self.lock:
-            logger.info("scanning for idle connections..")
+            stale_pools, self.stale_pools = self.stale_pools, []
+        for fs_pool in stale_pools:
+            self._close_pool(fs_pool, abort=True)
+        logger.info("scanning for idle connections..")
+        with self.lock:
+            fs_pools = list(self.fs_pools.values())
+        for fs_pool in fs_pools:
             idle_conns = []
-            for fs_name, connections in self.connections.items():
-                logger.debug(f'fs_name ({fs_name}) connections ({connections})')
-                for connection in connections:
-                    if connection.is_connection_idle(CephfsConnectionPool.CONNECTION_IDLE_INTERVAL):
-                        idle_conns.append((fs_name, connection))
-            logger.info(f'cleaning up connections: {idle_conns}')
-            for idle_conn in idle_conns:
-                self._del_connection(idle_conn[0], idle_conn[1])
+            with fs_pool.lock:
+                for connection in list(fs_pool.idle):
+                    if not connection.is_connection_idle(CephfsConnectionPool.CONNECTION_IDLE_INTERVAL):
+                        continue
+                    try:
+                        # lost the race against a lockless get_fs_handle()
+                        fs_pool.idle.remove(connection)
+                    except ValueError:
+                        continue
+                    fs_pool.connections.remove(connection)
+                    idle_conns.append(connection)
+                logger.debug(f'fs_name ({fs_pool.fs_name}) connections ({fs_pool.connections}) '
+                             f'ops in flight ({fs_pool.ops_in_flight()})')
+            if idle_conns:
+                logger.info(f'cleaning up connections: {idle_conns}')
+            for connection in idle_conns:
+                self._close(fs_pool, connection)
+
+    def dump(self) -> Dict[str, Dict[str, int]]:
+        """
+        Connections and ops in flight of each filesystem.
+        """
+        with self.lock:
+            fs_pools = list(self.fs_pools.values())
+        stats = {}
+        for fs_pool in fs_pools:
+            with fs_pool.lock:
+                stats[fs_pool.fs_name] = {
+                    'connections': len(fs_pool.connections),
+                    'idle': len(fs_pool.idle),
+                    'connecting': fs_pool.connecting,
+                    'ops_in_flight': fs_pool.ops_in_flight(),
+                }
+        return stats
+
+    def _get_fs_pool(self, fs_name: str) -> "CephfsConnectionPool.FsPool":
+        # pools are created on first use of a filesystem only, the fs_map is
+        # not fetched when handing out handles.
+        self.refresh_fs_map()
+        with self.lock:
+            fs_pool = self.fs_pools.get(fs_name)
+            if fs_pool is None:
+                fs_id = self.fs_ids.get(fs_name)
+                if fs_id is None:
+                    raise CephfsConnectionException(
+                        -errno.ENOENT, "FS '{0}' not found".format(fs_name))
+                fs_pool = CephfsConnectionPool.FsPool(fs_name, fs_id)
+                self.fs_pools[fs_name] = fs_pool
+            return fs_pool
 
     def get_fs_handle(self, fs_name: str) -> "cephfs.LibCephFS":
-        with self.lock:
-            try:
-                min_shared = 0
-                shared_connection = None
-                connections = self.connections.setdefault(fs_name, [])
-                logger.debug(f'[get] volume: ({fs_name}) connection: ({connections})')
-                if connections:
-                    min_shared = connections[0].ops_in_progress
-                    shared_connection = connections[0]
-                for connection in list(connections):
-                    logger.debug(f'[get] connection: {connection} usage: {connection.ops_in_progress}')
-                    if connection.ops_in_progress == 0:
-                        if connection.is_connection_valid():
-                            logger.debug(f'[get] connection ({connection}) can be reused')
-                            return connection.get_fs_handle()
-                        else:
-                            # filesystem id changed beneath us (or the filesystem does not exist).
-                            # this is possible if the filesystem got removed (and recreated with
-                            # same name) via "ceph fs rm/new" mon command.
-                            logger.warning(f'[get] filesystem id changed for volume ({fs_name}), disconnecting ({connection})')
-                            # note -- this will mutate @connections too
-                            self._del_connection(fs_name, connection)
-                    else:
-                        if connection.ops_in_progress < min_shared:
-                            min_shared = connection.ops_in_progress
-                            shared_connection = connection
-                # when we end up here, there are no "free" connections. so either spin up a new
-                # one or share it.
-                if len(connections) < CephfsConnectionPool.MAX_CONCURRENT_CONNECTIONS:
-                    logger.debug('[get] spawning new connection since no connection is unused and we still have room for more')
-                    connection = CephfsConnectionPool.Connection(self.mgr, fs_name)
-                    connection.connect()
-                    self.connections[fs_name].append(connection)
-                    return connection.get_fs_handle()
-                else:
-                    assert shared_connection is not None
-                    logger.debug(f'[get] using shared connection ({shared_connection})')
-                    return shared_connection.get_fs_handle()
-            except cephfs.Error as e:
+        while True:
+            fs_pool = self.fs_pools.get(fs_name)
+            if fs_pool is None:
+                fs_pool = self._get_fs_pool(fs_name)
+            connection = fs_pool.pop_idle()
+            if connection is None:
+                fs_handle = self._get_fs_handle(fs_pool)
+                if fs_handle is not None:
+                    return fs_handle
+                continue
+            logger.debug(f'[get] connection ({connection}) can be reused')
+            fs_handle = connection.get_fs_handle()
+            if not fs_pool.closing:
+                return fs_handle
+            # the pool got closed in the meantime
+            self._put_fs_handle(fs_pool, connection)
+
+    def _get_fs_handle(self, fs_pool: "CephfsConnectionPool.FsPool") -> Optional["cephfs.LibCephFS"]:
+        """
+        Get a handle when no connection is idle: open a connection if there
+        is room for one, share the least busy connection otherwise. Return
+        None if the pool got closed.
+        """
+        start = time.monotonic()
+        with fs_pool.lock:
+            while True:
+                if fs_pool.closing:
+                    return None
+                connection = fs_pool.pop_idle()
+                if connection is not None:
+                    fs_handle = connection.get_fs_handle()
+                    break
+                if len(fs_pool.connections) + fs_pool.connecting < CephfsConnectionPool.MAX_CONCURRENT_CONNECTIONS:
+                    fs_pool.connecting += 1
+                    fs_handle = None
+                    break
+                # a connection without ops that is not idle is being handed
+                # out by a lockless get_fs_handle(), do not share it yet.
+                busy = [c for c in fs_pool.connections if c.ops_in_progress > 0]
+                if busy:
+                    connection = min(busy, key=lambda c: c.ops_in_progress)
+                    logger.debug(f'[get] using shared connection ({connection})')
+                    fs_handle = connection.get_fs_handle()
+                    break
+                fs_pool.cond.wait(timeout=0.1)
+        if fs_handle is None:
+            logger.debug('[get] spawning new connection since no connection is unused and we still have room for more')
+            fs_handle = self._connect(fs_pool)
+        self._record(fs_pool.fs_name, 'wait', time.monotonic() - start)
+        return fs_handle
+
+    def _connect(self, fs_pool: "CephfsConnectionPool.FsPool") -> "cephfs.LibCephFS":
+        start = time.monotonic()
+        connection = CephfsConnectionPool.Connection(self.mgr, fs_pool.fs_name, fs_pool.fs_id)
+        try:
+            connection.connect()
+        except Exception as e:
+            with fs_pool.lock:
+                fs_pool.connecting -= 1
+                fs_pool.cond.notify_all()
+            if isinstance(e, cephfs.Error):
                 # try to provide a better error string if possible
                 if e.args[0] == errno.ENOENT:
                     raise CephfsConnectionException(
-                        -errno.ENOENT, "FS '{0}' not found".format(fs_name))
+                        -errno.ENOENT, "FS '{0}' not found".format(fs_pool.fs_name))
                 raise CephfsConnectionException(-e.args[0], e.args[1])
+            raise
+        self._record(fs_pool.fs_name, 'connect', time.monotonic() - start)
+        self.handles[id(connection.fs)] = (fs_pool, connection)
+        with fs_pool.lock:
+            fs_pool.connecting -= 1
+            fs_pool.connections.append(connection)
+            fs_pool.cond.notify_all()
+            # a pool closed in the meantime closes the connection on release
+            return connection.get_fs_handle()
 
     def put_fs_handle(self, fs_name: str, fs_handle: cephfs.LibCephFS) -> None:
-        with self.lock:
-            connections = self.connections.get(fs_name, [])
-            for connection in connections:
-                if connection.fs == fs_handle:
-                    logger.debug(f'[put] connection: {connection} usage: {connection.ops_in_progress}')
-                    connection.put_fs_handle(notify=lambda: self.cond.notifyAll())
-
-    def _del_connection(self, fs_name: str, connection: Connection, wait: bool = False) -> None:
-        self.connections[fs_name].remove(connection)
-        connection.del_fs_handle(waiter=None if not wait else lambda: self.cond.wait())
-
-    def _del_connections(self, fs_name: str, wait: bool = False) -> None:
-        for connection in list(self.connections.get(fs_name, [])):
-            self._del_connection(fs_name, connection, wait)
+        pool_connection = self.handles.get(id(fs_handle))
+        if pool_connection is None:
+            return
+        fs_pool, connection = pool_connection
+        if connection.fs is fs_handle:
+            self._put_fs_handle(fs_pool, connection)
+
+    def _put_fs_handle(self, fs_pool: "CephfsConnectionPool.FsPool",
+                       connection: "CephfsConnectionPool.Connection") -> None:
+        with fs_pool.lock:
+            logger.debug(f'[put] connection: {connection} usage: {connection.ops_in_progress}')
+            connection.put_fs_handle()
+            if connection.ops_in_progress:
+                return
+            fs_pool.cond.notify_all()
+            if not fs_pool.closing:
+                fs_pool.idle.append(connection)
+                return
+            fs_pool.connections.remove(connection)
+        self._close(fs_pool, connection)
+
+    def _close(self, fs_pool: "CephfsConnectionPool.FsPool",
+               connection: "CephfsConnectionPool.Connection") -> None:
+        start = time.monotonic()
+        self.handles.pop(id(connection.fs), None)
+        try:
+            if fs_pool.abort:
+                connection.abort()
+            else:
+                connection.disconnect()
+        finally:
+            self._record(fs_pool.fs_name, 'disconnect', time.monotonic() - start)
+            with fs_pool.lock:
+                fs_pool.cond.notify_all()
+
+    def _close_pool(self, fs_pool: "CephfsConnectionPool.FsPool",
+                    wait: bool = False, abort: bool = False) -> None:
+        """
+        Close the idle connections of a pool that is no longer handed out,
+        the others are closed once released. Optionally wait for that.
+        """
+        with fs_pool.lock:
+            fs_pool.closing = True
+            fs_pool.abort = fs_pool.abort or abort
+            idle_conns = []
+            while fs_pool.idle:
+                connection = fs_pool.pop_idle()
+                if connection is not None:
+                    fs_pool.connections.remove(connection)
+                    idle_conns.append(connection)
+        for connection in idle_conns:
+            self._close(fs_pool, connection)
+        if wait:
+            with fs_pool.lock:
+                while fs_pool.connections or fs_pool.connecting:
+                    fs_pool.cond.wait()
 
     def del_connections(self, fs_name: str, wait: bool = False) -> None:
         with self.lock:
-            self._del_connections(fs_name, wait)
+            fs_pool = self.fs_pools.pop(fs_name, None)
+        if fs_pool is not None:
+            self._close_pool(fs_pool, wait)
 
     def del_all_connections(self) -> None:
+        # the pools are closed without the lock held, a pool created in the
+        # meantime is left alone.
         with self.lock:
-            for fs_name in list(self.connections.keys()):
-                logger.info("waiting for pending ops for '{}'".format(fs_name))
-                self._del_connections(fs_name, wait=True)
-                logger.info("pending ops completed for '{}'".format(fs_name))
-            # no new connections should have been initialized since its
-            # guarded on shutdown.
-            assert len(self.connections) == 0
+            fs_pools = list(self.fs_pools.values()) + self.stale_pools
+            self.fs_pools.clear()
+            self.stale_pools = []
+        for fs_pool in fs_pools:
+            logger.info("waiting for pending ops for '{}'".format(fs_pool.fs_name))
+            self._close_pool(fs_pool, wait=True)
+            logger.info("pending ops completed for '{}'".format(fs_pool.fs_name))
 
 
 class CephfsClient(Generic[Module_T]):
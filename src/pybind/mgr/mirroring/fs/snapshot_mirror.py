@@ -295,6 +295,7 @@ class FSSnapshotMirror:
             with self.lock:
                 self.fs_map = self.mgr.get('fs_map')
                 self.refresh_pool_policy_locked()
+            self.local_fs.connection_pool.refresh_fs_map(self.fs_map, close=False)
 
     @staticmethod
     def make_spec(client_name, cluster_name):
@@ -0,0 +1,143 @@
+"""
+Time finding the PGs affected by a batch of OSDs being marked out, one OSD
+and one PG at a time as the progress module used to, and with every pool
+mapped once per map.
+
+Run from src/pybind/mgr:
+
+    UNITTEST=true PYTHONPATH=..:../../python-common \\
+        python -m progress.bench_osd_in_out --osds 1000 --pools 8 --pg-num 8192 --out 40
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Set
+
+from progress.module import Module, PgId
+
+
+class FakeOSDMap:
+    """
+    Maps a PG to `size` OSDs, picked by a seeded shuffle of the OSDs that
+    are in, so that marking an OSD out only moves the PGs it held.
+    """
+
+    def __init__(self, num_osds: int, pools: Dict[int, int], size: int,
+                 out: Set[int]) -> None:
+        self.num_osds = num_osds
+        self.pools = pools
+        self.size = size
+        self.out = out
+        self.calls = Counter()  # type: Counter
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'pools': [{'pool': pool_id, 'pg_num': pg_num}
+                      for pool_id, pg_num in self.pools.items()],
+            'osds': [{'osd': osd, 'in': 0.0 if osd in self.out else 1.0}
+                     for osd in range(self.num_osds)],
+        }
+
+    def _acting(self, pool_id: int, ps: int) -> List[int]:
+        rng = random.Random(pool_id << 32 | ps)
+        acting = []  # type: List[int]
+        while len(acting) < self.size:
+            osd = rng.randrange(self.num_osds)
+            if osd not in self.out and osd not in acting:
+                acting.append(osd)
+        return acting
+
+    def pg_to_up_acting_osds(self, pool_id: int, ps: int) -> Dict[str, Any]:
+        self.calls['pg_to_up_acting_osds'] += 1
+        acting = self._acting(pool_id, ps)
+        return {'up': acting, 'acting': acting,
+                'up_primary': acting[0], 'acting_primary': acting[0]}
+
+    def map_pool_pgs_acting(self, pool_id: int) -> Dict[str, List[int]]:
+        self.calls['map_pool_pgs_acting'] += 1
+        return {'{0}.{1:x}'.format(pool_id, ps): self._acting(pool_id, ps)
+                for ps in range(self.pools[pool_id])}
+
+
+def per_osd_affected_pgs(old_map: FakeOSDMap, new_map: FakeOSDMap,
+                         marked: List[int]) -> Dict[int, List[str]]:
+    """
+    The previous implementation of Module._osd_in_out(): both maps are
+    queried for every PG, once per OSD that was marked out.
+    """
+    affected = {}
+    old_dump = old_map.dump()
+    for osd_id in marked:
+        pgs = []
+        for pool in old_dump['pools']:
+            for ps in range(pool['pg_num']):
+                old_osds = set(old_map.pg_to_up_acting_osds(pool['pool'], ps)['acting'])
+                new_osds = set(new_map.pg_to_up_acting_osds(pool['pool'], ps)['acting'])
+                if (osd_id in old_osds or osd_id in new_osds) and old_osds != new_osds:
+                    pgs.append(str(PgId(pool['pool'], ps)))
+        affected[osd_id] = pgs
+    return affected
+
+
+def bench(name: str, fn: Callable[[], object], maps: List[FakeOSDMap],
+          runs: int) -> object:
+    timings = []
+    for _ in range(runs):
+        for m in maps:
+            m.calls.clear()
+        start = time.monotonic()
+        result = fn()
+        timings.append(time.monotonic() - start)
+    calls = sum((m.calls for m in maps), Counter())  # type: Counter
+    print('%-10s best %.3fs, worst %.3fs, %s' % (
+        name, min(timings), max(timings),
+        ', '.join('%d %s calls' % (n, c) for c, n in sorted(calls.items()))))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--osds', type=int, default=1000)
+    parser.add_argument('--pools', type=int, default=8)
+    parser.add_argument('--pg-num', type=int, default=8192)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--out', type=int, default=40,
+                        help='number of OSDs marked out in the same epoch')
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--skip-per-osd', action='store_true',
+                        help='only time the bulk path')
+    args = parser.parse_args()
+
+    pools = {pool_id: args.pg_num for pool_id in range(1, args.pools + 1)}
+    marked = list(range(args.out))
+    old_map = FakeOSDMap(args.osds, pools, args.size, set())
+    new_map = FakeOSDMap(args.osds, pools, args.size, set(marked))
+
+    affected = {}  # type: Dict[int, List[str]]
+
+    class Progress(Module):
+        # only look at the PGs, not at the recovery events
+        def _osd_in_out_event(self, osd_id: int, marked: str,
+                              affected_pgs: List[PgId]) -> None:
+            affected[osd_id] = [str(pg) for pg in affected_pgs]
+
+    progress = Progress('progress', 0, 0)
+
+    def bulk() -> Dict[int, List[str]]:
+        affected.clear()
+        progress._osdmap_changed(old_map, new_map)  # type: ignore[arg-type]
+        return dict(affected)
+
+    result = bench('bulk', bulk, [old_map, new_map], args.runs)
+    if not args.skip_per_osd:
+        expected = bench('per osd', lambda: per_osd_affected_pgs(old_map, new_map, marked),
+                         [old_map, new_map], args.runs)
+        assert result == expected
+    print('%d PGs affected' % sum(len(pgs) for pgs in affected.values()))
+
+
+if __name__ == '__main__':
+    main()
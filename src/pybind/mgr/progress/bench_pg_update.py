@@ -0,0 +1,110 @@
+"""
+Time updating the progress of several recovery events on every pg_progress
+tick, by looking at all of their PGs as the progress module used to, and
+through the PgRecoveryIndex, which only passes on the PGs that changed.
+
+Run from src/pybind/mgr:
+
+    UNITTEST=true PYTHONPATH=..:../../python-common \\
+        python -m progress.bench_pg_update --pgs 10000,100000 --events 4 --changed 0.01
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Set
+from unittest import mock
+
+from progress import module
+from progress.module import PgId, PgRecoveryEvent, PgRecoveryIndex
+
+
+def full_pg_update(pgs: List[PgId], original: Dict[str, int],
+                   pg_to_state: Dict[str, Any], start_epoch: int) -> List[PgId]:
+    """
+    The per tick part of the previous PgRecoveryEvent.pg_update(): every PG
+    of the event is stringified and looked up, and the list of remaining
+    PGs rebuilt.
+    """
+    complete: Set[PgId] = set()
+    complete_accumulate = 0.0
+    for pg in pgs:
+        pg_str = str(pg)
+        try:
+            info = pg_to_state[pg_str]
+        except KeyError:
+            complete.add(pg)
+            continue
+        if info['reported_epoch'] < start_epoch:
+            continue
+        states = info['state'].split("+")
+        if "active" in states and "clean" in states:
+            complete.add(pg)
+        elif info['num_bytes'] != 0:
+            ratio = float(info['num_bytes_recovered'] - original[pg_str]) / info['num_bytes']
+            complete_accumulate += min(max(ratio, 0.0), 1.0)
+    return list(set(pgs) ^ complete)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pgs', default='10000,100000',
+                        help='comma separated PG counts to time')
+    parser.add_argument('--events', type=int, default=4,
+                        help='number of recovery events, each tracking all the PGs of an OSD')
+    parser.add_argument('--share', type=float, default=0.1,
+                        help='fraction of the PGs tracked by each event')
+    parser.add_argument('--changed', type=float, default=0.01,
+                        help='fraction of the PGs changing between ticks')
+    parser.add_argument('--ticks', type=int, default=20)
+    args = parser.parse_args()
+
+    module._module = mock.Mock()  # Event._refresh()
+    log = mock.Mock()
+    rng = random.Random(0)
+
+    print('%8s %12s %12s' % ('pgs', 'full/tick', 'index/tick'))
+    for num_pgs in [int(n) for n in args.pgs.split(',')]:
+        pg_ids = [PgId(1, ps) for ps in range(num_pgs)]
+        pg_to_state: Dict[str, Dict[str, Any]] = {
+            str(pg): {'state': 'active+remapped+backfilling', 'num_bytes': 1 << 30,
+                      'num_bytes_recovered': 0, 'reported_epoch': 10}
+            for pg in pg_ids
+        }
+        tracked = [rng.sample(pg_ids, int(num_pgs * args.share))
+                   for _ in range(args.events)]
+        events = []
+        index = PgRecoveryIndex()
+        for osd, pgs in enumerate(tracked):
+            ev = PgRecoveryEvent('bench', [], list(pgs), [osd], 10, False)
+            ev.pg_update({'pgs': pg_to_state, 'pg_ready': True}, log)
+            index.add(ev, pg_to_state)
+            events.append(ev)
+        original = {pg_str: 0 for pg_str in pg_to_state}
+
+        full = 0.0
+        indexed = 0.0
+        for _ in range(args.ticks):
+            for pg_str in rng.sample(list(pg_to_state), int(num_pgs * args.changed)):
+                info = dict(pg_to_state[pg_str])
+                info['num_bytes_recovered'] += 1 << 20
+                pg_to_state[pg_str] = info
+
+            start = time.monotonic()
+            for pgs in tracked:
+                full_pg_update(pgs, original, pg_to_state, 10)
+            full += time.monotonic() - start
+
+            start = time.monotonic()
+            index.update(pg_to_state)
+            for ev in events:
+                ev.update_progress(log)
+            indexed += time.monotonic() - start
+
+        print('%8d %10.2fms %10.2fms' % (num_pgs, 1000 * full / args.ticks,
+                                         1000 * indexed / args.ticks))
+
+
+if __name__ == '__main__':
+    main()
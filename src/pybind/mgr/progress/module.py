@@ -286,12 +286,18 @@ class PgRecoveryEvent(Event):
     """
 
     def __init__(self, message, refs, which_pgs, which_osds, start_epoch, add_to_ceph_s):
-        # type: (str, List[Any], List[PgId], List[str], int, bool) -> None
+        # type: (str, List[Any], List[PgId], List[int], int, bool) -> None
         super().__init__(str(uuid.uuid4()), message, refs, add_to_ceph_s)
-        self._pgs = which_pgs
+        # the PGs that have not completed yet, by PG id
+        self._pgs = dict((str(pg), pg) for pg in which_pgs)  # type: Dict[str, PgId]
         self._which_osds = which_osds
         self._original_pg_count = len(self._pgs)
-        self._original_bytes_recovered = None  # type: Optional[Dict[PgId, float]]
+        self._original_bytes_recovered = {}  # type: Dict[str, int]
+        # how far along the PGs that are still recovering are, and the sum
+        # of that, so that a progress update does not need to look at the
+        # PGs that did not change
+        self._ratios = {}  # type: Dict[str, float]
+        self._ratio_sum = 0.0
         self._progress = 0.0
 
         self._start_epoch = start_epoch
@@ -301,28 +307,30 @@ class PgRecoveryEvent(Event):
     def which_osds(self):
         return self. _which_osds
 
+    @property
+    def pgs(self):
+        # type: () -> Dict[str, PgId]
+        return self._pgs
+
     def pg_update(self, pg_progress: Dict, log: Any) -> None:
-        # FIXME: O(pg_num) in python
-        # Sanity check to see if there are any missing PGs and to assign
-        # empty array and dictionary if there hasn't been any recovery
+        # Look at each of the PGs of this event in a full pg_progress dump.
+        # Once an event is registered with a PgRecoveryIndex, only the PGs
+        # that changed are passed to pg_changed() instead.
         pg_to_state: Dict[str, Any] = pg_progress["pgs"]
-        pg_ready: bool = pg_progress["pg_ready"]
-
-        if self._original_bytes_recovered is None:
-            self._original_bytes_recovered = {}
-            missing_pgs = []
-            for pg in self._pgs:
-                pg_str = str(pg)
-                if pg_str in pg_to_state:
-                    self._original_bytes_recovered[pg] = \
-                        pg_to_state[pg_str]['num_bytes_recovered']
-                else:
-                    missing_pgs.append(pg)
-            if pg_ready:
-                for pg in missing_pgs:
-                    self._pgs.remove(pg)
-
-        complete_accumulate = 0.0
+        for pg_str in list(self._pgs):
+            self.pg_changed(pg_str, pg_to_state.get(pg_str))
+        self.update_progress(log)
+
+    def pg_changed(self, pg_str, info):
+        # type: (str, Optional[Dict[str, Any]]) -> None
+        if pg_str not in self._pgs:
+            return
+        if info is None:
+            # The PG is gone!  Probably a pool was deleted. Drop it.
+            self._pg_complete(pg_str)
+            return
+        original = self._original_bytes_recovered.setdefault(
+            pg_str, info['num_bytes_recovered'])
 
         # Calculating progress as the number of PGs recovered divided by the
         # original where partially completed PGs count for something
@@ -332,55 +340,57 @@ class PgRecoveryEvent(Event):
         # few-bytes PGs that still need the housekeeping of their recovery
         # to be done. This is subjective...
 
-        complete = set()
-        for pg in self._pgs:
-            pg_str = str(pg)
-            try:
-                info = pg_to_state[pg_str]
-            except KeyError:
-                # The PG is gone!  Probably a pool was deleted. Drop it.
-                complete.add(pg)
-                continue
-            # Only checks the state of each PGs when it's epoch >= the OSDMap's epoch
-            if info['reported_epoch'] < self._start_epoch:
-                continue
-
-            state = info['state']
+        # Only checks the state of each PGs when it's epoch >= the OSDMap's epoch
+        if info['reported_epoch'] < self._start_epoch:
+            self._set_ratio(pg_str, 0.0)
+            return
 
-            states = state.split("+")
+        states = info['state'].split("+")
 
-            if "active" in states and "clean" in states:
-                complete.add(pg)
+        if "active" in states and "clean" in states:
+            self._pg_complete(pg_str)
+        elif info['num_bytes'] == 0:
+            # Empty PGs are considered 0% done until they are
+            # in the correct state.
+            self._set_ratio(pg_str, 0.0)
+        else:
+            recovered = info['num_bytes_recovered']
+            total_bytes = info['num_bytes']
+            if total_bytes > 0:
+                ratio = float(recovered - original) / total_bytes
+                # Since the recovered bytes (over time) could perhaps
+                # exceed the contents of the PG (moment in time), we
+                # must clamp this
+                ratio = min(ratio, 1.0)
+                ratio = max(ratio, 0.0)
             else:
-                if info['num_bytes'] == 0:
-                    # Empty PGs are considered 0% done until they are
-                    # in the correct state.
-                    pass
-                else:
-                    recovered = info['num_bytes_recovered']
-                    total_bytes = info['num_bytes']
-                    if total_bytes > 0:
-                        ratio = float(recovered -
-                                      self._original_bytes_recovered[pg]) / \
-                            total_bytes
-                        # Since the recovered bytes (over time) could perhaps
-                        # exceed the contents of the PG (moment in time), we
-                        # must clamp this
-                        ratio = min(ratio, 1.0)
-                        ratio = max(ratio, 0.0)
-
-                    else:
-                        # Dataless PGs (e.g. containing only OMAPs) count
-                        # as half done.
-                        ratio = 0.5
-                    complete_accumulate += ratio
-
-        self._pgs = list(set(self._pgs) ^ complete)
+                # Dataless PGs (e.g. containing only OMAPs) count
+                # as half done.
+                ratio = 0.5
+            self._set_ratio(pg_str, ratio)
+
+    def _set_ratio(self, pg_str, ratio):
+        # type: (str, float) -> None
+        self._ratio_sum += ratio - self._ratios.get(pg_str, 0.0)
+        if ratio:
+            self._ratios[pg_str] = ratio
+        else:
+            self._ratios.pop(pg_str, None)
+
+    def _pg_complete(self, pg_str):
+        # type: (str) -> None
+        self._set_ratio(pg_str, 0.0)
+        del self._pgs[pg_str]
+
+    def update_progress(self, log):
+        # type: (Any) -> None
+        if not self._ratios:
+            # do not let rounding errors of the running sum accumulate
+            self._ratio_sum = 0.0
         completed_pgs = self._original_pg_count - len(self._pgs)
         completed_pgs = max(completed_pgs, 0)
         try:
-            prog = (completed_pgs + complete_accumulate)\
-                / self._original_pg_count
+            prog = (completed_pgs + self._ratio_sum) / self._original_pg_count
         except ZeroDivisionError:
             prog = 0.0
 
@@ -395,9 +405,111 @@ class PgRecoveryEvent(Event):
         return self._progress
 
 
+class PgRecoveryIndex(object):
+    """
+    The PGs tracked by the PgRecoveryEvents, and the pg_progress entry each
+    of them was last seen with, so that one pass over the PGs updates all
+    the events and only the PGs that changed are passed on to them.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._events = {}  # type: Dict[str, Dict[str, PgRecoveryEvent]]
+        self._seen = {}  # type: Dict[str, Optional[tuple]]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._events)
+
+    @staticmethod
+    def _key(info):
+        # type: (Optional[Dict[str, Any]]) -> Optional[tuple]
+        if info is None:
+            return None
+        return (info['state'], info['reported_epoch'],
+                info['num_bytes'], info['num_bytes_recovered'])
+
+    def add(self, ev, pg_to_state):
+        # type: (PgRecoveryEvent, Dict[str, Dict[str, Any]]) -> None
+        """
+        Track the PGs of an event that was brought up to date with
+        pg_update() on pg_to_state.
+        """
+        for pg_str in ev.pgs:
+            self._events.setdefault(pg_str, {})[ev.id] = ev
+            key = self._key(pg_to_state.get(pg_str))
+            if pg_str not in self._seen:
+                self._seen[pg_str] = key
+            elif self._seen[pg_str] != key:
+                # the other events tracking this PG have not seen that
+                # entry yet: make sure they all get the next one
+                del self._seen[pg_str]
+
+    def remove(self, ev):
+        # type: (PgRecoveryEvent) -> None
+        for pg_str in ev.pgs:
+            events = self._events.get(pg_str)
+            if events is None:
+                continue
+            events.pop(ev.id, None)
+            if not events:
+                self._forget(pg_str)
+
+    def _forget(self, pg_str):
+        # type: (str) -> None
+        del self._events[pg_str]
+        self._seen.pop(pg_str, None)
+
+    def update(self, pg_to_state):
+        # type: (Dict[str, Dict[str, Any]]) -> int
+        """
+        Pass the PGs whose entry in pg_to_state differs from the last one
+        seen to the events tracking them.  Returns the number of changed
+        PGs.
+        """
+        changed = []
+        for pg_str in self._events:
+            info = pg_to_state.get(pg_str)
+            key = self._key(info)
+            if pg_str in self._seen and self._seen[pg_str] == key:
+                continue
+            self._seen[pg_str] = key
+            changed.append((pg_str, info))
+        self._apply(changed)
+        return len(changed)
+
+    def update_changed(self, changed_pgs, removed):
+        # type: (Dict[str, Dict[str, Any]], List[str]) -> int
+        """
+        Like update(), for the result of get_pg_progress_since(): only the
+        PGs that changed, and the ones that were removed, are looked at.
+        """
+        changed = [
+            (pg_str, info) for pg_str, info in changed_pgs.items()
+            if pg_str in self._events
+        ]  # type: List[tuple]
+        changed.extend((pg_str, None) for pg_str in removed
+                       if pg_str in self._events)
+        for pg_str, info in changed:
+            self._seen[pg_str] = self._key(info)
+        self._apply(changed)
+        return len(changed)
+
+    def _apply(self, changed):
+        # type: (List[tuple]) -> None
+        for pg_str, info in changed:
+            events = self._events[pg_str]
+            for ev_id, ev in list(events.items()):
+                ev.pg_changed(pg_str, info)
+                if pg_str not in ev.pgs:
+                    del events[ev_id]
+            if not events:
+                self._forget(pg_str)
+
+
 class PgId(object):
     def __init__(self, pool_id, ps):
-        # type: (str, int) -> None
+        # type: (int, int) -> None
         self.pool_id = pool_id
         self.ps = ps
 
@@ -465,6 +577,8 @@ class Module(MgrModule):
 
         self._events = {}  # type: Dict[str, Union[RemoteEvent, PgRecoveryEvent, GlobalRecoveryEvent]]
         self._completed_events = []  # type: List[GhostEvent]
+        self._pg_index = PgRecoveryIndex()
+        self._pg_progress_version = 0
 
         self._old_osd_map = None  # type: Optional[OSDMap]
 
@@ -492,51 +606,69 @@ class Module(MgrModule):
                     self.get_module_option(opt['name']))
             self.log.debug(' %s = %s', opt['name'], getattr(self, opt['name']))
 
-    def _osd_in_out(self, old_map, old_dump, new_map, osd_id, marked):
-        # type: (OSDMap, Dict, OSDMap, str, str) -> None
-        # A function that will create or complete an event when an
-        # OSD is marked in or out according to the affected PGs
-        affected_pgs = []
+    def _map_pgs_acting(self, osdmap, pool_id, pg_num):
+        # type: (OSDMap, int, int) -> List[List[int]]
+        # The acting sets of the first pg_num PGs of a pool, computed in one
+        # call into the OSDMap instead of one per PG.  PGs (or pools) that do
+        # not exist in this map have an empty acting set, just like
+        # pg_to_up_acting_osds() reports for them.
+        try:
+            by_pgid = osdmap.map_pool_pgs_acting(pool_id)
+        except KeyError:
+            by_pgid = {}
+        return [by_pgid.get("{0}.{1:x}".format(pool_id, ps), [])
+                for ps in range(pg_num)]
+
+    def _osds_in_out(self, old_map, old_dump, new_map, marked_osds):
+        # type: (OSDMap, Dict, OSDMap, List[tuple]) -> None
+        # Create or complete the events of all the OSDs that were marked
+        # in or out between two maps.  Every pool is mapped once per map,
+        # however many OSDs changed, and each PG that moved is attributed
+        # to the marked OSDs that were or are in its acting set.
+        affected_pgs = dict(
+            (osd_id, []) for osd_id, _ in marked_osds
+        )  # type: Dict[int, List[PgId]]
         for pool in old_dump['pools']:
-            pool_id = pool['pool']  # type: str
-            for ps in range(0, pool['pg_num']):
-
-                # Was this OSD affected by the OSD coming in/out?
-                # Compare old and new osds using
-                # data from the json dump
-                old_up_acting = old_map.pg_to_up_acting_osds(pool['pool'], ps)
-                old_osds = set(old_up_acting['acting'])
-                new_up_acting = new_map.pg_to_up_acting_osds(pool['pool'], ps)
-                new_osds = set(new_up_acting['acting'])
-
-                # Check the osd_id being in the acting set for both old
-                # and new maps to cover both out and in cases
-                was_on_out_or_in_osd = osd_id in old_osds or osd_id in new_osds
-                if not was_on_out_or_in_osd:
+            pool_id = pool['pool']
+            old_actings = self._map_pgs_acting(old_map, pool_id, pool['pg_num'])
+            new_actings = self._map_pgs_acting(new_map, pool_id, pool['pg_num'])
+            for ps, (old_acting, new_acting) in enumerate(zip(old_actings, new_actings)):
+                if old_acting == new_acting:
                     continue
 
-                self.log.debug("pool_id, ps = {0}, {1}".format(
-                    pool_id, ps
-                ))
-
-                self.log.debug(
-                    "old_up_acting: {0}".format(json.dumps(old_up_acting, indent=4, sort_keys=True)))
-
-                # Has this OSD been assigned a new location?
+                # Has this PG been assigned a new location?
                 # (it might not be if there is no suitable place to move
                 #  after an OSD is marked in/out)
-                
-                is_relocated = old_osds != new_osds
-                
-                self.log.debug(
-                    "new_up_acting: {0}".format(json.dumps(new_up_acting,
-                                                           indent=4,
-                                                           sort_keys=True)))
-
-                if was_on_out_or_in_osd and is_relocated:
-                    # This PG is now in motion, track its progress
-                    affected_pgs.append(PgId(pool_id, ps))
+                old_osds = set(old_acting)
+                new_osds = set(new_acting)
+                if old_osds == new_osds:
+                    continue
+
+                # Was it on one of the OSDs coming in/out?
+                osd_ids = [osd_id for osd_id in old_osds | new_osds
+                           if osd_id in affected_pgs]
+                if not osd_ids:
+                    continue
+
+                self.log.debug("pool_id, ps = {0}, {1}: acting {2} -> {3}".format(
+                    pool_id, ps, old_acting, new_acting))
+
+                # This PG is now in motion, track its progress
+                pg = PgId(pool_id, ps)
+                for osd_id in osd_ids:
+                    affected_pgs[osd_id].append(pg)
+
+        for osd_id, marked in marked_osds:
+            self._osd_in_out_event(osd_id, marked, affected_pgs[osd_id])
 
+    def _osd_in_out(self, old_map, old_dump, new_map, osd_id, marked):
+        # type: (OSDMap, Dict, OSDMap, int, str) -> None
+        # A function that will create or complete an event when an
+        # OSD is marked in or out according to the affected PGs
+        self._osds_in_out(old_map, old_dump, new_map, [(osd_id, marked)])
+
+    def _osd_in_out_event(self, osd_id, marked, affected_pgs):
+        # type: (int, str, List[PgId]) -> None
         # In the case that we ignored some PGs, log the reason why (we may
         # not end up creating a progress event)
 
@@ -566,8 +698,10 @@ class Module(MgrModule):
                     start_epoch=self.get_osdmap().get_epoch(),
                     add_to_ceph_s=False
                     )
-            r_ev.pg_update(self.get("pg_progress"), self.log)
+            pg_progress = self.get("pg_progress")
+            r_ev.pg_update(pg_progress, self.log)
             self._events[r_ev.id] = r_ev
+            self._pg_index.add(r_ev, pg_progress["pgs"])
 
     def _osdmap_changed(self, old_osdmap, new_osdmap):
         # type: (OSDMap, OSDMap) -> None
@@ -576,6 +710,7 @@ class Module(MgrModule):
 
         old_osds = dict([(o['osd'], o) for o in old_dump['osds']])
 
+        marked_osds = []  # type: List[tuple]
         for osd in new_dump['osds']:
             osd_id = osd['osd']
             new_weight = osd['in']
@@ -584,13 +719,16 @@ class Module(MgrModule):
 
                 if new_weight == 0.0 and old_weight > new_weight:
                     self.log.warning("osd.{0} marked out".format(osd_id))
-                    self._osd_in_out(old_osdmap, old_dump, new_osdmap, osd_id, "out")
+                    marked_osds.append((osd_id, "out"))
                 elif new_weight >= 1.0 and old_weight == 0.0:
                     # Only consider weight>=1.0 as "in" to avoid spawning
                     # individual recovery events on every adjustment
                     # in a gradual weight-in
                     self.log.warning("osd.{0} marked in".format(osd_id))
-                    self._osd_in_out(old_osdmap, old_dump, new_osdmap, osd_id, "in")
+                    marked_osds.append((osd_id, "in"))
+
+        if marked_osds:
+            self._osds_in_out(old_osdmap, old_dump, new_osdmap, marked_osds)
 
     def _pg_state_changed(self):
 
@@ -634,14 +772,22 @@ class Module(MgrModule):
             return
 
         global_event = False
-        data = self.get("pg_progress")
+        if len(self._pg_index):
+            # only fetch the PGs that changed since the last time
+            data = self.get_pg_progress_since(self._pg_progress_version)
+            self._pg_progress_version = data["version"]
+            if data["full"]:
+                changed = self._pg_index.update(data["pgs"])
+            else:
+                changed = self._pg_index.update_changed(data["pgs"], data["removed"])
+            self.log.debug("{0} tracked PGs changed".format(changed))
         for ev_id in list(self._events):
             try:
                 ev = self._events[ev_id]
                 # Check for types of events
                 # we have to update
                 if isinstance(ev, PgRecoveryEvent):
-                    ev.pg_update(data, self.log)
+                    ev.update_progress(self.log)
                     self.maybe_complete(ev)
                 elif isinstance(ev, GlobalRecoveryEvent):
                     global_event = True
@@ -777,6 +923,8 @@ class Module(MgrModule):
                        failed=ev.failed, failure_message=ev.failure_message))
         assert ev.id
         del self._events[ev.id]
+        if isinstance(ev, PgRecoveryEvent):
+            self._pg_index.remove(ev)
         self._prune_completed_events()
         self._dirty = True
 
@@ -847,6 +995,7 @@ class Module(MgrModule):
 
     def clear(self):
         self._events = {}
+        self._pg_index = PgRecoveryIndex()
         self._completed_events = []
         self._dirty = True
         self._save()
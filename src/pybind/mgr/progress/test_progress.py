@@ -47,6 +47,58 @@ class TestPgRecoveryEvent(object):
         self.test_event.pg_update(pg_progress, mock.Mock())
         assert self.test_event._progress == 1.0
 
+    def test_pg_index(self):
+        # two events sharing a PG, updated through the index, follow the
+        # same progress as an event updated from the full dump every time
+        def info(state, recovered, num_bytes=100, epoch=30):
+            return {"state": state, "num_bytes": num_bytes,
+                    "num_bytes_recovered": recovered, "reported_epoch": epoch}
+
+        pgs = {"1.0": info("active+remapped+backfilling", 0),
+               "1.1": info("active+remapped+backfilling", 0),
+               "1.2": info("active+remapped+backfilling", 0, epoch=29),
+               "1.3": info("active+remapped+backfill_wait", 0, num_bytes=0)}
+        first = module.PgRecoveryEvent(None, None, [module.PgId(1, i) for i in range(3)],
+                                       [0], 30, False)
+        second = module.PgRecoveryEvent(None, None, [module.PgId(1, i) for i in range(2, 4)],
+                                        [1], 30, False)
+        full = module.PgRecoveryEvent(None, None, [module.PgId(1, i) for i in range(3)],
+                                      [0], 30, False)
+        index = module.PgRecoveryIndex()
+        for ev in (first, second, full):
+            ev.pg_update({"pgs": pgs, "pg_ready": True}, mock.Mock())
+        index.add(first, pgs)
+        index.add(second, pgs)
+        assert len(index) == 4
+
+        updates = [
+            {"1.0": info("active+remapped+backfilling", 50)},
+            {"1.2": info("active+remapped+backfilling", 20)},
+            {"1.0": info("active+clean", 100), "1.3": info("active+clean", 0, num_bytes=0)},
+            {},
+            {"1.1": None},
+        ]
+        for update in updates:
+            for pg_str, pg_info in update.items():
+                if pg_info is None:
+                    del pgs[pg_str]
+                else:
+                    pgs[pg_str] = pg_info
+            changed = index.update(pgs)
+            assert changed == len(update)
+            for ev in (first, second):
+                ev.update_progress(mock.Mock())
+            full.pg_update({"pgs": pgs, "pg_ready": True}, mock.Mock())
+            assert first.progress == pytest.approx(full.progress)
+
+        assert first.progress == pytest.approx((2 + 0.2) / 3)
+        assert second.progress == pytest.approx((1 + 0.2) / 2)
+        # completed PGs are not tracked anymore
+        assert sorted(index._events) == ["1.2"]
+        index.remove(first)
+        index.remove(second)
+        assert len(index) == 0
+
 
 class OSDMap: 
     
@@ -86,6 +138,12 @@ class OSDMap:
     def pg_to_up_acting_osds(self, pool_id, ps):
         return self._pg_to_up_acting_osds(pool_id, ps)
 
+    def map_pool_pgs_acting(self, pool_id):
+        prefix = str(pool_id) + "."
+        return dict((pg["pg_id"], pg["acting"])
+                    for pg in self._pg_stats["pg_stats"]
+                    if pg["pg_id"].startswith(prefix))
+
 
 class TestModule(object):
     # Testing Module Class
@@ -98,7 +156,7 @@ class TestModule(object):
         module.Module._ceph_get_option = mock.Mock()  # .__init__
         module.Module._configure_logging = lambda *args: ...  # .__init__
         self.test_module = module.Module('module_name', 0, 0)  # so we can see if an event gets created
-        self.test_module.get = mock.Mock() # so we can call pg_update
+        self.test_module.get = mock.MagicMock() # so we can call pg_update
         self.test_module._complete = mock.Mock() # we want just to see if this event gets called
         self.test_module.get_osdmap = mock.Mock() # so that self.get_osdmap().get_epoch() works
         module._module = mock.Mock() # so that Event.refresh() works
@@ -172,3 +230,73 @@ class TestModule(object):
         assert self.test_module._complete.call_count == 1
         # check if a PgRecovery Event was created and pg_update gets triggered
         assert module.PgRecoveryEvent.pg_update.call_count == 2
+
+    def test_osds_in_out_single_pass(self):
+        # several OSDs marked out in the same epoch: every pool is mapped
+        # once per map, and each OSD gets an event for its own PGs
+        def pg(pg_id, acting):
+            return {"pg_id": pg_id, "up_primary": acting[0],
+                    "acting_primary": acting[0], "up": acting, "acting": acting}
+
+        old_pg_stats = {"pg_stats": [
+            pg("1.0", [0, 1]), pg("1.1", [1, 2]), pg("1.2", [2, 3]),
+            pg("2.0", [0, 3]), pg("2.a", [4, 5]),
+        ]}
+        new_pg_stats = {"pg_stats": [
+            pg("1.0", [2, 3]), pg("1.1", [2, 1]), pg("1.2", [2, 3]),
+            pg("2.0", [3, 4]), pg("2.a", [5, 4]),
+        ]}
+        dump = {"pools": [{"pool": 1, "pg_num": 3}, {"pool": 2, "pg_num": 11}]}
+        old_map = OSDMap(dump, old_pg_stats)
+        new_map = OSDMap(dump, new_pg_stats)
+        old_map.map_pool_pgs_acting = mock.Mock(wraps=old_map.map_pool_pgs_acting)
+        new_map.map_pool_pgs_acting = mock.Mock(wraps=new_map.map_pool_pgs_acting)
+
+        self.test_module._osds_in_out(old_map, dump, new_map,
+                                      [(0, "out"), (1, "out"), (5, "out")])
+
+        assert old_map.map_pool_pgs_acting.call_count == 2
+        assert new_map.map_pool_pgs_acting.call_count == 2
+        events = dict((ev.which_osds[0], ev) for ev in self.test_module._events.values())
+        # 1.1 and 2.a only changed the order of their acting set, and
+        # nothing moved off osd.5
+        assert sorted(events) == [0, 1]
+        assert [str(p) for p in events[0]._pgs] == ["1.0", "2.0"]
+        assert [str(p) for p in events[1]._pgs] == ["1.0"]
+
+    def test_osd_in_out_removed_pool(self):
+        old_pg_stats = {"pg_stats": [{"pg_id": "1.0", "up_primary": 3,
+                                      "acting_primary": 3, "up": [3, 0],
+                                      "acting": [3, 0]}]}
+        dump = {"pools": [{"pool": 1, "pg_num": 1}]}
+        old_map = OSDMap(dump, old_pg_stats)
+        new_map = OSDMap({"pools": []}, {"pg_stats": []})
+        new_map.map_pool_pgs_acting = mock.Mock(side_effect=KeyError(1))
+        self.test_module._osd_in_out(old_map, dump, new_map, 3, "out")
+        assert len(self.test_module._events) == 1
+
+    def test_process_pg_summary_changed_only(self):
+        def info(state):
+            return {"state": state, "num_bytes": 10, "num_bytes_recovered": 0,
+                    "reported_epoch": 30}
+
+        ev = module.PgRecoveryEvent("ev", [], [module.PgId(1, i) for i in range(3)],
+                                    [0], 30, False)
+        self.test_module._events[ev.id] = ev
+        self.test_module._pg_index.add(ev, {})
+        self.test_module._pg_state_changed = mock.Mock()
+        self.test_module.get_pg_progress_since = mock.Mock(side_effect=[
+            {"version": 10, "full": True, "removed": [], "pg_ready": True,
+             "pgs": dict((pg, info("active+remapped+backfilling"))
+                         for pg in ["1.0", "1.1", "1.2", "2.0"])},
+            {"version": 12, "full": False, "removed": ["1.2"], "pg_ready": True,
+             "pgs": {"1.0": info("active+clean"), "2.0": info("active+clean")}},
+        ])
+        self.test_module._process_pg_summary()
+        assert ev.progress == 0.0
+        self.test_module._process_pg_summary()
+        assert self.test_module.get_pg_progress_since.call_args_list == [
+            mock.call(0), mock.call(10)]
+        assert list(ev.pgs) == ["1.1"]
+        assert ev.progress == pytest.approx(2 / 3)
+        assert len(self.test_module._pg_index) == 1
@@ -1,4 +1,5 @@
 import cherrypy
+from cherrypy.lib.httputil import HeaderMap
 import yaml
 from collections import defaultdict
 import json
@@ -7,8 +8,14 @@ import os
 import re
 import threading
 import time
+import copy
 import enum
+import gzip
+import hashlib
+import io
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
 from tempfile import NamedTemporaryFile
 
 from mgr_module import CLIReadCommand, MgrModule, MgrStandbyModule, PG_STATES, Option, ServiceInfoT, HandleCommandResult, CLIWriteCommand
@@ -16,7 +23,7 @@ from mgr_util import get_default_addr, profile_method, build_url
 from orchestrator import OrchestratorClientMixin, raise_if_exception, OrchestratorError
 from rbd import RBD
 
-from typing import DefaultDict, Optional, Dict, Any, Set, cast, Tuple, Union, List, Callable, IO
+from typing import DefaultDict, Optional, Dict, Any, Set, cast, Tuple, Union, List, Callable, Container, IO
 LabelValues = Tuple[str, ...]
 Number = Union[int, float]
 MetricValue = Dict[LabelValues, Number]
@@ -122,6 +129,17 @@ HEALTH_CHECKS = [
 
 HEALTHCHECK_DETAIL = ('name', 'severity')
 
+MGR_MODULE_CALL = ('module', 'call', 'name')
+
+# Collectors run by Module.collect(), each fills the metrics of its
+# Module.get_<name>() method.  They refresh on every scrape unless an interval
+# is configured for them with the `collector_intervals` option.
+COLLECTORS = ['health', 'df', 'osd_blocklisted_entries', 'pool_stats', 'fs',
+              'osd_stats', 'quorum_status', 'mgr_status',
+              'metadata_and_osd_status', 'pg_status', 'pool_repaired_objects',
+              'num_objects', 'all_daemon_health_metrics', 'smb_metadata',
+              'perf_counters', 'rbd_stats', 'mgr_module_perf']
+
 
 class Severity(enum.Enum):
     ok = "HEALTH_OK"
@@ -310,6 +328,32 @@ class HealthHistory:
         return yaml.safe_dump(self.as_dict(), explicit_start=True, default_flow_style=False)
 
 
+# Must be kept in sync with promethize() in src/exporter/util.cc
+def promethize(path: str) -> str:
+    ''' replace illegal metric name characters '''
+    result = re.sub(r'[./\s]|::', '_', path).replace('+', '_plus')
+
+    # Hyphens usually turn into underscores, unless they are
+    # trailing
+    if result.endswith("-"):
+        result = result[0:-1] + "_minus"
+    else:
+        result = result.replace("-", "_")
+
+    return "ceph_{0}".format(result)
+
+
+def floatstr(value: float) -> str:
+    ''' represent as Go-compatible float '''
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
 class Metric(object):
     def __init__(self, mtype: str, name: str, desc: str, labels: Optional[LabelValues] = None) -> None:
         self.mtype = mtype
@@ -317,66 +361,63 @@ class Metric(object):
         self.desc = desc
         self.labelnames = labels  # tuple if present
         self.value: Dict[LabelValues, Number] = {}
+        # the exposition name, header and per labelset sample prefixes only
+        # depend on immutable attributes, so format them once and reuse them
+        # on every scrape
+        self.expname = promethize(name)
+        self.header = '\n# HELP {name} {desc}\n# TYPE {name} {mtype}'.format(
+            name=self.expname,
+            desc=desc,
+            mtype=mtype,
+        )
+        self._prefixes: Dict[LabelValues, str] = {}
 
     def clear(self) -> None:
         self.value = {}
 
+    def empty_copy(self) -> 'Metric':
+        new = copy.copy(self)
+        new.value = {}
+        new._prefixes = {}
+        return new
+
     def set(self, value: Number, labelvalues: Optional[LabelValues] = None) -> None:
         # labelvalues must be a tuple
         labelvalues = labelvalues or ('',)
         self.value[labelvalues] = value
 
-    def str_expfmt(self) -> str:
-
-        # Must be kept in sync with promethize() in src/exporter/util.cc
-        def promethize(path: str) -> str:
-            ''' replace illegal metric name characters '''
-            result = re.sub(r'[./\s]|::', '_', path).replace('+', '_plus')
-
-            # Hyphens usually turn into underscores, unless they are
-            # trailing
-            if result.endswith("-"):
-                result = result[0:-1] + "_minus"
-            else:
-                result = result.replace("-", "_")
-
-            return "ceph_{0}".format(result)
-
-        def floatstr(value: float) -> str:
-            ''' represent as Go-compatible float '''
-            if value == float('inf'):
-                return '+Inf'
-            if value == float('-inf'):
-                return '-Inf'
-            if math.isnan(value):
-                return 'NaN'
-            return repr(float(value))
-
-        name = promethize(self.name)
-        expfmt = '''
-# HELP {name} {desc}
-# TYPE {name} {mtype}'''.format(
-            name=name,
-            desc=self.desc,
-            mtype=self.mtype,
-        )
+    def _prefix(self, labelvalues: LabelValues) -> str:
+        if self.labelnames:
+            labels_list = zip(self.labelnames, labelvalues)
+            labels = ','.join('%s="%s"' % (k, v) for k, v in labels_list)
+        else:
+            labels = ''
+        if labels:
+            return '\n{name}{{{labels}}} '.format(name=self.expname, labels=labels)
+        return '\n{name} '.format(name=self.expname)
 
+    def write_expfmt(self, out: IO[str]) -> None:
+        """
+        Write the metric in the text exposition format to ``out``.
+        """
+        prefixes = self._prefixes
+        if len(prefixes) > 2 * len(self.value) + 16:
+            # drop the prefixes of label sets that went away (e.g. removed
+            # daemons or pools) instead of keeping them forever
+            prefixes.clear()
+        write = out.write
+        write(self.header)
         for labelvalues, value in self.value.items():
-            if self.labelnames:
-                labels_list = zip(self.labelnames, labelvalues)
-                labels = ','.join('%s="%s"' % (k, v) for k, v in labels_list)
-            else:
-                labels = ''
-            if labels:
-                fmtstr = '\n{name}{{{labels}}} {value}'
-            else:
-                fmtstr = '\n{name} {value}'
-            expfmt += fmtstr.format(
-                name=name,
-                labels=labels,
-                value=floatstr(value),
-            )
-        return expfmt
+            prefix = prefixes.get(labelvalues)
+            if prefix is None:
+                prefix = prefixes[labelvalues] = self._prefix(labelvalues)
+            write(prefix)
+            write(floatstr(value))
+
+    def str_expfmt(self) -> str:
+        out = io.StringIO()
+        self.write_expfmt(out)
+        return out.getvalue()
 
     def group_by(
         self,
@@ -482,6 +523,11 @@ class MetricCounter(Metric):
     def clear(self) -> None:
         pass  # Skip calls to clear as we want to keep the counters here.
 
+    def empty_copy(self) -> 'Metric':
+        new = super(MetricCounter, self).empty_copy()
+        new.value = defaultdict(lambda: 0)
+        return new
+
     def set(self,
             value: Number,
             labelvalues: Optional[LabelValues] = None) -> None:
@@ -496,6 +542,107 @@ class MetricCounter(Metric):
         self.value[labelvalues] += value
 
 
+class MetricShard(Dict[str, Metric]):
+    """
+    The metrics filled by one collector.
+
+    Metrics declared by the module are copied into the shard the first time
+    the collector uses them, so that collectors running concurrently never
+    share a Metric.
+    """
+
+    def __init__(self, templates: Dict[str, Metric]) -> None:
+        super(MetricShard, self).__init__()
+        self.templates = templates
+
+    def __missing__(self, key: str) -> Metric:
+        metric = self.templates[key].empty_copy()
+        self[key] = metric
+        return metric
+
+    def __contains__(self, key: object) -> bool:
+        return super(MetricShard, self).__contains__(key) or key in self.templates
+
+    def __delitem__(self, key: str) -> None:
+        # a declared metric dropped by a collector is dropped for good
+        self.templates.pop(key, None)
+        self.pop(key, None)
+
+    def clear_values(self) -> None:
+        for metric in self.values():
+            metric.clear()
+
+
+class MetricCollector(object):
+    def __init__(self, name: str, templates: Dict[str, Metric]) -> None:
+        self.name = name
+        self.method = 'get_{}'.format(name)
+        self.metrics = MetricShard(templates)
+        self.interval = 0.0
+        self.last_run = -math.inf
+        self.duration = 0.0
+
+    def due(self, now: float) -> bool:
+        return now - self.last_run >= self.interval
+
+
+class MetricsPayload(object):
+    """
+    A collected exposition, together with its gzip compressed variant and
+    the validators for conditional requests, all computed once per
+    collection instead of once per scrape.
+    """
+
+    def __init__(self, text: str, compresslevel: int = 6) -> None:
+        self.text = text
+        self.data = text.encode('utf-8')
+        self.gzipped = gzip.compress(self.data, compresslevel=compresslevel)
+        # weak, as both the identity and the gzip encoding share it
+        self.etag = 'W/"{}"'.format(hashlib.sha256(self.data).hexdigest()[:32])
+        self.modified = int(time.time())
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+    def not_modified(self, headers: HeaderMap) -> bool:
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            etags = [t.strip() for t in if_none_match.split(',')]
+            # weak comparison, ignoring the W/ prefixes
+            return '*' in etags or self.etag[2:] in (
+                t[2:] if t.startswith('W/') else t for t in etags)
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.modified <= since
+        return False
+
+    def accepts_gzip(self, headers: HeaderMap) -> bool:
+        for encoding in headers.elements('Accept-Encoding'):
+            if encoding.value.lower() in ('gzip', 'x-gzip', '*'):
+                return encoding.qvalue > 0
+        return False
+
+    def respond(self, request_headers: HeaderMap) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Return the status, headers and body to answer a request for the
+        metrics with.
+        """
+        headers = {
+            'Content-Type': 'text/plain',
+            'ETag': self.etag,
+            'Last-Modified': self.last_modified,
+            'Vary': 'Accept-Encoding',
+        }
+        if self.not_modified(request_headers):
+            return 304, headers, b''
+        if self.accepts_gzip(request_headers):
+            headers['Content-Encoding'] = 'gzip'
+            return 200, headers, self.gzipped
+        return 200, headers, self.data
+
+
 class MetricCollectionThread(threading.Thread):
     def __init__(self, module: 'Module') -> None:
         self.mod = module
@@ -523,20 +670,25 @@ class MetricCollectionThread(threading.Thread):
 
                 sleep_time = self.mod.scrape_interval - duration
                 if sleep_time < 0:
+                    slowest = self.mod.slowest_collector()
                     self.mod.log.warning(
                         'Collecting data took more time than configured scrape interval. '
                         'This possibly results in stale data. Please check the '
                         '`stale_cache_strategy` configuration option. '
                         'Collecting data took {:.2f} seconds but scrape interval is configured '
-                        'to be {:.0f} seconds.'.format(
+                        'to be {:.0f} seconds. The slowest collector was {} with {:.2f} '
+                        'seconds.'.format(
                             duration,
                             self.mod.scrape_interval,
+                            slowest.name,
+                            slowest.duration,
                         )
                     )
                     sleep_time = 0
 
+                payload = MetricsPayload(data)
                 with self.mod.collect_lock:
-                    self.mod.collect_cache = data
+                    self.mod.collect_cache = payload
                     self.mod.collect_time = duration
 
                 self.event.wait(sleep_time)
@@ -608,6 +760,27 @@ class Module(MgrModule, OrchestratorClientMixin):
             desc='Do not include perf-counters in the metrics output',
             long_desc='Gathering perf-counters from a single Prometheus exporter can degrade ceph-mgr performance, especially in large clusters. Instead, Ceph-exporter daemons are now used by default for perf-counter gathering. This should only be disabled when no ceph-exporters are deployed.',
             runtime=True
+        ),
+        Option(
+            name='collector_threads',
+            type='int',
+            default=4,
+            min=1,
+            desc='Number of metric collectors to run concurrently',
+            runtime=True
+        ),
+        Option(
+            name='collector_intervals',
+            type='str',
+            default='',
+            desc='Refresh intervals of individual metric collectors',
+            long_desc='Comma separated list of <collector>=<seconds>, e.g. '
+                      '"metadata_and_osd_status=300,df=60". Collectors without an '
+                      'interval refresh on every scrape, the others export the values '
+                      'of their last run in between. See the '
+                      'ceph_prometheus_collector_duration_seconds metric for the time '
+                      'each collector takes.',
+            runtime=True
         )
     ]
 
@@ -618,14 +791,18 @@ class Module(MgrModule, OrchestratorClientMixin):
         super(Module, self).__init__(*args, **kwargs)
         self.key_file: IO[bytes]
         self.cert_file: IO[bytes]
-        self.metrics = self._setup_static_metrics()
+        self.module_metrics = self._setup_static_metrics()
+        self.collectors = {name: MetricCollector(name, self.module_metrics)
+                           for name in COLLECTORS}
+        # the shard of the collector running in the current thread
+        self.collector_local = threading.local()
         self.shutdown_event = threading.Event()
         self.collect_lock = threading.Lock()
         self.collect_time = 0.0
         self.scrape_interval: float = 15.0
         self.cache = True
         self.stale_cache_strategy: str = self.STALE_CACHE_FAIL
-        self.collect_cache: Optional[str] = None
+        self.collect_cache: Optional[MetricsPayload] = None
         self.rbd_stats = {
             'pools': {},
             'pools_refresh_time': 0,
@@ -649,6 +826,10 @@ class Module(MgrModule, OrchestratorClientMixin):
         self.metrics_thread = MetricCollectionThread(_global_instance)
         self.health_history = HealthHistory(self)
 
+    @property
+    def metrics(self) -> Dict[str, Metric]:
+        return getattr(self.collector_local, 'metrics', self.module_metrics)
+
     def _setup_static_metrics(self) -> Dict[str, Metric]:
         metrics = {}
         metrics['health_status'] = Metric(
@@ -888,6 +1069,24 @@ class Module(MgrModule, OrchestratorClientMixin):
                 check.description,
             )
 
+        for path, mtype, desc in (
+                ('mgr_module_call_count', 'counter',
+                 'Calls of mgr modules into ceph-mgr (get) or other modules (remote)'),
+                ('mgr_module_call_bytes', 'counter',
+                 'Bytes of JSON deserialized by calls of mgr modules'),
+                ('mgr_module_call_seconds_sum', 'counter',
+                 'Seconds spent in calls of mgr modules'),
+                ('mgr_module_call_seconds_max', 'gauge',
+                 'Longest call of mgr modules, in seconds')):
+            metrics[path] = Metric(mtype, path, desc, MGR_MODULE_CALL)
+
+        metrics['prometheus_collector_duration_seconds'] = Metric(
+            'gauge',
+            'prometheus_collector_duration_seconds',
+            'Seconds the last run of a metric collector took',
+            ('collector',)
+        )
+
         return metrics
 
     def orch_is_available(self) -> bool:
@@ -1666,7 +1865,7 @@ class Module(MgrModule, OrchestratorClientMixin):
 
         self.metrics.update(new_metrics)
 
-    def get_collect_time_metrics(self) -> None:
+    def get_collect_time_metrics(self, skipped: Container[str] = ()) -> None:
         sum_metric = self.metrics.get('prometheus_collect_duration_seconds_sum')
         count_metric = self.metrics.get('prometheus_collect_duration_seconds_count')
         if sum_metric is None:
@@ -1689,7 +1888,7 @@ class Module(MgrModule, OrchestratorClientMixin):
         # decorator.
         for method_name, method in Module.__dict__.items():
             duration = getattr(method, '_execution_duration', None)
-            if duration is not None:
+            if duration is not None and method_name not in skipped:
                 cast(MetricCounter, sum_metric).add(duration, (method_name,))
                 cast(MetricCounter, count_metric).add(1, (method_name,))
 
@@ -1758,6 +1957,17 @@ class Module(MgrModule, OrchestratorClientMixin):
                     self.metrics[path].set(value, labels)
         self.add_fixed_name_metrics()
 
+    @profile_method()
+    def get_mgr_module_perf(self) -> None:
+        for module, calls in self.get_all_module_perf().items():
+            for kind, stats in calls.items():
+                for name, s in stats.items():
+                    labels = (module, kind, name)
+                    self.metrics['mgr_module_call_count'].set(s['count'], labels)
+                    self.metrics['mgr_module_call_bytes'].set(s['bytes'], labels)
+                    self.metrics['mgr_module_call_seconds_sum'].set(s['seconds'], labels)
+                    self.metrics['mgr_module_call_seconds_max'].set(s['max_seconds'], labels)
+
     @profile_method()
     def get_smb_metadata(self) -> None:
         try:
@@ -1820,39 +2030,100 @@ class Module(MgrModule, OrchestratorClientMixin):
         except Exception as e:
             self.log.error(f"Failed to get SMB metadata: {str(e)}")
 
+    def collector_intervals(self) -> Dict[str, float]:
+        intervals = {}
+        value = cast(str, self.get_module_option('collector_intervals'))
+        for item in filter(None, (i.strip() for i in value.split(','))):
+            name, _, seconds = item.partition('=')
+            name = name.strip()
+            if name not in self.collectors:
+                self.log.warning('ignoring interval of unknown collector %s', name)
+                continue
+            try:
+                intervals[name] = float(seconds)
+            except ValueError:
+                self.log.warning('ignoring invalid interval of collector %s: %s', name, seconds)
+        return intervals
+
+    def run_collector(self, collector: MetricCollector) -> None:
+        self.collector_local.metrics = collector.metrics
+        try:
+            start = time.monotonic()
+            collector.metrics.clear_values()
+            getattr(self, collector.method)()
+            collector.duration = time.monotonic() - start
+        finally:
+            del self.collector_local.metrics
+
+    def slowest_collector(self) -> MetricCollector:
+        return max(self.collectors.values(), key=lambda c: c.duration)
+
+    def write_metrics(self, out: IO[str]) -> None:
+        # merge the module's own metrics and the collectors' shards, keeping
+        # the order in which the metrics were declared
+        merged: Dict[str, List[Metric]] = {k: [m] for k, m in self.module_metrics.items()}
+        for collector in self.collectors.values():
+            for k, m in collector.metrics.items():
+                merged.setdefault(k, []).append(m)
+        for metrics in merged.values():
+            with_values = [m for m in metrics if m.value]
+            if len(with_values) > 1:
+                metric = with_values[0].empty_copy()
+                for m in with_values:
+                    metric.value.update(m.value)
+            elif with_values:
+                metric = with_values[0]
+            else:
+                metric = metrics[0]
+            metric.write_expfmt(out)
+
     @profile_method(True)
     def collect(self) -> str:
         # Clear the metrics before scraping
-        for k in self.metrics.keys():
-            self.metrics[k].clear()
-
-        self.get_health()
-        self.get_df()
-        self.get_osd_blocklisted_entries()
-        self.get_pool_stats()
-        self.get_fs()
-        self.get_osd_stats()
-        self.get_quorum_status()
-        self.get_mgr_status()
-        self.get_metadata_and_osd_status()
-        self.get_pg_status()
-        self.get_pool_repaired_objects()
-        self.get_num_objects()
-        self.get_all_daemon_health_metrics()
-        self.get_smb_metadata()
-
-        if not self.get_module_option('exclude_perf_counters'):
-            self.get_perf_counters()
-        self.get_rbd_stats()
-
-        self.get_collect_time_metrics()
+        for k in self.module_metrics.keys():
+            self.module_metrics[k].clear()
+
+        intervals = self.collector_intervals()
+        exclude_perf_counters = self.get_module_option('exclude_perf_counters')
+        now = time.monotonic()
+        due = []
+        for collector in self.collectors.values():
+            collector.interval = intervals.get(collector.name, 0.0)
+            if collector.name == 'perf_counters' and exclude_perf_counters:
+                collector.metrics.clear_values()
+                continue
+            if collector.due(now):
+                due.append(collector)
+
+        threads = cast(int, self.get_module_option('collector_threads'))
+        with ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+            futures = [executor.submit(self.run_collector, c) for c in due]
+        error = None
+        for collector, future in zip(due, futures):
+            try:
+                future.result()
+            except Exception as e:
+                # retry on the next scrape, after failing this one
+                error = error or e
+                continue
+            collector.last_run = now
+        if error is not None:
+            raise error
+
+        for collector in self.collectors.values():
+            self.metrics['prometheus_collector_duration_seconds'].set(
+                collector.duration, (collector.name,))
+        self.get_collect_time_metrics(
+            skipped=[c.method for c in self.collectors.values() if c not in due])
 
         # Return formatted metrics and clear no longer used data
-        _metrics = [m.str_expfmt() for m in self.metrics.values()]
-        for k in self.metrics.keys():
-            self.metrics[k].clear()
+        out = io.StringIO()
+        self.write_metrics(out)
+        for k in self.module_metrics.keys():
+            self.module_metrics[k].clear()
+        out.write('\n')
 
-        return ''.join(_metrics) + '\n'
+        return out.getvalue()
 
     @CLIReadCommand('prometheus file_sd_config')
     def get_file_sd_config(self) -> Tuple[int, str, str]:
@@ -1972,14 +2243,14 @@ class Module(MgrModule, OrchestratorClientMixin):
 </html>'''
 
             @cherrypy.expose
-            def metrics(self) -> Optional[str]:
+            def metrics(self) -> Union[str, bytes, None]:
                 # Lock the function execution
                 assert isinstance(_global_instance, Module)
                 with _global_instance.collect_lock:
                     return self._metrics(_global_instance)
 
             @staticmethod
-            def _metrics(instance: 'Module') -> Optional[str]:
+            def _metrics(instance: 'Module') -> Union[str, bytes, None]:
                 if not self.cache:
                     self.log.debug('Cache disabled, collecting and returning without cache')
                     cherrypy.response.headers['Content-Type'] = 'text/plain'
@@ -1989,10 +2260,14 @@ class Module(MgrModule, OrchestratorClientMixin):
                 if not instance.collect_cache:
                     raise cherrypy.HTTPError(503, 'No cached data available yet')
 
-                def respond() -> Optional[str]:
+                def respond() -> bytes:
                     assert isinstance(instance, Module)
-                    cherrypy.response.headers['Content-Type'] = 'text/plain'
-                    return instance.collect_cache
+                    assert instance.collect_cache is not None
+                    status, headers, body = instance.collect_cache.respond(
+                        cherrypy.request.headers)
+                    cherrypy.response.status = status
+                    cherrypy.response.headers.update(headers)
+                    return body
 
                 if instance.collect_time < instance.scrape_interval:
                     # Respond if cache isn't stale
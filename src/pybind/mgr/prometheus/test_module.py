@@ -1,7 +1,12 @@
+import gzip
+import threading
+from email.utils import formatdate
 from typing import Dict
-from unittest import TestCase
+from unittest import TestCase, mock
 
-from prometheus.module import Metric, LabelValues, Number
+from cherrypy.lib.httputil import HeaderMap
+
+from prometheus.module import COLLECTORS, Metric, MetricsPayload, LabelValues, Module, Number
 
 
 class MetricGroupTest(TestCase):
@@ -91,3 +96,154 @@ ceph_disk_occupation_display{ceph_daemon="osd.5+osd.6",device="/dev/dm-1",instan
         with self.assertRaises(AssertionError) as cm:
             m.group_by(["foo"], {"bar": "not callable str"})
         self.assertEqual(str(cm.exception), "joins must be callable")
+
+
+class MetricExpfmtTest(TestCase):
+    def test_str_expfmt(self):
+        m = Metric("gauge", "osd.op-", "desc", labels=("ceph_daemon",))
+        m.set(1, ("osd.0",))
+        m.set(float('inf'), ("osd.1",))
+        self.assertEqual(
+            m.str_expfmt(),
+            '\n# HELP ceph_osd_op_minus desc'
+            '\n# TYPE ceph_osd_op_minus gauge'
+            '\nceph_osd_op_minus{ceph_daemon="osd.0"} 1.0'
+            '\nceph_osd_op_minus{ceph_daemon="osd.1"} +Inf')
+
+    def test_str_expfmt__no_labels(self):
+        m = Metric("counter", "name", "desc")
+        m.set(2)
+        self.assertEqual(m.str_expfmt(),
+                         '\n# HELP ceph_name desc\n# TYPE ceph_name counter\nceph_name 2.0')
+
+    def test_write_expfmt__reuses_prefixes(self):
+        m = Metric("gauge", "name", "desc", labels=("ceph_daemon",))
+        m.set(1, ("osd.0",))
+        first = m.str_expfmt()
+        prefix = m._prefixes[("osd.0",)]
+        m.clear()
+        m.set(1, ("osd.0",))
+        self.assertEqual(m.str_expfmt(), first)
+        self.assertIs(m._prefixes[("osd.0",)], prefix)
+
+    def test_write_expfmt__drops_stale_prefixes(self):
+        m = Metric("gauge", "name", "desc", labels=("ceph_daemon",))
+        for i in range(100):
+            m.set(1, ("osd.%d" % i,))
+        m.str_expfmt()
+        self.assertEqual(len(m._prefixes), 100)
+        m.clear()
+        m.set(1, ("osd.0",))
+        m.str_expfmt()
+        self.assertEqual(list(m._prefixes), [("osd.0",)])
+
+
+class CollectTest(TestCase):
+    def setUp(self):
+        self.module = Module('prometheus', 0, 0)
+        self.options = {
+            'collector_threads': 4,
+            'collector_intervals': '',
+            'exclude_perf_counters': True,
+        }
+        self.module.get_module_option = mock.Mock(side_effect=self.options.get)
+        self.calls = []
+        self.barrier = threading.Barrier(2, timeout=10)
+        for name in COLLECTORS:
+            setattr(self.module, 'get_{}'.format(name), mock.Mock())
+        self.module.get_health.side_effect = self.get_health
+        self.module.get_df.side_effect = self.get_df
+
+    def get_health(self):
+        self.calls.append('health')
+        self.barrier.wait()
+        self.module.metrics['health_status'].set(0)
+
+    def get_df(self):
+        self.calls.append('df')
+        self.barrier.wait()
+        self.module.metrics['cluster_total_bytes'].set(len(self.calls))
+
+    def test_collectors_run_concurrently(self):
+        # both collectors wait for each other, they would time out if they
+        # ran one after the other
+        out = self.module.collect()
+        self.assertIn('\nceph_health_status 0.0', out)
+        self.assertIn('\nceph_cluster_total_bytes 2.0', out)
+        self.assertEqual(out.count('# TYPE ceph_health_status '), 1)
+        for name in COLLECTORS:
+            self.assertIn('ceph_prometheus_collector_duration_seconds{collector="%s"}' % name,
+                          out)
+        self.module.get_perf_counters.assert_not_called()
+
+    def test_collector_interval(self):
+        self.options['collector_intervals'] = 'df=3600,unknown=1'
+        self.module.collect()
+        self.barrier = threading.Barrier(1)
+        out = self.module.collect()
+        self.assertEqual(self.calls, ['health', 'df', 'health'])
+        # the values of the last run are exported until the next one
+        self.assertIn('\nceph_cluster_total_bytes 2.0', out)
+
+    def test_failed_collector_fails_the_scrape(self):
+        self.barrier = threading.Barrier(1)
+        self.module.get_fs.side_effect = RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            self.module.collect()
+        self.module.get_fs.side_effect = None
+        self.module.collect()
+        self.assertEqual(self.module.get_fs.call_count, 2)
+
+    def test_dropped_metric_stays_dropped(self):
+        self.barrier = threading.Barrier(1)
+
+        def get_health():
+            del self.module.metrics['healthcheck_slow_ops']
+        self.module.get_health.side_effect = get_health
+        out = self.module.collect()
+        self.assertNotIn('ceph_healthcheck_slow_ops', out)
+        self.module.get_health.side_effect = None
+        self.assertNotIn('ceph_healthcheck_slow_ops', self.module.collect())
+
+
+class MetricsPayloadTest(TestCase):
+    def setUp(self):
+        self.payload = MetricsPayload('\n# HELP ceph_name desc\n# TYPE ceph_name gauge\nceph_name 1.0\n')
+
+    def request(self, **headers):
+        h = HeaderMap()
+        for k, v in headers.items():
+            h[k.replace('_', '-')] = v
+        return self.payload.respond(h)
+
+    def test_identity(self):
+        status, headers, body = self.request()
+        self.assertEqual(status, 200)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.payload.text.encode())
+        self.assertEqual(headers['ETag'], self.payload.etag)
+
+    def test_gzip(self):
+        status, headers, body = self.request(Accept_Encoding='deflate, gzip;q=0.8')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), self.payload.data)
+
+    def test_gzip_refused(self):
+        _, headers, _ = self.request(Accept_Encoding='gzip;q=0')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_if_none_match(self):
+        etag = self.payload.etag
+        self.assertEqual(self.request(If_None_Match=etag)[0], 304)
+        self.assertEqual(self.request(If_None_Match='"other", ' + etag[2:])[0], 304)
+        self.assertEqual(self.request(If_None_Match='"other"')[0], 200)
+        # If-None-Match takes precedence over If-Modified-Since
+        self.assertEqual(self.request(If_None_Match='"other"',
+                                      If_Modified_Since=self.payload.last_modified)[0], 200)
+
+    def test_if_modified_since(self):
+        self.assertEqual(self.request(If_Modified_Since=self.payload.last_modified)[0], 304)
+        earlier = formatdate(self.payload.modified - 10, usegmt=True)
+        self.assertEqual(self.request(If_Modified_Since=earlier)[0], 200)
+        self.assertEqual(self.request(If_Modified_Since='garbage')[0], 200)
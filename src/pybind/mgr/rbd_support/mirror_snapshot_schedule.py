@@ -9,7 +9,7 @@ from threading import Condition, Lock, Thread
 from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 from .common import get_rbd_pools
-from .schedule import LevelSpec, Schedules
+from .schedule import LevelSpec, ScheduleQueue, Schedules
 
 
 def namespace_validator(ioctx: rados.Ioctx) -> None:
@@ -380,8 +380,7 @@ class MirrorSnapshotScheduleHandler:
                 ex, traceback.format_exc()))
 
     def init_schedule_queue(self) -> None:
-        # schedule_time => image_spec
-        self.queue: Dict[str, List[ImageSpec]] = {}
+        self.queue: ScheduleQueue[ImageSpec] = ScheduleQueue()
         # pool_id => {namespace => image_id}
         self.images: Dict[str, Dict[str, Dict[str, str]]] = {}
         self.schedules = Schedules(self)
@@ -404,7 +403,7 @@ class MirrorSnapshotScheduleHandler:
             if not self.schedules:
                 self.log.debug("MirrorSnapshotScheduleHandler: no schedules")
                 self.images = {}
-                self.queue = {}
+                self.queue.clear()
                 self.last_refresh_images = datetime.now()
                 return self.REFRESH_DELAY_SECONDS
 
@@ -478,9 +477,9 @@ class MirrorSnapshotScheduleHandler:
         # don't remove from queue "due" images
         now_string = datetime.strftime(now, "%Y-%m-%d %H:%M:00")
 
-        for schedule_time in list(self.queue):
+        for schedule_time, image_spec in self.queue.items():
             if schedule_time > now_string:
-                del self.queue[schedule_time]
+                self.queue.remove(image_spec)
 
         if not self.schedules:
             return
@@ -523,47 +522,32 @@ class MirrorSnapshotScheduleHandler:
             return
 
         schedule_time = schedule.next_run(now)
-        if schedule_time not in self.queue:
-            self.queue[schedule_time] = []
         self.log.debug(
             "MirrorSnapshotScheduleHandler: scheduling {}/{}/{} at {}".format(
                 pool_id, namespace, image_id, schedule_time))
-        image_spec = ImageSpec(pool_id, namespace, image_id)
-        if image_spec not in self.queue[schedule_time]:
-            self.queue[schedule_time].append(image_spec)
+        self.queue.push(schedule_time, ImageSpec(pool_id, namespace, image_id))
 
     def dequeue(self) -> Tuple[Optional[ImageSpec], float]:
-        if not self.queue:
+        first = self.queue.first()
+        if not first:
             return None, 1000.0
 
         now = datetime.now()
-        schedule_time = sorted(self.queue)[0]
+        schedule_time = first[0]
 
         if datetime.strftime(now, "%Y-%m-%d %H:%M:%S") < schedule_time:
             wait_time = (datetime.strptime(schedule_time,
                                            "%Y-%m-%d %H:%M:%S") - now)
             return None, wait_time.total_seconds()
 
-        images = self.queue[schedule_time]
-        image = images.pop(0)
-        if not images:
-            del self.queue[schedule_time]
-        return image, 0.0
+        return self.queue.pop(), 0.0
 
     def remove_from_queue(self, pool_id: str, namespace: str, image_id: str) -> None:
         self.log.debug(
             "MirrorSnapshotScheduleHandler: descheduling {}/{}/{}".format(
                 pool_id, namespace, image_id))
 
-        empty_slots = []
-        image_spec = ImageSpec(pool_id, namespace, image_id)
-        for schedule_time, images in self.queue.items():
-            if image_spec in images:
-                images.remove(image_spec)
-                if not images:
-                    empty_slots.append(schedule_time)
-        for schedule_time in empty_slots:
-            del self.queue[schedule_time]
+        self.queue.remove(ImageSpec(pool_id, namespace, image_id))
 
     def add_schedule(self,
                      level_spec: LevelSpec,
@@ -610,14 +594,13 @@ class MirrorSnapshotScheduleHandler:
 
         scheduled_images = []
         with self.lock:
-            for schedule_time in sorted(self.queue):
-                for pool_id, namespace, image_id in self.queue[schedule_time]:
-                    if not level_spec.matches(pool_id, namespace, image_id):
-                        continue
-                    image_name = self.images[pool_id][namespace][image_id]
-                    scheduled_images.append({
-                        'schedule_time': schedule_time,
-                        'image': image_name
-                    })
+            for schedule_time, (pool_id, namespace, image_id) in self.queue.items():
+                if not level_spec.matches(pool_id, namespace, image_id):
+                    continue
+                image_name = self.images[pool_id][namespace][image_id]
+                scheduled_images.append({
+                    'schedule_time': schedule_time,
+                    'image': image_name
+                })
         return 0, json.dumps({'scheduled_images': scheduled_images},
                              indent=4, sort_keys=True), ""
@@ -1,11 +1,13 @@
 import datetime
+import heapq
+import itertools
 import json
 import rados
 import rbd
 import re
 
 from dateutil.parser import parse
-from typing import cast, Any, Callable, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+from typing import cast, Any, Callable, Dict, Generic, Hashable, List, Optional, Set, Tuple, TypeVar, TYPE_CHECKING
 
 from .common import get_rbd_pools
 if TYPE_CHECKING:
@@ -579,3 +581,79 @@ class Schedules:
                     'schedule': schedule.to_list(),
                 }
         return result
+
+
+K = TypeVar('K', bound=Hashable)
+
+
+class ScheduleQueue(Generic[K]):
+    """
+    Items (images, namespaces) queued at their next schedule time.
+
+    A min-heap orders the items by schedule time, and by time of queueing
+    for the same schedule time, and an index by item makes queueing,
+    removing and popping items O(log n). An item is queued at most once,
+    at its earliest schedule time. Removed items are dropped from the heap
+    lazily.
+    """
+
+    def __init__(self) -> None:
+        # [schedule time, sequence number, item or None if removed]
+        self.heap: List[List[Any]] = []
+        self.entries: Dict[K, List[Any]] = {}
+        self.sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, item: K) -> bool:
+        return item in self.entries
+
+    def push(self, schedule_time: str, item: K) -> None:
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] <= schedule_time:
+                return
+            self._drop(entry)
+        entry = [schedule_time, next(self.sequence), item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, item: K) -> None:
+        entry = self.entries.pop(item, None)
+        if entry is not None:
+            self._drop(entry)
+
+    def _drop(self, entry: List[Any]) -> None:
+        entry[2] = None
+        # compact once removed entries make up most of the heap
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [e for e in self.heap if e[2] is not None]
+            heapq.heapify(self.heap)
+
+    def first(self) -> Optional[Tuple[str, K]]:
+        """
+        The item with the earliest schedule time and that time.
+        """
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return self.heap[0][0], self.heap[0][2]
+
+    def pop(self) -> Optional[K]:
+        if self.first() is None:
+            return None
+        item = heapq.heappop(self.heap)[2]
+        del self.entries[item]
+        return item
+
+    def clear(self) -> None:
+        self.heap = []
+        self.entries = {}
+
+    def items(self) -> List[Tuple[str, K]]:
+        """
+        Schedule times and items, in the order they are due.
+        """
+        return [(e[0], e[2]) for e in sorted(self.entries.values())]
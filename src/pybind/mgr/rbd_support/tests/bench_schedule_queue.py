@@ -0,0 +1,168 @@
+"""
+Time the mirror snapshot and trash purge schedule queues at scale.
+
+The handlers are run with the heap based ScheduleQueue and with the dict of
+schedule time slots they used before. Run from src/pybind/mgr:
+
+    UNITTEST=true PYTHONPATH=..:../../python-common \\
+        python -m rbd_support.tests.bench_schedule_queue --images 50000
+"""
+
+import argparse
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple
+
+from rbd_support.schedule import K, LevelSpec, ScheduleQueue
+from rbd_support.tests.fixtures import (make_images, make_mirror_snapshot_handler,
+                                        make_trash_purge_handler, set_images)
+
+
+class DictQueue(Generic[K]):
+    """
+    The queue of the handlers before ScheduleQueue: lists of items by
+    schedule time, sorted on every dequeue and scanned on every enqueue and
+    removal.
+    """
+
+    def __init__(self) -> None:
+        self.queue: Dict[str, List[K]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.queue.values())
+
+    def push(self, schedule_time: str, item: K) -> None:
+        if schedule_time not in self.queue:
+            self.queue[schedule_time] = []
+        if item not in self.queue[schedule_time]:
+            self.queue[schedule_time].append(item)
+
+    def remove(self, item: K) -> None:
+        empty_slots = []
+        for schedule_time, items in self.queue.items():
+            if item in items:
+                items.remove(item)
+                if not items:
+                    empty_slots.append(schedule_time)
+        for schedule_time in empty_slots:
+            del self.queue[schedule_time]
+
+    def first(self) -> Optional[Tuple[str, K]]:
+        if not self.queue:
+            return None
+        schedule_time = sorted(self.queue)[0]
+        return schedule_time, self.queue[schedule_time][0]
+
+    def pop(self) -> Optional[K]:
+        first = self.first()
+        if first is None:
+            return None
+        items = self.queue[first[0]]
+        item = items.pop(0)
+        if not items:
+            del self.queue[first[0]]
+        return item
+
+    def clear(self) -> None:
+        self.queue = {}
+
+    def items(self) -> List[Tuple[str, K]]:
+        return [(schedule_time, item) for schedule_time in sorted(self.queue)
+                for item in self.queue[schedule_time]]
+
+
+def timed(timings: Dict[str, float], name: str, func: Callable[[], Any]) -> None:
+    start = time.monotonic()
+    func()
+    timings[name] = time.monotonic() - start
+
+
+def bench_mirror_snapshot(queue: Any, num_pools: int, images_per_pool: int,
+                          interval: str) -> Dict[str, float]:
+    handler = make_mirror_snapshot_handler(interval)
+    handler.queue = queue
+    images = make_images(num_pools, images_per_pool)
+    fewer_images = make_images(num_pools, images_per_pool * 9 // 10)
+    timings: Dict[str, float] = {}
+
+    timed(timings, 'refresh', lambda: set_images(handler, images))
+
+    def rebuild() -> None:
+        with handler.lock:
+            handler.rebuild_queue()
+    timed(timings, 'rebuild', rebuild)
+    timed(timings, 'remove 10%', lambda: set_images(handler, fewer_images))
+    timed(timings, 'status', lambda: handler.status(LevelSpec.make_global()))
+
+    def drain() -> None:
+        # everything is due: dequeue all images, as the scheduler thread does
+        with handler.lock:
+            handler.queue.clear()
+            for pool_id, namespaces in handler.images.items():
+                for namespace, image_ids in namespaces.items():
+                    for image_id in image_ids:
+                        handler.enqueue(datetime(2000, 1, 1), pool_id, namespace, image_id)
+            while handler.dequeue()[0]:
+                pass
+    timed(timings, 'drain', drain)
+    return timings
+
+
+def bench_trash_purge(queue: Any, num_pools: int, namespaces_per_pool: int,
+                      interval: str) -> Dict[str, float]:
+    handler = make_trash_purge_handler(interval)
+    handler.queue = queue
+    pools = {
+        str(pool_id): {'ns{}'.format(i): 'pool{}'.format(pool_id)
+                       for i in range(namespaces_per_pool)}
+        for pool_id in range(1, num_pools + 1)
+    }
+    timings: Dict[str, float] = {}
+
+    def refresh() -> None:
+        with handler.lock:
+            handler.refresh_queue(pools)
+            handler.pools = pools
+    timed(timings, 'refresh', refresh)
+
+    def rebuild() -> None:
+        with handler.lock:
+            handler.rebuild_queue()
+    timed(timings, 'rebuild', rebuild)
+    timed(timings, 'status', lambda: handler.status(LevelSpec.make_global()))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=50000,
+                        help='number of mirrored images, spread over the pools')
+    parser.add_argument('--pools', type=int, default=10)
+    parser.add_argument('--namespaces', type=int, default=1000,
+                        help='number of namespaces per pool for trash purge')
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--skip-dict', action='store_true',
+                        help='only time the heap queue, the dict queue is '
+                        'quadratic and takes minutes at 50k images')
+    args = parser.parse_args()
+
+    queues: List[Tuple[str, Callable[[], Any]]] = [('heap', ScheduleQueue)]
+    if not args.skip_dict:
+        queues.append(('dict', DictQueue))
+
+    images_per_pool = max(args.images // args.pools, 1)
+    for name, queue_type in queues:
+        timings = bench_mirror_snapshot(queue_type(), args.pools, images_per_pool,
+                                        args.interval)
+        print('mirror snapshot %-5s %s' % (name, ', '.join(
+            '%s %.3fs' % (op, t) for op, t in timings.items())))
+    for name, queue_type in queues:
+        timings = bench_trash_purge(queue_type(), args.pools, args.namespaces,
+                                    args.interval)
+        print('trash purge     %-5s %s' % (name, ', '.join(
+            '%s %.3fs' % (op, t) for op, t in timings.items())))
+
+
+if __name__ == '__main__':
+    main()
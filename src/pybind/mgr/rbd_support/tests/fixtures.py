@@ -0,0 +1,62 @@
+import logging
+from typing import Any, Dict, Optional
+from unittest import mock
+
+from rbd_support.mirror_snapshot_schedule import MirrorSnapshotScheduleHandler
+from rbd_support.schedule import Interval, Schedule, ScheduleQueue
+from rbd_support.trash_purge_schedule import TrashPurgeScheduleHandler
+
+
+class SchedulesStub:
+    """
+    Schedules with a single schedule for every image and namespace.
+    """
+
+    def __init__(self, interval: str = '1h') -> None:
+        self.schedule = Schedule('')
+        self.schedule.add(Interval.from_string(interval))
+
+    def __len__(self) -> int:
+        return 1
+
+    def find(self, pool_id: str, namespace: str,
+             image_id: Optional[str] = None) -> Schedule:
+        return self.schedule
+
+
+def make_images(num_pools: int, images_per_pool: int) -> Dict[str, Dict[str, Dict[str, str]]]:
+    return {
+        str(pool_id): {
+            '': {'{:x}'.format(i): 'pool{}/image{}'.format(pool_id, i)
+                 for i in range(images_per_pool)}
+        }
+        for pool_id in range(1, num_pools + 1)
+    }
+
+
+def make_module() -> mock.MagicMock:
+    module = mock.MagicMock()
+    module.log = logging.getLogger('rbd_support')
+    return module
+
+
+def make_mirror_snapshot_handler(interval: str = '1h') -> MirrorSnapshotScheduleHandler:
+    handler = MirrorSnapshotScheduleHandler(make_module())
+    handler.images = {}
+    handler.queue = ScheduleQueue()
+    handler.schedules = SchedulesStub(interval)  # type: ignore
+    return handler
+
+
+def make_trash_purge_handler(interval: str = '1h') -> TrashPurgeScheduleHandler:
+    handler = TrashPurgeScheduleHandler(make_module())
+    handler.pools = {}
+    handler.queue = ScheduleQueue()
+    handler.schedules = SchedulesStub(interval)  # type: ignore
+    return handler
+
+
+def set_images(handler: Any, images: Dict[str, Dict[str, Dict[str, str]]]) -> None:
+    with handler.lock:
+        handler.refresh_queue(images)
+        handler.images = images
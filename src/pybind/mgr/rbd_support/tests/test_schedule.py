@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+
+from rbd_support.mirror_snapshot_schedule import ImageSpec
+from rbd_support.schedule import LevelSpec, ScheduleQueue
+from rbd_support.tests.fixtures import (make_images, make_mirror_snapshot_handler,
+                                        make_trash_purge_handler, set_images)
+
+
+def test_schedule_queue_order():
+    queue = ScheduleQueue()
+    queue.push('2024-01-01 00:02:00', 'a')
+    queue.push('2024-01-01 00:01:00', 'b')
+    queue.push('2024-01-01 00:02:00', 'c')
+    queue.push('2024-01-01 00:01:00', 'd')
+    assert len(queue) == 4
+    assert queue.first() == ('2024-01-01 00:01:00', 'b')
+    # items are queued once, at their earliest time
+    queue.push('2024-01-01 00:03:00', 'b')
+    queue.push('2024-01-01 00:00:00', 'c')
+    assert len(queue) == 4
+    assert queue.items() == [('2024-01-01 00:00:00', 'c'),
+                             ('2024-01-01 00:01:00', 'b'),
+                             ('2024-01-01 00:01:00', 'd'),
+                             ('2024-01-01 00:02:00', 'a')]
+    queue.remove('b')
+    queue.remove('x')
+    assert 'b' not in queue
+    assert [queue.pop() for _ in range(3)] == ['c', 'd', 'a']
+    assert queue.first() is None
+    assert queue.pop() is None
+
+
+def test_schedule_queue_compaction():
+    queue = ScheduleQueue()
+    for i in range(1000):
+        queue.push('2024-01-01 00:00:00', i)
+    for i in range(990):
+        queue.remove(i)
+    assert len(queue) == 10
+    assert len(queue.heap) < 100
+    assert [queue.pop() for _ in range(10)] == list(range(990, 1000))
+
+
+def test_mirror_snapshot_queue():
+    handler = make_mirror_snapshot_handler()
+    set_images(handler, make_images(2, 3))
+    assert len(handler.queue) == 6
+    with handler.lock:
+        image_spec, wait_time = handler.dequeue()
+    assert image_spec is None
+    assert 0 < wait_time <= 3600
+
+    # refreshing the images deschedules the ones that are gone
+    images = make_images(2, 3)
+    del images['2']
+    set_images(handler, images)
+    assert len(handler.queue) == 3
+
+    _, out, _ = handler.status(LevelSpec.make_global())
+    scheduled = json.loads(out)['scheduled_images']
+    assert [s['image'] for s in scheduled] == ['pool1/image0', 'pool1/image1', 'pool1/image2']
+
+    # images are due in the order they were queued
+    with handler.lock:
+        handler.queue.clear()
+        for image_id in ['2', '0', '1']:
+            handler.enqueue(datetime(2000, 1, 1), '1', '', image_id)
+        dequeued = [handler.dequeue()[0] for _ in range(4)]
+    assert dequeued == [ImageSpec('1', '', '2'), ImageSpec('1', '', '0'),
+                        ImageSpec('1', '', '1'), None]
+
+
+def test_mirror_snapshot_rebuild_keeps_due_images():
+    handler = make_mirror_snapshot_handler()
+    set_images(handler, make_images(1, 2))
+    with handler.lock:
+        handler.queue.clear()
+        handler.enqueue(datetime(2000, 1, 1), '1', '', '0')
+        handler.rebuild_queue()
+        assert handler.dequeue()[0] == ImageSpec('1', '', '0')
+        assert handler.dequeue()[0] is None
+    assert len(handler.queue) == 1
+
+
+def test_trash_purge_queue():
+    handler = make_trash_purge_handler()
+    with handler.lock:
+        handler.pools = {'1': {'': 'pool1', 'ns': 'pool1'}}
+        handler.enqueue(datetime(2000, 1, 1), '1', 'ns')
+        handler.enqueue(datetime(2000, 1, 1), '1', '')
+        handler.enqueue(datetime.now(), '1', 'ns')
+        assert len(handler.queue) == 2
+        handler.remove_from_queue('1', '')
+        assert handler.dequeue() == (('1', 'ns'), 0.0)
+        assert handler.dequeue() == (None, 1000.0)
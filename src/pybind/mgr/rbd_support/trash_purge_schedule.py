@@ -5,10 +5,10 @@ import traceback
 
 from datetime import datetime
 from threading import Condition, Lock, Thread
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from .common import get_rbd_pools
-from .schedule import LevelSpec, Schedules
+from .schedule import LevelSpec, ScheduleQueue, Schedules
 
 
 class TrashPurgeScheduleHandler:
@@ -72,7 +72,7 @@ class TrashPurgeScheduleHandler:
                 pool_id, namespace, e))
 
     def init_schedule_queue(self) -> None:
-        self.queue: Dict[str, List[Tuple[str, str]]] = {}
+        self.queue: ScheduleQueue[Tuple[str, str]] = ScheduleQueue()
         # pool_id => {namespace => pool_name}
         self.pools: Dict[str, Dict[str, str]] = {}
         self.schedules = Schedules(self)
@@ -95,7 +95,7 @@ class TrashPurgeScheduleHandler:
             if not self.schedules:
                 self.log.debug("TrashPurgeScheduleHandler: no schedules")
                 self.pools = {}
-                self.queue = {}
+                self.queue.clear()
                 self.last_refresh_pools = datetime.now()
                 return self.REFRESH_DELAY_SECONDS
 
@@ -142,9 +142,9 @@ class TrashPurgeScheduleHandler:
         # don't remove from queue "due" images
         now_string = datetime.strftime(now, "%Y-%m-%d %H:%M:00")
 
-        for schedule_time in list(self.queue):
+        for schedule_time, ns_spec in self.queue.items():
             if schedule_time > now_string:
-                del self.queue[schedule_time]
+                self.queue.remove(ns_spec)
 
         if not self.schedules:
             return
@@ -181,46 +181,32 @@ class TrashPurgeScheduleHandler:
             return
 
         schedule_time = schedule.next_run(now)
-        if schedule_time not in self.queue:
-            self.queue[schedule_time] = []
         self.log.debug(
             "TrashPurgeScheduleHandler: scheduling {}/{} at {}".format(
                 pool_id, namespace, schedule_time))
-        ns_spec = (pool_id, namespace)
-        if ns_spec not in self.queue[schedule_time]:
-            self.queue[schedule_time].append((pool_id, namespace))
+        self.queue.push(schedule_time, (pool_id, namespace))
 
     def dequeue(self) -> Tuple[Optional[Tuple[str, str]], float]:
-        if not self.queue:
+        first = self.queue.first()
+        if not first:
             return None, 1000.0
 
         now = datetime.now()
-        schedule_time = sorted(self.queue)[0]
+        schedule_time = first[0]
 
         if datetime.strftime(now, "%Y-%m-%d %H:%M:%S") < schedule_time:
             wait_time = (datetime.strptime(schedule_time,
                                            "%Y-%m-%d %H:%M:%S") - now)
             return None, wait_time.total_seconds()
 
-        namespaces = self.queue[schedule_time]
-        namespace = namespaces.pop(0)
-        if not namespaces:
-            del self.queue[schedule_time]
-        return namespace, 0.0
+        return self.queue.pop(), 0.0
 
     def remove_from_queue(self, pool_id: str, namespace: str) -> None:
         self.log.debug(
             "TrashPurgeScheduleHandler: descheduling {}/{}".format(
                 pool_id, namespace))
 
-        empty_slots = []
-        for schedule_time, namespaces in self.queue.items():
-            if (pool_id, namespace) in namespaces:
-                namespaces.remove((pool_id, namespace))
-                if not namespaces:
-                    empty_slots.append(schedule_time)
-        for schedule_time in empty_slots:
-            del self.queue[schedule_time]
+        self.queue.remove((pool_id, namespace))
 
     def add_schedule(self,
                      level_spec: LevelSpec,
@@ -267,16 +253,15 @@ class TrashPurgeScheduleHandler:
 
         scheduled = []
         with self.lock:
-            for schedule_time in sorted(self.queue):
-                for pool_id, namespace in self.queue[schedule_time]:
-                    if not level_spec.matches(pool_id, namespace):
-                        continue
-                    pool_name = self.pools[pool_id][namespace]
-                    scheduled.append({
-                        'schedule_time': schedule_time,
-                        'pool_id': pool_id,
-                        'pool_name': pool_name,
-                        'namespace': namespace
-                    })
+            for schedule_time, (pool_id, namespace) in self.queue.items():
+                if not level_spec.matches(pool_id, namespace):
+                    continue
+                pool_name = self.pools[pool_id][namespace]
+                scheduled.append({
+                    'schedule_time': schedule_time,
+                    'pool_id': pool_id,
+                    'pool_name': pool_name,
+                    'namespace': namespace
+                })
         return 0, json.dumps({'scheduled': scheduled}, indent=4,
                              sort_keys=True), ""
@@ -45,6 +45,7 @@ class Module(MgrModule):
         fs_map = self.get('fs_map')
         if not fs_map:
             return
+        self.client.connection_pool.refresh_fs_map(fs_map, close=False)
 
         # we don't know for which fs config has been changed
         fs_names = set()
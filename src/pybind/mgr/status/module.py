@@ -372,3 +372,47 @@ class Module(MgrModule):
             return 0, json.dumps(json_output, sort_keys=True,indent=4,separators=(',', ': ')) , ""
         else:
             return 0, osd_table.get_string(), ""
+
+    @CLIReadCommand("mgr module perf")
+    def handle_mgr_module_perf(self,
+                               module: Optional[str] = None,
+                               reset: bool = False,
+                               format: str = 'plain') -> Tuple[int, str, str]:
+        """
+        Show the calls mgr modules make into ceph-mgr and into each other
+        """
+        perf = self.get_all_module_perf(reset)
+        if module is not None:
+            if module not in perf:
+                return -errno.ENOENT, "", "Module '{}' is not enabled".format(module)
+            perf = {module: perf[module]}
+
+        if format in ('json', 'json-pretty'):
+            indent = 4 if format == 'json-pretty' else None
+            return 0, json.dumps(perf, sort_keys=True, indent=indent), ""
+
+        rows = []
+        for module_name, calls in perf.items():
+            for kind, stats in calls.items():
+                for name, s in stats.items():
+                    rows.append((module_name, kind, name, s))
+        # the most expensive calls first
+        rows.sort(key=lambda r: r[3]['seconds'], reverse=True)
+
+        table = PrettyTable(['MODULE', 'CALL', 'NAME', 'CALLS', 'BYTES',
+                             'TOTAL', 'AVG', 'MAX'],
+                            border=False)
+        table.left_padding_width = 0
+        table.right_padding_width = 2
+        for col in ('CALLS', 'BYTES', 'TOTAL', 'AVG', 'MAX'):
+            table.align[col] = 'r'
+        for module_name, kind, name, s in rows:
+            table.add_row((
+                module_name, kind, name,
+                mgr_util.format_dimless(s['count'], 5),
+                mgr_util.format_bytes(s['bytes'], 5),
+                '{:.3f}s'.format(s['seconds']),
+                '{:.1f}ms'.format(s['seconds'] * 1000 / s['count']),
+                '{:.1f}ms'.format(s['max_seconds'] * 1000),
+            ))
+        return 0, table.get_string(), ""
@@ -213,13 +213,43 @@ if 'UNITTEST' in os.environ:
         class MockObjectNotFound(Exception):
             pass
 
+        class MockCephFSError(Exception):
+            pass
+
+        class MockCephFSOSError(MockCephFSError):
+            def __init__(self, errno, strerror):
+                super(MockCephFSOSError, self).__init__(errno, strerror)
+                self.errno = errno
+                self.strerror = strerror
+
+        cephfs = mock.Mock(
+            Error=MockCephFSError,
+            OSError=MockCephFSOSError,
+            AT_SYMLINK_NOFOLLOW=0x100,
+            CEPH_STATX_MODE=0x1,
+            CEPH_STATX_UID=0x4,
+            CEPH_STATX_GID=0x8,
+            CEPH_STATX_ATIME=0x20,
+            CEPH_STATX_MTIME=0x40,
+            CEPH_STATX_CTIME=0x80,
+            CEPH_STATX_SIZE=0x200,
+            CEPH_STATX_BTIME=0x800,
+            CEPH_SETATTR_MODE=0x1,
+            CEPH_SETATTR_UID=0x2,
+            CEPH_SETATTR_GID=0x4,
+            CEPH_SETATTR_MTIME=0x8,
+            CEPH_SETATTR_ATIME=0x10)
+        for name in ('PermissionError', 'ObjectNotFound', 'NoData', 'ObjectExists',
+                     'InvalidValue', 'NoSpace', 'ObjectNotEmpty', 'NotDirectory'):
+            setattr(cephfs, name, type(name, (MockCephFSOSError,), {}))
+
         sys.modules.update({
             'rados': mock.MagicMock(
                 Error=MockRadosError,
                 OSError=MockRadosError,
                 ObjectNotFound=MockObjectNotFound),
             'rbd': mock.Mock(),
-            'cephfs': mock.Mock(),
+            'cephfs': cephfs,
         })
 
     # Unconditionally mock the rados objects when we're imported
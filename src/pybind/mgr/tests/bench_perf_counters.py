@@ -0,0 +1,80 @@
+"""
+Time fetching the perf counters of many synthetic OSDs, counter by counter as
+ceph-mgr used to, and through the bulk snapshot, and the prometheus perf
+counter collector on top of the latter.
+
+Run from src/pybind/mgr:
+
+    UNITTEST=true PYTHONPATH=..:../../python-common \\
+        python -m tests.bench_perf_counters --osds 5000 --counters 200
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, cast
+
+from mgr_module import MgrModule, ServiceInfoT
+from tests.perf_counters import FakePerfCounters
+
+
+def per_counter_perf_counters(module: MgrModule) -> Dict[str, dict]:
+    """
+    The previous implementation of get_unlabeled_perf_counters(): one schema
+    and one latest value call per counter of every daemon.
+    """
+    result = defaultdict(dict)  # type: Dict[str, dict]
+    for server in module.list_servers():
+        for service in cast(List[ServiceInfoT], server['services']):
+            svc_full_name = "{0}.{1}".format(service['type'], service['id'])
+            schema = module.get_unlabeled_perf_schema(service['type'], service['id'])[svc_full_name]
+            for counter_path, counter_schema in schema.items():
+                if cast(int, counter_schema['priority']) < module.PRIO_USEFUL:
+                    continue
+                counter_info = dict(counter_schema)
+                if cast(int, counter_schema['type']) & module.PERFCOUNTER_LONGRUNAVG:
+                    counter_info['value'], counter_info['count'] = \
+                        module.get_unlabeled_counter_latest_avg(
+                            service['type'], service['id'], counter_path)
+                else:
+                    counter_info['value'] = module.get_unlabeled_counter_latest(
+                        service['type'], service['id'], counter_path)
+                result[svc_full_name][counter_path] = counter_info
+    return result
+
+
+def bench(name: str, fn: Callable[[], object], counters: FakePerfCounters, runs: int) -> None:
+    timings = []
+    for _ in range(runs):
+        counters.calls.clear()
+        start = time.monotonic()
+        fn()
+        timings.append(time.monotonic() - start)
+    print('%-20s best %.3fs, worst %.3fs, %d calls into ceph-mgr per scrape' % (
+        name, min(timings), max(timings), sum(counters.calls.values())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--osds', type=int, default=5000)
+    parser.add_argument('--counters', type=int, default=200,
+                        help='number of perf counters per OSD')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    from prometheus.module import Module
+
+    counters = FakePerfCounters(args.osds, args.counters)
+    prometheus = Module('prometheus', 0, 0)
+    counters.install(prometheus)
+
+    bench('per counter', lambda: per_counter_perf_counters(prometheus), counters, args.runs)
+    prometheus.get_unlabeled_perf_counters()  # warm up the schema cache
+    bench('bulk snapshot', prometheus.get_unlabeled_perf_counters, counters, args.runs)
+    bench('prometheus collector', prometheus.get_perf_counters, counters, args.runs)
+    assert per_counter_perf_counters(prometheus) == prometheus.get_unlabeled_perf_counters()
+
+
+if __name__ == '__main__':
+    main()
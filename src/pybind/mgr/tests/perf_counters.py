@@ -0,0 +1,67 @@
+"""
+A synthetic set of daemons and their unlabeled perf counters, served through
+the ceph_module calls MgrModule uses to fetch them.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from mgr_module import MgrModule
+
+
+class FakePerfCounters(object):
+    def __init__(self, num_osds: int, num_counters: int, version: str = '19.2.0') -> None:
+        self.versions = {str(i): version for i in range(num_osds)}
+        self.schema: Dict[str, Dict[str, Any]] = {}
+        for i in range(num_counters):
+            tp = MgrModule.PERFCOUNTER_LONGRUNAVG if i % 4 == 0 else MgrModule.PERFCOUNTER_COUNTER
+            self.schema['osd.counter_%d' % i] = {
+                'description': 'counter %d' % i,
+                'type': tp | MgrModule.PERFCOUNTER_U64,
+                'priority': MgrModule.PRIO_USEFUL if i % 8 else MgrModule.PRIO_DEBUGONLY,
+                'units': 0,
+            }
+        self.calls: Dict[str, int] = {}
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def datapoint(self, svc_id: str, path: str) -> Tuple[float, ...]:
+        value = int(svc_id) * 1000 + int(path.rsplit('_', 1)[1])
+        if self.schema[path]['type'] & MgrModule.PERFCOUNTER_LONGRUNAVG:
+            return (1.0, value, 2)
+        return (1.0, value)
+
+    def get_server(self, hostname: Any) -> List[Dict[str, Any]]:
+        self._count('get_server')
+        return [{
+            'hostname': 'host%d' % i,
+            'services': [{'type': 'osd', 'id': svc_id, 'ceph_version': version}],
+        } for i, (svc_id, version) in enumerate(self.versions.items())]
+
+    def get_unlabeled_perf_schema(self, svc_type: str, svc_id: str) -> Dict[str, Any]:
+        self._count('get_unlabeled_perf_schema')
+        return {'osd.%s' % svc_id: dict(self.schema)}
+
+    def get_latest_unlabeled_counter(self, svc_type: str, svc_id: str,
+                                     path: str) -> Dict[str, Tuple[float, ...]]:
+        self._count('get_latest_unlabeled_counter')
+        return {path: self.datapoint(svc_id, path)}
+
+    def get_latest_unlabeled_counters(self, svc_type: str,
+                                      prio_limit: int) -> Dict[str, Dict[str, Tuple[float, ...]]]:
+        self._count('get_latest_unlabeled_counters')
+        if svc_type not in ('', 'osd'):
+            return {}
+        return {
+            'osd.%s' % svc_id: {
+                path: self.datapoint(svc_id, path)
+                for path, schema in self.schema.items()
+                if schema['priority'] >= prio_limit
+            } for svc_id in self.versions
+        }
+
+    def install(self, module: MgrModule) -> None:
+        module._ceph_get_server = self.get_server  # type: ignore
+        module._ceph_get_unlabeled_perf_schema = self.get_unlabeled_perf_schema  # type: ignore
+        module._ceph_get_latest_unlabeled_counter = self.get_latest_unlabeled_counter  # type: ignore
+        module._ceph_get_latest_unlabeled_counters = self.get_latest_unlabeled_counters  # type: ignore
@@ -1,5 +1,7 @@
 import datetime
+import errno
 from unittest.mock import MagicMock, patch
+import mgr_module
 import mgr_util
 
 import pytest
@@ -85,3 +87,117 @@ class TestCephFsEarmarkResolver:
         mock_parse_earmark.side_effect = mgr_util.EarmarkParseError
         result = resolver.check_earmark("error.test", mgr_util.EarmarkTopScope.SMB)
         assert result is False
+
+
+class TestCephfsConnectionPool:
+
+    @pytest.fixture
+    def mgr(self):
+        mgr = MagicMock()
+        mgr.fs_map = {
+            'epoch': 1,
+            'filesystems': [{'id': 1, 'mdsmap': {'fs_name': 'a'}}],
+        }
+        mgr.get.side_effect = lambda name: mgr.fs_map
+        mgr._module_perf = mgr_module.ModulePerf()
+        return mgr
+
+    @pytest.fixture
+    def pool(self, mgr):
+        with patch('mgr_util.RTimer'), \
+                patch('mgr_util.cephfs.LibCephFS', side_effect=lambda **kwargs: MagicMock()):
+            yield mgr_util.CephfsConnectionPool(mgr)
+
+    def test_idle_handle_reused(self, mgr, pool):
+        fs_handle = pool.get_fs_handle('a')
+        pool.put_fs_handle('a', fs_handle)
+        assert mgr.get.call_count == 1
+        for _ in range(3):
+            assert pool.get_fs_handle('a') is fs_handle
+            pool.put_fs_handle('a', fs_handle)
+        # no fs_map lookup when an idle handle is handed out
+        assert mgr.get.call_count == 1
+        assert pool.dump() == {'a': {'connections': 1, 'idle': 1,
+                                     'connecting': 0, 'ops_in_flight': 0}}
+        assert mgr._module_perf.dump()['cephfs']['a.connect']['count'] == 1
+
+    def test_busy_connections_shared(self, pool):
+        max_connections = mgr_util.CephfsConnectionPool.MAX_CONCURRENT_CONNECTIONS
+        fs_handles = [pool.get_fs_handle('a') for _ in range(max_connections)]
+        assert len(set(map(id, fs_handles))) == max_connections
+        # the least busy connection is shared
+        assert pool.get_fs_handle('a') is fs_handles[0]
+        assert pool.get_fs_handle('a') is fs_handles[1]
+        assert pool.dump()['a'] == {'connections': max_connections, 'idle': 0,
+                                    'connecting': 0, 'ops_in_flight': max_connections + 2}
+
+    def test_unknown_fs(self, pool):
+        with pytest.raises(mgr_util.CephfsConnectionException) as e:
+            pool.get_fs_handle('b')
+        assert e.value.errno == -errno.ENOENT
+
+    def test_recreated_fs(self, mgr, pool):
+        busy = pool.get_fs_handle('a')
+        idle = pool.get_fs_handle('a')
+        pool.put_fs_handle('a', idle)
+
+        # same epoch: nothing changes
+        pool.refresh_fs_map()
+        idle.abort_conn.assert_not_called()
+
+        mgr.fs_map = {
+            'epoch': 2,
+            'filesystems': [{'id': 2, 'mdsmap': {'fs_name': 'a'}}],
+        }
+        pool.refresh_fs_map()
+        idle.abort_conn.assert_called_once()
+        busy.abort_conn.assert_not_called()
+        fs_handle = pool.get_fs_handle('a')
+        assert fs_handle is not busy and fs_handle is not idle
+
+        # connections to the old filesystem are aborted once released
+        pool.put_fs_handle('a', busy)
+        busy.abort_conn.assert_called_once()
+        assert pool.dump()['a']['connections'] == 1
+
+    def test_recreated_fs_notified(self, mgr, pool):
+        idle = pool.get_fs_handle('a')
+        pool.put_fs_handle('a', idle)
+        mgr.fs_map = {
+            'epoch': 2,
+            'filesystems': [{'id': 2, 'mdsmap': {'fs_name': 'a'}}],
+        }
+        pool.refresh_fs_map(mgr.fs_map, close=False)
+        # the pool is replaced, the idle connection is left to the timer
+        fs_handle = pool.get_fs_handle('a')
+        assert fs_handle is not idle
+        idle.abort_conn.assert_not_called()
+        pool.cleanup_connections()
+        idle.abort_conn.assert_called_once()
+        fs_handle.abort_conn.assert_not_called()
+        assert pool.stale_pools == []
+
+    def test_del_all_connections(self, pool):
+        fs_handle = pool.get_fs_handle('a')
+        pool.put_fs_handle('a', fs_handle)
+        pool.del_all_connections()
+        fs_handle.shutdown.assert_called_once()
+        assert pool.dump() == {}
+        # the pool of the filesystem is created again on use
+        assert pool.get_fs_handle('a') is not fs_handle
+
+    def test_idle_connections_evicted(self, pool):
+        fs_handles = [pool.get_fs_handle('a') for _ in range(2)]
+        pool.put_fs_handle('a', fs_handles[0])
+        with patch.object(mgr_util.CephfsConnectionPool, 'CONNECTION_IDLE_INTERVAL', 0):
+            pool.cleanup_connections()
+        fs_handles[0].shutdown.assert_called_once()
+        fs_handles[1].shutdown.assert_not_called()
+        assert pool.dump()['a']['connections'] == 1
+
+    def test_del_connections(self, pool):
+        fs_handle = pool.get_fs_handle('a')
+        pool.put_fs_handle('a', fs_handle)
+        pool.del_connections('a', wait=True)
+        fs_handle.shutdown.assert_called_once()
+        assert pool.dump() == {}
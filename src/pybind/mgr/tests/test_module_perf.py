@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from mgr_module import CallStats, MgrModule
+from tests import mock
+
+
+@pytest.fixture
+def module():
+    m = MgrModule('test', 0, 0)
+    m._ceph_get = mock.Mock(return_value=b'{"epoch": 1}')
+    m._ceph_dispatch_remote = mock.Mock(return_value=42)
+    return m
+
+
+def test_call_stats_buckets():
+    stats = CallStats()
+    for seconds in (0.0005, 0.002, 0.002, 10):
+        stats.record(seconds, 10)
+    dump = stats.dump()
+    assert dump['count'] == 4
+    assert dump['bytes'] == 40
+    assert dump['max_seconds'] == 10
+    buckets = dict(dump['buckets'])
+    assert buckets['0.001'] == 1
+    assert buckets['0.005'] == 3
+    assert buckets['5.0'] == 3
+    assert buckets['inf'] == 4
+
+
+def test_get_is_recorded(module):
+    assert module.get('osd_map') == {'epoch': 1}
+    module.get('osd_map')
+    module.get('device abc')
+    perf = module.get_module_perf()
+    assert perf['get']['osd_map']['count'] == 2
+    assert perf['get']['osd_map']['bytes'] == 2 * len(b'{"epoch": 1}')
+    assert perf['get']['device']['count'] == 1
+    assert perf['remote'] == {}
+
+
+def test_remote_is_recorded(module):
+    assert module.remote('other', 'method', 1) == 42
+    module._ceph_dispatch_remote.side_effect = RuntimeError('failed')
+    with pytest.raises(RuntimeError):
+        module.remote('other', 'method')
+    perf = module.get_module_perf(reset=True)
+    assert perf['remote']['other.method']['count'] == 2
+    assert module.get_module_perf() == {'get': {}, 'remote': {}, 'cephfs': {}}
+
+
+def test_all_module_perf(module):
+    module._ceph_get.return_value = json.dumps({
+        'modules': ['test', 'other', 'broken'],
+        'always_on_modules': {},
+    }).encode()
+    module._ceph_get_release_name = mock.Mock(return_value='squid')
+
+    def dispatch_remote(name, method, args, kwargs):
+        if name == 'broken':
+            raise ImportError('Module not found')
+        return {'get': {}, 'remote': {}}
+    module._ceph_dispatch_remote = mock.Mock(side_effect=dispatch_remote)
+    perf = module.get_all_module_perf()
+    assert sorted(perf) == ['other', 'test']
+    assert perf['test']['get']['mgr_map']['count'] == 1
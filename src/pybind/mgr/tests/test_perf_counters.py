@@ -0,0 +1,64 @@
+import pytest
+
+from mgr_module import MgrModule
+from tests.perf_counters import FakePerfCounters
+
+
+@pytest.fixture
+def counters():
+    return FakePerfCounters(num_osds=3, num_counters=16)
+
+
+@pytest.fixture
+def module(counters):
+    m = MgrModule('test', 0, 0)
+    counters.install(m)
+    return m
+
+
+def test_unlabeled_perf_counters(module, counters):
+    result = module.get_unlabeled_perf_counters()
+    assert sorted(result) == ['osd.0', 'osd.1', 'osd.2']
+    # debug only counters are filtered out
+    assert len(result['osd.1']) == 14
+    assert 'osd.counter_0' not in result['osd.1']
+    avg = result['osd.1']['osd.counter_4']
+    assert avg['value'] == 1004
+    assert avg['count'] == 2
+    assert avg['description'] == 'counter 4'
+    assert result['osd.2']['osd.counter_5']['value'] == 2005
+    assert 'count' not in result['osd.2']['osd.counter_5']
+    assert counters.calls == {
+        'get_server': 1,
+        'get_latest_unlabeled_counters': 1,
+        'get_unlabeled_perf_schema': 3,
+    }
+
+
+def test_schema_is_cached(module, counters):
+    first = module.get_unlabeled_perf_counters()
+    assert module.get_unlabeled_perf_counters() == first
+    assert counters.calls['get_unlabeled_perf_schema'] == 3
+    assert counters.calls['get_latest_unlabeled_counters'] == 2
+
+
+def test_schema_is_refetched_on_metadata_change(module, counters):
+    module.get_unlabeled_perf_counters()
+    counters.versions['1'] = '19.2.1'
+    module.get_unlabeled_perf_counters()
+    assert counters.calls['get_unlabeled_perf_schema'] == 4
+
+
+def test_schema_is_refetched_on_new_counter(module, counters):
+    module.get_unlabeled_perf_counters()
+    counters.schema['osd.counter_16'] = dict(counters.schema['osd.counter_1'])
+    result = module.get_unlabeled_perf_counters()
+    assert counters.calls['get_unlabeled_perf_schema'] == 6
+    assert result['osd.0']['osd.counter_16']['value'] == 16
+
+
+def test_schema_cache_drops_removed_daemons(module, counters):
+    module.get_unlabeled_perf_counters()
+    del counters.versions['2']
+    assert sorted(module.get_unlabeled_perf_counters()) == ['osd.0', 'osd.1']
+    assert sorted(module._perf_schema_cache) == ['osd.0', 'osd.1']
@@ -1,17 +1,17 @@
 import os
-import stat
 import time
 import errno
 import logging
+import threading
 from contextlib import contextmanager
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import cephfs
 from mgr_util import lock_timeout_log
 
 from .async_job import AsyncJobs
 from .exception import IndexException, MetadataMgrException, OpSmException, VolumeException
-from .fs_util import copy_file
+from .clone_engine import CloneEngine, CloneStats
 from .operations.versions.op_sm import SubvolumeOpSm
 from .operations.versions.subvolume_attrs import SubvolumeTypes, SubvolumeStates, SubvolumeActions
 from .operations.resolver import resolve_group_and_subvolume_name
@@ -97,78 +97,32 @@ def handle_clone_pending(fs_client, volspec, volname, index, groupname, subvolna
         raise VolumeException(oe.errno, oe.error_str)
     return (next_state, False)
 
-def sync_attrs(fs_handle, target_path, source_statx):
-    try:
-        fs_handle.lchown(target_path, source_statx["uid"], source_statx["gid"])
-        fs_handle.lutimes(target_path, (time.mktime(source_statx["atime"].timetuple()),
-                                        time.mktime(source_statx["mtime"].timetuple())))
-        fs_handle.lchmod(target_path, source_statx["mode"])
-    except cephfs.Error as e:
-        log.warning("error synchronizing attrs for {0} ({1})".format(target_path, e))
-        raise e
-
-def bulk_copy(fs_handle, source_path, dst_path, should_cancel):
+def bulk_copy(fs_client, volname, fs_handle, source_path, dst_path, should_cancel, copy_threads, stats):
     """
     bulk copy data from source to destination -- only directories, symlinks
     and regular files are synced.
     """
-    log.info("copying data from {0} to {1}".format(source_path, dst_path))
-    def cptree(src_root_path, dst_root_path):
-        log.debug("cptree: {0} -> {1}".format(src_root_path, dst_root_path))
-        try:
-            with fs_handle.opendir(src_root_path) as dir_handle:
-                d = fs_handle.readdir(dir_handle)
-                while d and not should_cancel():
-                    if d.d_name not in (b".", b".."):
-                        log.debug("d={0}".format(d))
-                        d_full_src = os.path.join(src_root_path, d.d_name)
-                        d_full_dst = os.path.join(dst_root_path, d.d_name)
-                        stx = fs_handle.statx(d_full_src, cephfs.CEPH_STATX_MODE  |
-                                                          cephfs.CEPH_STATX_UID   |
-                                                          cephfs.CEPH_STATX_GID   |
-                                                          cephfs.CEPH_STATX_ATIME |
-                                                          cephfs.CEPH_STATX_MTIME |
-                                                          cephfs.CEPH_STATX_SIZE,
-                                                          cephfs.AT_SYMLINK_NOFOLLOW)
-                        handled = True
-                        mo = stx["mode"] & ~stat.S_IFMT(stx["mode"])
-                        if stat.S_ISDIR(stx["mode"]):
-                            log.debug("cptree: (DIR) {0}".format(d_full_src))
-                            try:
-                                fs_handle.mkdir(d_full_dst, mo)
-                            except cephfs.Error as e:
-                                if not e.args[0] == errno.EEXIST:
-                                    raise
-                            cptree(d_full_src, d_full_dst)
-                        elif stat.S_ISLNK(stx["mode"]):
-                            log.debug("cptree: (SYMLINK) {0}".format(d_full_src))
-                            target = fs_handle.readlink(d_full_src, 4096)
-                            try:
-                                fs_handle.symlink(target[:stx["size"]], d_full_dst)
-                            except cephfs.Error as e:
-                                if not e.args[0] == errno.EEXIST:
-                                    raise
-                        elif stat.S_ISREG(stx["mode"]):
-                            log.debug("cptree: (REG) {0}".format(d_full_src))
-                            copy_file(fs_handle, d_full_src, d_full_dst, mo, cancel_check=should_cancel)
-                        else:
-                            handled = False
-                            log.warning("cptree: (IGNORE) {0}".format(d_full_src))
-                        if handled:
-                            sync_attrs(fs_handle, d_full_dst, stx)
-                    d = fs_handle.readdir(dir_handle)
-                stx_root = fs_handle.statx(src_root_path, cephfs.CEPH_STATX_ATIME |
-                                                          cephfs.CEPH_STATX_MTIME,
-                                                          cephfs.AT_SYMLINK_NOFOLLOW)
-                fs_handle.lutimes(dst_root_path, (time.mktime(stx_root["atime"].timetuple()),
-                                                  time.mktime(stx_root["mtime"].timetuple())))
-        except cephfs.Error as e:
-            if not e.args[0] == errno.ENOENT:
-                raise VolumeException(-e.args[0], e.args[1])
-    cptree(source_path, dst_path)
+    log.info("copying data from {0} to {1} ({2} threads)".format(source_path, dst_path, copy_threads))
+    engine = CloneEngine(fs_client, volname, copy_threads, should_cancel, stats)
+    engine.copy(fs_handle, source_path, dst_path)
     if should_cancel():
         raise VolumeException(-errno.EINTR, "user interrupted clone operation")
 
+def get_clone_size(fs_handle, src_path):
+    """
+    size and number of entries of the snapshot being cloned, as progress of
+    a copy that has not started yet.
+    """
+    try:
+        bytes_total = int(fs_handle.getxattr(src_path, 'ceph.dir.rbytes'))
+        entries_total = int(fs_handle.getxattr(src_path, 'ceph.dir.rentries'))
+    except cephfs.Error as e:
+        # the copy fails, or copies nothing, if the snapshot went missing
+        log.info(f'get_clone_size(): getxattr failed on source path "{src_path}": {e}')
+        bytes_total = entries_total = 0
+    return {'bytes_total': bytes_total, 'bytes_copied': 0,
+            'entries_total': entries_total, 'entries_copied': 0}
+
 def set_quota_on_clone(fs_handle, clone_volumes_pair):
     src_path = clone_volumes_pair[1].snapshot_data_path(clone_volumes_pair[2])
     dst_path = clone_volumes_pair[0].path
@@ -216,7 +170,7 @@ def set_quota_on_clone(fs_handle, clone_volumes_pair):
         except cephfs.Error as e:
              raise VolumeException(-e.args[0], e.args[1])
 
-def do_clone(fs_client, volspec, volname, groupname, subvolname, should_cancel):
+def do_clone(fs_client, volspec, volname, groupname, subvolname, should_cancel, copy_threads, track_progress):
     with open_volume_lockless(fs_client, volname) as fs_handle:
         with open_clone_subvol_pair_in_group(fs_client.mgr, fs_handle, volspec,
                 volname, groupname, subvolname, lockless=False) as \
@@ -225,7 +179,9 @@ def do_clone(fs_client, volspec, volname, groupname, subvolname, should_cancel):
             dst_path = subvol0.path
             # XXX: this is where cloning (of subvolume's snapshots) actually
             # happens.
-            bulk_copy(fs_handle, src_path, dst_path, should_cancel)
+            with track_progress(fs_handle, volname, subvol0, src_path) as stats:
+                bulk_copy(fs_client, volname, fs_handle, src_path, dst_path, should_cancel,
+                          copy_threads, stats)
             set_quota_on_clone(fs_handle, (subvol0, subvol1, subvol2))
 
 def update_clone_failure_status(fs_client, volspec, volname, groupname, subvolname, ve):
@@ -244,9 +200,11 @@ def log_clone_failure(volname, groupname, subvolname, ve):
     else:
         log.error("Clone failed: ({0}, {1}, {2}, reason -> {3})".format(volname, groupname, subvolname, ve))
 
-def handle_clone_in_progress(fs_client, volspec, volname, index, groupname, subvolname, should_cancel):
+def handle_clone_in_progress(fs_client, volspec, volname, index, groupname, subvolname, should_cancel,
+                             copy_threads, track_progress):
     try:
-        do_clone(fs_client, volspec, volname, groupname, subvolname, should_cancel)
+        do_clone(fs_client, volspec, volname, groupname, subvolname, should_cancel,
+                 copy_threads, track_progress)
         next_state = SubvolumeOpSm.transition(SubvolumeTypes.TYPE_CLONE,
                                               SubvolumeStates.STATE_INPROGRESS,
                                               SubvolumeActions.ACTION_SUCCESS)
@@ -263,6 +221,7 @@ def handle_clone_failed(fs_client, volspec, volname, index, groupname, subvolnam
         # detach source but leave the clone section intact for later inspection
         with open_clone_subvol_pair_in_vol(fs_client, volspec, volname, groupname,
                 subvolname) as (subvol0, subvol1, subvol2):
+            subvol0.remove_clone_progress()
             subvol1.detach_snapshot(subvol2, index)
     except (MetadataMgrException, VolumeException) as e:
         log.error("failed to detach clone from snapshot: {0}".format(e))
@@ -272,6 +231,7 @@ def handle_clone_complete(fs_client, volspec, volname, index, groupname, subvoln
     try:
         with open_clone_subvol_pair_in_vol(fs_client, volspec, volname,
                 groupname, subvolname) as (subvol0, subvol1, subvol2):
+            subvol0.remove_clone_progress()
             subvol1.detach_snapshot(subvol2, index)
     except (MetadataMgrException, VolumeException) as e:
         log.error("failed to detach clone from snapshot: {0}".format(e))
@@ -327,19 +287,47 @@ class Cloner(AsyncJobs):
     this relies on a simple state machine (which mimics states from SubvolumeOpSm class) as
     the driver. file types supported are directories, symbolic links and regular files.
     """
-    def __init__(self, volume_client, tp_size, snapshot_clone_delay, clone_no_wait):
-        super(Cloner, self).__init__(volume_client, "cloner", tp_size)
-
+    def __init__(self, volume_client, tp_size, snapshot_clone_delay, clone_no_wait, copy_threads):
         self.vc = volume_client
         self.snapshot_clone_delay = snapshot_clone_delay
         self.snapshot_clone_no_wait = clone_no_wait
+        self.copy_threads = copy_threads
+        # (volume name, clone base path) -> CloneStats of clones being copied
+        self.clone_stats: Dict[Tuple[str, bytes], CloneStats] = {}
+        self.clone_stats_lock = threading.Lock()
         self.state_table = {
             SubvolumeStates.STATE_PENDING      : handle_clone_pending,
-            SubvolumeStates.STATE_INPROGRESS   : handle_clone_in_progress,
+            SubvolumeStates.STATE_INPROGRESS   : self._handle_clone_in_progress,
             SubvolumeStates.STATE_COMPLETE     : handle_clone_complete,
             SubvolumeStates.STATE_FAILED       : handle_clone_failed,
             SubvolumeStates.STATE_CANCELED     : handle_clone_failed,
         }
+        super(Cloner, self).__init__(volume_client, "cloner", tp_size)
+
+    def _handle_clone_in_progress(self, fs_client, volspec, volname, index, groupname, subvolname, should_cancel):
+        return handle_clone_in_progress(fs_client, volspec, volname, index, groupname, subvolname,
+                                        should_cancel, self.copy_threads, self.track_clone_progress)
+
+    @contextmanager
+    def track_clone_progress(self, fs_handle, volname, clone_subvolume, src_path):
+        # the size of the snapshot is looked up once per copy, then saved
+        # with the progress of the copy.
+        saved = clone_subvolume.get_clone_progress()
+        if saved is None:
+            saved = get_clone_size(fs_handle, src_path)
+        stats = CloneStats(saved, clone_subvolume.set_clone_progress)
+        key = (volname, clone_subvolume.base_path)
+        with self.clone_stats_lock:
+            self.clone_stats[key] = stats
+        try:
+            yield stats
+        finally:
+            with self.clone_stats_lock:
+                self.clone_stats.pop(key, None)
+
+    def get_clone_stats(self, volname, clone_base_path):
+        with self.clone_stats_lock:
+            return self.clone_stats.get((volname, clone_base_path), None)
 
     def reconfigure_max_concurrent_clones(self, tp_size):
         return super(Cloner, self).reconfigure_max_async_threads(tp_size)
@@ -350,6 +338,9 @@ class Cloner(AsyncJobs):
     def reconfigure_reject_clones(self, clone_no_wait):
         self.snapshot_clone_no_wait = clone_no_wait
 
+    def reconfigure_clone_copy_threads(self, copy_threads):
+        self.copy_threads = copy_threads
+
     def is_clone_cancelable(self, clone_state):
         return not (SubvolumeOpSm.is_complete_state(clone_state) or SubvolumeOpSm.is_failed_state(clone_state))
 
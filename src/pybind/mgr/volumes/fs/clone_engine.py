@@ -0,0 +1,312 @@
+'''
+Parallel copy of a snapshot to a clone subvolume.
+
+A clone is copied by a pool of worker threads, each holding a libcephfs
+handle from the connection pool for the volume. Workers take directories
+to scan and regular files to copy from a shared work queue: scanning a
+directory creates its subdirectories and symbolic links right away and
+queues its subdirectories and files, so that the tree is walked and the
+files are copied concurrently. The ownership, mode and times of a copied
+entry are set with a single setattr request, and data is synced once per
+handle when the copy is done rather than once per file. The progress of the
+copy is counted by the workers as they go (see CloneStats).
+'''
+import os
+import stat
+import errno
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import cephfs
+from mgr_util import format_bytes, format_dimless
+
+from .exception import VolumeException
+from .fs_util import copy_file
+from .operations.volume import open_volume_lockless
+
+log = logging.getLogger(__name__)
+
+STATX_MASK = (cephfs.CEPH_STATX_MODE | cephfs.CEPH_STATX_UID
+              | cephfs.CEPH_STATX_GID | cephfs.CEPH_STATX_ATIME
+              | cephfs.CEPH_STATX_MTIME | cephfs.CEPH_STATX_SIZE)
+
+TIMES_MASK = cephfs.CEPH_SETATTR_ATIME | cephfs.CEPH_SETATTR_MTIME
+ATTRS_MASK = (TIMES_MASK | cephfs.CEPH_SETATTR_MODE
+              | cephfs.CEPH_SETATTR_UID | cephfs.CEPH_SETATTR_GID)
+
+
+class CloneStats:
+    """
+    Progress of a clone, updated by the copy workers.
+
+    The progress is saved in the metadata of the clone now and then, so
+    that it is still known after a mgr failover. The copy is then started
+    over and the saved progress is reported until the new copy gets past it.
+    """
+
+    # seconds between saves of the progress
+    SAVE_INTERVAL = 10
+
+    def __init__(self, saved=None, save=None):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        # size of the snapshot being cloned and progress of earlier copies
+        self.saved = dict(saved or {})
+        self.save = save
+        self.last_save = self.started
+
+    def add(self, files=0, dirs=0, nbytes=0):
+        with self.lock:
+            self.files += files
+            self.dirs += dirs
+            self.bytes += nbytes
+
+    def rates(self) -> Tuple[float, float]:
+        """
+        Files (regular files and symbolic links) and bytes copied per second
+        since the copy started.
+        """
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 0.001)
+            return self.files / elapsed, self.bytes / elapsed
+
+    def progress(self) -> Dict[str, int]:
+        """
+        Bytes and entries (like the ceph.dir.rbytes and ceph.dir.rentries
+        of the snapshot, which include its root) copied so far, and in total.
+        """
+        with self.lock:
+            nbytes = self.bytes
+            entries = 1 + self.files + self.dirs
+        return {
+            'bytes_total': self.saved.get('bytes_total', 0),
+            'bytes_copied': max(self.saved.get('bytes_copied', 0), nbytes),
+            'entries_total': self.saved.get('entries_total', 0),
+            'entries_copied': max(self.saved.get('entries_copied', 0), entries),
+        }
+
+    def checkpoint(self):
+        """
+        Save the progress if it has not been saved for SAVE_INTERVAL.
+        """
+        now = time.monotonic()
+        if self.save is None or now - self.last_save < CloneStats.SAVE_INTERVAL:
+            return
+        self.last_save = now
+        progress = self.progress()
+        if progress == self.saved:
+            return
+        try:
+            self.save(progress)
+            self.saved = progress
+        except Exception as e:
+            # not worth failing the clone for
+            log.warning("failed to save clone progress: {0}".format(e))
+
+    def report(self) -> Dict[str, str]:
+        files_rate, bytes_rate = self.rates()
+        return {
+            'files/s': format_dimless(int(files_rate), 4).strip(),
+            'bytes/s': format_bytes(int(bytes_rate), 4).strip(),
+        }
+
+
+class _Dir:
+    """
+    A directory being copied. Its attributes are set once everything below
+    it has been copied, as creating entries in it updates its times.
+    """
+    __slots__ = ('src', 'dst', 'stx', 'parent', 'pending')
+
+    def __init__(self, src, dst, stx, parent):
+        self.src = src
+        self.dst = dst
+        self.stx = stx
+        self.parent: Optional[_Dir] = parent
+        # the scan of the directory plus its files and subdirectories that
+        # have not been copied yet
+        self.pending = 1
+
+
+class CloneEngine:
+    """
+    Copy the tree at a path of a volume to another path of the same volume
+    with a pool of worker threads. Only directories, symbolic links and
+    regular files are copied.
+    """
+
+    # a worker scanning a directory copies files itself instead of queueing
+    # them when this many are queued already, which bounds the queue for
+    # directories with millions of entries.
+    MAX_QUEUED_FILES = 10000
+
+    def __init__(self, fs_client, volname, nr_workers, should_cancel, stats):
+        self.fs_client = fs_client
+        self.volname = volname
+        self.nr_workers = max(1, nr_workers)
+        self.should_cancel = should_cancel
+        self.stats = stats
+
+        self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.dirs: Deque[_Dir] = deque()
+        self.files: Deque[Tuple[_Dir, bytes, bytes, Dict[str, Any]]] = deque()
+        # set when the copy finished, failed or got canceled
+        self.stopping = False
+        self.error: Optional[VolumeException] = None
+
+    def copy(self, fs_handle, src_path, dst_path):
+        try:
+            stx = fs_handle.statx(src_path, STATX_MASK, cephfs.AT_SYMLINK_NOFOLLOW)
+        except cephfs.Error as e:
+            if e.args[0] == errno.ENOENT:
+                return
+            raise VolumeException(-e.args[0], e.args[1])
+        self.dirs.append(_Dir(src_path, dst_path, stx, None))
+
+        name = threading.current_thread().name
+        workers = [threading.Thread(target=self._run, name=f'{name}.copy.{i}')
+                   for i in range(self.nr_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=1)
+                self.stats.checkpoint()
+        if self.error is not None:
+            raise self.error
+
+    def _should_stop(self):
+        return self.stopping or self.should_cancel()
+
+    def _fail(self, ve):
+        with self.lock:
+            if self.error is None:
+                self.error = ve
+            self.stopping = True
+            self.cv.notify_all()
+
+    def _run(self):
+        try:
+            with open_volume_lockless(self.fs_client, self.volname) as fs_handle:
+                while True:
+                    task = self._get_task()
+                    if task is None:
+                        break
+                    if isinstance(task, _Dir):
+                        self._scan(fs_handle, task)
+                    else:
+                        parent, src, dst, stx = task
+                        self._copy_file(fs_handle, src, dst, stx)
+                        self._release(fs_handle, parent)
+                if self.error is None and not self.should_cancel():
+                    fs_handle.sync_fs()
+        except VolumeException as ve:
+            self._fail(ve)
+        except cephfs.Error as e:
+            self._fail(VolumeException(-e.args[0], e.args[1]))
+        except Exception as e:
+            log.exception("clone copy worker failed")
+            self._fail(VolumeException(-errno.EIO, str(e)))
+
+    def _get_task(self):
+        with self.lock:
+            while True:
+                if self.stopping:
+                    return None
+                if self.should_cancel():
+                    self.stopping = True
+                    self.cv.notify_all()
+                    return None
+                # copying files first keeps the queue short
+                if self.files:
+                    return self.files.popleft()
+                if self.dirs:
+                    return self.dirs.popleft()
+                # wake up now and then to notice cancellation
+                self.cv.wait(timeout=1)
+
+    def _release(self, fs_handle, d):
+        """
+        One task of directory @d is done: set the attributes of @d and of
+        its ancestors that are now complete.
+        """
+        while d is not None:
+            with self.lock:
+                d.pending -= 1
+                if d.pending or self.stopping:
+                    return
+            if d.parent is None:
+                # only the times of the clone root are synced from the
+                # snapshot, it keeps the attributes of the subvolume.
+                fs_handle.setattrx(d.dst, d.stx, TIMES_MASK, cephfs.AT_SYMLINK_NOFOLLOW)
+                with self.lock:
+                    self.stopping = True
+                    self.cv.notify_all()
+            else:
+                fs_handle.setattrx(d.dst, d.stx, ATTRS_MASK, cephfs.AT_SYMLINK_NOFOLLOW)
+            d = d.parent
+
+    def _scan(self, fs_handle, d):
+        log.debug("scanning: {0} -> {1}".format(d.src, d.dst))
+        try:
+            with fs_handle.opendir(d.src) as dir_handle:
+                entry = fs_handle.readdir(dir_handle)
+                while entry and not self._should_stop():
+                    if entry.d_name not in (b".", b".."):
+                        self._copy_entry(fs_handle, d, entry.d_name)
+                    entry = fs_handle.readdir(dir_handle)
+        except cephfs.Error as e:
+            if not e.args[0] == errno.ENOENT:
+                raise VolumeException(-e.args[0], e.args[1])
+        self._release(fs_handle, d)
+
+    def _copy_entry(self, fs_handle, d, name):
+        src = os.path.join(d.src, name)
+        dst = os.path.join(d.dst, name)
+        stx = fs_handle.statx(src, STATX_MASK, cephfs.AT_SYMLINK_NOFOLLOW)
+        if stat.S_ISDIR(stx["mode"]):
+            log.debug("copy: (DIR) {0}".format(src))
+            try:
+                fs_handle.mkdir(dst, stat.S_IMODE(stx["mode"]))
+            except cephfs.Error as e:
+                if not e.args[0] == errno.EEXIST:
+                    raise
+            self.stats.add(dirs=1)
+            with self.lock:
+                d.pending += 1
+                self.dirs.append(_Dir(src, dst, stx, d))
+                self.cv.notify()
+        elif stat.S_ISLNK(stx["mode"]):
+            log.debug("copy: (SYMLINK) {0}".format(src))
+            target = fs_handle.readlink(src, 4096)
+            try:
+                fs_handle.symlink(target[:stx["size"]], dst)
+            except cephfs.Error as e:
+                if not e.args[0] == errno.EEXIST:
+                    raise
+            fs_handle.setattrx(dst, stx, ATTRS_MASK, cephfs.AT_SYMLINK_NOFOLLOW)
+            self.stats.add(files=1)
+        elif stat.S_ISREG(stx["mode"]):
+            log.debug("copy: (REG) {0}".format(src))
+            with self.lock:
+                queue = len(self.files) < CloneEngine.MAX_QUEUED_FILES
+                if queue:
+                    d.pending += 1
+                    self.files.append((d, src, dst, stx))
+                    self.cv.notify()
+            if not queue:
+                self._copy_file(fs_handle, src, dst, stx)
+        else:
+            log.warning("copy: (IGNORE) {0}".format(src))
+
+    def _copy_file(self, fs_handle, src, dst, stx):
+        copied = copy_file(fs_handle, src, dst, stat.S_IMODE(stx["mode"]),
+                           cancel_check=self._should_stop, attrs=stx, sync=False)
+        self.stats.add(files=1, nbytes=copied)
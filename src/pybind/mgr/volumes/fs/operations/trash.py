@@ -1,7 +1,11 @@
 import os
+import time
 import uuid
 import logging
+import threading
+from collections import deque
 from contextlib import contextmanager
+from typing import Callable, Deque, Optional
 
 import cephfs
 
@@ -10,6 +14,191 @@ from ..exception import VolumeException
 
 log = logging.getLogger(__name__)
 
+class _PurgeDir:
+    """
+    A directory being purged, removed once it is empty.
+    """
+    __slots__ = ('path', 'parent', 'pending')
+
+    def __init__(self, path, parent):
+        self.path = path
+        self.parent: Optional[_PurgeDir] = parent
+        # the scan of the directory plus its subdirectories that have not
+        # been removed yet
+        self.pending = 1
+
+
+class PurgeTree:
+    """
+    Purge of a directory tree, walked iteratively with a queue of
+    directories to scan. Scanning a directory unlinks its files and queues
+    its subdirectories, and a directory is removed once its scan and its
+    subdirectories are done.
+
+    The thread owning the purge (see `run()`) can be joined by other purge
+    threads with nothing else to do (see `help()`), so that a large trash
+    entry is purged by several threads at a time.
+    """
+
+    # seconds between two calls to `on_work`
+    WAKEUP_INTERVAL = 1.0
+
+    def __init__(self, path, should_cancel):
+        self.path = path
+        self.should_cancel = should_cancel
+        self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.dirs: Deque[_PurgeDir] = deque()
+        self.helpers = 0
+        # set when the purge finished, failed or got canceled
+        self.stopping = False
+        self.done = False
+        self.error: Optional[VolumeException] = None
+        # called when directories are queued, to wake up idle purge threads
+        self.on_work: Optional[Callable[[], None]] = None
+        self.last_wakeup = 0.0
+        self.started = time.monotonic()
+        self.removed = 0
+
+    def run(self, fs):
+        """
+        Purge the tree, return once it is gone or the purge was stopped.
+        """
+        log.debug("rmtree {0}".format(self.path))
+        with self.lock:
+            self.dirs.append(_PurgeDir(self.path, None))
+        while True:
+            self._work(fs, self.should_cancel)
+            with self.lock:
+                # helpers may still queue directories, and are waited for
+                # before returning
+                while True:
+                    if self.stopping or self.done:
+                        if not self.helpers:
+                            break
+                    elif self.dirs:
+                        break
+                    elif self.should_cancel():
+                        self.stopping = True
+                        continue
+                    self.cv.wait(timeout=1)
+                if self.stopping or self.done:
+                    break
+        if self.error is not None:
+            raise self.error
+
+    def add_helper(self):
+        """
+        Register a thread to help with the purge, if there is work for it.
+        """
+        with self.lock:
+            if self.stopping or not self.dirs:
+                return False
+            self.helpers += 1
+            return True
+
+    def help(self, fs, should_cancel):
+        """
+        Purge directories queued by the owner of the purge until there are
+        none left. Called by threads registered with `add_helper()`.
+        """
+        self._work(fs, should_cancel)
+
+    def remove_helper(self):
+        with self.lock:
+            self.helpers -= 1
+            self.cv.notify_all()
+
+    def progress(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 0.001)
+            return self.removed, self.removed / elapsed
+
+    def _should_stop(self, should_cancel):
+        if should_cancel():
+            with self.lock:
+                self.stopping = True
+                self.cv.notify_all()
+        return self.stopping
+
+    def _fail(self, ve):
+        with self.lock:
+            if self.error is None:
+                self.error = ve
+            self.stopping = True
+            self.cv.notify_all()
+
+    def _work(self, fs, should_cancel):
+        try:
+            while not self._should_stop(should_cancel):
+                with self.lock:
+                    if not self.dirs:
+                        return
+                    d = self.dirs.popleft()
+                self._scan(fs, d, should_cancel)
+        except cephfs.Error as e:
+            self._fail(VolumeException(-e.args[0], e.args[1]))
+        except VolumeException as ve:
+            self._fail(ve)
+
+    def _scan(self, fs, d, should_cancel):
+        removed = 0
+        queued = False
+        try:
+            with fs.opendir(d.path) as dir_handle:
+                entry = fs.readdir(dir_handle)
+                while entry and not self._should_stop(should_cancel):
+                    if entry.d_name not in (b".", b".."):
+                        d_full = os.path.join(d.path, entry.d_name)
+                        if entry.is_dir():
+                            with self.lock:
+                                d.pending += 1
+                                self.dirs.append(_PurgeDir(d_full, d))
+                                self.cv.notify()
+                            queued = True
+                        else:
+                            fs.unlink(d_full)
+                            removed += 1
+                    entry = fs.readdir(dir_handle)
+        except cephfs.ObjectNotFound:
+            pass
+        finally:
+            with self.lock:
+                self.removed += removed
+        if queued:
+            self._wakeup()
+        self._release(fs, d)
+
+    def _release(self, fs, d):
+        while d is not None:
+            with self.lock:
+                d.pending -= 1
+                # remove the directory only if we were not asked to cancel
+                # (else we would fail to remove this anyway)
+                if d.pending or self.stopping:
+                    return
+            try:
+                fs.rmdir(d.path)
+            except cephfs.ObjectNotFound:
+                pass
+            with self.lock:
+                self.removed += 1
+                if d.parent is None:
+                    self.done = True
+                    self.cv.notify_all()
+            d = d.parent
+
+    def _wakeup(self):
+        if self.on_work is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_wakeup < PurgeTree.WAKEUP_INTERVAL:
+                return
+            self.last_wakeup = now
+        self.on_work()
+
+
 class Trash(GroupTemplate):
     GROUP_NAME = "_deleting"
 
@@ -51,41 +240,18 @@ class Trash(GroupTemplate):
         """
         return self._get_single_dir_entry(exclude_list)
 
-    def purge(self, trashpath, should_cancel):
+    def purge(self, trashpath, should_cancel, tree=None):
         """
         purge a trash entry.
 
         :praram trash_entry: the trash entry to purge
         :praram should_cancel: callback to check if the purge should be aborted
+        :praram tree: PurgeTree other purge threads can help with, if any
         :return: None
         """
-        def rmtree(root_path):
-            log.debug("rmtree {0}".format(root_path))
-            try:
-                with self.fs.opendir(root_path) as dir_handle:
-                    d = self.fs.readdir(dir_handle)
-                    while d and not should_cancel():
-                        if d.d_name not in (b".", b".."):
-                            d_full = os.path.join(root_path, d.d_name)
-                            if d.is_dir():
-                                rmtree(d_full)
-                            else:
-                                self.fs.unlink(d_full)
-                        d = self.fs.readdir(dir_handle)
-            except cephfs.ObjectNotFound:
-                return
-            except cephfs.Error as e:
-                raise VolumeException(-e.args[0], e.args[1])
-            # remove the directory only if we were not asked to cancel
-            # (else we would fail to remove this anyway)
-            if not should_cancel():
-                self.fs.rmdir(root_path)
-
-        # catch any unlink errors
-        try:
-            rmtree(trashpath)
-        except cephfs.Error as e:
-            raise VolumeException(-e.args[0], e.args[1])
+        if tree is None:
+            tree = PurgeTree(trashpath, should_cancel)
+        tree.run(self.fs)
 
     def dump(self, path):
         """
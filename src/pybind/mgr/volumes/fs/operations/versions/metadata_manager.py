@@ -64,6 +64,9 @@ class MetadataManager(object):
     CLONE_FAILURE_META_KEY_ERRNO = "errno"
     CLONE_FAILURE_META_KEY_ERROR_MSG = "error_msg"
 
+    CLONE_PROGRESS_SECTION = "CLONE_PROGRESS"
+    CLONE_PROGRESS_META_KEYS = ["bytes_total", "bytes_copied", "entries_total", "entries_copied"]
+
     def __init__(self, fs, config_path, mode):
         self.fs = fs
         self.mode = mode
@@ -138,7 +141,7 @@ class MetadataManager(object):
         return self.config.remove_option(section, key)
 
     def remove_section(self, section):
-        self.config.remove_section(section)
+        return self.config.remove_section(section)
 
     def update_section(self, section, key, value):
         if not self.config.has_section(section):
@@ -150,6 +150,32 @@ class SubvolumeV1(SubvolumeBase, SubvolumeTemplate):
             log.error(f"Failed to add clone failure status clone={self.subvol_name} group={self.group_name} "
                       f"reason={me.args[1]}, errno:{-me.args[0]}, {os.strerror(-me.args[0])}")
 
+    def set_clone_progress(self, progress):
+        self.metadata_mgr.add_section(MetadataManager.CLONE_PROGRESS_SECTION)
+        self.metadata_mgr.update_section_multi(MetadataManager.CLONE_PROGRESS_SECTION, progress)
+        self.metadata_mgr.flush()
+
+    def get_clone_progress(self):
+        """
+        Progress of the copy saved by the cloner, None if there is none.
+        """
+        try:
+            return {key: int(self.metadata_mgr.get_option(MetadataManager.CLONE_PROGRESS_SECTION, key))
+                    for key in MetadataManager.CLONE_PROGRESS_META_KEYS}
+        except (MetadataMgrException, ValueError):
+            return None
+
+    def remove_clone_progress(self):
+        """
+        Drop the progress saved by the cloner, once the clone is done with.
+        """
+        try:
+            if self.metadata_mgr.remove_section(MetadataManager.CLONE_PROGRESS_SECTION):
+                self.metadata_mgr.flush()
+        except MetadataMgrException as me:
+            log.warning(f"Failed to remove clone progress clone={self.subvol_name} group={self.group_name} "
+                        f"reason={me.args[1]}, errno:{-me.args[0]}, {os.strerror(-me.args[0])}")
+
     def create_clone(self, pool, source_volname, source_subvolume, snapname):
         subvolume_type = SubvolumeTypes.TYPE_CLONE
         try:
@@ -2,6 +2,8 @@ import errno
 import logging
 import os
 import stat
+from contextlib import contextmanager
+from typing import Dict, Tuple
 
 import cephfs
 
@@ -12,7 +14,7 @@ from .operations.template import SubvolumeOpType
 from .operations.group import open_group
 from .operations.subvolume import open_subvol
 from .operations.volume import open_volume, open_volume_lockless
-from .operations.trash import open_trashcan
+from .operations.trash import PurgeTree, open_trashcan
 
 log = logging.getLogger(__name__)
 
@@ -57,7 +59,7 @@ def subvolume_purge(fs_client, volspec, volname, trashcan, subvolume_trash_entry
 
 
 # helper for starting a purge operation on a trash entry
-def purge_trash_entry_for_volume(fs_client, volspec, volname, purge_entry, should_cancel):
+def purge_trash_entry_for_volume(fs_client, volspec, volname, purge_entry, should_cancel, track_purge):
     log.debug("purging trash entry '{0}' for volume '{1}'".format(purge_entry, volname))
 
     ret = 0
@@ -74,7 +76,8 @@ def purge_trash_entry_for_volume(fs_client, volspec, volname, purge_entry, shoul
                         log.debug("purging entry pointing to subvolume trash: {0}".format(tgt))
                         delink = True
                         try:
-                            trashcan.purge(tgt, should_cancel)
+                            with track_purge(volname, purge_entry, tgt, should_cancel) as tree:
+                                trashcan.purge(tgt, should_cancel, tree)
                         except VolumeException as ve:
                             if not ve.errno == -errno.ENOENT:
                                 delink = False
@@ -86,7 +89,8 @@ def purge_trash_entry_for_volume(fs_client, volspec, volname, purge_entry, shoul
                                 trashcan.delink(purge_entry)
                     else:
                         log.debug("purging entry pointing to trash: {0}".format(pth))
-                        trashcan.purge(pth, should_cancel)
+                        with track_purge(volname, purge_entry, pth, should_cancel) as tree:
+                            trashcan.purge(pth, should_cancel, tree)
                 except cephfs.Error as e:
                     log.warn("failed to remove trash entry: {0}".format(e))
     except VolumeException as ve:
@@ -94,6 +98,18 @@ def purge_trash_entry_for_volume(fs_client, volspec, volname, purge_entry, shoul
     return ret
 
 
+class PurgeHelperJob:
+    """
+    Job of a purge thread helping with the purge of a trash entry another
+    purge thread is working on.
+    """
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __repr__(self):
+        return "PurgeHelperJob({0})".format(self.tree.path)
+
+
 class ThreadPoolPurgeQueueMixin(AsyncJobs):
     """
     Purge queue mixin class maintaining a pool of threads for purging trash entries.
@@ -101,14 +117,80 @@ class ThreadPoolPurgeQueueMixin(AsyncJobs):
     entries (belonging to a set of volumes) have huge directory tree's (such as, lots
     of small files in a directory w/ deep directory trees), this model may lead to
     _all_ threads purging entries for one volume (starving other volumes).
+
+    Threads with no trash entry to purge help purging the entries other threads
+    are working on, a directory of the entry at a time.
     """
     def __init__(self, volume_client, tp_size):
+        self.vc = volume_client
+        # (volume name, trash entry) -> PurgeTree of the entries being purged
+        self.purge_trees: Dict[Tuple[str, bytes], PurgeTree] = {}
         super(ThreadPoolPurgeQueueMixin, self).__init__(volume_client, "purgejob", tp_size)
 
-        self.vc = volume_client
+    @contextmanager
+    def track_purge(self, volname, purge_entry, path, should_cancel):
+        tree = PurgeTree(path, should_cancel)
+        tree.on_work = self._wakeup_threads
+        with self.lock:
+            self.purge_trees[(volname, purge_entry)] = tree
+        try:
+            yield tree
+        finally:
+            with self.lock:
+                self.purge_trees.pop((volname, purge_entry), None)
+            removed, rate = tree.progress()
+            log.info("purged {0} entries of {1} at {2:.1f} entries/s".format(removed, path, rate))
+
+    def _wakeup_threads(self):
+        with self.lock:
+            self.cv.notifyAll()
+
+    def get_purge_progress(self, volname, prefix=None):
+        """
+        progress of the purges running for a volume, limited to trash entries
+        under @prefix if given.
+        """
+        purging = 0
+        removed = 0
+        rate = 0.0
+        with self.lock:
+            trees = [tree for (vol, _), tree in self.purge_trees.items()
+                     if vol == volname and (prefix is None or tree.path.startswith(prefix))]
+        for tree in trees:
+            tree_removed, tree_rate = tree.progress()
+            purging += 1
+            removed += tree_removed
+            rate += tree_rate
+        if not purging:
+            return None
+        return {
+            'entries_purging': purging,
+            'entries_removed': removed,
+            'removal_rate': round(rate, 1),
+        }
+
+    def get_job(self):
+        next_job = super(ThreadPoolPurgeQueueMixin, self).get_job()
+        if next_job:
+            return next_job
+        # no trash entry to pick up: help with one being purged
+        for (volname, _), tree in self.purge_trees.items():
+            if volname in self.jobs and tree.add_helper():
+                return (volname, PurgeHelperJob(tree))
+        return None
 
     def get_next_job(self, volname, running_jobs):
         return get_trash_entry_for_volume(self.fs_client, self.vc.volspec, volname, running_jobs)
 
     def execute_job(self, volname, job, should_cancel):
-        purge_trash_entry_for_volume(self.fs_client, self.vc.volspec, volname, job, should_cancel)
+        if isinstance(job, PurgeHelperJob):
+            try:
+                with open_volume_lockless(self.fs_client, volname) as fs_handle:
+                    job.tree.help(fs_handle, should_cancel)
+            except VolumeException as ve:
+                log.error("error helping to purge {0} ({1})".format(job.tree.path, ve))
+            finally:
+                job.tree.remove_helper()
+            return
+        purge_trash_entry_for_volume(self.fs_client, self.vc.volspec, volname, job,
+                                     should_cancel, self.track_purge)
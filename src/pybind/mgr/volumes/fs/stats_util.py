@@ -69,15 +69,6 @@ def get_amount_copied(src_path, dst_path, fs_handle):
     return size_t, size_c, percent
 
 
-def get_percent_copied(src_path, dst_path, fs_handle):
-    retval = get_amount_copied(src_path, dst_path, fs_handle)
-    if not retval:
-        return retval
-    else:
-        _, _, percent = retval
-        return percent
-
-
 def get_stats(src_path, dst_path, fs_handle):
     rentries = 'ceph.dir.rentries'
     # set it to true when either src_path or dst_path has gone missing.
@@ -112,6 +103,26 @@ def get_stats(src_path, dst_path, fs_handle):
     }
 
 
+def get_progress_stats(progress):
+    '''
+    Same as get_stats(), from the progress tracked by the cloner instead of
+    the rstats of the source and destination.
+    '''
+    size_t, size_c = progress['bytes_total'], progress['bytes_copied']
+    percent: float
+    if size_t == 0 or size_c == 0:
+        percent = 0
+    else:
+        percent = round(min(size_c / size_t, 1) * 100, 3)
+
+    return {
+        'percentage cloned': percent,
+        'amount cloned': get_size_ratio_str(size_c, size_t),
+        'files cloned': get_num_ratio_str(progress['entries_copied'],
+                                          progress['entries_total']),
+    }
+
+
 class CloneInfo:
 
     def __init__(self, volname):
@@ -124,6 +135,10 @@ class CloneInfo:
         self.dst_group_name = None
         self.dst_subvol_name = None
         self.dst_path = None
+        self.dst_base_path = None
+
+        # progress of the copy saved by the cloner
+        self.progress = None
 
 
 class CloneProgressReporter:
@@ -131,8 +146,8 @@ class CloneProgressReporter:
     def __init__(self, volclient, vol_spec):
         self.vol_spec = vol_spec
 
-        # instance of VolumeClient is needed here so that call to
-        # LibCephFS.getxattr() can be made.
+        # instance of VolumeClient is needed here to look up clones and the
+        # progress tracked by its cloner.
         self.volclient = volclient
 
         # Creating an RTimer instance in advance so that we can check if clone
@@ -175,6 +190,8 @@ class CloneProgressReporter:
                                 SubvolumeOpType.CLONE_INTERNAL) \
                                 as (_, _, dst_subvol):
             ci.dst_path = dst_subvol.path
+            ci.dst_base_path = dst_subvol.base_path
+            ci.progress = dst_subvol.get_clone_progress()
             log.debug(f'destination subvolume path for clone - {ci.dst_path}')
 
         clone_state = get_clone_state(self.volclient, self.vol_spec, ci.volname,
@@ -253,6 +270,18 @@ class CloneProgressReporter:
                   f'{self.ongoing_clones_count} are ongoing clones')
         return clones
 
+    def _get_percent_copied(self, clone):
+        '''
+        Progress of a clone as tracked by the cloner, pending clones and
+        clones that are yet to be picked up after a mgr failover have none.
+        '''
+        clone_stats = self.volclient.cloner.get_clone_stats(clone.volname,
+                                                            clone.dst_base_path)
+        progress = clone_stats.progress() if clone_stats else clone.progress
+        if not progress:
+            return None
+        return get_progress_stats(progress)['percentage cloned']
+
     def _update_progress_bar_event(self, ev_id, ev_msg, ev_progress_fraction):
         log.debug(f'ev_id = {ev_id} ev_progress_fraction = {ev_progress_fraction}')
         log.debug(f'ev_msg = {ev_msg}')
@@ -305,16 +334,13 @@ class CloneProgressReporter:
             total_onpen_clones = len(clones)
 
         for clone in clones:
-            with open_volume_lockless(self.volclient, clone.volname) as \
-                    fs_handle:
-                percent = get_percent_copied(clone.src_path, clone.dst_path,
-                                             fs_handle)
-                if not percent:
-                    continue
-                if clone in clones[:total_ongoing_clones]:
-                    sum_percent_ongoing += percent
-                if show_onpen_bar:
-                    sum_percent_onpen += percent
+            percent = self._get_percent_copied(clone)
+            if not percent:
+                continue
+            if clone in clones[:total_ongoing_clones]:
+                sum_percent_ongoing += percent
+            if show_onpen_bar:
+                sum_percent_onpen += percent
 
         avg_percent_ongoing = round(sum_percent_ongoing / total_ongoing_clones, 3)
         # progress module takes progress as a fraction between 0.0 to 1.0.
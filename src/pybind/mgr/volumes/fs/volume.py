@@ -14,7 +14,7 @@ from ceph.fs.earmarking import CephFSVolumeEarmarking, EarmarkException
 from mgr_util import CephfsClient
 
 from .fs_util import listdir, has_subdir
-from .stats_util import get_stats
+from .stats_util import get_progress_stats, get_stats
 
 from .operations.group import open_group, create_group, remove_group, \
     open_group_unique, set_group_attrs
@@ -63,7 +63,7 @@ class VolumeClient(CephfsClient["Module"]):
         # volume specification
         self.volspec = VolSpec(mgr.rados.conf_get('client_snapdir'))
         self.cloner = Cloner(self, self.mgr.max_concurrent_clones, self.mgr.snapshot_clone_delay,
-                             self.mgr.snapshot_clone_no_wait)
+                             self.mgr.snapshot_clone_no_wait, self.mgr.snapshot_clone_copy_threads)
         self.clone_progress_reporter = CloneProgressReporter(self,
                                                              self.volspec)
         self.purge_queue = ThreadPoolPurgeQueueMixin(self, 4)
@@ -87,6 +87,15 @@ class VolumeClient(CephfsClient["Module"]):
         # last, delete all libcephfs handles from connection pool
         self.connection_pool.del_all_connections()
 
+    def refresh_fs_map(self, fs_map):
+        """
+        drop the connections to removed or recreated volumes, from our pool
+        and from the pools of the cloner and purge threads. called from
+        notify(): idle connections are aborted by the timers of the pools.
+        """
+        for fs_client in (self, self.cloner.fs_client, self.purge_queue.fs_client):
+            fs_client.connection_pool.refresh_fs_map(fs_map, close=False)
+
     def cluster_log(self, msg, lvl=None):
         """
         log to cluster log with default log level as WARN.
@@ -189,6 +198,9 @@ class VolumeClient(CephfsClient["Module"]):
                 except cephfs.Error as e:
                     if e.args[0] == errno.ENOENT:
                         pass
+                purge_progress = self.purge_queue.get_purge_progress(volname)
+                if purge_progress:
+                    vol_info_dict['purge_progress'] = purge_progress
                 df = self.mgr.get("df")
                 pool_stats = dict([(p['id'], p['stats']) for p in df['pools']])
                 osdmap = self.mgr.get("osd_map")
@@ -516,6 +528,10 @@ class VolumeClient(CephfsClient["Module"]):
                         subvol_info_dict = subvolume.info()
                         subvol_info_dict["mon_addrs"] = mon_addr_lst
                         subvol_info_dict["flavor"] = subvolume.VERSION
+                        purge_progress = self.purge_queue.get_purge_progress(
+                            volname, prefix=subvolume.base_path + b'/')
+                        if purge_progress:
+                            subvol_info_dict["purge_progress"] = purge_progress
                         ret = 0, json.dumps(subvol_info_dict, indent=4, sort_keys=True), ""
         except VolumeException as ve:
             ret = self.volume_exception_to_retval(ve)
@@ -1028,21 +1044,34 @@ class VolumeClient(CephfsClient["Module"]):
 
         return src_path
 
-    def _get_clone_progress_report(self, vol_handle, dst_group, dst_subvol):
-        dst_path = dst_subvol.base_path.decode('utf-8')
-        src_path = self._get_clone_src_path(vol_handle, dst_group, dst_subvol)
-        if not src_path:
-            return None
+    def _get_clone_progress_report(self, vol_handle, volname, dst_group, dst_subvol):
+        clone_stats = self.cloner.get_clone_stats(volname, dst_subvol.base_path)
+        if clone_stats:
+            progress = clone_stats.progress()
+        else:
+            # being copied by another mgr before a failover
+            progress = dst_subvol.get_clone_progress()
+
+        if progress:
+            stats = get_progress_stats(progress)
+        else:
+            # clones started by a mgr that did not save the progress
+            dst_path = dst_subvol.base_path.decode('utf-8')
+            src_path = self._get_clone_src_path(vol_handle, dst_group, dst_subvol)
+            if not src_path:
+                return None
+            stats = get_stats(src_path, dst_path, vol_handle)
 
-        stats = get_stats(src_path, dst_path, vol_handle)
         if stats:
             stats['percentage cloned'] = str(stats['percentage cloned']) + '%'
+            if clone_stats:
+                stats.update(clone_stats.report())
         return stats
 
-    def _get_clone_status(self, vol_handle, group, subvol):
+    def _get_clone_status(self, vol_handle, volname, group, subvol):
         status = subvol.status
         if status['state'] == 'in-progress':
-            stats = self._get_clone_progress_report(vol_handle, group, subvol)
+            stats = self._get_clone_progress_report(vol_handle, volname, group, subvol)
             if stats:
                 status.update({'progress_report': stats})
 
@@ -1058,7 +1087,7 @@ class VolumeClient(CephfsClient["Module"]):
             with open_volume(self, volname) as fs_handle:
                 with open_group(fs_handle, self.volspec, groupname) as group:
                     with open_subvol(self.mgr, fs_handle, self.volspec, group, clonename, SubvolumeOpType.CLONE_STATUS) as subvolume:
-                        status = self._get_clone_status(fs_handle, group, subvolume)
+                        status = self._get_clone_status(fs_handle, volname, group, subvolume)
                         ret = 0, status, ""
         except VolumeException as ve:
             ret = self.volume_exception_to_retval(ve)
@@ -3,7 +3,7 @@ import logging
 import traceback
 import threading
 
-from mgr_module import MgrModule, Option
+from mgr_module import MgrModule, NotifyType, Option
 import orchestrator
 
 from .fs.volume import VolumeClient
@@ -40,6 +40,8 @@ def mgr_cmd_wrap(f):
 
 
 class Module(orchestrator.OrchestratorClientMixin, MgrModule):
+    NOTIFY_TYPES = [NotifyType.fs_map]
+
     COMMANDS = [
         {
             'cmd': 'fs volume ls',
@@ -599,6 +601,12 @@ class Module(orchestrator.OrchestratorClientMixin, MgrModule):
             type='int',
             default=4,
             desc='Number of asynchronous cloner threads'),
+        Option(
+            'snapshot_clone_copy_threads',
+            type='int',
+            default=8,
+            min=1,
+            desc='Number of threads copying data for each clone'),
         Option(
             'snapshot_clone_delay',
             type='int',
@@ -630,6 +638,7 @@ class Module(orchestrator.OrchestratorClientMixin, MgrModule):
         self.inited = False
         # for mypy
         self.max_concurrent_clones = None
+        self.snapshot_clone_copy_threads = None
         self.snapshot_clone_delay = None
         self.periodic_async_work = False
         self.snapshot_clone_no_wait = None
@@ -646,6 +655,10 @@ class Module(orchestrator.OrchestratorClientMixin, MgrModule):
     def shutdown(self):
         self.vc.shutdown()
 
+    def notify(self, notify_type, notify_id):
+        if notify_type == NotifyType.fs_map and self.inited:
+            self.vc.refresh_fs_map(self.get('fs_map'))
+
     def config_notify(self):
         """
         This method is called whenever one of our config options is changed.
@@ -660,6 +673,8 @@ class Module(orchestrator.OrchestratorClientMixin, MgrModule):
                 if self.inited:
                     if opt['name'] == "max_concurrent_clones":
                         self.vc.cloner.reconfigure_max_concurrent_clones(self.max_concurrent_clones)
+                    elif opt['name'] == "snapshot_clone_copy_threads":
+                        self.vc.cloner.reconfigure_clone_copy_threads(self.snapshot_clone_copy_threads)
                     elif opt['name'] == "snapshot_clone_delay":
                         self.vc.cloner.reconfigure_snapshot_clone_delay(self.snapshot_clone_delay)
                     elif opt['name'] == "periodic_async_work":
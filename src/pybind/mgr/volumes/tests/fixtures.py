@@ -0,0 +1,304 @@
+import errno
+import os
+import stat
+import threading
+from datetime import datetime, timedelta
+
+import cephfs
+
+from tests import mock
+
+
+class FakeDirEntry:
+    def __init__(self, name, mode):
+        self.d_name = name
+        self.mode = mode
+
+    def is_dir(self):
+        return stat.S_ISDIR(self.mode)
+
+
+class FakeDir:
+    def __init__(self, entries):
+        self.entries = iter(entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeFS:
+    """
+    An in-memory filesystem with the parts of the libcephfs API the clone
+    and purge code use. Handles from `handle()` share the tree, but count
+    their own `sync_fs` calls.
+
+    `ops` logs the (op, path) of the calls that change the tree or the
+    attributes. `fail` maps an (op, path) to the errno it fails with, and
+    `on_op` is called with the (op, path) of every call.
+    """
+
+    def __init__(self, shared=None):
+        root = shared is None
+        if root:
+            shared = {
+                'lock': threading.RLock(),
+                'nodes': {},
+                'fds': {},
+                'ops': [],
+                'fail': {},
+                'on_op': [None],
+                'clock': [datetime(2020, 1, 1)],
+            }
+        self.shared = shared
+        self.lock = shared['lock']
+        self.nodes = shared['nodes']
+        self.ops = shared['ops']
+        self.fail = shared['fail']
+        self.syncs = 0
+        if root:
+            self.nodes[b'/'] = self._node(stat.S_IFDIR | 0o755, 0, 0)
+
+    def handle(self):
+        return FakeFS(self.shared)
+
+    @property
+    def on_op(self):
+        return self.shared['on_op'][0]
+
+    @on_op.setter
+    def on_op(self, fn):
+        self.shared['on_op'][0] = fn
+
+    # setting up a tree
+
+    def add_dir(self, path, mode=0o755, uid=0, gid=0, mtime=None):
+        self._add(path, self._node(stat.S_IFDIR | mode, uid, gid, mtime))
+
+    def add_file(self, path, data=b'', mode=0o644, uid=0, gid=0, mtime=None):
+        node = self._node(stat.S_IFREG | mode, uid, gid, mtime)
+        node['data'] = bytearray(data)
+        self._add(path, node)
+
+    def add_symlink(self, path, target, uid=0, gid=0, mtime=None):
+        node = self._node(stat.S_IFLNK | 0o777, uid, gid, mtime)
+        node['data'] = bytearray(target)
+        self._add(path, node)
+
+    def walk(self, top):
+        """
+        paths below @top, relative to it
+        """
+        top = self._path(top)
+        prefix = top.rstrip(b'/') + b'/'
+        return sorted(p[len(prefix):] for p in self.nodes if p.startswith(prefix))
+
+    def node(self, path):
+        return self.nodes[self._path(path)]
+
+    # libcephfs
+
+    def statx(self, path, mask, flag):
+        node = self._lookup('statx', path)
+        return {
+            'mode': node['mode'],
+            'uid': node['uid'],
+            'gid': node['gid'],
+            'size': len(node['data']),
+            'atime': node['atime'],
+            'mtime': node['mtime'],
+        }
+
+    def opendir(self, path):
+        path = self._path(path)
+        with self.lock:
+            self._lookup('opendir', path)
+            prefix = path.rstrip(b'/') + b'/'
+            entries = [FakeDirEntry(b'.', stat.S_IFDIR), FakeDirEntry(b'..', stat.S_IFDIR)]
+            entries += [FakeDirEntry(p[len(prefix):], n['mode'])
+                        for p, n in sorted(self.nodes.items())
+                        if p.startswith(prefix) and b'/' not in p[len(prefix):]]
+        return FakeDir(entries)
+
+    def readdir(self, handle):
+        return next(handle.entries, None)
+
+    def mkdir(self, path, mode):
+        self._create('mkdir', path, self._node(stat.S_IFDIR | mode, 0, 0))
+
+    def symlink(self, target, path):
+        node = self._node(stat.S_IFLNK | 0o777, 0, 0)
+        node['data'] = bytearray(target)
+        self._create('symlink', path, node)
+
+    def readlink(self, path, size):
+        return bytes(self._lookup('readlink', path)['data'][:size])
+
+    def setattrx(self, path, stx, mask, flags):
+        self._setattr(self._lookup('setattrx', path), stx, mask)
+
+    def open(self, path, flags, mode=0):
+        path = self._path(path)
+        with self.lock:
+            if flags & os.O_CREAT and path not in self.nodes:
+                node = self._node(stat.S_IFREG | mode, 0, 0)
+                node['data'] = bytearray()
+                self._create('open', path, node)
+            else:
+                node = self._lookup('open', path)
+            if flags & os.O_TRUNC:
+                node['data'] = bytearray()
+            fd = len(self.shared['fds']) + 1
+            self.shared['fds'][fd] = [path, 0]
+            return fd
+
+    def read(self, fd, offset, size):
+        # at the offset of the file descriptor when @offset is negative
+        path, pos = self.shared['fds'][fd]
+        if offset >= 0:
+            pos = offset
+        data = bytes(self._lookup('read', path)['data'][pos:pos + size])
+        self.shared['fds'][fd][1] = pos + len(data)
+        return data
+
+    def write(self, fd, data, offset):
+        path, pos = self.shared['fds'][fd]
+        if offset >= 0:
+            pos = offset
+        node = self._lookup('write', path)
+        node['data'][pos:pos + len(data)] = data
+        self.shared['fds'][fd][1] = pos + len(data)
+        return len(data)
+
+    def fsetattrx(self, fd, stx, mask):
+        path = self.shared['fds'][fd][0]
+        self._setattr(self._lookup('fsetattrx', path), stx, mask)
+
+    def fsync(self, fd, syncdataonly):
+        pass
+
+    def close(self, fd):
+        pass
+
+    def sync_fs(self):
+        self.syncs += 1
+
+    def rename(self, src, dst):
+        src, dst = self._path(src), self._path(dst)
+        with self.lock:
+            node = self._lookup('rename', src)
+            if stat.S_ISDIR(node['mode']):
+                raise cephfs.OSError(errno.EISDIR, 'is a directory')
+            self._remove(src)
+            self.nodes.pop(dst, None)
+            self._add(dst, node)
+
+    def unlink(self, path):
+        path = self._path(path)
+        with self.lock:
+            node = self._lookup('unlink', path)
+            if stat.S_ISDIR(node['mode']):
+                raise cephfs.OSError(errno.EISDIR, 'is a directory')
+            self._remove(path)
+
+    def rmdir(self, path):
+        path = self._path(path)
+        with self.lock:
+            self._lookup('rmdir', path)
+            if self.walk(path):
+                raise cephfs.ObjectNotEmpty(errno.ENOTEMPTY, 'directory not empty')
+            self._remove(path)
+
+    # helpers
+
+    def _node(self, mode, uid, gid, mtime=None):
+        if mtime is None:
+            mtime = self._tick()
+        return {'mode': mode, 'uid': uid, 'gid': gid, 'data': bytearray(),
+                'atime': mtime, 'mtime': mtime}
+
+    def _tick(self):
+        with self.lock:
+            clock = self.shared['clock']
+            clock[0] += timedelta(seconds=1)
+            return clock[0]
+
+    @staticmethod
+    def _path(path):
+        if isinstance(path, str):
+            path = path.encode('utf-8')
+        return os.path.normpath(path)
+
+    def _add(self, path, node):
+        path = self._path(path)
+        with self.lock:
+            parent = self.nodes[os.path.dirname(path)]
+            parent['mtime'] = self._tick()
+            self.nodes[path] = node
+
+    def _lookup(self, op, path):
+        path = self._path(path)
+        if self.on_op is not None:
+            self.on_op(op, path)
+        err = self.fail.get((op, path))
+        if err is not None:
+            raise cephfs.OSError(err, os.strerror(err))
+        with self.lock:
+            node = self.nodes.get(path)
+            if node is None:
+                raise cephfs.ObjectNotFound(errno.ENOENT, 'no such file or directory')
+            if op in ('setattrx', 'fsetattrx', 'rmdir', 'unlink', 'rename'):
+                self.ops.append((op, path))
+            return node
+
+    def _create(self, op, path, node):
+        path = self._path(path)
+        if self.on_op is not None:
+            self.on_op(op, path)
+        err = self.fail.get((op, path))
+        if err is not None:
+            raise cephfs.OSError(err, os.strerror(err))
+        with self.lock:
+            if path in self.nodes:
+                raise cephfs.ObjectExists(errno.EEXIST, 'file exists')
+            parent = self.nodes.get(os.path.dirname(path))
+            if parent is None:
+                raise cephfs.ObjectNotFound(errno.ENOENT, 'no such file or directory')
+            parent['mtime'] = self._tick()
+            self.nodes[path] = node
+            self.ops.append((op, path))
+
+    def _remove(self, path):
+        self.nodes[os.path.dirname(path)]['mtime'] = self._tick()
+        del self.nodes[path]
+
+    def _setattr(self, node, stx, mask):
+        with self.lock:
+            if mask & cephfs.CEPH_SETATTR_MODE:
+                node['mode'] = stat.S_IFMT(node['mode']) | stat.S_IMODE(stx['mode'])
+            if mask & cephfs.CEPH_SETATTR_UID:
+                node['uid'] = stx['uid']
+            if mask & cephfs.CEPH_SETATTR_GID:
+                node['gid'] = stx['gid']
+            if mask & cephfs.CEPH_SETATTR_ATIME:
+                node['atime'] = stx['atime']
+            if mask & cephfs.CEPH_SETATTR_MTIME:
+                node['mtime'] = stx['mtime']
+
+
+def make_fs_client(fs):
+    """
+    A volume client whose connection pool hands out handles of @fs.
+    """
+    fs_client = mock.Mock()
+    fs_client.handles = []
+
+    def get_fs_handle(fs_name):
+        handle = fs.handle()
+        fs_client.handles.append(handle)
+        return handle
+
+    fs_client.connection_pool.get_fs_handle.side_effect = get_fs_handle
+    return fs_client
@@ -0,0 +1,200 @@
+import errno
+import os
+import stat
+import threading
+from collections import deque
+
+import pytest
+
+from volumes.fs.clone_engine import CloneEngine, CloneStats
+from volumes.fs.exception import VolumeException
+from volumes.tests.fixtures import FakeFS, make_fs_client
+
+SRC = b'/snap'
+DST = b'/clone'
+
+
+def make_tree(fs, depth=6, width=20):
+    """
+    a deep and a wide directory, with files, symbolic links and an empty
+    directory, owned by different users
+    """
+    fs.add_dir(SRC, mode=0o700, uid=7, gid=7)
+    path = SRC
+    for i in range(depth):
+        path = os.path.join(path, b'd%d' % i)
+        fs.add_dir(path, mode=0o750 - i, uid=i, gid=100 + i)
+        fs.add_file(os.path.join(path, b'f'), data=b'x' * i, mode=0o600, uid=i, gid=i)
+    wide = os.path.join(SRC, b'wide')
+    fs.add_dir(wide, mode=0o711, uid=1000, gid=1000)
+    for i in range(width):
+        fs.add_file(os.path.join(wide, b'f%d' % i), data=b'%d' % i, mode=0o640 + i % 8,
+                    uid=1000 + i, gid=2000 + i)
+    fs.add_symlink(os.path.join(wide, b'link'), b'f0', uid=3, gid=4)
+    fs.add_dir(os.path.join(wide, b'empty'), mode=0o555, uid=5, gid=6)
+    # the clone root is the subvolume, created beforehand
+    fs.add_dir(DST, mode=0o755)
+
+
+def run_copy(fs, nr_workers=4, should_cancel=lambda: False):
+    fs_client = make_fs_client(fs)
+    engine = CloneEngine(fs_client, 'vol', nr_workers, should_cancel, CloneStats())
+    engine.copy(fs_client.connection_pool.get_fs_handle('vol'), SRC, DST)
+    return engine, fs_client
+
+
+def assert_same(fs, src, dst):
+    s, d = fs.node(src), fs.node(dst)
+    assert (d['mode'], d['uid'], d['gid'], d['data']) == (s['mode'], s['uid'], s['gid'], s['data'])
+    assert (d['atime'], d['mtime']) == (s['atime'], s['mtime'])
+
+
+@pytest.mark.parametrize('nr_workers', [1, 4])
+def test_copy_tree(nr_workers):
+    fs = FakeFS()
+    make_tree(fs)
+    root_mode = fs.node(DST)['mode']
+    engine, fs_client = run_copy(fs, nr_workers)
+
+    assert fs.walk(DST) == fs.walk(SRC)
+    for path in fs.walk(SRC):
+        assert_same(fs, os.path.join(SRC, path), os.path.join(DST, path))
+    # the clone root only gets the times of the snapshot
+    assert fs.node(DST)['mode'] == root_mode
+    assert fs.node(DST)['mtime'] == fs.node(SRC)['mtime']
+
+    assert not engine.dirs and not engine.files
+    stats = engine.stats
+    assert stats.files + stats.dirs == len(fs.walk(SRC))
+    assert stats.bytes == sum(len(fs.node(os.path.join(SRC, p))['data'])
+                              for p in fs.walk(SRC)
+                              if stat.S_ISREG(fs.node(os.path.join(SRC, p))['mode']))
+
+
+def test_dir_attrs_set_after_children():
+    fs = FakeFS()
+    make_tree(fs)
+    run_copy(fs)
+
+    last = {}
+    for i, (op, path) in enumerate(fs.ops):
+        last[path] = i
+    for i, (op, path) in enumerate(fs.ops):
+        if op != 'setattrx' or not stat.S_ISDIR(fs.node(path)['mode']):
+            continue
+        # the last change to the directory or below it is its setattr
+        below = [j for p, j in last.items() if p.startswith(path + b'/')]
+        assert i == last[path] and all(j < i for j in below), path
+    # which is done once the clone root is, and ends the copy
+    assert fs.ops[-1] == ('setattrx', DST)
+
+
+def test_copy_stops_once_root_is_done():
+    fs = FakeFS()
+    make_tree(fs)
+    engine, fs_client = run_copy(fs, nr_workers=8)
+    assert engine.stopping
+    assert engine.error is None
+    assert not [t for t in threading.enumerate() if '.copy.' in t.name]
+    # a handle per worker, and the one the copy was started with
+    assert len(fs_client.handles) == 9
+    assert fs_client.connection_pool.put_fs_handle.call_count == 8
+
+
+def test_single_sync_per_worker():
+    fs = FakeFS()
+    make_tree(fs)
+    engine, fs_client = run_copy(fs, nr_workers=4)
+    workers = fs_client.handles[1:]
+    assert [handle.syncs for handle in workers] == [1, 1, 1, 1]
+
+
+class RecordingDeque(deque):
+    def append(self, item):
+        super().append(item)
+        self.longest = max(getattr(self, 'longest', 0), len(self))
+
+
+def test_files_copied_inline_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(CloneEngine, 'MAX_QUEUED_FILES', 2)
+    fs = FakeFS()
+    make_tree(fs)
+    fs_client = make_fs_client(fs)
+    engine = CloneEngine(fs_client, 'vol', 1, lambda: False, CloneStats())
+    engine.files = RecordingDeque()
+    engine.copy(fs.handle(), SRC, DST)
+
+    assert engine.files.longest == 2
+    for path in fs.walk(SRC):
+        assert_same(fs, os.path.join(SRC, path), os.path.join(DST, path))
+    assert fs.node(DST)['mtime'] == fs.node(SRC)['mtime']
+
+
+def test_failure_stops_the_copy():
+    fs = FakeFS()
+    make_tree(fs)
+    fs.fail[('open', os.path.join(SRC, b'wide', b'f3'))] = errno.EIO
+    with pytest.raises(VolumeException) as e:
+        run_copy(fs)
+    assert e.value.errno == -errno.EIO
+
+    assert os.path.join(b'wide', b'f3') not in fs.walk(DST)
+    # the clone root is left alone
+    assert ('setattrx', DST) not in fs.ops
+
+
+def test_failure_skips_sync():
+    fs = FakeFS()
+    make_tree(fs)
+    fs.fail[('mkdir', os.path.join(DST, b'wide'))] = errno.EDQUOT
+    fs_client = make_fs_client(fs)
+    engine = CloneEngine(fs_client, 'vol', 4, lambda: False, CloneStats())
+    with pytest.raises(VolumeException) as e:
+        engine.copy(fs.handle(), SRC, DST)
+    assert e.value.errno == -errno.EDQUOT
+    assert engine.stopping
+    assert [handle.syncs for handle in fs_client.handles] == [0, 0, 0, 0]
+    assert fs_client.connection_pool.put_fs_handle.call_count == 4
+
+
+def test_first_failure_is_kept():
+    engine = CloneEngine(make_fs_client(FakeFS()), 'vol', 1, lambda: False, CloneStats())
+    engine._fail(VolumeException(-errno.EIO, 'first'))
+    engine._fail(VolumeException(-errno.ENOSPC, 'second'))
+    assert engine.stopping
+    assert engine.error.errno == -errno.EIO
+
+
+def test_cancel():
+    fs = FakeFS()
+    make_tree(fs, width=200)
+    canceled = threading.Event()
+    created = []
+
+    def on_op(op, path):
+        if op == 'open' and path.startswith(DST):
+            created.append(path)
+            if len(created) == 10:
+                canceled.set()
+
+    fs.on_op = on_op
+    fs_client = make_fs_client(fs)
+    engine = CloneEngine(fs_client, 'vol', 4, canceled.is_set, CloneStats())
+    try:
+        engine.copy(fs.handle(), SRC, DST)
+    except VolumeException as e:
+        # a file being copied when the clone got canceled
+        assert e.errno == -errno.EINTR
+    assert engine.stopping
+    assert len(fs.walk(DST)) < len(fs.walk(SRC))
+    assert ('setattrx', DST) not in fs.ops
+    assert [handle.syncs for handle in fs_client.handles] == [0, 0, 0, 0]
+
+
+def test_missing_source():
+    fs = FakeFS()
+    fs.add_dir(DST)
+    fs_client = make_fs_client(fs)
+    engine = CloneEngine(fs_client, 'vol', 4, lambda: False, CloneStats())
+    engine.copy(fs.handle(), SRC, DST)
+    assert fs_client.handles == []
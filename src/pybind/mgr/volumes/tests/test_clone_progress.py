@@ -0,0 +1,63 @@
+import pytest
+
+from volumes.fs import async_cloner
+from volumes.fs.operations.versions.metadata_manager import MetadataManager
+from volumes.fs.operations.versions.subvolume_v1 import SubvolumeV1
+from volumes.tests.fixtures import FakeFS
+from tests import mock
+
+META = b'/clone/.meta'
+PROGRESS = {'bytes_total': 100, 'bytes_copied': 40, 'entries_total': 10, 'entries_copied': 4}
+
+
+def open_clone(fs):
+    metadata_mgr = MetadataManager(fs, META, 0o640)
+    metadata_mgr.refresh()
+    clone = SubvolumeV1.__new__(SubvolumeV1)
+    clone.metadata_mgr = metadata_mgr
+    clone.subvolname = 'clone'
+    clone.group = mock.Mock(group_name='_nogroup')
+    return clone
+
+
+@pytest.fixture
+def fs():
+    fs = FakeFS()
+    fs.add_dir(b'/clone')
+    metadata_mgr = MetadataManager(fs, META, 0o640)
+    metadata_mgr.init(1, 'clone', '/clone', 'in-progress')
+    metadata_mgr.flush()
+    return fs
+
+
+def test_clone_progress_is_saved_and_removed(fs):
+    open_clone(fs).set_clone_progress(PROGRESS)
+    assert open_clone(fs).get_clone_progress() == PROGRESS
+
+    open_clone(fs).remove_clone_progress()
+    clone = open_clone(fs)
+    assert clone.get_clone_progress() is None
+    assert MetadataManager.CLONE_PROGRESS_SECTION.encode() not in fs.node(META)['data']
+    # the rest of the metadata is kept
+    assert clone.metadata_mgr.get_global_option('state') == 'in-progress'
+
+
+def test_no_clone_progress_to_remove(fs):
+    renames = fs.ops.count(('rename', META + b'.tmp'))
+    open_clone(fs).remove_clone_progress()
+    # the metadata is left alone
+    assert fs.ops.count(('rename', META + b'.tmp')) == renames
+
+
+@pytest.mark.parametrize('handler', [async_cloner.handle_clone_complete,
+                                     # for failed and canceled clones
+                                     async_cloner.handle_clone_failed])
+def test_clone_progress_removed_when_clone_finishes(monkeypatch, handler):
+    subvols = (mock.Mock(), mock.Mock(), mock.Mock())
+    open_pair = mock.MagicMock()
+    open_pair.return_value.__enter__.return_value = subvols
+    monkeypatch.setattr(async_cloner, 'open_clone_subvol_pair_in_vol', open_pair)
+
+    assert handler(mock.Mock(), mock.Mock(), 'vol', 'index', None, 'clone', lambda: False) == (None, True)
+    subvols[0].remove_clone_progress.assert_called_once_with()
+    subvols[1].detach_snapshot.assert_called_once_with(subvols[2], 'index')
@@ -0,0 +1,325 @@
+import errno
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import cephfs
+import pytest
+
+from volumes.fs import volume
+from volumes.fs.exception import VolumeException
+from volumes.fs.operations.trash import PurgeTree, _PurgeDir
+from volumes.fs.purge_queue import PurgeHelperJob, ThreadPoolPurgeQueueMixin
+from volumes.fs.volume import VolumeClient
+from volumes.tests.fixtures import FakeFS, make_fs_client
+from tests import mock
+
+TRASH = b'/volumes/_deleting/entry'
+
+
+def make_trash(nr_dirs=8, nr_files=4, depth=3):
+    fs = FakeFS()
+    fs.add_dir(b'/volumes')
+    fs.add_dir(b'/volumes/_deleting')
+    fs.add_dir(TRASH)
+    for i in range(nr_dirs):
+        path = os.path.join(TRASH, b'd%d' % i)
+        for j in range(depth):
+            fs.add_dir(path)
+            for k in range(nr_files):
+                fs.add_file(os.path.join(path, b'f%d' % k))
+            path = os.path.join(path, b's%d' % j)
+    return fs
+
+
+def start(target, *args, name=None):
+    # daemons, not to hang the tests when one fails
+    t = threading.Thread(target=target, args=args, name=name, daemon=True)
+    t.start()
+    return t
+
+
+def run_tree(tree, fs):
+    """
+    run the purge in a thread, keeping what it raised
+    """
+    result = {}
+
+    def run():
+        try:
+            tree.run(fs.handle())
+        except VolumeException as ve:
+            result['error'] = ve
+
+    return start(run), result
+
+
+def helping(tree, fs, should_cancel=lambda: False, before_remove=None):
+    """
+    a purge thread registered as a helper of @tree, like a PurgeHelperJob
+    """
+    def helper():
+        try:
+            tree.help(fs, should_cancel)
+        finally:
+            if before_remove is not None:
+                before_remove.wait()
+            tree.remove_helper()
+
+    if not tree.add_helper():
+        return None
+    return start(helper, name='purge-helper')
+
+
+def assert_rmdir_order(fs):
+    rmdirs = [(i, path) for i, (op, path) in enumerate(fs.ops) if op == 'rmdir']
+    for i, path in rmdirs:
+        # every entry below a directory is gone before it is removed
+        assert all(j < i for j, (_, p) in enumerate(fs.ops) if p.startswith(path + b'/')), path
+    assert fs.ops[-1] == ('rmdir', TRASH)
+
+
+def test_purge():
+    fs = make_trash()
+    entries = len(fs.walk(TRASH)) + 1
+    tree = PurgeTree(TRASH, lambda: False)
+    tree.run(fs.handle())
+
+    assert TRASH not in fs.nodes
+    assert tree.done and tree.helpers == 0
+    assert tree.progress()[0] == entries
+    assert_rmdir_order(fs)
+
+
+def test_purge_with_helpers(monkeypatch):
+    monkeypatch.setattr(PurgeTree, 'WAKEUP_INTERVAL', 0)
+    fs = make_trash(nr_dirs=32)
+    entries = len(fs.walk(TRASH)) + 1
+    tree = PurgeTree(TRASH, lambda: False)
+    helpers = []
+    lock = threading.Lock()
+
+    def on_work():
+        with lock:
+            while len(helpers) < 3:
+                helper = helping(tree, fs.handle())
+                if helper is None:
+                    break
+                helpers.append(helper)
+
+    tree.on_work = on_work
+    tree.run(fs.handle())
+    for t in helpers:
+        t.join()
+
+    assert helpers
+    assert TRASH not in fs.nodes
+    assert tree.helpers == 0
+    assert tree.progress()[0] == entries
+    assert_rmdir_order(fs)
+
+
+def test_run_waits_for_helpers():
+    fs = make_trash()
+    tree = PurgeTree(TRASH, lambda: False)
+    release = threading.Event()
+    helpers = []
+    tree.on_work = lambda: helpers.append(
+        helping(tree, fs.handle(), before_remove=release))
+    owner, result = run_tree(tree, fs)
+
+    # the tree is gone, but a helper is still registered
+    owner.join(timeout=.5)
+    assert owner.is_alive()
+    assert tree.helpers == 1
+    release.set()
+    owner.join()
+    helpers[0].join()
+    assert 'error' not in result
+    assert TRASH not in fs.nodes
+
+
+def test_helper_failure_fails_the_purge():
+    fs = make_trash()
+    tree = PurgeTree(TRASH, lambda: False)
+    failing = fs.handle()
+    failing.unlink = mock.Mock(side_effect=cephfs.OSError(errno.EIO, 'io error'))
+    # the owner waits for the helper to be done with the directories it
+    # queued, which it fails on
+    tree.on_work = lambda: helping(tree, failing).join()
+
+    with pytest.raises(VolumeException) as e:
+        tree.run(fs.handle())
+    assert e.value.errno == -errno.EIO
+    assert tree.stopping and tree.helpers == 0
+    assert failing.unlink.called
+    # nothing is removed once the purge failed
+    assert TRASH in fs.nodes
+    assert ('rmdir', TRASH) not in fs.ops
+
+
+@pytest.mark.parametrize('canceled', ['owner', 'helper'])
+def test_cancel_with_helpers(canceled):
+    """
+    canceling the jobs of a volume cancels the owner and the helpers,
+    pausing the purge queue cancels the helper threads as well
+    """
+    fs = make_trash()
+    cancel = threading.Event()
+    tree = PurgeTree(TRASH, cancel.is_set if canceled == 'owner' else lambda: False)
+    helper_busy = threading.Event()
+    resume = threading.Event()
+    helper_fs = fs.handle()
+    helpers = []
+
+    def on_op(op, path):
+        if threading.current_thread().name == 'purge-helper' and op == 'opendir':
+            helper_busy.set()
+            resume.wait()
+
+    def on_work():
+        if not helpers:
+            helpers.append(helping(tree, helper_fs,
+                                   cancel.is_set if canceled == 'helper' else lambda: False))
+            # until the helper is busy with a directory
+            helper_busy.wait()
+
+    fs.on_op = on_op
+    tree.on_work = on_work
+    owner, result = run_tree(tree, fs)
+    assert helper_busy.wait(timeout=10)
+    cancel.set()
+
+    # the purge stops, once the helper is done with its directory
+    owner.join(timeout=.5)
+    assert owner.is_alive()
+    resume.set()
+    owner.join()
+    helpers[0].join()
+    assert 'error' not in result
+    assert tree.stopping and not tree.done
+    assert tree.helpers == 0
+    assert TRASH in fs.nodes
+    assert ('rmdir', TRASH) not in fs.ops
+
+
+def make_purge_queue(fs):
+    # the purge queue without its threads
+    pq = ThreadPoolPurgeQueueMixin.__new__(ThreadPoolPurgeQueueMixin)
+    pq.vc = mock.Mock()
+    pq.fs_client = make_fs_client(fs)
+    pq.purge_trees = {}
+    pq.lock = threading.Lock()
+    pq.cv = threading.Condition(pq.lock)
+    pq.q = deque(['vol'])
+    pq.jobs = {'vol': []}
+    pq.get_next_job = mock.Mock(return_value=(0, None))
+    return pq
+
+
+def test_get_helper_job():
+    fs = make_trash()
+    pq = make_purge_queue(fs)
+    # a thread purging the entry
+    pq.jobs['vol'].append((b'entry', mock.Mock()))
+    with pq.track_purge('vol', b'entry', TRASH, lambda: False) as tree:
+        assert pq.get_job() is None
+        tree.dirs.append(mock.Mock())
+        vol, job = pq.get_job()
+        assert vol == 'vol' and isinstance(job, PurgeHelperJob)
+        assert job.tree is tree and tree.helpers == 1
+
+        # nothing to help with once the purge is stopping
+        tree.stopping = True
+        assert pq.get_job() is None
+        tree.stopping = False
+        # or once the jobs of the volume got canceled
+        pq.jobs.pop('vol')
+        pq.q.clear()
+        assert pq.get_job() is None
+    assert pq.purge_trees == {}
+
+
+def test_helper_job():
+    fs = make_trash()
+    pq = make_purge_queue(fs)
+    tree = PurgeTree(TRASH, lambda: False)
+    tree.dirs.append(_PurgeDir(os.path.join(TRASH, b'd0'), None))
+    tree.helpers = 1
+    pq.execute_job('vol', PurgeHelperJob(tree), lambda: False)
+    assert tree.helpers == 0
+    assert os.path.join(TRASH, b'd0') not in fs.nodes
+
+    # the helper is unregistered even when it cannot get a handle
+    pq.fs_client.connection_pool.get_fs_handle.side_effect = \
+        VolumeException(-errno.ENOENT, 'no volume')
+    tree.helpers = 1
+    pq.execute_job('vol', PurgeHelperJob(tree), lambda: False)
+    assert tree.helpers == 0
+
+
+@contextmanager
+def yielding(value):
+    yield value
+
+
+@pytest.fixture
+def vc(monkeypatch):
+    fs = make_trash()
+    vc = VolumeClient.__new__(VolumeClient)
+    vc.mgr = mock.Mock()
+    vc.mgr.get.side_effect = lambda what: {
+        'df': {'pools': [{'id': 1, 'stats': {'bytes_used': 1, 'max_avail': 2}}]},
+        'osd_map': {'pools': [{'pool': 1, 'pool_name': 'meta'}]},
+        'mon_map': {'mons': [{'addr': '1.2.3.4:6789/0'}]},
+    }[what]
+    vc.volspec = mock.Mock(base_dir='/volumes')
+    vc.purge_queue = make_purge_queue(fs)
+    monkeypatch.setattr(volume, 'open_volume', lambda vc, volname: yielding(fs.handle()))
+    monkeypatch.setattr(volume, 'get_pool_ids', lambda mgr, volname: (1, []))
+    monkeypatch.setattr(volume, 'get_pending_subvol_deletions_count',
+                        lambda fs, path: {'pending_subvolume_deletions': 2})
+    return vc
+
+
+def test_purge_progress_in_volume_info(vc):
+    ret, out, err = vc.volume_info(vol_name='vol', human_readable=False)
+    assert ret == 0
+    assert 'purge_progress' not in json.loads(out)
+
+    with vc.purge_queue.track_purge('vol', b'a', TRASH, lambda: False) as tree:
+        tree.removed = 10
+        with vc.purge_queue.track_purge('vol', b'b', b'/volumes/_deleting/b', lambda: False):
+            with vc.purge_queue.track_purge('other', b'c', b'/volumes/_deleting/c', lambda: False):
+                ret, out, err = vc.volume_info(vol_name='vol', human_readable=False)
+    assert ret == 0
+    progress = json.loads(out)['purge_progress']
+    assert sorted(progress) == ['entries_purging', 'entries_removed', 'removal_rate']
+    assert progress['entries_purging'] == 2
+    assert progress['entries_removed'] == 10
+    assert progress['removal_rate'] > 0
+
+
+def test_purge_progress_in_subvolume_info(vc, monkeypatch):
+    subvolume = mock.Mock(base_path=b'/volumes/_nogroup/sv', VERSION=2)
+    subvolume.info.side_effect = lambda: {'state': 'snapshot-retained'}
+    monkeypatch.setattr(volume, 'open_group', lambda *args: yielding(mock.Mock()))
+    monkeypatch.setattr(volume, 'open_subvol', lambda *args: yielding(subvolume))
+
+    def info():
+        ret, out, err = vc.subvolume_info(vol_name='vol', sub_name='sv', group_name=None)
+        assert ret == 0
+        return json.loads(out)
+
+    with vc.purge_queue.track_purge('vol', b'a', b'/volumes/_nogroup/sv2/.trash/x',
+                                    lambda: False):
+        assert 'purge_progress' not in info()
+        with vc.purge_queue.track_purge('vol', b'b', b'/volumes/_nogroup/sv/.trash/y',
+                                        lambda: False) as tree:
+            tree.removed = 3
+            progress = info()['purge_progress']
+    assert progress['entries_purging'] == 1
+    assert progress['entries_removed'] == 3
+    assert 'purge_progress' not in info()
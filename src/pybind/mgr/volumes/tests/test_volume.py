@@ -0,0 +1,58 @@
+import pytest
+
+import mgr_module
+from mgr_module import NotifyType
+from mgr_util import CephfsClient
+from volumes.fs.volume import VolumeClient
+from volumes.module import Module
+from tests import mock
+
+
+def fs_map(epoch, fs_id):
+    return {
+        'epoch': epoch,
+        'filesystems': [{'id': fs_id, 'mdsmap': {'fs_name': 'vol'}}],
+    }
+
+
+@pytest.fixture
+def module():
+    with mock.patch('mgr_util.RTimer'), \
+            mock.patch('mgr_util.cephfs.LibCephFS', side_effect=lambda **kwargs: mock.MagicMock()):
+        mgr = mock.MagicMock()
+        mgr.fs_map = fs_map(1, 1)
+        mgr.get.side_effect = lambda what: mgr.fs_map
+        mgr._module_perf = mgr_module.ModulePerf()
+        # the volume client, with the clients of the cloner and purge threads
+        vc = VolumeClient.__new__(VolumeClient)
+        CephfsClient.__init__(vc, mgr)
+        vc.cloner = mock.Mock(fs_client=CephfsClient(mgr))
+        vc.purge_queue = mock.Mock(fs_client=CephfsClient(mgr))
+        m = Module.__new__(Module)
+        m.get = mgr.get
+        m.mgr = mgr
+        m.vc = vc
+        m.inited = True
+        yield m
+
+
+def test_recreated_volume_invalidates_all_pools(module):
+    vc = module.vc
+    pools = [vc.connection_pool,
+             vc.cloner.fs_client.connection_pool,
+             vc.purge_queue.fs_client.connection_pool]
+    idle = []
+    for pool in pools:
+        fs_handle = pool.get_fs_handle('vol')
+        pool.put_fs_handle('vol', fs_handle)
+        idle.append(fs_handle)
+
+    module.mgr.fs_map = fs_map(2, 2)
+    module.notify(NotifyType.fs_map, None)
+    for pool, fs_handle in zip(pools, idle):
+        # the notify thread does not wait for the connections to be aborted
+        fs_handle.abort_conn.assert_not_called()
+        assert pool.get_fs_handle('vol') is not fs_handle
+    for pool, fs_handle in zip(pools, idle):
+        pool.cleanup_connections()
+        fs_handle.abort_conn.assert_called_once()